@@ -688,17 +688,9 @@ else:
     logging.info("💻 Local environment detected - initializing database")
     init_database()
 
-# Initialize Scheduler for background tasks
-logging.info("📅 Initializing Scheduler for background tasks...")
-try:
-    from scheduler_tasks import init_scheduler
-    scheduler = init_scheduler(app)
-    if scheduler:
-        logging.info("✅ Scheduler inicializado - tarefas periódicas ativas")
-    else:
-        logging.warning("⚠️ Scheduler não inicializado - tarefas periódicas desabilitadas")
-except Exception as e:
-    logging.warning(f"⚠️ Scheduler initialization skipped: {e}")
+# O scheduler de tarefas periódicas não sobe na importação (Alembic e scripts
+# também importam este módulo): os pontos de entrada do servidor chamam
+# scheduler_tasks.iniciar_no_servidor()
 
 # Register API Blueprint last
 try:
@@ -712,4 +704,6 @@ except Exception as e:
     logging.error(f"❌ Error registering API blueprint: {e}")
 
 if __name__ == "__main__":
+    from scheduler_tasks import iniciar_no_servidor
+    iniciar_no_servidor(app)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
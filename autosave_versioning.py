@@ -0,0 +1,93 @@
+"""
+Versionamento do AutoSave - Concorrência Otimista
+Cada relatório tem um autosave_version inteiro. O cliente envia apenas os campos
+alterados junto com a versão que conhece; o servidor incrementa a versão com um
+UPDATE condicional (WHERE autosave_version = <versão do cliente>) antes de aplicar
+o patch. Se outro dispositivo salvou antes, nenhuma linha é afetada e a rota
+responde 409 com a versão e os valores atuais, em vez de sobrescrever.
+
+Clientes antigos (sem 'version' no payload) continuam funcionando: a versão é
+incrementada sem verificação, como o último-a-gravar-vence de antes.
+"""
+
+import json
+import logging
+from datetime import date, datetime
+
+from flask import jsonify
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+logger = logging.getLogger(__name__)
+
+
+def parse_version(data):
+    """Versão enviada pelo cliente ('version'), ou None se ausente/inválida"""
+    value = data.get('version')
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def claim_autosave_version(obj, expected_version):
+    """
+    Incrementa autosave_version de forma atômica.
+
+    O UPDATE condicional segura o lock da linha até o commit, então dois
+    salvamentos simultâneos com a mesma versão não passam ambos.
+
+    Returns:
+        nova versão, ou None em caso de conflito
+    """
+    from app import db
+
+    model = type(obj)
+    stmt = update(model).where(model.id == obj.id)
+    if expected_version is not None:
+        stmt = stmt.where(model.autosave_version == expected_version)
+    stmt = stmt.values(autosave_version=model.autosave_version + 1).returning(model.autosave_version)
+
+    # Sem autoflush: a verificação de versão precisa ir ao banco antes do patch
+    with db.session.no_autoflush:
+        new_version = db.session.execute(stmt.execution_options(synchronize_session=False)).scalar_one_or_none()
+    if new_version is None:
+        return None
+    # Atualiza a instância carregada sem marcá-la como alterada
+    set_committed_value(obj, 'autosave_version', new_version)
+    return new_version
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str) and value[:1] in ('[', '{'):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def conflict_response(obj, data, fields):
+    """
+    Resposta 409: versão atual e os valores do servidor para os campos que o
+    cliente tentou alterar, para que ele possa mesclar ou recarregar.
+    """
+    from app import db
+
+    db.session.rollback()
+    db.session.refresh(obj)
+    server_values = {campo: _json_value(getattr(obj, campo, None)) for campo in fields if campo in data}
+    logger.warning(f"⚠️ AutoSave: conflito de versão em {type(obj).__name__} {obj.id} "
+                   f"(cliente={data.get('version')}, servidor={obj.autosave_version})")
+    return jsonify({
+        'success': False,
+        'conflict': True,
+        'error': 'Este relatório foi alterado em outro dispositivo. Recarregue para ver a versão mais recente.',
+        'version': obj.autosave_version,
+        'server': server_values,
+        'updated_at': obj.updated_at.isoformat() if obj.updated_at else None
+    }), 409
@@ -0,0 +1,63 @@
+"""
+Configuração dos testes (pytest)
+
+Os testes nunca usam o DATABASE_URL do ambiente: shells do Railway/Replit
+exportam o banco de produção, e os fixtures criam e apagam tabelas. O app é
+importado com TEST_DATABASE_URL (padrão: SQLite em memória), e nenhuma DDL
+roda se o banco não for SQLite em memória ou um banco cujo nome termina em
+'_test'.
+
+Uso nos testes:
+    @pytest.fixture
+    def projeto(tabelas):
+        with app.app_context():
+            tabelas(User, Projeto)   # cria só o que o teste usa
+            ...
+            yield projeto
+        # as tabelas são apagadas no fim do teste
+"""
+
+import os
+
+import pytest
+from sqlalchemy.engine import make_url
+
+
+def banco_de_teste(url):
+    """True para SQLite em memória ou banco '*_test'"""
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        return url.database in (None, '', ':memory:')
+    return (url.database or '').endswith('_test')
+
+
+# Antes de qualquer `import app`: o app lê DATABASE_URL na importação
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+os.environ.pop('RAILWAY_ENVIRONMENT', None)
+if not banco_de_teste(os.environ['DATABASE_URL']):
+    raise pytest.UsageError(f"TEST_DATABASE_URL deve ser SQLite em memória ou um banco '*_test': "
+                            f"{make_url(os.environ['DATABASE_URL']).render_as_string(hide_password=True)}")
+
+
+@pytest.fixture
+def tabelas():
+    """
+    Função que cria as tabelas dos modelos pedidos (apagando restos de outro
+    teste) no banco de teste; todas são apagadas no fim do teste.
+    """
+    from app import app, db
+
+    criadas = []
+
+    def criar(*modelos):
+        assert banco_de_teste(db.engine.url), f"DDL recusada fora do banco de teste: {db.engine.url!r}"
+        novas = [modelo.__table__ for modelo in modelos]
+        db.metadata.drop_all(bind=db.engine, tables=novas)
+        db.metadata.create_all(bind=db.engine, tables=novas)
+        criadas.extend(novas)
+
+    yield criar
+
+    with app.app_context():
+        db.session.remove()
+        db.metadata.drop_all(bind=db.engine, tables=criadas)
@@ -0,0 +1,164 @@
+"""
+Contadores do Dashboard - Materializados e Atualizados por Evento
+Os números do dashboard (obras ativas, visitas agendadas, relatórios
+pendentes, usuários ativos) ficam na tabela dashboard_counters: abrir o
+dashboard é uma única consulta de poucas linhas, sem COUNT(*).
+
+Funcionamento:
+    - Um listener de sessão (como em sync_tombstones.py) vê cada flush que
+      cria, apaga ou muda o campo de um contador (status de Projeto, Visita e
+      Relatorio; ativo de User) e acumula o delta em session.info.
+    - Depois do commit, os deltas são somados numa transação curta e
+      separada: a transação da requisição não segura o lock da linha do
+      contador até o fim, então escritas concorrentes não se serializam.
+      Rollback descarta os deltas.
+    - Os campos contados têm active_history=True (models.py): o valor
+      antigo é carregado antes da atribuição e o delta sempre pode ser
+      calculado.
+    - Alterações que o listener não enxerga (UPDATE em massa, SQL direto,
+      processo que morre entre o commit e a soma) são corrigidas pela
+      tarefa agendada 'reconciliar_contadores_dashboard', que recalcula
+      tudo com COUNT; até lá o dashboard pode ficar defasado.
+    - Sem as linhas na tabela (banco novo), a primeira leitura reconcilia.
+"""
+
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+_listeners_installed = False
+# Marcador de "valor antigo não carregado": o delta não pode ser calculado
+DESCONHECIDO = object()
+
+
+def definicoes():
+    """chave -> (modelo, campo, conta(valor) -> bool, condição SQL para a reconciliação)"""
+    from models import Projeto, Visita, Relatorio, User
+    from report_status import PENDENTES_DASHBOARD, AGUARDANDO_APROVACAO
+
+    return {
+        'projetos_ativos': (Projeto, 'status', lambda v: v == 'Ativo', Projeto.status == 'Ativo'),
+        'visitas_agendadas': (Visita, 'status', lambda v: v == 'Agendada', Visita.status == 'Agendada'),
+        'relatorios_pendentes': (Relatorio, 'status', lambda v: v in PENDENTES_DASHBOARD,
+                                 Relatorio.status.in_(PENDENTES_DASHBOARD)),
+        'relatorios_aguardando_aprovacao': (Relatorio, 'status', lambda v: v == AGUARDANDO_APROVACAO,
+                                            Relatorio.status == AGUARDANDO_APROVACAO),
+        'usuarios_ativos': (User, 'ativo', lambda v: bool(v), User.ativo.is_(True)),
+    }
+
+
+class DashboardCounters:
+    """Leitura e reconciliação dos contadores"""
+
+    def valores(self):
+        """{chave: valor} de todos os contadores (uma consulta)"""
+        from app import db
+        from models import DashboardCounter
+
+        valores = dict(db.session.query(DashboardCounter.chave, DashboardCounter.valor))
+        if set(definicoes()) - set(valores):
+            valores = self.reconciliar()
+        return valores
+
+    def reconciliar(self):
+        """Recalcula todos os contadores com COUNT e grava; devolve {chave: valor}"""
+        from app import db
+        from models import DashboardCounter
+
+        agora = datetime.utcnow()
+        valores = {}
+        for chave, (modelo, _, _, condicao) in definicoes().items():
+            valores[chave] = db.session.query(db.func.count(modelo.id)).filter(condicao).scalar()
+
+        tabela = DashboardCounter.__table__
+        corrigidos = []
+        for chave, valor in valores.items():
+            atual = db.session.query(DashboardCounter.valor).filter_by(chave=chave).scalar()
+            if atual is None:
+                db.session.execute(tabela.insert().values(chave=chave, valor=valor, atualizado_em=agora))
+            elif atual != valor:
+                db.session.execute(tabela.update().where(tabela.c.chave == chave)
+                                   .values(valor=valor, atualizado_em=agora))
+                corrigidos.append(f"{chave}: {atual} -> {valor}")
+        db.session.commit()
+
+        if corrigidos:
+            logger.warning(f"⚠️ Contadores do dashboard corrigidos na reconciliação: {', '.join(corrigidos)}")
+        return valores
+
+
+def install_counter_listeners():
+    """Soma os deltas dos contadores depois do commit das mudanças"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    _listeners_installed = True
+
+    from sqlalchemy import event, inspect
+    from sqlalchemy.orm import Session
+    from models import DashboardCounter
+
+    contadores = definicoes()
+    tabela = DashboardCounter.__table__
+
+    def _antes_depois(obj, campo, session):
+        """
+        (valor antes do flush, valor depois); None no lado que não existe
+        (objeto novo/apagado). DESCONHECIDO se o valor antigo não foi carregado
+        (não deve acontecer com active_history=True).
+        """
+        if obj in session.new:
+            return None, getattr(obj, campo)
+        historico = getattr(inspect(obj).attrs, campo).history
+        if obj in session.deleted:
+            return (historico.deleted[0] if historico.deleted else getattr(obj, campo)), None
+        if not historico.has_changes():
+            return None, None
+        if not historico.deleted:
+            return DESCONHECIDO
+        return historico.deleted[0], historico.added[0] if historico.added else None
+
+    @event.listens_for(Session, 'after_flush')
+    def _acumular_deltas(session, flush_context):
+        objetos = list(session.new) + list(session.dirty) + list(session.deleted)
+        deltas = session.info.setdefault('dashboard_deltas', {})
+        for chave, (modelo, campo, conta, _) in contadores.items():
+            for obj in objetos:
+                if type(obj) is not modelo:
+                    continue
+                par = _antes_depois(obj, campo, session)
+                if par is DESCONHECIDO:
+                    # Fica para a reconciliação agendada
+                    logger.warning(f"⚠️ Contador {chave}: valor antigo de {modelo.__name__} não carregado")
+                    continue
+                antes, depois = par
+                delta = (1 if obj not in session.deleted and conta(depois) else 0) - \
+                        (1 if obj not in session.new and conta(antes) else 0)
+                if delta:
+                    deltas[chave] = deltas.get(chave, 0) + delta
+
+    @event.listens_for(Session, 'after_commit')
+    def _aplicar_apos_commit(session):
+        deltas = {chave: delta for chave, delta in session.info.pop('dashboard_deltas', {}).items() if delta}
+        if not deltas:
+            return
+        from app import db
+
+        agora = datetime.utcnow()
+        try:
+            # Transação própria e curta: o lock de cada linha dura só o UPDATE
+            with db.engine.begin() as conexao:
+                for chave, delta in sorted(deltas.items()):
+                    conexao.execute(tabela.update().where(tabela.c.chave == chave)
+                                    .values(valor=tabela.c.valor + delta, atualizado_em=agora))
+        except Exception as e:
+            logger.warning(f"⚠️ Contadores do dashboard não atualizados ({e}); a reconciliação corrige")
+
+    @event.listens_for(Session, 'after_rollback')
+    def _descartar_no_rollback(session):
+        session.info.pop('dashboard_deltas', None)
+
+
+# Create singleton instance
+dashboard_counters = DashboardCounters()
@@ -0,0 +1,578 @@
+"""
+Outbox de E-mails - Entrega em Segundo Plano
+Tira o envio dos e-mails de aprovação do ciclo da requisição: os serviços de
+e-mail só gravam uma linha por destinatário em email_outbox; o worker envia
+pelo Resend com concorrência limitada e tenta de novo em falhas transitórias.
+
+Arquitetura:
+    - enqueue(): grava as mensagens (chave de idempotência única por
+      relatório + aprovação + destinatário) e acorda o worker.
+    - Worker (threads no processo web): reivindica linhas vencidas com um
+      UPDATE condicional, então dois workers nunca enviam a mesma linha.
+    - O anexo é copiado no enqueue para o store de anexos da outbox
+      (endereçado por conteúdo, mesmo backend do photo_store: local ou S3),
+      então não depende de arquivos temporários nem do host que enfileirou.
+      A cópia é apagada quando a última linha que a usa chega a um estado
+      final (enviado/falhou).
+    - As linhas reivindicadas são agrupadas por anexo: o PDF é lido e
+      codificado uma vez por lote, e o lote sai por uma única conexão.
+      No transporte 'auto' (padrão), lotes sem anexo vão numa chamada a
+      /emails/batch do Resend (que não aceita anexos) e lotes de várias
+      mensagens com o mesmo PDF vão por uma conexão SMTP ao relay do Resend.
+    - A mesma chave vai no header Idempotency-Key do Resend: se o processo
+      morrer depois do POST, o reenvio não duplica o e-mail. O SMTP não tem
+      esse header; lá a chave vira o Message-ID, e um processo que morra
+      entre o envio e o commit pode reenviar a mensagem.
+    - O scheduler chama processar_pendentes() periodicamente para as novas
+      tentativas e para linhas de workers reiniciados. Uma linha cujo lease
+      expira já com max_tentativas (a mensagem derruba ou trava o worker)
+      vai para 'falhou' em vez de voltar à fila.
+    - O resultado final vai para EnvioRelatorio/LogEnvioEmail (relatórios comuns).
+
+Configuração (variáveis de ambiente):
+    EMAIL_OUTBOX_CONCURRENCY  = envios simultâneos (padrão: 2, limite do Resend é 2 req/s)
+    EMAIL_OUTBOX_MAX_ATTEMPTS = tentativas por mensagem (padrão: 5)
+    EMAIL_OUTBOX_BACKOFF      = segundos da primeira espera, dobrando a cada falha (padrão: 30)
+    EMAIL_OUTBOX_LEASE        = segundos até uma linha 'enviando' ser considerada perdida (padrão: 300)
+    EMAIL_OUTBOX_TRANSPORT    = 'auto' (padrão: lotes com anexo por SMTP, o resto por HTTP),
+                                'resend' (só HTTP) ou 'smtp' (só SMTP)
+    EMAIL_OUTBOX_ATTACHMENTS_PATH      = diretório dos anexos no backend local (padrão: uploads/email_outbox)
+    EMAIL_OUTBOX_ATTACHMENTS_S3_PREFIX = prefixo dos anexos no backend S3 (padrão: email_outbox/)
+    EMAIL_OUTBOX_SMTP_HOST/PORT/USER/PASSWORD = servidor SMTP (padrão: relay do Resend,
+                                smtp.resend.com:465, usuário 'resend', senha = RESEND_API_KEY)
+"""
+
+import os
+import json
+import base64
+import random
+import hashlib
+import logging
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.application import MIMEApplication
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+import requests
+from sqlalchemy import and_, or_, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_MAXIMO = 3600  # segundos
+LOTE_MAXIMO = 100  # limite do endpoint /emails/batch do Resend
+
+# Respostas do Resend que valem nova tentativa (409 = mesma chave ainda em processamento)
+STATUS_TRANSITORIOS = (408, 409, 429)
+
+
+class EnvioTransitorioError(Exception):
+    """Falha que pode dar certo numa nova tentativa (rede, 429, 5xx)"""
+
+
+class EnvioPermanenteError(Exception):
+    """Falha definitiva (destinatário inválido, anexo ausente, 4xx)"""
+
+
+_anexos_store = None
+_anexos_lock = threading.Lock()
+
+
+def get_attachment_store():
+    """Store compartilhado dos anexos da outbox (mesmo backend do photo_store)"""
+    global _anexos_store
+    if _anexos_store is None:
+        with _anexos_lock:
+            if _anexos_store is None:
+                from photo_store import build_store
+                _anexos_store = build_store(
+                    os.environ.get('EMAIL_OUTBOX_ATTACHMENTS_PATH', os.path.join('uploads', 'email_outbox')),
+                    os.environ.get('EMAIL_OUTBOX_ATTACHMENTS_S3_PREFIX', 'email_outbox/'),
+                )
+    return _anexos_store
+
+
+def chave_idempotencia(tipo, relatorio_id, referencia, destinatario):
+    """Chave estável por relatório + aprovação + destinatário"""
+    bruto = f"{tipo}:{relatorio_id}:{referencia or ''}:{destinatario.strip().lower()}"
+    return hashlib.sha256(bruto.encode('utf-8')).hexdigest()
+
+
+class EmailOutboxWorker:
+    """Fila persistente de e-mails com worker de entrega"""
+
+    def __init__(self, concurrency=None, max_attempts=None, backoff=None, lease=None, transport=None):
+        self.concurrency = concurrency or int(os.environ.get('EMAIL_OUTBOX_CONCURRENCY', '2'))
+        self.max_attempts = max_attempts or int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '5'))
+        self.backoff = backoff or int(os.environ.get('EMAIL_OUTBOX_BACKOFF', '30'))
+        self.lease = lease or int(os.environ.get('EMAIL_OUTBOX_LEASE', '300'))
+        self.transport = (transport or os.environ.get('EMAIL_OUTBOX_TRANSPORT', 'auto')).lower()
+        self._pool = None
+        self._drainer = None
+        self._lock = threading.Lock()
+
+    def _pools(self):
+        # Criados sob demanda: com gunicorn --preload o fork acontece depois do import
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='email-outbox')
+                self._drainer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='email-outbox-drain')
+                logger.info(f"📧 Worker de e-mails iniciado ({self.concurrency} envios simultâneos)")
+            return self._pool, self._drainer
+
+    def enqueue(self, mensagens, tipo, relatorio_id, projeto_id=None, usuario_id=None, referencia=None):
+        """
+        Grava as mensagens na outbox e agenda o envio.
+
+        Args:
+            mensagens: lista de dicts com destinatario, nome_destinatario, assunto,
+                corpo_html, anexo_path e anexo_nome (o arquivo é copiado para o
+                store de anexos; o caminho só precisa existir durante o enqueue)
+            referencia: distingue envios do mesmo relatório (ex.: data da aprovação);
+                a mesma referência nunca gera dois e-mails para o mesmo destinatário
+
+        Returns:
+            número de mensagens novas enfileiradas
+        """
+        from flask import current_app
+        from app import db
+        from models import EmailOutbox
+
+        novas = []
+        anexos = {}  # caminho -> hash no store (o mesmo PDF é copiado uma vez)
+        for msg in mensagens:
+            chave = chave_idempotencia(tipo, relatorio_id, referencia, msg['destinatario'])
+            anexo_path = msg.get('anexo_path')
+            if anexo_path and anexo_path not in anexos:
+                with open(anexo_path, 'rb') as f:
+                    anexos[anexo_path], _ = get_attachment_store().put_stream(f)
+            novas.append(EmailOutbox(
+                idempotency_key=chave,
+                tipo=tipo,
+                relatorio_id=relatorio_id,
+                projeto_id=projeto_id,
+                usuario_id=usuario_id,
+                destinatario=msg['destinatario'],
+                nome_destinatario=msg.get('nome_destinatario'),
+                assunto=msg['assunto'],
+                corpo_html=msg['corpo_html'],
+                anexo_hash=anexos.get(anexo_path),
+                anexo_nome=msg.get('anexo_nome') or (os.path.basename(anexo_path) if anexo_path else None),
+                status='pendente',
+                max_tentativas=self.max_attempts,
+                proxima_tentativa_em=datetime.utcnow(),
+            ))
+
+        if not novas:
+            return 0
+
+        # Jobs repetidos da mesma aprovação não duplicam envios
+        existentes = {
+            chave for (chave,) in db.session.query(EmailOutbox.idempotency_key).filter(
+                EmailOutbox.idempotency_key.in_([m.idempotency_key for m in novas])
+            )
+        }
+        novas = [m for m in novas if m.idempotency_key not in existentes]
+        if existentes:
+            logger.info(f"📧 Outbox: {len(existentes)} mensagem(ns) já enfileirada(s) para {tipo} {relatorio_id}")
+        if not novas:
+            return 0
+
+        db.session.add_all(novas)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Outro worker enfileirou a mesma aprovação ao mesmo tempo
+            db.session.rollback()
+            logger.info(f"📧 Outbox: envio de {tipo} {relatorio_id} já enfileirado por outro worker")
+            return 0
+        logger.info(f"📧 Outbox: {len(novas)} e-mail(s) enfileirado(s) para {tipo} {relatorio_id}")
+
+        self.wake(current_app._get_current_object())
+        return len(novas)
+
+    def wake(self, app):
+        """Agenda uma rodada de envio (rodadas são serializadas numa única thread)"""
+        _, drainer = self._pools()
+        drainer.submit(self._drain, app)
+
+    def _drain(self, app):
+        with app.app_context():
+            try:
+                self.processar_pendentes()
+            except Exception as e:
+                logger.error(f"❌ Outbox: erro no worker de e-mails: {e}", exc_info=True)
+            finally:
+                from app import db
+                db.session.remove()
+
+    def processar_pendentes(self, limite=50):
+        """
+        Envia as mensagens vencidas até esgotar a fila.
+
+        Returns:
+            número de mensagens processadas
+        """
+        from flask import current_app
+
+        app = current_app._get_current_object()
+        pool, _ = self._pools()
+        total = 0
+        while True:
+            ids = self._reivindicar(limite)
+            if not ids:
+                break
+            list(pool.map(lambda lote: self._enviar_lote(app, lote), self._agrupar(ids)))
+            total += len(ids)
+        return total
+
+    def _agrupar(self, ids):
+        """Agrupa as mensagens pelo anexo: cada lote lê e codifica o PDF uma única vez"""
+        from app import db
+        from models import EmailOutbox
+
+        lotes = {}
+        linhas = db.session.query(EmailOutbox.id, EmailOutbox.anexo_hash, EmailOutbox.anexo_path,
+                                  EmailOutbox.anexo_nome) \
+            .filter(EmailOutbox.id.in_(ids)).order_by(EmailOutbox.id)
+        for outbox_id, anexo_hash, anexo_path, anexo_nome in linhas:
+            lotes.setdefault((anexo_hash, anexo_path, anexo_nome), []).append(outbox_id)
+        return [ids_lote[i:i + LOTE_MAXIMO] for ids_lote in lotes.values()
+                for i in range(0, len(ids_lote), LOTE_MAXIMO)]
+
+    def _reivindicar(self, limite):
+        """Marca até `limite` linhas vencidas como 'enviando' e retorna seus ids"""
+        from app import db
+        from models import EmailOutbox
+
+        agora = datetime.utcnow()
+        self._desistir_de_leases_esgotados(agora, limite)
+        vencida = or_(
+            and_(EmailOutbox.status == 'pendente', EmailOutbox.proxima_tentativa_em <= agora),
+            and_(EmailOutbox.status == 'enviando', EmailOutbox.bloqueado_ate < agora,
+                 EmailOutbox.tentativas < EmailOutbox.max_tentativas),
+        )
+        candidatos = db.session.query(EmailOutbox.id).filter(vencida) \
+            .order_by(EmailOutbox.proxima_tentativa_em).limit(limite).all()
+
+        reivindicados = []
+        for (outbox_id,) in candidatos:
+            # UPDATE condicional: outro worker pode ter reivindicado a linha entre o SELECT e aqui
+            resultado = db.session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == outbox_id, vencida)
+                .values(status='enviando',
+                        tentativas=EmailOutbox.tentativas + 1,
+                        bloqueado_ate=agora + timedelta(seconds=self.lease))
+                .execution_options(synchronize_session=False)
+            )
+            if resultado.rowcount == 1:
+                reivindicados.append(outbox_id)
+        db.session.commit()
+        return reivindicados
+
+    def _desistir_de_leases_esgotados(self, agora, limite):
+        """
+        Linhas 'enviando' com lease expirado e sem tentativas restantes: o
+        worker caiu ou travou nelas max_tentativas vezes, então vão para 'falhou'.
+        """
+        from app import db
+        from models import EmailOutbox
+
+        esgotada = and_(EmailOutbox.status == 'enviando', EmailOutbox.bloqueado_ate < agora,
+                        EmailOutbox.tentativas >= EmailOutbox.max_tentativas)
+        candidatos = db.session.query(EmailOutbox.id).filter(esgotada).limit(limite).all()
+
+        desistidas = []
+        for (outbox_id,) in candidatos:
+            erro = 'Envio interrompido (worker caiu ou travou) em todas as tentativas'
+            resultado = db.session.execute(
+                update(EmailOutbox)
+                .where(EmailOutbox.id == outbox_id, esgotada)
+                .values(status='falhou', bloqueado_ate=None, ultimo_erro=erro)
+                .execution_options(synchronize_session=False)
+            )
+            if resultado.rowcount == 1:
+                desistidas.append(outbox_id)
+        if not desistidas:
+            db.session.commit()
+            return
+
+        mensagens = EmailOutbox.query.filter(EmailOutbox.id.in_(desistidas)).all()
+        for msg in mensagens:
+            logger.error(f"❌ Outbox: e-mail {msg.id} para {msg.destinatario} desistiu após "
+                         f"{msg.tentativas} tentativas interrompidas")
+            self._registrar_historico(msg)
+        db.session.commit()
+        self._liberar_anexos({msg.anexo_hash for msg in mensagens if msg.anexo_hash})
+
+    def _enviar_lote(self, app, ids):
+        """Envia um lote de mensagens reivindicadas (mesmo anexo) e registra os resultados"""
+        with app.app_context():
+            from app import db
+            from models import EmailOutbox
+
+            try:
+                mensagens = EmailOutbox.query.filter(
+                    EmailOutbox.id.in_(ids), EmailOutbox.status == 'enviando'
+                ).order_by(EmailOutbox.id).all()
+                if not mensagens:
+                    return
+
+                resultados = self._transportar(mensagens)
+                for msg in mensagens:
+                    self._aplicar_resultado(msg, resultados[msg.id])
+                db.session.commit()
+                self._liberar_anexos({msg.anexo_hash for msg in mensagens
+                                      if msg.anexo_hash and msg.status in ('enviado', 'falhou')})
+            except Exception as e:
+                db.session.rollback()
+                # As linhas continuam 'enviando' e voltam à fila quando o lease expirar
+                logger.error(f"❌ Outbox: erro ao processar lote {ids}: {e}", exc_info=True)
+            finally:
+                db.session.remove()
+
+    def _liberar_anexos(self, hashes):
+        """Apaga do store os anexos que nenhuma linha pendente/enviando ainda usa"""
+        from app import db
+        from models import EmailOutbox
+
+        for anexo_hash in hashes:
+            em_uso = db.session.query(EmailOutbox.id).filter(
+                EmailOutbox.anexo_hash == anexo_hash,
+                EmailOutbox.status.in_(('pendente', 'enviando')),
+            ).first()
+            if em_uso is None:
+                try:
+                    get_attachment_store().delete(anexo_hash)
+                except Exception as e:
+                    logger.warning(f"⚠️ Outbox: não foi possível apagar o anexo {anexo_hash[:12]}: {e}")
+
+    def _aplicar_resultado(self, msg, resultado):
+        """resultado: id do provedor (sucesso) ou a exceção do envio"""
+        if isinstance(resultado, EnvioTransitorioError):
+            msg.ultimo_erro = str(resultado)
+            if msg.tentativas >= msg.max_tentativas:
+                msg.status = 'falhou'
+                logger.error(f"❌ Outbox: e-mail {msg.id} para {msg.destinatario} desistiu após "
+                             f"{msg.tentativas} tentativas: {resultado}")
+            else:
+                espera = self._espera(msg.tentativas)
+                msg.status = 'pendente'
+                msg.proxima_tentativa_em = datetime.utcnow() + timedelta(seconds=espera)
+                logger.warning(f"⚠️ Outbox: e-mail {msg.id} para {msg.destinatario} falhou "
+                               f"({resultado}); nova tentativa em {espera:.0f}s")
+        elif isinstance(resultado, Exception):
+            msg.status = 'falhou'
+            msg.ultimo_erro = str(resultado)
+            logger.error(f"❌ Outbox: e-mail {msg.id} para {msg.destinatario} rejeitado: {resultado}")
+        else:
+            msg.provider_id = resultado
+            msg.status = 'enviado'
+            msg.enviado_em = datetime.utcnow()
+            msg.ultimo_erro = None
+            logger.info(f"✅ Outbox: e-mail {msg.id} enviado para {msg.destinatario} "
+                        f"(tentativa {msg.tentativas}) - ID: {msg.provider_id}")
+
+        msg.bloqueado_ate = None
+        if msg.status in ('enviado', 'falhou'):
+            self._registrar_historico(msg)
+
+    def _espera(self, tentativas):
+        """Backoff exponencial com jitter"""
+        espera = min(self.backoff * (2 ** (tentativas - 1)), BACKOFF_MAXIMO)
+        return espera * random.uniform(1.0, 1.2)
+
+    def _transportar(self, mensagens):
+        """
+        Envia o lote pelo transporte configurado.
+
+        Returns:
+            {outbox_id: id do provedor ou exceção}
+        """
+        msg = mensagens[0]
+        anexo = None
+        if msg.anexo_hash:
+            store = get_attachment_store()
+            if not store.exists(msg.anexo_hash):
+                erro = EnvioPermanenteError(f"Anexo não encontrado no store: {msg.anexo_hash}")
+                return {m.id: erro for m in mensagens}
+            anexo = (msg.anexo_nome or 'relatorio.pdf', store.read(msg.anexo_hash))
+        elif msg.anexo_path:
+            if not os.path.exists(msg.anexo_path):
+                erro = EnvioPermanenteError(f"Anexo não encontrado: {msg.anexo_path}")
+                return {m.id: erro for m in mensagens}
+            with open(msg.anexo_path, 'rb') as f:
+                anexo = (msg.anexo_nome or os.path.basename(msg.anexo_path), f.read())
+
+        if self.transport == 'smtp' or (self.transport == 'auto' and anexo and len(mensagens) > 1):
+            return self._enviar_smtp(mensagens, anexo)
+        return self._enviar_resend(mensagens, anexo)
+
+    def _enviar_resend(self, mensagens, anexo):
+        """
+        Resend via HTTP numa única conexão (keep-alive).
+
+        Sem anexo o lote inteiro vai numa chamada a /emails/batch; se o Resend
+        rejeitar o lote (ex.: um endereço inválido), cai para envios
+        individuais para que só o destinatário problemático falhe. O endpoint
+        de lote não aceita anexos: com o transporte 'resend', mensagens com
+        PDF são enviadas uma a uma, reaproveitando o mesmo base64.
+        """
+        from email_service_unified import get_email_service
+
+        servico = get_email_service()
+        anexos = None
+        if anexo:
+            anexos = [{"filename": anexo[0], "content": base64.b64encode(anexo[1]).decode('utf-8')}]
+
+        with requests.Session() as sessao:
+            sessao.headers.update({
+                "Authorization": f"Bearer {servico.api_key}",
+                "Content-Type": "application/json",
+            })
+
+            if anexos is None and len(mensagens) > 1:
+                try:
+                    return self._post_resend_batch(sessao, servico, mensagens)
+                except EnvioTransitorioError as e:
+                    return {m.id: e for m in mensagens}
+                except EnvioPermanenteError as e:
+                    logger.warning(f"⚠️ Outbox: lote de {len(mensagens)} e-mails rejeitado ({e}); "
+                                   f"enviando individualmente")
+
+            resultados = {}
+            for msg in mensagens:
+                payload = self._payload_resend(servico, msg)
+                if anexos:
+                    payload["attachments"] = anexos
+                try:
+                    resposta = self._post(sessao, servico.resend_endpoint, payload, msg.idempotency_key)
+                    resultados[msg.id] = resposta.get('id')
+                except (EnvioTransitorioError, EnvioPermanenteError) as e:
+                    resultados[msg.id] = e
+            return resultados
+
+    def _post_resend_batch(self, sessao, servico, mensagens):
+        chave = hashlib.sha256(':'.join(m.idempotency_key for m in mensagens).encode('utf-8')).hexdigest()
+        resposta = self._post(sessao, servico.resend_endpoint.rstrip('/') + '/batch',
+                              [self._payload_resend(servico, m) for m in mensagens], chave)
+        enviados = resposta.get('data') or []
+        if len(enviados) != len(mensagens):
+            raise EnvioPermanenteError(f"Resposta de lote inesperada: {len(enviados)}/{len(mensagens)} ids")
+        return {m.id: item.get('id') for m, item in zip(mensagens, enviados)}
+
+    @staticmethod
+    def _payload_resend(servico, msg):
+        return {
+            "from": servico.from_email,
+            "to": msg.destinatario,
+            "subject": msg.assunto,
+            "html": msg.corpo_html,
+        }
+
+    @staticmethod
+    def _post(sessao, url, payload, idempotency_key):
+        """POST para o Resend; retorna o JSON da resposta ou levanta Envio*Error"""
+        try:
+            response = sessao.post(url, json=payload, headers={"Idempotency-Key": idempotency_key}, timeout=30)
+        except (requests.Timeout, requests.ConnectionError) as e:
+            raise EnvioTransitorioError(f"{type(e).__name__}: {e}")
+
+        if response.status_code == 200:
+            return response.json()
+
+        erro = f"HTTP {response.status_code}: {response.text[:300]}"
+        if response.status_code in STATUS_TRANSITORIOS or response.status_code >= 500:
+            raise EnvioTransitorioError(erro)
+        raise EnvioPermanenteError(erro)
+
+    def _enviar_smtp(self, mensagens, anexo):
+        """
+        Uma conexão SMTP autenticada para o lote inteiro; a parte MIME do
+        anexo é codificada uma vez e reaproveitada em todas as mensagens.
+        """
+        from email_service_unified import get_email_service
+
+        servico = get_email_service()
+        host = os.environ.get('EMAIL_OUTBOX_SMTP_HOST', 'smtp.resend.com')
+        port = int(os.environ.get('EMAIL_OUTBOX_SMTP_PORT', '465'))
+        usuario = os.environ.get('EMAIL_OUTBOX_SMTP_USER', 'resend')
+        senha = os.environ.get('EMAIL_OUTBOX_SMTP_PASSWORD') or servico.api_key
+
+        parte_anexo = None
+        if anexo:
+            parte_anexo = MIMEApplication(anexo[1], _subtype='pdf')
+            parte_anexo.add_header('Content-Disposition', 'attachment', filename=anexo[0])
+
+        try:
+            conexao = smtplib.SMTP_SSL(host, port, timeout=30)
+            conexao.login(usuario, senha)
+        except (smtplib.SMTPException, OSError) as e:
+            erro = EnvioTransitorioError(f"SMTP {host}:{port}: {type(e).__name__}: {e}")
+            return {m.id: erro for m in mensagens}
+
+        resultados = {}
+        with conexao:
+            for msg in mensagens:
+                mime = MIMEMultipart()
+                mime['From'] = servico.from_email
+                mime['To'] = msg.destinatario
+                mime['Subject'] = msg.assunto
+                # Message-ID estável: reenvios da mesma mensagem são identificáveis pelo servidor
+                mime['Message-ID'] = f"<{msg.idempotency_key}@email-outbox>"
+                mime.attach(MIMEText(msg.corpo_html, 'html', 'utf-8'))
+                if parte_anexo is not None:
+                    mime.attach(parte_anexo)
+                try:
+                    conexao.send_message(mime)
+                    resultados[msg.id] = None
+                except smtplib.SMTPRecipientsRefused as e:
+                    resultados[msg.id] = EnvioPermanenteError(f"SMTP recusou {msg.destinatario}: {e.recipients}")
+                except smtplib.SMTPResponseException as e:
+                    erro_cls = EnvioPermanenteError if e.smtp_code >= 500 else EnvioTransitorioError
+                    resultados[msg.id] = erro_cls(f"SMTP {e.smtp_code}: {e.smtp_error!r}")
+                except (smtplib.SMTPException, OSError) as e:
+                    # Conexão perdida: esta e as restantes voltam para a fila
+                    erro = EnvioTransitorioError(f"SMTP: {type(e).__name__}: {e}")
+                    for restante in mensagens:
+                        resultados.setdefault(restante.id, erro)
+                    break
+        return resultados
+
+    def _registrar_historico(self, msg):
+        """Resultado final nas tabelas de histórico de envio (apenas relatórios comuns)"""
+        from app import db
+        from models import EnvioRelatorio, LogEnvioEmail
+
+        if msg.tipo != 'relatorio':
+            return
+
+        enviado = msg.status == 'enviado'
+        db.session.add(EnvioRelatorio(
+            relatorio_id=msg.relatorio_id,
+            email_destinatario=msg.destinatario[:120],
+            nome_destinatario=msg.nome_destinatario,
+            data_envio=msg.enviado_em or datetime.utcnow(),
+            status_entrega='Enviado' if enviado else 'Falhou',
+            tentativas=msg.tentativas,
+            erro_envio=msg.ultimo_erro,
+        ))
+        if msg.projeto_id and msg.usuario_id:
+            db.session.add(LogEnvioEmail(
+                projeto_id=msg.projeto_id,
+                relatorio_id=msg.relatorio_id,
+                usuario_id=msg.usuario_id,
+                destinatarios=json.dumps([msg.destinatario]),
+                assunto=msg.assunto,
+                status='enviado' if enviado else 'falhou',
+                erro_detalhes=msg.ultimo_erro,
+                data_envio=msg.enviado_em or datetime.utcnow(),
+            ))
+
+
+# Create singleton instance
+email_outbox = EmailOutboxWorker()
@@ -365,14 +365,14 @@ class ReportApprovalEmailService:
                 'error': str(e)
             }
     
-    def send_approval_email(self, relatorio, pdf_path):
+    def send_approval_email(self, relatorio, pdf_path, usuario_id=None):
         """
-        Envia e-mail de aprovação com Resend SÍNCRONAMENTE (aguarda resposta).
-        Retorna o resultado real do envio.
+        Enfileira o e-mail de aprovação na outbox (email_outbox.py).
+        O envio acontece em segundo plano, com novas tentativas em falhas transitórias.
         """
         try:
             current_app.logger.info(f"\n{'='*70}")
-            current_app.logger.info(f"📧 INICIANDO ENVIO DE EMAIL - RELATÓRIO {relatorio.numero}")
+            current_app.logger.info(f"📧 ENFILEIRANDO EMAIL - RELATÓRIO {relatorio.numero}")
             current_app.logger.info(f"{'='*70}")
             
             recipients = self._get_recipients_for_report(relatorio)
@@ -383,7 +383,7 @@ class ReportApprovalEmailService:
             
             if not recipients:
                 current_app.logger.warning(f"⚠️ NENHUM DESTINATÁRIO! Retornando sucesso vazio")
-                return {'success': True, 'enviados': 0, 'error': None}
+                return {'success': True, 'enfileirados': 0, 'total': 0, 'error': None}
             
             # Obter nome da obra
             obra_nome = "Obra"
@@ -395,102 +395,38 @@ class ReportApprovalEmailService:
             # PDF existe?
             if not os.path.exists(pdf_path):
                 current_app.logger.warning(f"⚠️ PDF não encontrado: {pdf_path}")
-                return {'success': True, 'enviados': 0, 'error': None}
+                return {'success': True, 'enfileirados': 0, 'total': len(recipients), 'error': None}
             
             # Assunto: Relatório “nº do relatório” – Obra “nome da obra”
             numero_rel = getattr(relatorio, 'numero', 'N/A')
             assunto = f"Relatório {numero_rel} – Obra {obra_nome}"
             
-            # Ler PDF e converter para base64
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_base64 = base64.b64encode(pdf_file.read()).decode('utf-8')
+            from email_service_unified import resolve_recipient_names
+            nomes = resolve_recipient_names(recipients)
             
-            enviados = 0
-            erros = []
-            
-            for idx, recipient_email in enumerate(recipients):
-                try:
-                    # DELAY para respeitar rate limit de 2 requests/segundo (500ms entre requisições)
-                    if idx > 0:
-                        import time
-                        time.sleep(0.6)
-                    
-                    destinatario_nome = recipient_email.split('@')[0]
-                    try:
-                        from models import User
-                        user = User.query.filter_by(email=recipient_email).first()
-                        if user and user.nome_completo:
-                            destinatario_nome = user.nome_completo
-                    except:
-                        pass
-                    
-                    corpo_html = self._format_email_body(destinatario_nome, obra_nome, relatorio.data_aprovacao, relatorio)
-                    
-                    current_app.logger.info(f"📤 [{idx+1}/{len(recipients)}] Enviando para {recipient_email}...")
-                    
-                    # Payload para Resend
-                    payload = {
-                        "from": self.from_email,
-                        "to": recipient_email,
-                        "subject": assunto,
-                        "html": corpo_html,
-                        "attachments": [
-                            {
-                                "filename": os.path.basename(pdf_path),
-                                "content": pdf_base64
-                            }
-                        ]
-                    }
-                    
-                    # Headers com API key
-                    headers = {
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    # Fazer POST para Resend - SÍNCRONO
-                    response = requests.post(
-                        self.resend_endpoint,
-                        json=payload,
-                        headers=headers,
-                        timeout=30
-                    )
-                    
-                    current_app.logger.info(f"📨 Resposta Resend - Status: {response.status_code}")
-                    current_app.logger.info(f"📨 Resposta Body: {response.text[:500]}")
-                    
-                    if response.status_code == 200:
-                        enviados += 1
-                        response_data = response.json()
-                        email_id = response_data.get('id', 'N/A')
-                        current_app.logger.info(f"✅ Email enviado com sucesso para {recipient_email} - ID: {email_id}")
-                    else:
-                        error_msg = response.text if response.text else f"HTTP {response.status_code}"
-                        erros.append(f"{recipient_email}: {error_msg}")
-                        current_app.logger.error(f"❌ ERRO ao enviar para {recipient_email}: {error_msg}")
-                
-                except Exception as e:
-                    erro_msg = f"{recipient_email}: {type(e).__name__}: {str(e)}"
-                    erros.append(erro_msg)
-                    current_app.logger.error(f"❌ EXCEÇÃO ao enviar para {recipient_email}: {erro_msg}", exc_info=True)
-            
-            resultado_final = {
-                'success': enviados > 0,
-                'enviados': enviados,
-                'total': len(recipients),
-                'error': "; ".join(erros) if erros else None
-            }
+            mensagens = []
+            for recipient_email in recipients:
+                destinatario_nome = nomes.get(recipient_email.strip().lower()) or recipient_email.split('@')[0]
+                mensagens.append({
+                    'destinatario': recipient_email,
+                    'nome_destinatario': destinatario_nome,
+                    'assunto': assunto,
+                    'corpo_html': self._format_email_body(destinatario_nome, obra_nome, relatorio.data_aprovacao, relatorio),
+                    'anexo_path': pdf_path,
+                    'anexo_nome': os.path.basename(pdf_path),
+                })
             
-            current_app.logger.info(f"\n{'='*60}")
-            current_app.logger.info(f"📊 RESULTADO FINAL DO ENVIO")
-            current_app.logger.info(f"{'='*60}")
-            current_app.logger.info(f"✅ Enviados: {enviados}/{len(recipients)}")
-            if erros:
-                current_app.logger.info(f"❌ Erros: {'; '.join(erros)}")
-            current_app.logger.info(f"{'='*60}\n")
+            from email_outbox import email_outbox
+            enfileirados = email_outbox.enqueue(
+                mensagens, 'relatorio', relatorio.id,
+                projeto_id=relatorio.projeto_id,
+                usuario_id=usuario_id,
+                referencia=relatorio.data_aprovacao.isoformat() if relatorio.data_aprovacao else None,
+            )
             
-            return resultado_final
+            current_app.logger.info(f"📬 {enfileirados}/{len(recipients)} e-mail(s) enfileirado(s) para envio")
+            return {'success': True, 'enfileirados': enfileirados, 'total': len(recipients), 'error': None}
         
         except Exception as e:
-            current_app.logger.error(f"❌ ERRO CRÍTICO ao enviar emails: {e}", exc_info=True)
-            return {'success': False, 'enviados': 0, 'error': str(e)}
+            current_app.logger.error(f"❌ ERRO CRÍTICO ao enfileirar emails: {e}", exc_info=True)
+            return {'success': False, 'enfileirados': 0, 'error': str(e)}
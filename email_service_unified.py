@@ -10,14 +10,25 @@ import logging
 import time
 from datetime import datetime
 from flask import current_app
-from difflib import SequenceMatcher
 
 logger = logging.getLogger(__name__)
 
 
-def _similarity(a, b):
-    """Calcula similaridade entre duas strings (0-1)"""
-    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+def resolve_recipient_names(emails):
+    """Nome completo dos usuários cadastrados, por e-mail (minúsculo), numa única consulta"""
+    from sqlalchemy import func
+    from models import User
+
+    emails = list({e.strip().lower() for e in emails if e})
+    if not emails:
+        return {}
+    try:
+        rows = User.query.with_entities(func.lower(User.email), User.nome_completo) \
+            .filter(func.lower(User.email).in_(emails)).all()
+    except Exception as e:
+        logger.warning(f"⚠️ Erro ao buscar nomes dos destinatários: {e}")
+        return {}
+    return {email: nome for email, nome in rows if nome}
 
 
 class UnifiedReportEmailService:
@@ -35,49 +46,19 @@ class UnifiedReportEmailService:
     
     def _find_email_by_name(self, nome):
         """
-        Procura email de uma pessoa pelo nome em múltiplas tabelas.
+        Procura email de uma pessoa pelo nome (User e EmailCliente) no índice
+        de trigramas de recipient_index.py.
         Retorna o email encontrado ou None.
         """
         if not nome or not isinstance(nome, str):
             return None
         
-        nome_clean = nome.strip().lower()
-        best_match = None
-        best_score = 0.6  # Threshold mínimo
-        
         try:
-            from models import User, EmailCliente
-            
-            # 1. Procurar em User por nome_completo ou username
-            users = User.query.all()
-            for user in users:
-                score = 0
-                # Tentar nome_completo
-                if hasattr(user, 'nome_completo') and user.nome_completo:
-                    score = _similarity(nome_clean, user.nome_completo.strip().lower())
-                # Tentar username
-                if hasattr(user, 'username') and user.username:
-                    score = max(score, _similarity(nome_clean, user.username.strip().lower()))
-                
-                if score > best_score and user.email:
-                    best_score = score
-                    best_match = user.email.strip()
-                    logger.info(f"      ✅ Encontrado em User: {nome} → {best_match} (score: {score:.2f})")
-            
-            # 2. Procurar em EmailCliente
-            emails = EmailCliente.query.all()
-            for email_cliente in emails:
-                if hasattr(email_cliente, 'nome') and email_cliente.nome:
-                    score = _similarity(nome_clean, email_cliente.nome.strip().lower())
-                    if score > best_score and email_cliente.email:
-                        best_score = score
-                        best_match = email_cliente.email.strip()
-                        logger.info(f"      ✅ Encontrado em EmailCliente: {nome} → {best_match} (score: {score:.2f})")
-        
+            from recipient_index import recipient_index
+            return recipient_index.lookup(nome)
         except Exception as e:
             logger.debug(f"      ⚠️ Erro ao procurar email para '{nome}': {e}")
-        
-        return best_match if best_score > 0.6 else None
+            return None
     
     def _collect_all_recipients(self, relatorio):
         """
@@ -383,13 +364,14 @@ class UnifiedReportEmailService:
 </html>"""
         return html
     
-    def send_approval_email(self, relatorio, pdf_path):
+    def send_approval_email(self, relatorio, pdf_path, usuario_id=None):
         """
-        Envia email de aprovação de forma SÍNCRONA para TODOS os destinatários.
+        Enfileira o email de aprovação para TODOS os destinatários na outbox
+        (email_outbox.py); o envio acontece em segundo plano.
         """
         try:
             logger.info(f"\n{'='*70}")
-            logger.info(f"📧 INICIANDO ENVIO DE EMAIL")
+            logger.info(f"📧 ENFILEIRANDO EMAIL")
             logger.info(f"{'='*70}")
             logger.info(f"Relatório: {getattr(relatorio, 'numero', 'N/A')}")
             logger.info(f"Tipo: {type(relatorio).__name__}")
@@ -401,7 +383,7 @@ class UnifiedReportEmailService:
             
             if not recipients:
                 logger.warning(f"⚠️ Nenhum destinatário encontrado para {getattr(relatorio, 'numero', 'relatório')}")
-                return {'success': True, 'enviados': 0, 'total': 0, 'erros': []}
+                return {'success': True, 'enfileirados': 0, 'total': 0, 'erros': []}
             
             # Obter nome da obra
             obra_nome = "Obra"
@@ -413,16 +395,7 @@ class UnifiedReportEmailService:
             # Validar PDF
             if not os.path.exists(pdf_path):
                 logger.error(f"❌ PDF não encontrado: {pdf_path}")
-                return {'success': False, 'enviados': 0, 'total': len(recipients), 'erros': ['PDF não encontrado']}
-            
-            # Ler PDF
-            try:
-                with open(pdf_path, 'rb') as f:
-                    pdf_base64 = base64.b64encode(f.read()).decode('utf-8')
-                logger.info(f"✅ PDF lido com sucesso")
-            except Exception as e:
-                logger.error(f"❌ Erro ao ler PDF: {e}")
-                return {'success': False, 'enviados': 0, 'total': len(recipients), 'erros': [f'Erro ao ler PDF: {e}']}
+                return {'success': False, 'enfileirados': 0, 'total': len(recipients), 'erros': ['PDF não encontrado']}
             
             # Preparar assunto (Express: Relatório de visita do dia “xx/xx/xx” – Obra “nome da obra”)
             data_visita_str = "Data N/A"
@@ -437,108 +410,49 @@ class UnifiedReportEmailService:
                 
             assunto = f"Relatório de visita do dia {data_visita_str} – Obra {obra_nome}"
             
-            # Enviar para cada destinatário
-            enviados = 0
+            nomes = resolve_recipient_names(recipients)
+            mensagens = []
             erros = []
-            
-            logger.info(f"\n{'='*70}")
-            logger.info(f"📤 ENVIANDO EMAILS - {len(recipients)} destinatário(s)")
-            logger.info(f"{'='*70}")
-            
             for idx, recipient_email in enumerate(recipients, 1):
-                try:
-                    # Validação básica
-                    if not recipient_email or '@' not in recipient_email:
-                        logger.warning(f"❌ [{idx}/{len(recipients)}] Email inválido: {recipient_email}")
-                        erros.append(f"{recipient_email}: Email inválido")
-                        continue
-                    
-                    logger.info(f"📤 [{idx}/{len(recipients)}] Preparando email para: {recipient_email}")
-                    
-                    # Obter nome do destinatário
-                    destinatario_nome = recipient_email.split('@')[0].title()
-                    try:
-                        from models import User
-                        user = User.query.filter_by(email=recipient_email).first()
-                        if user and hasattr(user, 'nome_completo') and user.nome_completo:
-                            destinatario_nome = user.nome_completo
-                    except:
-                        pass
-                    
-                    # Montar HTML do corpo
-                    corpo_html = self._build_html_body(destinatario_nome, obra_nome, getattr(relatorio, 'data_aprovacao', None), relatorio)
-                    
-                    # Preparar payload
-                    payload = {
-                        "from": self.from_email,
-                        "to": recipient_email,
-                        "subject": assunto,
-                        "html": corpo_html,
-                        "attachments": [
-                            {
-                                "filename": os.path.basename(pdf_path),
-                                "content": pdf_base64
-                            }
-                        ]
-                    }
-                    
-                    headers = {
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    }
-                    
-                    logger.info(f"   Enviando via Resend API...")
-                    
-                    # ⏰ Delay para respeitar rate limit de 2 req/seg (0.5s = 2 req/seg)
-                    if idx > 1:
-                        time.sleep(0.5)
-                    
-                    # POST para Resend
-                    response = requests.post(
-                        self.resend_endpoint,
-                        json=payload,
-                        headers=headers,
-                        timeout=30
-                    )
-                    
-                    if response.status_code == 200:
-                        response_data = response.json()
-                        email_id = response_data.get('id', 'N/A')
-                        enviados += 1
-                        logger.info(f"✅ [{idx}/{len(recipients)}] Email enviado com sucesso! ID: {email_id}")
-                    else:
-                        erro = f"HTTP {response.status_code}: {response.text[:100]}"
-                        erros.append(f"{recipient_email}: {erro}")
-                        logger.error(f"❌ [{idx}/{len(recipients)}] Erro ao enviar para {recipient_email}: {erro}")
+                # Validação básica
+                if not recipient_email or '@' not in recipient_email:
+                    logger.warning(f"❌ [{idx}/{len(recipients)}] Email inválido: {recipient_email}")
+                    erros.append(f"{recipient_email}: Email inválido")
+                    continue
+                
+                # Obter nome do destinatário
+                destinatario_nome = nomes.get(recipient_email.strip().lower()) or recipient_email.split('@')[0].title()
                 
-                except Exception as e:
-                    erro = f"{type(e).__name__}: {str(e)}"
-                    erros.append(f"{recipient_email}: {erro}")
-                    logger.error(f"❌ Exceção ao enviar para {recipient_email}: {erro}", exc_info=True)
+                mensagens.append({
+                    'destinatario': recipient_email,
+                    'nome_destinatario': destinatario_nome,
+                    'assunto': assunto,
+                    'corpo_html': self._build_html_body(destinatario_nome, obra_nome, getattr(relatorio, 'data_aprovacao', None), relatorio),
+                    'anexo_path': pdf_path,
+                    'anexo_nome': os.path.basename(pdf_path),
+                })
             
-            # Resultado final
-            resultado = {
-                'success': enviados > 0,
-                'enviados': enviados,
+            from email_outbox import email_outbox
+            tipo = 'express' if type(relatorio).__name__ == 'RelatorioExpress' else 'relatorio'
+            data_aprovacao = getattr(relatorio, 'data_aprovacao', None)
+            enfileirados = email_outbox.enqueue(
+                mensagens, tipo, relatorio.id,
+                projeto_id=getattr(relatorio, 'projeto_id', None),
+                usuario_id=usuario_id,
+                referencia=data_aprovacao.isoformat() if data_aprovacao else None,
+            )
+            
+            logger.info(f"📬 {enfileirados}/{len(recipients)} email(s) enfileirado(s) para envio")
+            return {
+                'success': True,
+                'enfileirados': enfileirados,
                 'total': len(recipients),
                 'erros': erros
             }
-            
-            logger.info(f"\n{'='*70}")
-            logger.info(f"📊 RESULTADO FINAL")
-            logger.info(f"{'='*70}")
-            logger.info(f"✅ Enviados: {resultado['enviados']}/{resultado['total']}")
-            if erros:
-                logger.info(f"❌ Erros ({len(erros)}):")
-                for erro in erros:
-                    logger.info(f"   - {erro}")
-            logger.info(f"{'='*70}\n")
-            
-            return resultado
         
         except Exception as e:
-            logger.error(f"❌ ERRO CRÍTICO ao enviar emails: {e}", exc_info=True)
-            return {'success': False, 'enviados': 0, 'total': 0, 'erros': [str(e)]}
+            logger.error(f"❌ ERRO CRÍTICO ao enfileirar emails: {e}", exc_info=True)
+            return {'success': False, 'enfileirados': 0, 'total': 0, 'erros': [str(e)]}
 
 
 # Singleton global
@@ -209,7 +209,7 @@ class RelatorioForm(FlaskForm):
     lembrete_proxima_visita = TextAreaField('Lembrete para Próxima Visita', validators=[Optional()])
     status = SelectField('Status', choices=[
         ('Rascunho', 'Rascunho'),
-        ('Aguardando Aprovacao', 'Aguardando Aprovação'),
+        ('Aguardando Aprovação', 'Aguardando Aprovação'),
         ('Aprovado', 'Aprovado'),
         ('Rejeitado', 'Rejeitado')
     ], default='Rascunho')
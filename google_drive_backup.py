@@ -375,10 +375,10 @@ def backup_all_reports_to_drive(token_info: Dict[str, Any], db_session, Relatori
     
     generator = WeasyPrintReportGenerator()
     
-    # Usar case-insensitive para capturar todas as variações de status
-    from sqlalchemy import func
+    # Status já normalizados no banco (report_status.py)
+    from report_status import APROVADOS, APROVADO
     relatorios = Relatorio.query.filter(
-        func.lower(Relatorio.status).in_(['aprovado', 'finalizado', 'aprovado final'])
+        Relatorio.status.in_(APROVADOS)
     ).all()
     results['relatorios']['total'] = len(relatorios)
     
@@ -405,9 +405,9 @@ def backup_all_reports_to_drive(token_info: Dict[str, Any], db_session, Relatori
                 results['relatorios']['skipped'] += 1
                 continue
             
-            fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).order_by(FotoRelatorio.ordem).all()
-            
-            pdf_bytes = generator.generate_report_pdf(relatorio, fotos)
+            # Cache de PDFs: relatórios já visualizados/aprovados não são re-renderizados
+            from pdf_cache import get_report_pdf
+            pdf_bytes = get_report_pdf(relatorio)
             
             filename = f"{filename_base}_{datetime.now().strftime('%Y%m%d')}.pdf"
             
@@ -424,9 +424,8 @@ def backup_all_reports_to_drive(token_info: Dict[str, Any], db_session, Relatori
             results['relatorios']['failed'] += 1
             print(f"Erro ao fazer backup do relatório {relatorio.id}: {str(e)}")
     
-    # Usar case-insensitive para capturar todas as variações de status
     relatorios_express = RelatorioExpress.query.filter(
-        func.lower(RelatorioExpress.status).in_(['aprovado', 'finalizado', 'aprovado final'])
+        RelatorioExpress.status == APROVADO
     ).all()
     results['express']['total'] = len(relatorios_express)
     
@@ -549,9 +548,9 @@ def backup_photos_to_drive(token_info: Dict[str, Any], db_session, Relatorio, Fo
     }
     
     # 1. Processar Relatórios Comuns (Aprovados)
-    from sqlalchemy import func
+    from report_status import APROVADOS, APROVADO
     relatorios = Relatorio.query.filter(
-        func.lower(Relatorio.status).in_(['aprovado', 'finalizado', 'aprovado final'])
+        Relatorio.status.in_(APROVADOS)
     ).all()
     
     # Cache de pastas de obra para evitar chamadas repetidas à API
@@ -559,7 +558,7 @@ def backup_photos_to_drive(token_info: Dict[str, Any], db_session, Relatorio, Fo
     obra_folders_cache = {}
     
     for relatorio in relatorios:
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).all()
+        fotos = FotoRelatorio.query_with_bytes().filter_by(relatorio_id=relatorio.id).all()
         if not fotos:
             continue
             
@@ -679,11 +678,11 @@ def backup_photos_to_drive(token_info: Dict[str, Any], db_session, Relatorio, Fo
 
     # 2. Processar Relatórios Express (Aprovados)
     relatorios_express = RelatorioExpress.query.filter(
-        func.lower(RelatorioExpress.status).in_(['aprovado', 'finalizado', 'aprovado final'])
+        RelatorioExpress.status == APROVADO
     ).all()
     
     for express in relatorios_express:
-        fotos = FotoRelatorioExpress.query.filter_by(relatorio_express_id=express.id).all()
+        fotos = FotoRelatorioExpress.query_with_bytes().filter_by(relatorio_express_id=express.id).all()
         if not fotos:
             continue
             
@@ -0,0 +1,30 @@
+"""
+Hooks do gunicorn (carregado automaticamente do diretório de trabalho).
+Bind, workers e timeout continuam definidos na linha de comando (start.sh / Procfile).
+"""
+import os
+
+# Workers com threads: cada stream SSE (/api/notificacoes/stream) ocupa uma
+# thread enquanto aberto; com workers síncronos ele bloquearia o worker inteiro.
+# Só metade das threads aceita streams (NOTIFICATION_STREAM_MAX_PER_WORKER);
+# acima disso o cliente volta ao polling
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '16'))
+
+
+def post_fork(server, worker):
+    """Pré-carrega template, CSS e fontes do gerador de PDF em cada worker"""
+    try:
+        from pdf_generator_weasy import warm_up
+        warm_up()
+        server.log.info(f"🖨️ Gerador de PDF pré-carregado no worker {worker.pid}")
+    except Exception as e:
+        server.log.warning(f"⚠️ Falha no warm-up do gerador de PDF: {e}")
+
+    # Cada worker se candidata a líder do scheduler; só um executa as tarefas
+    try:
+        from app import app
+        from scheduler_tasks import iniciar_no_servidor
+        iniciar_no_servidor(app)
+    except Exception as e:
+        server.log.warning(f"⚠️ Scheduler não iniciado no worker {worker.pid}: {e}")
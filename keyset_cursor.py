@@ -0,0 +1,46 @@
+"""
+Cursor de Paginação Keyset - Compartilhado pelas Listagens
+Usado pela listagem /reports (report_listing.py) e pelos endpoints da API
+(routes_api.py), para que todas paginem do mesmo jeito.
+
+Funcionamento:
+    - O cursor é a lista dos valores das colunas de ordenação de uma linha
+      da página (datas em ISO 8601), em JSON codificado em base64 url-safe.
+    - A próxima página é uma condição WHERE sobre esses valores + LIMIT,
+      sem OFFSET: a página 50 custa o mesmo que a página 1.
+    - A última coluna da ordenação deve ser única (id) para não pular nem
+      repetir linhas com valores iguais nas anteriores.
+"""
+
+import json
+import base64
+from datetime import date
+
+
+def ler_cursor(texto, conversores):
+    """Cursor -> valores convertidos (um conversor por coluna); ValueError se inválido"""
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(texto.encode('ascii')))
+        return [converter(valor) for converter, valor in zip(conversores, valores, strict=True)]
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+
+def gerar_cursor(valores):
+    """Valores das colunas de ordenação -> cursor"""
+    valores = [v.isoformat() if isinstance(v, date) else v for v in valores]
+    return base64.urlsafe_b64encode(json.dumps(valores).encode('ascii')).decode('ascii')
+
+
+def condicao_depois(colunas, valores, descendentes):
+    """
+    WHERE das linhas que vêm depois de `valores` na ordem de `colunas`.
+    (a, b) depois de (va, vb): a > va OR (a = va AND b > vb), com < nas descendentes.
+    """
+    from app import db
+
+    condicao = None
+    for coluna, valor, desc in reversed(list(zip(colunas, valores, descendentes))):
+        depois = coluna < valor if desc else coluna > valor
+        condicao = depois if condicao is None else db.or_(depois, db.and_(coluna == valor, condicao))
+    return condicao
@@ -96,5 +96,7 @@ if os.environ.get("RAILWAY_ENVIRONMENT"):
 # Run the Flask development server
 if __name__ == '__main__':
     import os
+    from scheduler_tasks import iniciar_no_servidor
+    iniciar_no_servidor(app)
     port = int(os.environ.get("PORT", 5000))
     app.run(host="0.0.0.0", port=port, debug=False)
@@ -65,6 +65,9 @@ def main():
         from main import app as main_app
         logger.info("✅ Sistema principal carregado com sucesso!")
         
+        from scheduler_tasks import iniciar_no_servidor
+        iniciar_no_servidor(main_app)
+        
         # Get port from environment
         port = int(os.environ.get('PORT', 5000))
         logger.info(f"🌐 Servidor iniciando na porta {port}")
@@ -61,7 +61,7 @@ def migrate_photos_to_database(dry_run=False, limit=100):
             # Migrar FotoRelatorio
             print("\n📸 PROCESSANDO FOTOS DE RELATÓRIOS NORMAIS...")
             fotos_normais = FotoRelatorio.query.filter(
-                FotoRelatorio.imagem == None,
+                FotoRelatorio.imagem_hash == None,
                 FotoRelatorio.filename != None
             ).limit(limit).all()
             
@@ -78,8 +78,8 @@ def migrate_photos_to_database(dry_run=False, limit=100):
                                 foto.imagem = f.read()
                             
                             # Validar que os dados foram lidos
-                            if foto.imagem and len(foto.imagem) > 0:
-                                print(f"  ✅ [{i:3d}] Migrada: {foto.filename} ({len(foto.imagem):,} bytes)")
+                            if foto.imagem_size:
+                                print(f"  ✅ [{i:3d}] Migrada: {foto.filename} ({foto.imagem_size:,} bytes)")
                                 stats['fotos_normais_migradas'] += 1
                             else:
                                 print(f"  ❌ [{i:3d}] Erro: arquivo vazio - {foto.filename}")
@@ -100,7 +100,7 @@ def migrate_photos_to_database(dry_run=False, limit=100):
             # Migrar FotoRelatorioExpress
             print("\n📸 PROCESSANDO FOTOS DE RELATÓRIOS EXPRESS...")
             fotos_express = FotoRelatorioExpress.query.filter(
-                FotoRelatorioExpress.imagem == None,
+                FotoRelatorioExpress.imagem_hash == None,
                 FotoRelatorioExpress.filename != None
             ).limit(limit).all()
             
@@ -117,8 +117,8 @@ def migrate_photos_to_database(dry_run=False, limit=100):
                                 foto.imagem = f.read()
                             
                             # Validar que os dados foram lidos
-                            if foto.imagem and len(foto.imagem) > 0:
-                                print(f"  ✅ [{i:3d}] Migrada: {foto.filename} ({len(foto.imagem):,} bytes)")
+                            if foto.imagem_size:
+                                print(f"  ✅ [{i:3d}] Migrada: {foto.filename} ({foto.imagem_size:,} bytes)")
                                 stats['fotos_express_migradas'] += 1
                             else:
                                 print(f"  ❌ [{i:3d}] Erro: arquivo vazio - {foto.filename}")
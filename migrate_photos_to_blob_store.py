@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Script de migração que esvazia a coluna BYTEA 'imagem' das tabelas de fotos,
+movendo os bytes para o photo store endereçado por conteúdo (photo_store.py).
+
+Processa as linhas em lotes pequenos por chave (id > último id), então o consumo
+de memória é limitado a um lote por vez, independente do tamanho do banco.
+Pode ser interrompido e executado novamente: só processa linhas com 'imagem' preenchida.
+
+IMPORTANTE:
+- Sempre faça backup do banco antes de executar
+- Configure PHOTO_STORE_BACKEND / PHOTO_STORE_PATH iguais aos do servidor web
+
+Uso:
+    python migrate_photos_to_blob_store.py [--dry-run] [--batch-size N] [--table T]
+
+Opções:
+    --dry-run: Apenas conta o que seria migrado
+    --batch-size N: Linhas por lote (padrão: 20)
+    --table T: fotos_relatorio, fotos_relatorio_express ou all (padrão: all)
+"""
+
+import os
+import sys
+import argparse
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+TABELAS_FOTOS = ['fotos_relatorio', 'fotos_relatorio_express']
+
+
+def drain_table(db, store, table, batch_size=20, dry_run=False):
+    """
+    Move os bytes de uma tabela para o store, lote a lote.
+
+    Returns:
+        dict: Estatísticas da tabela
+    """
+    from sqlalchemy import text
+
+    stats = {'migradas': 0, 'bytes': 0, 'erros': []}
+
+    if dry_run:
+        row = db.session.execute(text(
+            f"SELECT COUNT(*) AS total, COALESCE(SUM(LENGTH(imagem)), 0) AS bytes "
+            f"FROM {table} WHERE imagem IS NOT NULL"
+        )).fetchone()
+        stats['migradas'] = row.total
+        stats['bytes'] = int(row.bytes)
+        return stats
+
+    last_id = 0
+    while True:
+        rows = db.session.execute(text(
+            f"SELECT id, imagem FROM {table} "
+            f"WHERE imagem IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit"
+        ), {'last_id': last_id, 'limit': batch_size}).fetchall()
+
+        if not rows:
+            break
+
+        for row in rows:
+            last_id = row.id
+            try:
+                digest, size = store.put(bytes(row.imagem))
+                db.session.execute(text(
+                    f"UPDATE {table} SET imagem = NULL, imagem_hash = :hash, imagem_size = :size "
+                    f"WHERE id = :id"
+                ), {'hash': digest, 'size': size, 'id': row.id})
+                stats['migradas'] += 1
+                stats['bytes'] += size
+            except Exception as e:
+                stats['erros'].append(f"{table} ID {row.id}: {e}")
+
+        # Commit por lote: progresso persistido e memória liberada
+        db.session.commit()
+        db.session.expunge_all()
+        print(f"  ✅ {table}: {stats['migradas']} fotos migradas ({stats['bytes']:,} bytes) - último id {last_id}")
+
+    return stats
+
+
+def migrate_blobs(tables, batch_size=20, dry_run=False):
+    from app import app, db
+    from photo_store import get_photo_store
+
+    resultado = {}
+    with app.app_context():
+        store = get_photo_store()
+        print(f"📦 Photo store: {type(store).__name__}")
+        for table in tables:
+            print(f"\n📸 PROCESSANDO {table}...")
+            resultado[table] = drain_table(db, store, table, batch_size=batch_size, dry_run=dry_run)
+    return resultado
+
+
+def main():
+    """Função principal do script"""
+    parser = argparse.ArgumentParser(
+        description='Move fotos da coluna BYTEA para o photo store endereçado por hash'
+    )
+    parser.add_argument('--dry-run', action='store_true', help='Apenas conta o que seria migrado')
+    parser.add_argument('--batch-size', type=int, default=20, help='Linhas por lote (padrão: 20)')
+    parser.add_argument('--table', choices=TABELAS_FOTOS + ['all'], default='all')
+    args = parser.parse_args()
+
+    tables = TABELAS_FOTOS if args.table == 'all' else [args.table]
+
+    print("🚀 MIGRAÇÃO DE FOTOS - BYTEA → PHOTO STORE")
+    print(f"⏰ Iniciado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"🏃 Modo: {'DRY-RUN (simulação)' if args.dry_run else 'EXECUÇÃO REAL'}")
+
+    resultado = migrate_blobs(tables, batch_size=args.batch_size, dry_run=args.dry_run)
+
+    print("\n📊 RELATÓRIO FINAL:")
+    for table, stats in resultado.items():
+        verbo = 'a migrar' if args.dry_run else 'migradas'
+        print(f"   - {table}: {stats['migradas']} fotos {verbo} ({stats['bytes']:,} bytes), {len(stats['erros'])} erros")
+        for erro in stats['erros']:
+            print(f"     ❌ {erro}")
+
+    print(f"\n⏰ Finalizado em: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+
+if __name__ == '__main__':
+    main()
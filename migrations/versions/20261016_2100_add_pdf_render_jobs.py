@@ -0,0 +1,50 @@
+"""add pdf_render_jobs table for background PDF rendering
+
+Revision ID: add_pdf_render_jobs
+Revises: add_user_devices
+Create Date: 2026-10-16 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_pdf_render_jobs'
+down_revision = 'add_user_devices'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'pdf_render_jobs' not in tables:
+        op.create_table('pdf_render_jobs',
+            sa.Column('id', sa.String(length=36), nullable=False),
+            sa.Column('tipo', sa.String(length=20), nullable=False),
+            sa.Column('relatorio_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=False, server_default='pendente'),
+            sa.Column('result_path', sa.String(length=500), nullable=True),
+            sa.Column('erro', sa.Text(), nullable=True),
+            sa.Column('acao', sa.String(length=30), nullable=True),
+            sa.Column('solicitado_por_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['solicitado_por_id'], ['users.id'], ondelete='SET NULL'),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_pdf_render_jobs_relatorio_id', 'pdf_render_jobs', ['relatorio_id'])
+    else:
+        print("⚠️ Table 'pdf_render_jobs' already exists, skipping creation.")
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'pdf_render_jobs' in inspector.get_table_names():
+        op.drop_index('ix_pdf_render_jobs_relatorio_id', table_name='pdf_render_jobs')
+        op.drop_table('pdf_render_jobs')
@@ -0,0 +1,39 @@
+"""add autosave_version to relatorios and relatorios_express
+
+Revision ID: add_autosave_version
+Revises: add_pdf_render_jobs
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_autosave_version'
+down_revision = 'add_pdf_render_jobs'
+branch_labels = None
+depends_on = None
+
+TABELAS = ['relatorios', 'relatorios_express']
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    for tabela in TABELAS:
+        colunas = [c['name'] for c in inspector.get_columns(tabela)]
+        if 'autosave_version' not in colunas:
+            op.add_column(tabela, sa.Column('autosave_version', sa.Integer(), nullable=False, server_default='0'))
+        else:
+            print(f"⚠️ Column '{tabela}.autosave_version' already exists, skipping.")
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    for tabela in TABELAS:
+        colunas = [c['name'] for c in inspector.get_columns(tabela)]
+        if 'autosave_version' in colunas:
+            op.drop_column(tabela, 'autosave_version')
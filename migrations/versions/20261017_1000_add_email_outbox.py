@@ -0,0 +1,63 @@
+"""add email_outbox table for background approval e-mail delivery
+
+Revision ID: add_email_outbox
+Revises: add_autosave_version
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_email_outbox'
+down_revision = 'add_autosave_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    tables = inspector.get_table_names()
+
+    if 'email_outbox' not in tables:
+        op.create_table('email_outbox',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('idempotency_key', sa.String(length=64), nullable=False),
+            sa.Column('tipo', sa.String(length=20), nullable=False),
+            sa.Column('relatorio_id', sa.Integer(), nullable=False),
+            sa.Column('projeto_id', sa.Integer(), nullable=True),
+            sa.Column('usuario_id', sa.Integer(), nullable=True),
+            sa.Column('destinatario', sa.String(length=255), nullable=False),
+            sa.Column('nome_destinatario', sa.String(length=200), nullable=True),
+            sa.Column('assunto', sa.String(length=500), nullable=False),
+            sa.Column('corpo_html', sa.Text(), nullable=False),
+            sa.Column('anexo_path', sa.String(length=500), nullable=True),
+            sa.Column('anexo_nome', sa.String(length=255), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=False, server_default='pendente'),
+            sa.Column('tentativas', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('max_tentativas', sa.Integer(), nullable=False, server_default='5'),
+            sa.Column('proxima_tentativa_em', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+            sa.Column('bloqueado_ate', sa.DateTime(), nullable=True),
+            sa.Column('ultimo_erro', sa.Text(), nullable=True),
+            sa.Column('provider_id', sa.String(length=100), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+            sa.Column('enviado_em', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['usuario_id'], ['users.id'], ondelete='SET NULL'),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('idempotency_key', name='uq_email_outbox_idempotency_key')
+        )
+        op.create_index('ix_email_outbox_relatorio_id', 'email_outbox', ['relatorio_id'])
+        op.create_index('ix_email_outbox_status_proxima', 'email_outbox', ['status', 'proxima_tentativa_em'])
+    else:
+        print("⚠️ Table 'email_outbox' already exists, skipping creation.")
+
+
+def downgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    if 'email_outbox' in inspector.get_table_names():
+        op.drop_index('ix_email_outbox_status_proxima', table_name='email_outbox')
+        op.drop_index('ix_email_outbox_relatorio_id', table_name='email_outbox')
+        op.drop_table('email_outbox')
@@ -0,0 +1,48 @@
+"""add pg_trgm GIN indexes on user and contact names for recipient lookup
+
+Revision ID: add_name_trigram_indexes
+Revises: add_email_outbox
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_name_trigram_indexes'
+down_revision = 'add_email_outbox'
+branch_labels = None
+depends_on = None
+
+# (índice, tabela, coluna) usados por recipient_index.py com RECIPIENT_INDEX_BACKEND=pg_trgm
+INDICES = [
+    ('ix_users_nome_completo_trgm', 'users', 'nome_completo'),
+    ('ix_users_username_trgm', 'users', 'username'),
+    ('ix_emails_clientes_nome_contato_trgm', 'emails_clientes', 'nome_contato'),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        print("⚠️ pg_trgm is PostgreSQL-only, skipping trigram indexes.")
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    inspector = sa.inspect(conn)
+    for nome, tabela, coluna in INDICES:
+        existentes = [ix['name'] for ix in inspector.get_indexes(tabela)]
+        if nome not in existentes:
+            op.execute(f'CREATE INDEX {nome} ON {tabela} USING gin (lower({coluna}) gin_trgm_ops)')
+        else:
+            print(f"⚠️ Index '{nome}' already exists, skipping.")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    for nome, _, _ in INDICES:
+        op.execute(f'DROP INDEX IF EXISTS {nome}')
@@ -0,0 +1,71 @@
+"""add relatorio_express_id to notificacoes, backfill report references and
+index the per-user listing
+
+Revision ID: add_notificacao_report_refs
+Revises: add_name_trigram_indexes
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_notificacao_report_refs'
+down_revision = 'add_name_trigram_indexes'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_notificacoes_user_status_created'
+
+# Notificações antigas só têm o relatório no link; o id passa a ficar numa coluna
+BACKFILL_RELATORIO = """
+    UPDATE notificacoes n
+       SET relatorio_id = substring(n.link_destino from '^/reports/([0-9]+)')::integer
+     WHERE n.relatorio_id IS NULL
+       AND n.tipo LIKE 'relatorio%'
+       AND n.tipo NOT LIKE 'relatorio_express%'
+       AND EXISTS (SELECT 1 FROM relatorios r
+                    WHERE r.id = substring(n.link_destino from '^/reports/([0-9]+)')::integer)
+"""
+
+BACKFILL_EXPRESS = """
+    UPDATE notificacoes n
+       SET relatorio_express_id = substring(n.link_destino from '^/relatorio-express/([0-9]+)')::integer
+     WHERE n.relatorio_express_id IS NULL
+       AND n.tipo LIKE 'relatorio_express%'
+       AND EXISTS (SELECT 1 FROM relatorios_express r
+                    WHERE r.id = substring(n.link_destino from '^/relatorio-express/([0-9]+)')::integer)
+"""
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    columns = [col['name'] for col in inspector.get_columns('notificacoes')]
+    if 'relatorio_express_id' not in columns:
+        with op.batch_alter_table('notificacoes') as batch_op:
+            batch_op.add_column(sa.Column('relatorio_express_id', sa.Integer(), nullable=True))
+            batch_op.create_foreign_key('fk_notificacoes_relatorio_express_id', 'relatorios_express',
+                                        ['relatorio_express_id'], ['id'], ondelete='SET NULL')
+    else:
+        print("⚠️ Column 'relatorio_express_id' already exists, skipping.")
+
+    if conn.dialect.name == 'postgresql':
+        op.execute(BACKFILL_RELATORIO)
+        op.execute(BACKFILL_EXPRESS)
+    else:
+        print("⚠️ Backfill of report references is PostgreSQL-only, skipping.")
+
+    indexes = [ix['name'] for ix in inspector.get_indexes('notificacoes')]
+    if INDEX_NAME not in indexes:
+        op.create_index(INDEX_NAME, 'notificacoes', ['user_id', 'status', 'created_at'])
+    else:
+        print(f"⚠️ Index '{INDEX_NAME}' already exists, skipping.")
+
+
+def downgrade():
+    op.drop_index(INDEX_NAME, table_name='notificacoes')
+    with op.batch_alter_table('notificacoes') as batch_op:
+        batch_op.drop_constraint('fk_notificacoes_relatorio_express_id', type_='foreignkey')
+        batch_op.drop_column('relatorio_express_id')
@@ -0,0 +1,32 @@
+"""add index on notificacoes.expires_at for the batched expiry cleanup
+
+Revision ID: add_notificacoes_expires_index
+Revises: add_notificacao_report_refs
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_notificacoes_expires_index'
+down_revision = 'add_notificacao_report_refs'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_notificacoes_expires_at'
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    indexes = [ix['name'] for ix in inspector.get_indexes('notificacoes')]
+    if INDEX_NAME not in indexes:
+        op.create_index(INDEX_NAME, 'notificacoes', ['expires_at'])
+    else:
+        print(f"⚠️ Index '{INDEX_NAME}' already exists, skipping.")
+
+
+def downgrade():
+    op.drop_index(INDEX_NAME, table_name='notificacoes')
@@ -0,0 +1,77 @@
+"""add updated_at columns, indexes and sync_tombstones for the app delta sync
+
+Revision ID: add_sync_delta
+Revises: add_notificacoes_expires_index
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_sync_delta'
+down_revision = 'add_notificacoes_expires_index'
+branch_labels = None
+depends_on = None
+
+# tabela -> coluna usada para preencher updated_at das linhas existentes
+NEW_UPDATED_AT = {
+    'projetos': 'created_at',
+    'visitas': 'created_at',
+    'fotos_relatorio': 'created_at',
+    'lembretes': 'criado_em',
+}
+
+# nome -> (tabela, colunas)
+INDEXES = {
+    'ix_projetos_updated_at': ('projetos', ['updated_at']),
+    'ix_visitas_responsavel_updated': ('visitas', ['responsavel_id', 'updated_at']),
+    'ix_fotos_relatorio_updated_at': ('fotos_relatorio', ['updated_at']),
+    'ix_lembretes_updated_at': ('lembretes', ['updated_at']),
+    'ix_relatorios_autor_updated': ('relatorios', ['autor_id', 'updated_at']),
+}
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    for table, source in NEW_UPDATED_AT.items():
+        columns = [col['name'] for col in inspector.get_columns(table)]
+        if 'updated_at' in columns:
+            print(f"⚠️ Column '{table}.updated_at' already exists, skipping.")
+            continue
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f"UPDATE {table} SET updated_at = COALESCE({source}, CURRENT_TIMESTAMP)")
+
+    # Relatórios antigos podem ter updated_at nulo e sumiriam das varreduras por cursor
+    op.execute("UPDATE relatorios SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL")
+
+    for name, (table, columns) in INDEXES.items():
+        indexes = [ix['name'] for ix in inspector.get_indexes(table)]
+        if name not in indexes:
+            op.create_index(name, table, columns)
+        else:
+            print(f"⚠️ Index '{name}' already exists, skipping.")
+
+    if 'sync_tombstones' not in inspector.get_table_names():
+        op.create_table(
+            'sync_tombstones',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('entidade', sa.String(length=30), nullable=False),
+            sa.Column('entidade_id', sa.Integer(), nullable=False),
+            sa.Column('removido_em', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index('ix_sync_tombstones_removido', 'sync_tombstones', ['removido_em', 'id'])
+    else:
+        print("⚠️ Table 'sync_tombstones' already exists, skipping.")
+
+
+def downgrade():
+    op.drop_index('ix_sync_tombstones_removido', table_name='sync_tombstones')
+    op.drop_table('sync_tombstones')
+    for name, (table, _) in INDEXES.items():
+        op.drop_index(name, table_name=table)
+    for table in NEW_UPDATED_AT:
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,169 @@
+"""add full-text search vectors, GIN indexes and triggers for reports
+
+Revision ID: add_report_search
+Revises: add_sync_delta
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_report_search'
+down_revision = 'add_sync_delta'
+branch_labels = None
+depends_on = None
+
+# Documento de cada relatório (usado por report_search.py):
+#   A = número, título (e obra no Express); B = descrição, categoria, local;
+#   C = conteúdo, observações finais; D = título/legenda/descrição das fotos
+FUNCTIONS = """
+CREATE OR REPLACE FUNCTION relatorios_search_vector(r relatorios) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(r.numero, '')), 'A')
+        || setweight(to_tsvector('pt_unaccent', coalesce(r.titulo, '')), 'A')
+        || setweight(to_tsvector('pt_unaccent', concat_ws(' ', r.descricao, r.categoria, r.local)), 'B')
+        || setweight(to_tsvector('pt_unaccent', concat_ws(' ', r.conteudo, r.observacoes_finais)), 'C')
+        || setweight(to_tsvector('pt_unaccent', coalesce((
+               SELECT string_agg(concat_ws(' ', f.titulo, f.legenda, f.descricao, f.tipo_servico, f.local), ' ')
+               FROM fotos_relatorio f WHERE f.relatorio_id = r.id), '')), 'D')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION relatorios_express_search_vector(r relatorios_express) RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(r.numero, '')), 'A')
+        || setweight(to_tsvector('pt_unaccent', concat_ws(' ', r.titulo, r.obra_nome, r.obra_construtora)), 'A')
+        || setweight(to_tsvector('pt_unaccent', concat_ws(' ', r.descricao, r.categoria, r.local, r.obra_endereco)), 'B')
+        || setweight(to_tsvector('pt_unaccent', concat_ws(' ', r.conteudo, r.observacoes_finais)), 'C')
+        || setweight(to_tsvector('pt_unaccent', coalesce((
+               SELECT string_agg(concat_ws(' ', f.titulo, f.legenda, f.descricao, f.tipo_servico, f.local), ' ')
+               FROM fotos_relatorio_express f WHERE f.relatorio_express_id = r.id), '')), 'D')
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION relatorios_search_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := relatorios_search_vector(NEW);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION relatorios_express_search_trigger() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := relatorios_express_search_vector(NEW);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fotos_relatorio_search_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE relatorios r SET search_vector = relatorios_search_vector(r)
+    WHERE r.id IN (
+        CASE WHEN TG_OP <> 'DELETE' THEN NEW.relatorio_id END,
+        CASE WHEN TG_OP <> 'INSERT' THEN OLD.relatorio_id END
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION fotos_relatorio_express_search_trigger() RETURNS trigger AS $$
+BEGIN
+    UPDATE relatorios_express r SET search_vector = relatorios_express_search_vector(r)
+    WHERE r.id IN (
+        CASE WHEN TG_OP <> 'DELETE' THEN NEW.relatorio_express_id END,
+        CASE WHEN TG_OP <> 'INSERT' THEN OLD.relatorio_express_id END
+    );
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Só recalcula quando muda texto que entra no documento (autosave de outros campos não paga o custo)
+TRIGGERS = """
+CREATE TRIGGER relatorios_search_update
+    BEFORE INSERT OR UPDATE OF numero, titulo, descricao, categoria, local, conteudo, observacoes_finais
+    ON relatorios FOR EACH ROW EXECUTE FUNCTION relatorios_search_trigger();
+
+CREATE TRIGGER relatorios_express_search_update
+    BEFORE INSERT OR UPDATE OF numero, titulo, obra_nome, obra_construtora, obra_endereco,
+                               descricao, categoria, local, conteudo, observacoes_finais
+    ON relatorios_express FOR EACH ROW EXECUTE FUNCTION relatorios_express_search_trigger();
+
+CREATE TRIGGER fotos_relatorio_search_update
+    AFTER INSERT OR DELETE OR UPDATE OF relatorio_id, titulo, legenda, descricao, tipo_servico, local
+    ON fotos_relatorio FOR EACH ROW EXECUTE FUNCTION fotos_relatorio_search_trigger();
+
+CREATE TRIGGER fotos_relatorio_express_search_update
+    AFTER INSERT OR DELETE OR UPDATE OF relatorio_express_id, titulo, legenda, descricao, tipo_servico, local
+    ON fotos_relatorio_express FOR EACH ROW EXECUTE FUNCTION fotos_relatorio_express_search_trigger();
+"""
+
+# (índice, tabela)
+INDICES = [
+    ('ix_relatorios_search_vector', 'relatorios'),
+    ('ix_relatorios_express_search_vector', 'relatorios_express'),
+]
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        print("⚠️ Full-text search is PostgreSQL-only, skipping (report_search.py falls back to ILIKE).")
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'pt_unaccent') THEN
+                CREATE TEXT SEARCH CONFIGURATION pt_unaccent (COPY = portuguese);
+                ALTER TEXT SEARCH CONFIGURATION pt_unaccent
+                    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+            END IF;
+        END
+        $$
+    """)
+
+    inspector = sa.inspect(conn)
+    for _, tabela in INDICES:
+        columns = [col['name'] for col in inspector.get_columns(tabela)]
+        if 'search_vector' not in columns:
+            op.execute(f'ALTER TABLE {tabela} ADD COLUMN search_vector tsvector')
+        else:
+            print(f"⚠️ Column '{tabela}.search_vector' already exists, skipping.")
+
+    op.execute(FUNCTIONS)
+    for trigger, tabela in [('relatorios_search_update', 'relatorios'),
+                            ('relatorios_express_search_update', 'relatorios_express'),
+                            ('fotos_relatorio_search_update', 'fotos_relatorio'),
+                            ('fotos_relatorio_express_search_update', 'fotos_relatorio_express')]:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger} ON {tabela}')
+    op.execute(TRIGGERS)
+
+    # Preenche os relatórios existentes
+    op.execute('UPDATE relatorios r SET search_vector = relatorios_search_vector(r)')
+    op.execute('UPDATE relatorios_express r SET search_vector = relatorios_express_search_vector(r)')
+
+    for nome, tabela in INDICES:
+        existentes = [ix['name'] for ix in inspector.get_indexes(tabela)]
+        if nome not in existentes:
+            op.execute(f'CREATE INDEX {nome} ON {tabela} USING gin (search_vector)')
+        else:
+            print(f"⚠️ Index '{nome}' already exists, skipping.")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+
+    op.execute('DROP TRIGGER IF EXISTS fotos_relatorio_express_search_update ON fotos_relatorio_express')
+    op.execute('DROP TRIGGER IF EXISTS fotos_relatorio_search_update ON fotos_relatorio')
+    op.execute('DROP TRIGGER IF EXISTS relatorios_express_search_update ON relatorios_express')
+    op.execute('DROP TRIGGER IF EXISTS relatorios_search_update ON relatorios')
+    for funcao in ('fotos_relatorio_express_search_trigger()', 'fotos_relatorio_search_trigger()',
+                   'relatorios_express_search_trigger()', 'relatorios_search_trigger()'):
+        op.execute(f'DROP FUNCTION IF EXISTS {funcao}')
+    for nome, tabela in INDICES:
+        op.execute(f'DROP INDEX IF EXISTS {nome}')
+        op.execute(f'ALTER TABLE {tabela} DROP COLUMN IF EXISTS search_vector')
+    op.execute('DROP FUNCTION IF EXISTS relatorios_express_search_vector(relatorios_express)')
+    op.execute('DROP FUNCTION IF EXISTS relatorios_search_vector(relatorios)')
+    op.execute('DROP TEXT SEARCH CONFIGURATION IF EXISTS pt_unaccent')
@@ -0,0 +1,105 @@
+"""fold legacy report status spellings into canonical values and index (status, created_at)
+
+Values that match no known spelling are moved to the "in progress" status
+(and printed), so every row satisfies the CHECK constraint: Postgres checks
+it on each UPDATE of a row, even when the constraint was added NOT VALID.
+
+Revision ID: add_report_status_canonical
+Revises: add_report_search
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from datetime import datetime
+import unicodedata
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_report_status_canonical'
+down_revision = 'add_report_search'
+branch_labels = None
+depends_on = None
+
+# Cópia dos valores de report_status.py (a migração não importa o app)
+RELATORIO = {
+    'preenchimento': 'preenchimento',
+    'em preenchimento': 'preenchimento',
+    'em andamento': 'preenchimento',
+    'rascunho': 'Rascunho',
+    'em edicao': 'Em edição',
+    'aguardando aprovacao': 'Aguardando Aprovação',
+    'pendente': 'Aguardando Aprovação',
+    'aprovado': 'Aprovado',
+    'aprovado final': 'Aprovado',
+    'rejeitado': 'Rejeitado',
+    'enviado': 'Enviado',
+    'finalizado': 'Finalizado',
+}
+
+EXPRESS = {
+    'preenchimento': 'Em preenchimento',
+    'em preenchimento': 'Em preenchimento',
+    'em andamento': 'Em preenchimento',
+    'aguardando aprovacao': 'Aguardando Aprovação',
+    'pendente': 'Aguardando Aprovação',
+    'aprovado': 'Aprovado',
+    'aprovado final': 'Aprovado',
+    'finalizado': 'Aprovado',
+    'rejeitado': 'Rejeitado',
+}
+
+# tabela -> (aliases, status para valores desconhecidos, índice, constraint)
+TABLES = {
+    'relatorios': (RELATORIO, 'preenchimento', 'ix_relatorios_status_created', 'ck_relatorios_status'),
+    'relatorios_express': (EXPRESS, 'Em preenchimento', 'ix_relatorios_express_status_created',
+                           'ck_relatorios_express_status'),
+}
+
+
+def _chave(valor):
+    sem_acento = unicodedata.normalize('NFKD', valor).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acento.replace('_', ' ').lower().split())
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+    agora = datetime.utcnow()
+
+    for table, (aliases, desconhecido, index, constraint) in TABLES.items():
+        existentes = [linha[0] for linha in conn.execute(sa.text(f'SELECT DISTINCT status FROM {table}'))
+                      if linha[0] is not None]
+        for valor in existentes:
+            canonico = aliases.get(_chave(valor))
+            if canonico is None:
+                # Linha que ficasse fora do CHECK não poderia mais ser atualizada (nem um autosave)
+                print(f"⚠️ {table}: unknown status {valor!r} mapped to {desconhecido!r}.")
+                canonico = desconhecido
+            if canonico != valor:
+                # updated_at avança para o delta sync do app receber a grafia nova
+                resultado = conn.execute(
+                    sa.text(f'UPDATE {table} SET status = :novo, updated_at = :agora WHERE status = :antigo'),
+                    {'novo': canonico, 'antigo': valor, 'agora': agora}
+                )
+                print(f"✅ {table}: {resultado.rowcount} rows '{valor}' -> '{canonico}'")
+
+        indexes = [ix['name'] for ix in inspector.get_indexes(table)]
+        if index not in indexes:
+            op.create_index(index, table, ['status', 'created_at'])
+        else:
+            print(f"⚠️ Index '{index}' already exists, skipping.")
+
+        if conn.dialect.name == 'postgresql':
+            # Todas as linhas já estão canônicas: a constraint é validada na criação
+            permitidos = ', '.join("'" + v.replace("'", "''") + "'" for v in sorted(set(aliases.values())))
+            op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}')
+            op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {constraint} CHECK (status IN ({permitidos}))')
+
+
+def downgrade():
+    conn = op.get_bind()
+    for table, (_, _, index, constraint) in TABLES.items():
+        if conn.dialect.name == 'postgresql':
+            op.execute(f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {constraint}')
+        op.drop_index(index, table_name=table)
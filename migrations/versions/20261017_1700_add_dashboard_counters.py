@@ -0,0 +1,36 @@
+"""add dashboard_counters table for materialized dashboard numbers
+
+Revision ID: add_dashboard_counters
+Revises: add_report_status_canonical
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_dashboard_counters'
+down_revision = 'add_report_status_canonical'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    # As linhas são criadas pela primeira leitura do app (reconciliação com COUNT)
+    if 'dashboard_counters' not in inspector.get_table_names():
+        op.create_table(
+            'dashboard_counters',
+            sa.Column('chave', sa.String(length=50), nullable=False),
+            sa.Column('valor', sa.Integer(), nullable=False, server_default='0'),
+            sa.Column('atualizado_em', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('chave'),
+        )
+    else:
+        print("⚠️ Table 'dashboard_counters' already exists, skipping.")
+
+
+def downgrade():
+    op.drop_table('dashboard_counters')
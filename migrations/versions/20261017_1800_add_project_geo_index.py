@@ -0,0 +1,43 @@
+"""add earthdistance GiST index on project coordinates for nearest-project queries
+
+Revision ID: add_project_geo_index
+Revises: add_dashboard_counters
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_project_geo_index'
+down_revision = 'add_dashboard_counters'
+branch_labels = None
+depends_on = None
+
+INDEX = 'ix_projetos_ll_to_earth'
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        print("⚠️ earthdistance is PostgreSQL-only, skipping (project_geo_index.py uses the in-memory index).")
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS cube')
+    op.execute('CREATE EXTENSION IF NOT EXISTS earthdistance')
+
+    inspector = sa.inspect(conn)
+    existentes = [ix['name'] for ix in inspector.get_indexes('projetos')]
+    if INDEX not in existentes:
+        # Parcial: obras sem coordenadas não entram no índice nem nas buscas
+        op.execute(f'CREATE INDEX {INDEX} ON projetos USING gist (ll_to_earth(latitude, longitude)) '
+                   'WHERE latitude IS NOT NULL AND longitude IS NOT NULL')
+    else:
+        print(f"⚠️ Index '{INDEX}' already exists, skipping.")
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        return
+    op.execute(f'DROP INDEX IF EXISTS {INDEX}')
@@ -0,0 +1,30 @@
+"""add tentativas to pdf_render_jobs for re-dispatching lost jobs
+
+Revision ID: add_pdf_job_attempts
+Revises: add_project_geo_index
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_pdf_job_attempts'
+down_revision = 'add_project_geo_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    colunas = [c['name'] for c in inspector.get_columns('pdf_render_jobs')]
+    if 'tentativas' not in colunas:
+        op.add_column('pdf_render_jobs', sa.Column('tentativas', sa.Integer(), nullable=False, server_default='0'))
+    else:
+        print("⚠️ Column 'pdf_render_jobs.tentativas' already exists, skipping.")
+
+
+def downgrade():
+    op.drop_column('pdf_render_jobs', 'tentativas')
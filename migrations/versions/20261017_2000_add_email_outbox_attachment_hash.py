@@ -0,0 +1,32 @@
+"""add anexo_hash to email_outbox (attachments copied to a shared store)
+
+Revision ID: add_email_outbox_anexo_hash
+Revises: add_pdf_job_attempts
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_email_outbox_anexo_hash'
+down_revision = 'add_pdf_job_attempts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    colunas = [c['name'] for c in inspector.get_columns('email_outbox')]
+    if 'anexo_hash' not in colunas:
+        op.add_column('email_outbox', sa.Column('anexo_hash', sa.String(length=64), nullable=True))
+        op.create_index('ix_email_outbox_anexo_hash', 'email_outbox', ['anexo_hash'])
+    else:
+        print("⚠️ Column 'email_outbox.anexo_hash' already exists, skipping.")
+
+
+def downgrade():
+    op.drop_index('ix_email_outbox_anexo_hash', table_name='email_outbox')
+    op.drop_column('email_outbox', 'anexo_hash')
@@ -0,0 +1,38 @@
+"""add result_hash and despachado_em to pdf_render_jobs (results in a shared store)
+
+Revision ID: add_pdf_job_result_hash
+Revises: add_email_outbox_anexo_hash
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'add_pdf_job_result_hash'
+down_revision = 'add_email_outbox_anexo_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    conn = op.get_bind()
+    inspector = sa.inspect(conn)
+
+    colunas = [c['name'] for c in inspector.get_columns('pdf_render_jobs')]
+    if 'result_hash' not in colunas:
+        op.add_column('pdf_render_jobs', sa.Column('result_hash', sa.String(length=64), nullable=True))
+        op.create_index('ix_pdf_render_jobs_result_hash', 'pdf_render_jobs', ['result_hash'])
+    else:
+        print("⚠️ Column 'pdf_render_jobs.result_hash' already exists, skipping.")
+
+    if 'despachado_em' not in colunas:
+        op.add_column('pdf_render_jobs', sa.Column('despachado_em', sa.DateTime(), nullable=True))
+    else:
+        print("⚠️ Column 'pdf_render_jobs.despachado_em' already exists, skipping.")
+
+
+def downgrade():
+    op.drop_column('pdf_render_jobs', 'despachado_em')
+    op.drop_index('ix_pdf_render_jobs_result_hash', table_name='pdf_render_jobs')
+    op.drop_column('pdf_render_jobs', 'result_hash')
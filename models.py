@@ -5,8 +5,13 @@ from app import db
 import os
 from cryptography.fernet import Fernet
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import validates
+from report_status import normalizar_status, PREENCHIMENTO, EXPRESS_PREENCHIMENTO
 import pytz
 
+# JSONB no Postgres; JSON no SQLite (desenvolvimento local e testes)
+JSONB_OU_JSON = JSONB().with_variant(db.JSON(), 'sqlite')
+
 # Brazil timezone for datetime defaults
 BRAZIL_TZ = pytz.timezone('America/Sao_Paulo')
 
@@ -28,7 +33,7 @@ class User(UserMixin, db.Model):
     is_developer = db.Column(db.Boolean, default=False)  # Novo tipo de usuário
     is_aprovador_express = db.Column(db.Boolean, default=False)  # Aprovador de Relatório Express
     primeiro_login = db.Column(db.Boolean, default=True)  # Campo para controlar primeiro login
-    ativo = db.Column(db.Boolean, default=True)
+    ativo = db.column_property(db.Column(db.Boolean, default=True), active_history=True)  # contador do dashboard
     cor_agenda = db.Column(db.String(7), default="#0EA5E9")  # Cor HEX para agenda - Item 29
     fcm_token = db.Column(db.Text, nullable=True)  # Token do Firebase Cloud Messaging para push notifications
     reset_token = db.Column(db.String(100), nullable=True, unique=True)  # Token para recuperação de senha
@@ -186,9 +191,10 @@ class Projeto(db.Model):
     email_principal = db.Column(db.String(255), nullable=False)  # E-mail principal obrigatório
     data_inicio = db.Column(db.Date)
     data_previsao_fim = db.Column(db.Date)
-    status = db.Column(db.String(50), default='Ativo')
+    status = db.column_property(db.Column(db.String(50), default='Ativo'), active_history=True)  # contador do dashboard
     numeracao_inicial = db.Column(db.Integer, default=1, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Delta sync do app
     
     # Informações Técnicas (todos opcionais)
     elementos_construtivos_base = db.Column(db.Text, nullable=True)
@@ -318,7 +324,7 @@ class Visita(db.Model):
     data_realizada = db.Column(db.DateTime, nullable=True)
     observacoes = db.Column(db.Text)  # Renomeado de objetivo, agora opcional
     atividades_realizadas = db.Column(db.Text)
-    status = db.Column(db.String(50), default='Agendada')
+    status = db.column_property(db.Column(db.String(50), default='Agendada'), active_history=True)  # contador do dashboard
     endereco_gps = db.Column(db.String(200))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
@@ -326,6 +332,9 @@ class Visita(db.Model):
     criado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Usuário criador - Item 31
     google_event_id = db.Column(db.String(255), nullable=True)  # ID do evento no Google Calendar para evitar duplicação
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Delta sync do app
+    
+    __table_args__ = (db.Index('ix_visitas_responsavel_updated', 'responsavel_id', 'updated_at'),)
     
     @property
     def projeto(self):
@@ -398,16 +407,22 @@ class Relatorio(db.Model):
     lembrete_proxima_visita = db.Column(db.DateTime, nullable=True)  # Lembrete para próxima visita (TIMESTAMP)
     observacoes_finais = db.Column(db.Text, nullable=True)  # Observações finais do relatório
     
-    status = db.Column(db.String(50), default='em_andamento')  # em_andamento (legado), preenchimento, Aguardando Aprovação, Aprovado, Rejeitado
+    status = db.column_property(db.Column(db.String(50), default=PREENCHIMENTO), active_history=True)  # Valores canônicos em report_status.STATUS_RELATORIO
     comentario_aprovacao = db.Column(db.Text)
-    acompanhantes = db.Column(JSONB, nullable=True)  # JSONB array of visit attendees
+    acompanhantes = db.Column(JSONB_OU_JSON, nullable=True)  # JSONB array of visit attendees
     criado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Usuário que criou
     atualizado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Último usuário que atualizou
     created_at = db.Column(db.DateTime, default=brazil_now)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    autosave_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Concorrência otimista do autosave
+    # search_vector (tsvector) existe só no Postgres, mantido por trigger; ver report_search.py
     
     # Composite unique constraint: numero must be unique within each project
-    __table_args__ = (db.UniqueConstraint('projeto_id', 'numero', name='uq_relatorios_projeto_numero'),)
+    __table_args__ = (
+        db.UniqueConstraint('projeto_id', 'numero', name='uq_relatorios_projeto_numero'),
+        db.Index('ix_relatorios_autor_updated', 'autor_id', 'updated_at'),
+        db.Index('ix_relatorios_status_created', 'status', 'created_at'),
+    )
     
     # Relacionamentos SQLAlchemy otimizados (evitam queries adicionais)
     autor = db.relationship('User', foreign_keys=[autor_id], backref='relatorios_criados', lazy='select')
@@ -431,6 +446,10 @@ class Relatorio(db.Model):
     def visita(self):
         return db.session.get(Visita, self.visita_id) if self.visita_id else None
     
+    @validates('status')
+    def _normalizar_status(self, key, valor):
+        return normalizar_status(valor)
+    
 
 class ChecklistTemplate(db.Model):
     __tablename__ = 'checklist_templates'
@@ -480,7 +499,68 @@ class ComunicacaoVisita(db.Model):
     def fotos(self):
         return FotoRelatorio.query.filter_by(relatorio_id=self.id).order_by(FotoRelatorio.ordem).all()
 
-class FotoRelatorio(db.Model):
+class FotoBlobMixin:
+    """
+    Bytes da foto vivem no photo_store (endereçado por imagem_hash).
+    A coluna 'imagem' do banco é legado e só é lida para linhas ainda não migradas.
+    Ela é mapeada como deferred/raiseload: consultas comuns trazem apenas metadados.
+    """
+
+    @classmethod
+    def query_with_bytes(cls):
+        """Query que também carrega a coluna legada de bytes - apenas para serving de imagem e PDF"""
+        from sqlalchemy.orm import undefer
+        return cls.query.options(undefer(cls.imagem_legado))
+
+    def _legacy_bytes(self):
+        """
+        Lê a coluna legada. Se ela não foi carregada (a foto não veio de
+        query_with_bytes()), faz o SELECT avulso mas registra um warning com o
+        chamador: é o mesmo N+1 de blob que o raiseload existe para mostrar.
+        """
+        from sqlalchemy import inspect as sa_inspect
+        state = sa_inspect(self)
+        if 'imagem_legado' in state.unloaded:
+            if self.id is None:
+                return None
+            import logging
+            import traceback
+            chamador = next((f for f in reversed(traceback.extract_stack()[:-1])
+                             if f.filename != __file__), None)
+            origem = f" (chamador: {chamador.filename}:{chamador.lineno} em {chamador.name})" if chamador else ''
+            logging.getLogger(__name__).warning(
+                f"⚠️ Blob legado de {type(self).__name__} {self.id} carregado fora de query_with_bytes(){origem}"
+            )
+            legado = db.session.query(type(self).imagem_legado).filter(type(self).id == self.id).scalar()
+        else:
+            legado = self.imagem_legado
+        if isinstance(legado, memoryview):
+            legado = bytes(legado)
+        return legado
+
+    @property
+    def imagem(self):
+        from photo_store import get_photo_store
+        store = get_photo_store()
+        if self.imagem_hash and store.exists(self.imagem_hash):
+            return store.read(self.imagem_hash)
+        return self._legacy_bytes()
+
+    @imagem.setter
+    def imagem(self, data):
+        if data is None:
+            self.imagem_legado = None
+            self.imagem_hash = None
+            self.imagem_size = None
+            return
+        from photo_store import get_photo_store
+        from photo_derivatives import photo_derivative_service
+        self.imagem_hash, self.imagem_size = get_photo_store().put(data)
+        self.imagem_legado = None
+        if photo_derivative_service.eager:
+            photo_derivative_service.generate_all(self.imagem_hash, source_bytes=bytes(data))
+
+class FotoRelatorio(FotoBlobMixin, db.Model):
     __tablename__ = 'fotos_relatorio'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -502,13 +582,15 @@ class FotoRelatorio(db.Model):
     ordem = db.Column(db.Integer, default=0)  # Ordem de exibição (começando em 0)
     coordenadas_anotacao = db.Column(db.JSON)
     
-    # Armazenamento binário (legacy - manter compatibilidade)
-    imagem = db.Column(db.LargeBinary, nullable=True)
+    # Bytes ficam no photo_store (chave = imagem_hash); coluna 'imagem' é legado em migração
+    # deferred + raiseload: listagens nunca carregam o blob; use query_with_bytes() quando precisar
+    imagem_legado = db.deferred(db.Column('imagem', db.LargeBinary, nullable=True), raiseload=True)
     imagem_hash = db.Column(db.String(64), nullable=True)
     content_type = db.Column(db.String(100), nullable=True)
     imagem_size = db.Column(db.Integer, nullable=True)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Delta sync do app
     
     # Relacionamento
     relatorio = db.relationship('Relatorio', backref=db.backref('imagens', lazy='dynamic', order_by='FotoRelatorio.ordem', cascade='all, delete-orphan'))
@@ -700,10 +782,15 @@ class ProjetoChecklistConfig(db.Model):
 class Notificacao(db.Model):
     """Modelo para notificações automáticas do sistema"""
     __tablename__ = 'notificacoes'
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Listagem do sino: notificações do usuário por status, mais recentes primeiro
+        db.Index('ix_notificacoes_user_status_created', 'user_id', 'status', 'created_at'),
+        {'extend_existing': True},
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     relatorio_id = db.Column(db.Integer, db.ForeignKey('relatorios.id'), nullable=True)
+    relatorio_express_id = db.Column(db.Integer, db.ForeignKey('relatorios_express.id', ondelete='SET NULL'), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     usuario_origem_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     usuario_destino_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -712,9 +799,11 @@ class Notificacao(db.Model):
     mensagem = db.Column(db.Text, nullable=False)
     link_destino = db.Column(db.String(500), nullable=True)
     status = db.Column(db.String(50), default='nao_lida')  # nova, lida, nao_lida
+    # 'nova' (notification_service) e 'nao_lida' (padrão da coluna) contam como não lidas
+    STATUS_NAO_LIDAS = ('nova', 'nao_lida')
     lida_em = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
-    expires_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)  # Limpeza periódica (scheduler_tasks)
     email_enviado = db.Column(db.Boolean, default=False)
     email_sucesso = db.Column(db.Boolean, nullable=True)
     email_erro = db.Column(db.Text, nullable=True)
@@ -747,6 +836,11 @@ class Notificacao(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
     
+    @classmethod
+    def nao_lida(cls):
+        """Condição SQL das não lidas - a mesma no sino, no stream e no serviço"""
+        return cls.status.in_(cls.STATUS_NAO_LIDAS)
+    
     def marcar_como_lida(self):
         """Marca a notificação como lida"""
         self.status = 'lida'
@@ -802,27 +896,35 @@ class RelatorioExpress(db.Model):
     
     # Status - EXATAMENTE iguais ao Relatório Comum
     # Em preenchimento → Aguardando Aprovação → Aprovado / Rejeitado
-    status = db.Column(db.String(50), default='Em preenchimento')
+    status = db.Column(db.String(50), default=EXPRESS_PREENCHIMENTO)  # Valores canônicos em report_status.STATUS_EXPRESS
     comentario_aprovacao = db.Column(db.Text)
     
     # Funcionários/Acompanhantes
-    acompanhantes = db.Column(JSONB, nullable=True)
+    acompanhantes = db.Column(JSONB_OU_JSON, nullable=True)
     
     # Auditoria
     criado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     atualizado_por = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
     created_at = db.Column(db.DateTime, default=brazil_now)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    autosave_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # Concorrência otimista do autosave
+    # search_vector (tsvector) existe só no Postgres, mantido por trigger; ver report_search.py
     
     # Relacionamentos
     autor = db.relationship('User', foreign_keys=[autor_id], backref='relatorios_express_criados', lazy='select')
     aprovador = db.relationship('User', foreign_keys=[aprovador_id], backref='relatorios_express_aprovados', lazy='select')
     
+    __table_args__ = (db.Index('ix_relatorios_express_status_created', 'status', 'created_at'),)
+    
+    @validates('status')
+    def _normalizar_status(self, key, valor):
+        return normalizar_status(valor, express=True)
+    
     def __repr__(self):
         return f'<RelatorioExpress {self.numero}>'
 
 
-class FotoRelatorioExpress(db.Model):
+class FotoRelatorioExpress(FotoBlobMixin, db.Model):
     """
     Fotos do Relatório Express - Idêntico ao FotoRelatorio
     """
@@ -847,8 +949,9 @@ class FotoRelatorioExpress(db.Model):
     ordem = db.Column(db.Integer, default=0)
     coordenadas_anotacao = db.Column(db.JSON)
     
-    # Armazenamento binário (legacy)
-    imagem = db.Column(db.LargeBinary, nullable=True)
+    # Bytes ficam no photo_store (chave = imagem_hash); coluna 'imagem' é legado em migração
+    # deferred + raiseload: listagens nunca carregam o blob; use query_with_bytes() quando precisar
+    imagem_legado = db.deferred(db.Column('imagem', db.LargeBinary, nullable=True), raiseload=True)
     imagem_hash = db.Column(db.String(64), nullable=True)
     content_type = db.Column(db.String(100), nullable=True)
     imagem_size = db.Column(db.Integer, nullable=True)
@@ -882,6 +985,7 @@ class Lembrete(db.Model):
     # Auditoria
     criado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     criado_por_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)  # Delta sync do app
     
     # Relacionamentos
     projeto = db.relationship('Projeto', backref=db.backref('lembretes', lazy='dynamic', cascade='all, delete-orphan'))
@@ -903,4 +1007,131 @@ class Lembrete(db.Model):
             'fechado_por': self.fechado_por.username if self.fechado_por else None,
             'criado_em': self.criado_em.isoformat() if self.criado_em else None,
             'criado_por': self.criado_por.username if self.criado_por else None
-        }
\ No newline at end of file
+        }
+
+class PdfRenderJob(db.Model):
+    """
+    Job de renderização de PDF em segundo plano (pdf_jobs.py)
+    
+    Persistido para que o status possa ser consultado de qualquer worker
+    do gunicorn e sobreviva a reinícios.
+    """
+    __tablename__ = 'pdf_render_jobs'
+    
+    id = db.Column(db.String(36), primary_key=True)  # uuid4
+    tipo = db.Column(db.String(20), nullable=False)  # 'relatorio' | 'express'
+    relatorio_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, processando, concluido, erro
+    result_path = db.Column(db.String(500), nullable=True)  # jobs anteriores ao store compartilhado
+    result_hash = db.Column(db.String(64), nullable=True, index=True)  # PDF no store de pdf_jobs.get_result_store()
+    erro = db.Column(db.Text, nullable=True)
+    acao = db.Column(db.String(30), nullable=True)  # pós-processamento, ex.: 'email_aprovacao'
+    tentativas = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # re-despachos após worker perdido
+    
+    solicitado_por_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    despachado_em = db.Column(db.DateTime, nullable=True)  # último (re)despacho - base do check de job parado
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    solicitado_por = db.relationship('User', foreign_keys=[solicitado_por_id])
+    
+    def __repr__(self):
+        return f'<PdfRenderJob {self.id} - {self.tipo} {self.relatorio_id} - {self.status}>'
+    
+    def to_dict(self):
+        """Serializa o job para a API de status"""
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'relatorio_id': self.relatorio_id,
+            'status': self.status,
+            'erro': self.erro,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class EmailOutbox(db.Model):
+    """
+    Fila persistente de e-mails (email_outbox.py)
+    
+    Cada linha é uma mensagem para um destinatário. A rota só grava a linha;
+    o worker envia em segundo plano, com novas tentativas em falhas transitórias.
+    """
+    __tablename__ = 'email_outbox'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    idempotency_key = db.Column(db.String(64), nullable=False)  # também enviada ao Resend
+    tipo = db.Column(db.String(20), nullable=False)  # 'relatorio' | 'express'
+    relatorio_id = db.Column(db.Integer, nullable=False, index=True)
+    projeto_id = db.Column(db.Integer, nullable=True)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'), nullable=True)
+    
+    destinatario = db.Column(db.String(255), nullable=False)
+    nome_destinatario = db.Column(db.String(200), nullable=True)
+    assunto = db.Column(db.String(500), nullable=False)
+    corpo_html = db.Column(db.Text, nullable=False)
+    anexo_path = db.Column(db.String(500), nullable=True)  # legado: arquivo local do host que enfileirou
+    anexo_hash = db.Column(db.String(64), nullable=True, index=True)  # cópia no store de anexos da outbox
+    anexo_nome = db.Column(db.String(255), nullable=True)
+    
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, enviando, enviado, falhou
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=5)
+    proxima_tentativa_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    bloqueado_ate = db.Column(db.DateTime, nullable=True)  # lease do worker que está enviando
+    ultimo_erro = db.Column(db.Text, nullable=True)
+    provider_id = db.Column(db.String(100), nullable=True)  # id retornado pelo Resend
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    enviado_em = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('idempotency_key', name='uq_email_outbox_idempotency_key'),
+        db.Index('ix_email_outbox_status_proxima', 'status', 'proxima_tentativa_em'),
+    )
+    
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} - {self.destinatario} - {self.status}>'
+
+
+class SyncTombstone(db.Model):
+    """
+    Registro de exclusões para o delta sync do app (sync_tombstones.py)
+    
+    Quando um projeto, relatório, visita, foto ou lembrete é apagado, a linha
+    some da tabela de origem; o tombstone fica para que /api/sync/down avise
+    os aparelhos que ainda têm a cópia offline.
+    """
+    __tablename__ = 'sync_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    entidade = db.Column(db.String(30), nullable=False)  # projetos, relatorios, visitas, fotos, lembretes
+    entidade_id = db.Column(db.Integer, nullable=False)
+    removido_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (db.Index('ix_sync_tombstones_removido', 'removido_em', 'id'),)
+    
+    def __repr__(self):
+        return f'<SyncTombstone {self.entidade} {self.entidade_id}>'
+
+
+class DashboardCounter(db.Model):
+    """
+    Contadores do dashboard mantidos por evento (dashboard_counters.py)
+    
+    Cada linha é um número exibido no dashboard; listeners de sessão somam
+    +1/-1 das mudanças de status numa transação curta depois do commit. O que
+    eles não enxergam fica defasado até a tarefa agendada
+    'reconciliar_contadores_dashboard' recalcular tudo (a cada 15 minutos).
+    """
+    __tablename__ = 'dashboard_counters'
+    
+    chave = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<DashboardCounter {self.chave}={self.valor}>'
@@ -38,7 +38,8 @@ class NotificationService:
         
         return f"{self.base_url}{path}"
     
-    def criar_notificacao(self, user_id, tipo, titulo, mensagem, link_destino=None, enviar_push=True):
+    def criar_notificacao(self, user_id, tipo, titulo, mensagem, link_destino=None, enviar_push=True,
+                          relatorio_id=None, relatorio_express_id=None):
         """
         Cria uma notificação genérica no sistema
         
@@ -49,9 +50,11 @@ class NotificationService:
             mensagem: Mensagem da notificação
             link_destino: URL de destino ao clicar na notificação
             enviar_push: Se deve enviar push notification
+            relatorio_id: Relatório referenciado (usado para ocultar pendências já processadas)
+            relatorio_express_id: Relatório Express referenciado
         """
         try:
-            from models import Notificacao, User
+            from models import Notificacao
             
             notificacao = Notificacao(
                 user_id=user_id,
@@ -59,82 +62,22 @@ class NotificationService:
                 titulo=titulo,
                 mensagem=mensagem,
                 link_destino=link_destino,
+                relatorio_id=relatorio_id,
+                relatorio_express_id=relatorio_express_id,
                 status='nova'
             )
             
             db.session.add(notificacao)
-            db.session.flush()
-            
+            db.session.commit()
+
+            from notification_stream import notification_broker
+            notification_broker.publish(user_id, 'nova', self.serializar_notificacao(notificacao), notificacao.id)
+
             if enviar_push:
-                from models import UserDevice
-                
-                # Get ALL devices for this user
-                devices = UserDevice.query.filter_by(user_id=user_id).all()
-                
-                if devices:
-                    player_ids = [d.player_id for d in devices]
-                    device_count = len(player_ids)
-                    
-                    logger.info(f"📱 Sending push to {device_count} device(s) for user {user_id}")
-                    logger.info(f"📱 Player IDs: {[pid[:20]+'...' for pid in player_ids]}")
-                    
-                    # Convert relative path to absolute URL for OneSignal
-                    full_url = self._build_full_url(link_destino)
-                    
-                    # Send to all devices
-                    result = self.onesignal_service.send_notification_to_many(
-                        player_ids=player_ids,
-                        title=f"Nova Notificação - {current_app.config.get('APP_NAME', 'ObraFlow')}",
-                        message=mensagem,
-                        url=full_url,
-                        data={'tipo': tipo} if tipo else None
-                    )
-                    
-                    # SELF-HEALING: Remove invalid player IDs if reported by OneSignal
-                    if result and not result.get('success') and 'response' in result:
-                        response_data = result.get('response', {})
-                        # Check for invalid_player_ids in errors
-                        errors = response_data.get('errors')
-                        invalid_ids = []
-                        
-                        if isinstance(errors, dict) and 'invalid_player_ids' in errors:
-                            invalid_ids = errors['invalid_player_ids']
-                        elif response_data.get('invalid_player_ids'):
-                            invalid_ids = response_data.get('invalid_player_ids')
-                            
-                        if invalid_ids:
-                            current_app.logger.warning(f"🧹 SELF-HEALING: Removing {len(invalid_ids)} invalid device(s) from database")
-                            try:
-                                # Remove invalid devices to force re-registration
-                                db.session.query(UserDevice).filter(UserDevice.player_id.in_(invalid_ids)).delete(synchronize_session=False)
-                                db.session.commit()
-                                current_app.logger.info("✅ Invalid devices removed successfully. User needs to re-login/refresh to register new ID.")
-                            except Exception as e:
-                                current_app.logger.error(f"❌ Error removing invalid devices: {e}")
-                                db.session.rollback()
+                # Envio ao OneSignal fora da requisição, agrupado com outras notificações
+                from push_dispatcher import push_dispatcher
+                push_dispatcher.enqueue(notificacao.id)
 
-                    if result and result.get('success'):
-                        current_app.logger.info(f"✅ Push sent! {result.get('recipients')} device(s) received")
-                    else:
-                        current_app.logger.info(f"⚠️ Push missed: {result.get('error')}")
-                else:
-                    logger.info(f"📱 User {user_id} has NO registered devices")
-                    
-                    # Fallback: Try old fcm_token method
-                    usuario_destino = User.query.get(user_id)
-                    if usuario_destino and usuario_destino.fcm_token:
-                        logger.info(f"📱 Trying fallback fcm_token: {usuario_destino.fcm_token[:20]}...")
-                        full_url = self._build_full_url(link_destino)
-                        
-                        self.onesignal_service.send_notification(
-                            player_id=usuario_destino.fcm_token,
-                            title=titulo,
-                            message=mensagem,
-                            url=full_url,
-                            data={'tipo': tipo} if tipo else None
-                        )
-            
-            db.session.commit()
             logger.info(f"✅ Notificação criada: {titulo} para usuário {user_id}")
             
             return {
@@ -273,7 +216,8 @@ class NotificationService:
                 tipo='relatorio_pendente',
                 titulo='Você tem um relatório com aprovação pendente',
                 mensagem=f'O relatório nº {numero_rel} "{titulo_rel}" da obra "{projeto_nome}" está aguardando sua aprovação.',
-                link_destino=f'/reports/{relatorio_id}/review'
+                link_destino=f'/reports/{relatorio_id}/review',
+                relatorio_id=relatorio_id
             )
             
             return resultado
@@ -315,7 +259,8 @@ class NotificationService:
                 tipo='relatorio_reprovado',
                 titulo='Relatório reprovado',
                 mensagem=mensagem,
-                link_destino=f'/reports/{relatorio_id}/edit'
+                link_destino=f'/reports/{relatorio_id}/edit',
+                relatorio_id=relatorio_id
             )
             
             return resultado
@@ -337,7 +282,7 @@ class NotificationService:
             tipo: Notification type
             
         Returns:
-            bool: True if sent successfully, False otherwise
+            bool: True if queued for sending, False otherwise
         """
         try:
             # Prepare notification data
@@ -346,21 +291,11 @@ class NotificationService:
                 'timestamp': datetime.utcnow().isoformat()
             }
             
-            # Send via OneSignal
-            result = self.onesignal_service.send_notification(
-                player_id=token,
-                title=titulo,
-                message=corpo,
-                data=data,
-                url=link
-            )
-            
-            if result.get('success'):
-                logger.info(f"✅ Push notification enviada via OneSignal")
-                return True
-            else:
-                logger.warning(f"⚠️ Falha ao enviar via OneSignal: {result.get('error')}")
-                return False
+            # Enfileirado: o OneSignal é chamado pelo despachante, fora da requisição
+            from push_dispatcher import push_dispatcher
+            push_dispatcher.enqueue_direct([token], titulo, corpo, url=link, data=data)
+            logger.info(f"📱 Push notification enfileirada para OneSignal")
+            return bool(token)
                 
         except Exception as e:
             logger.error(f"❌ Erro ao enviar push notification via OneSignal: {e}")
@@ -388,6 +323,9 @@ class NotificationService:
             notificacao.marcar_como_lida()
             db.session.commit()
             
+            from notification_stream import notification_broker
+            notification_broker.publish(user_id, 'lida', {'ids': [notificacao.id]})
+            
             return {'success': True}
         
         except Exception as e:
@@ -405,9 +343,9 @@ class NotificationService:
         try:
             from models import Notificacao
             
-            notificacoes = Notificacao.query.filter_by(
-                user_id=user_id,
-                status='nova'
+            notificacoes = Notificacao.query.filter(
+                Notificacao.user_id == user_id,
+                Notificacao.nao_lida()
             ).all()
             
             count = 0
@@ -418,6 +356,10 @@ class NotificationService:
             db.session.commit()
             logger.info(f"✅ {count} notificações marcadas como lidas para usuário {user_id}")
             
+            if count:
+                from notification_stream import notification_broker
+                notification_broker.publish(user_id, 'lida', {'todas': True})
+            
             return {'success': True, 'count': count}
         
         except Exception as e:
@@ -440,7 +382,7 @@ class NotificationService:
             query = Notificacao.query.filter_by(user_id=user_id)
             
             if apenas_nao_lidas:
-                query = query.filter_by(status='nova')
+                query = query.filter(Notificacao.nao_lida())
             
             notificacoes = query.order_by(Notificacao.created_at.desc()).limit(limit).all()
             
@@ -484,7 +426,8 @@ class NotificationService:
                 tipo='relatorio_aprovado',
                 titulo='Relatório aprovado',
                 mensagem=f'Seu relatório nº {numero_rel} "{titulo_rel}" da obra "{projeto_nome}" foi aprovado por {aprovador_nome}.',
-                link_destino=f'/reports/{relatorio_id}/edit'
+                link_destino=f'/reports/{relatorio_id}/edit',
+                relatorio_id=relatorio_id
             )
             
             return resultado
@@ -539,7 +482,8 @@ class NotificationService:
                     tipo='relatorio_criado',
                     titulo='Novo relatório criado',
                     mensagem=f'Um novo relatório nº {numero_rel} "{titulo_rel}" foi criado para a obra "{projeto_nome}".',
-                    link_destino=f'/reports/{relatorio_id}'
+                    link_destino=f'/reports/{relatorio_id}',
+                    relatorio_id=relatorio_id
                 )
                 
                 if resultado['success']:
@@ -616,7 +560,8 @@ class NotificationService:
                 tipo='relatorio_editado',
                 titulo='Relatório pendente foi editado',
                 mensagem=f'{editor_nome} editou o relatório nº {numero_rel} "{titulo_rel}" da obra "{projeto_nome}" que está aguardando sua aprovação.',
-                link_destino=f'/reports/{relatorio_id}/review'
+                link_destino=f'/reports/{relatorio_id}/review',
+                relatorio_id=relatorio_id
             )
             
             return resultado
@@ -625,27 +570,34 @@ class NotificationService:
             logger.error(f"❌ Erro ao criar notificação de relatório editado: {e}")
             return {'success': False, 'error': str(e)}
     
-    def limpar_notificacoes_expiradas(self):
+    def limpar_notificacoes_expiradas(self, lote=None):
         """
         Remove notificações que expiraram (mais de 24 horas)
+        
+        Apaga em lotes de `lote` linhas (DELETE por id, um commit por lote) para
+        não carregar as notificações na memória nem segurar locks longos.
         """
         try:
-            from models import Notificacao
+            from sqlalchemy import text
             
+            lote = lote or int(os.environ.get('NOTIFICATION_CLEANUP_BATCH', '5000'))
             agora = datetime.utcnow()
+            count = 0
             
-            # Buscar notificações expiradas
-            notificacoes_expiradas = Notificacao.query.filter(
-                Notificacao.expires_at < agora
-            ).all()
-            
-            count = len(notificacoes_expiradas)
+            while True:
+                # DELETE ... LIMIT não existe no Postgres; o limite vai na subconsulta
+                removidas = db.session.execute(text("""
+                    DELETE FROM notificacoes
+                     WHERE id IN (SELECT id FROM notificacoes
+                                   WHERE expires_at < :agora
+                                   LIMIT :lote)
+                """), {'agora': agora, 'lote': lote}).rowcount
+                db.session.commit()
+                count += removidas
+                if removidas < lote:
+                    break
             
             if count > 0:
-                for notificacao in notificacoes_expiradas:
-                    db.session.delete(notificacao)
-                
-                db.session.commit()
                 logger.info(f"🧹 {count} notificações expiradas removidas")
             else:
                 logger.debug("ℹ️ Nenhuma notificação expirada encontrada")
@@ -707,7 +659,8 @@ class NotificationService:
                 tipo='relatorio_express_pendente',
                 titulo='Novo Relatório Express aguardando aprovação',
                 mensagem=f'O Relatório Express "{relatorio.numero}" da obra "{relatorio.obra_nome}" está aguardando sua aprovação.',
-                link_destino=f'/relatorio-express/{relatorio_express_id}'
+                link_destino=f'/relatorio-express/{relatorio_express_id}',
+                relatorio_express_id=relatorio_express_id
             )
             
             return resultado
@@ -740,7 +693,8 @@ class NotificationService:
                 tipo='relatorio_express_aprovado',
                 titulo='Relatório Express aprovado',
                 mensagem=f'Seu Relatório Express "{relatorio.numero}" da obra "{relatorio.obra_nome}" foi aprovado por {aprovador_nome}.',
-                link_destino=f'/relatorio-express/{relatorio_express_id}'
+                link_destino=f'/relatorio-express/{relatorio_express_id}',
+                relatorio_express_id=relatorio_express_id
             )
             
             return resultado
@@ -778,7 +732,8 @@ class NotificationService:
                 tipo='relatorio_express_reprovado',
                 titulo='Relatório Express rejeitado',
                 mensagem=mensagem,
-                link_destino=f'/relatorio-express/{relatorio_express_id}/editar'
+                link_destino=f'/relatorio-express/{relatorio_express_id}/editar',
+                relatorio_express_id=relatorio_express_id
             )
             
             return resultado
@@ -845,7 +800,8 @@ class NotificationService:
                 tipo='relatorio_express_editado',
                 titulo='Relatório Express pendente foi editado',
                 mensagem=f'{editor_nome} editou o Relatório Express "{relatorio.numero}" da obra "{relatorio.obra_nome}" que está aguardando sua aprovação.',
-                link_destino=f'/relatorio-express/{relatorio_express_id}'
+                link_destino=f'/relatorio-express/{relatorio_express_id}',
+                relatorio_express_id=relatorio_express_id
             )
             
             return resultado
@@ -854,6 +810,20 @@ class NotificationService:
             logger.error(f"❌ Erro ao criar notificação de Relatório Express editado: {e}")
             return {'success': False, 'error': str(e)}
     
+    def serializar_notificacao(self, notif):
+        """Formato usado por /api/notificacoes e pelo stream SSE"""
+        return {
+            'id': notif.id,
+            'titulo': notif.titulo,
+            'mensagem': notif.mensagem,
+            'tipo': notif.tipo,
+            'icone': self.get_icone_tipo(notif.tipo),
+            'status': notif.status,
+            'link_destino': notif.link_destino,
+            'created_at': notif.created_at.isoformat() if notif.created_at else None,
+            'lida_em': notif.lida_em.isoformat() if notif.lida_em else None
+        }
+    
     def get_icone_tipo(self, tipo):
         icones = {
             'obra_criada': '🏗️',
@@ -868,7 +838,8 @@ class NotificationService:
             'relatorio_express_pendente': '⚡',
             'relatorio_express_aprovado': '✅',
             'relatorio_express_reprovado': '❌',
-            'relatorio_express_editado': '✏️'
+            'relatorio_express_editado': '✏️',
+            'email_aprovacao_falhou': '⚠️'
         }
         return icones.get(tipo, '🔔')
 
@@ -0,0 +1,179 @@
+"""
+Stream de Notificações - Server-Sent Events
+Entrega notificações novas e mudanças de leitura ao navegador pelo endpoint
+/api/notificacoes/stream, no lugar do polling de /api/notificacoes.
+
+Funcionamento:
+    - NotificationService publica um evento depois de cada commit que cria
+      ou marca notificações como lidas.
+    - Com Postgres, o evento vai por NOTIFY no canal 'notificacoes'; cada
+      worker do gunicorn mantém uma única conexão em LISTEN e repassa o
+      evento aos streams abertos naquele processo.
+    - Sem Postgres (SQLite/desenvolvimento), a entrega é direta entre as
+      threads do próprio processo.
+    - Um stream parado só espera na fila em memória: usuário ocioso não
+      gera consulta ao banco. O banco só é consultado ao reconectar, para
+      reenviar o que chegou depois do Last-Event-ID.
+    - Cada stream aberto ocupa uma thread do worker gthread por até
+      NOTIFICATION_STREAM_MAX_SECONDS. Acima de NOTIFICATION_STREAM_MAX_PER_WORKER
+      streams no processo, subscribe() recusa o stream e o endpoint responde
+      503: o navegador volta ao polling de /api/notificacoes, e as threads
+      restantes continuam livres para as requisições comuns.
+
+Configuração (variáveis de ambiente):
+    NOTIFICATION_STREAM_BACKEND        = 'auto' (padrão), 'postgres' ou 'memory'
+    NOTIFICATION_STREAM_MAX_PER_WORKER = streams simultâneos por processo
+                                         (padrão: metade de GUNICORN_THREADS, ou 8)
+"""
+
+import os
+import json
+import time
+import queue
+import select
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CANAL_PG = 'notificacoes'
+# NOTIFY aceita até 8000 bytes de payload
+LIMITE_PAYLOAD_PG = 7900
+# Eventos guardados por stream antes de descartar (cliente lento)
+TAMANHO_FILA = 100
+
+
+def formatar_evento(evento, dados, event_id=None):
+    """Mensagem SSE: 'id: ...' (opcional), 'event: ...' e 'data: ...'"""
+    linhas = []
+    if event_id is not None:
+        linhas.append(f"id: {event_id}")
+    linhas.append(f"event: {evento}")
+    linhas.append(f"data: {json.dumps(dados, ensure_ascii=False)}")
+    return '\n'.join(linhas) + '\n\n'
+
+
+class NotificationBroker:
+    """Pub/sub de eventos de notificação por usuário"""
+
+    def __init__(self, backend=None, max_streams=None):
+        self.backend = (backend or os.environ.get('NOTIFICATION_STREAM_BACKEND', 'auto')).lower()
+        padrao = max(1, int(os.environ.get('GUNICORN_THREADS', '16')) // 2)
+        self.max_streams = max_streams or int(os.environ.get('NOTIFICATION_STREAM_MAX_PER_WORKER', str(padrao)))
+        self._assinantes = {}  # user_id -> filas dos streams abertos
+        self._abertos = 0
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def _usa_postgres(self):
+        if self.backend == 'auto':
+            from app import db
+            self.backend = 'postgres' if db.engine.dialect.name == 'postgresql' else 'memory'
+        return self.backend == 'postgres'
+
+    def subscribe(self, user_id):
+        """
+        Fila que recebe (evento, dados, event_id) do usuário, ou None se o
+        processo já tem max_streams streams abertos (o cliente deve usar polling)
+        """
+        with self._lock:
+            if self._abertos >= self.max_streams:
+                logger.warning(f"⚠️ Limite de {self.max_streams} streams de notificação atingido; "
+                               f"usuário {user_id} vai usar polling")
+                return None
+            fila = queue.Queue(maxsize=TAMANHO_FILA)
+            self._assinantes.setdefault(user_id, set()).add(fila)
+            self._abertos += 1
+        if self._usa_postgres():
+            self._garantir_listener()
+        return fila
+
+    def unsubscribe(self, user_id, fila):
+        with self._lock:
+            filas = self._assinantes.get(user_id)
+            if filas and fila in filas:
+                filas.discard(fila)
+                self._abertos -= 1
+                if not filas:
+                    del self._assinantes[user_id]
+
+    def publish(self, user_id, evento, dados, event_id=None):
+        """Publica um evento para os streams do usuário (chamar depois do commit)"""
+        try:
+            if self._usa_postgres():
+                self._notify_pg(user_id, evento, dados, event_id)
+            else:
+                self._entregar(user_id, evento, dados, event_id)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao publicar evento de notificação ({evento}) para usuário {user_id}: {e}")
+
+    def _entregar(self, user_id, evento, dados, event_id):
+        with self._lock:
+            filas = list(self._assinantes.get(user_id, ()))
+        for fila in filas:
+            try:
+                fila.put_nowait((evento, dados, event_id))
+            except queue.Full:
+                # Cliente que não consome: ao reconectar ele recupera pelo Last-Event-ID
+                logger.debug(f"Fila de stream cheia para usuário {user_id}; evento descartado")
+
+    def _notify_pg(self, user_id, evento, dados, event_id):
+        from sqlalchemy import text
+        from app import db
+
+        payload = json.dumps({'u': user_id, 'e': evento, 'd': dados, 'i': event_id}, ensure_ascii=False)
+        if len(payload.encode('utf-8')) > LIMITE_PAYLOAD_PG and isinstance(dados, dict) and 'mensagem' in dados:
+            dados = dict(dados, mensagem=dados['mensagem'][:1000] + '…')
+            payload = json.dumps({'u': user_id, 'e': evento, 'd': dados, 'i': event_id}, ensure_ascii=False)
+        with db.engine.begin() as conn:
+            conn.execute(text("SELECT pg_notify(:canal, :payload)"), {'canal': CANAL_PG, 'payload': payload})
+
+    def _garantir_listener(self):
+        from flask import current_app
+
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._escutar_pg, args=(current_app._get_current_object(),),
+                                                  name='notification-listener', daemon=True)
+                self._listener.start()
+
+    def _escutar_pg(self, app):
+        """Mantém uma conexão em LISTEN e repassa os eventos aos streams do processo"""
+        from app import db
+
+        while True:
+            conn = None
+            try:
+                with app.app_context():
+                    proxy = db.engine.raw_connection()
+                # Fora do pool: a conexão fica presa ao LISTEN enquanto o processo viver
+                proxy.detach()
+                conn = proxy.dbapi_connection
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CANAL_PG}")
+                logger.info("🔔 Stream de notificações: escutando canal Postgres")
+
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        aviso = conn.notifies.pop(0)
+                        try:
+                            msg = json.loads(aviso.payload)
+                            self._entregar(msg['u'], msg['e'], msg['d'], msg.get('i'))
+                        except (ValueError, KeyError) as e:
+                            logger.warning(f"⚠️ Evento de notificação inválido: {e}")
+            except Exception as e:
+                logger.error(f"❌ Stream de notificações: conexão LISTEN perdida ({e}); reconectando em 5s")
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                time.sleep(5)
+
+
+# Create singleton instance
+notification_broker = NotificationBroker()
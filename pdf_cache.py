@@ -0,0 +1,213 @@
+"""
+Cache de PDFs Renderizados
+Evita re-renderizar com WeasyPrint o mesmo relatório (visualizar, baixar, aprovar, backup Drive).
+
+Chave: id do relatório + fingerprint do conteúdo (updated_at, status, dados da obra,
+hash/ordem/legenda de cada foto). Qualquer edição gera um fingerprint novo, então
+uma entrada antiga nunca é servida; a invalidação por escrita apenas libera espaço.
+
+Armazenamento em disco com despejo LRU limitado por tamanho.
+
+Configuração (variáveis de ambiente):
+    PDF_CACHE_PATH   = diretório do cache (padrão: uploads/pdf_cache)
+    PDF_CACHE_MAX_MB = tamanho máximo total (padrão: 500)
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+FOTO_FINGERPRINT_FIELDS = ('id', 'imagem_hash', 'ordem', 'legenda', 'descricao', 'tipo_servico', 'local', 'titulo')
+
+
+def report_fingerprint(relatorio, fotos):
+    """Fingerprint do conteúdo que afeta o PDF - usa apenas metadados (sem blobs)"""
+    h = hashlib.sha256()
+    h.update(f"{relatorio.id}|{relatorio.updated_at}|{relatorio.status}|{relatorio.data_aprovacao}".encode())
+    projeto = getattr(relatorio, 'projeto', None)
+    if projeto is not None:
+        for column in projeto.__table__.columns:
+            h.update(f"|{column.name}={getattr(projeto, column.key, None)}".encode())
+    for foto in fotos:
+        h.update(('|' + '|'.join(str(getattr(foto, f, None)) for f in FOTO_FINGERPRINT_FIELDS)).encode())
+    return h.hexdigest()
+
+
+class ReportPDFCache:
+    """Cache em disco de PDFs por relatório, com despejo LRU por tamanho total"""
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = os.path.abspath(root or os.environ.get('PDF_CACHE_PATH', os.path.join('uploads', 'pdf_cache')))
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('PDF_CACHE_MAX_MB', '500')) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _dir(self, relatorio_id):
+        return os.path.join(self.root, str(relatorio_id))
+
+    def path_for(self, relatorio_id, fingerprint):
+        return os.path.join(self._dir(relatorio_id), f"{fingerprint}.pdf")
+
+    def get_path(self, relatorio_id, fingerprint):
+        """Caminho da entrada se existir (marca como usada recentemente)"""
+        path = self.path_for(relatorio_id, fingerprint)
+        if os.path.exists(path):
+            try:
+                os.utime(path, None)
+            except OSError:
+                pass
+            return path
+        return None
+
+    def put(self, relatorio_id, fingerprint, pdf_bytes):
+        """Grava a entrada, remove versões antigas do mesmo relatório e aplica o limite"""
+        directory = self._dir(relatorio_id)
+        os.makedirs(directory, exist_ok=True)
+        path = self.path_for(relatorio_id, fingerprint)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(pdf_bytes)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        for name in os.listdir(directory):
+            if name.endswith('.pdf') and name != os.path.basename(path):
+                try:
+                    os.unlink(os.path.join(directory, name))
+                except OSError:
+                    pass
+        self._evict()
+        return path
+
+    def invalidate(self, relatorio_id):
+        shutil.rmtree(self._dir(relatorio_id), ignore_errors=True)
+
+    def _evict(self):
+        """Remove as entradas menos usadas recentemente até caber em max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for dirpath, _, filenames in os.walk(self.root):
+                for name in filenames:
+                    if not name.endswith('.pdf'):
+                        continue
+                    full = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(full)
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, full))
+                    total += st.st_size
+            if total <= self.max_bytes:
+                return
+            entries.sort()
+            for _, size, full in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(full)
+                    total -= size
+                    logger.info(f"🧹 PDF cache: removido {full}")
+                except OSError:
+                    pass
+
+
+# Create singleton instance
+report_pdf_cache = ReportPDFCache()
+
+_listeners_installed = False
+
+
+def cached_report_pdf_path(relatorio):
+    """Caminho do PDF em cache para o conteúdo atual do relatório, ou None (sem renderizar)"""
+    from models import FotoRelatorio
+
+    fotos_meta = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).order_by(FotoRelatorio.ordem).all()
+    return report_pdf_cache.get_path(relatorio.id, report_fingerprint(relatorio, fotos_meta))
+
+
+def get_report_pdf(relatorio, output_path=None, render=None):
+    """
+    PDF do relatório (WeasyPrint) via cache.
+    A verificação usa só metadados das fotos; em cache miss o gerador lê cada foto
+    já redimensionada (photo_derivatives), sem carregar os originais de uma vez.
+
+    Args:
+        render: callable(relatorio, fotos) -> bytes usado em cache miss
+                (padrão: WeasyPrintReportGenerator no próprio processo)
+
+    Returns:
+        bytes do PDF, ou output_path quando informado (arquivo copiado do cache)
+    """
+    from models import FotoRelatorio
+
+    fotos_meta = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).order_by(FotoRelatorio.ordem).all()
+    fingerprint = report_fingerprint(relatorio, fotos_meta)
+
+    cached_path = report_pdf_cache.get_path(relatorio.id, fingerprint)
+    if cached_path:
+        logger.info(f"📄 PDF cache HIT relatório {relatorio.id}")
+    else:
+        logger.info(f"📄 PDF cache MISS relatório {relatorio.id} - renderizando")
+        fotos = fotos_meta
+        if render is None:
+            from pdf_generator_weasy import WeasyPrintReportGenerator
+            render = WeasyPrintReportGenerator().generate_report_pdf
+        pdf_bytes = render(relatorio, fotos)
+        try:
+            cached_path = report_pdf_cache.put(relatorio.id, fingerprint, pdf_bytes)
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível gravar PDF no cache: {e}")
+            if output_path:
+                with open(output_path, 'wb') as f:
+                    f.write(pdf_bytes)
+                return output_path
+            return pdf_bytes
+
+    if output_path:
+        shutil.copyfile(cached_path, output_path)
+        return output_path
+    with open(cached_path, 'rb') as f:
+        return f.read()
+
+
+def install_invalidation_listeners():
+    """
+    Invalida o cache quando Relatorio / FotoRelatorio são gravados.
+    Os ids são coletados no flush e a remoção acontece só após o commit.
+    """
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    _listeners_installed = True
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from models import Relatorio, FotoRelatorio
+
+    @event.listens_for(Session, 'after_flush')
+    def _collect_report_ids(session, flush_context):
+        ids = session.info.setdefault('pdf_cache_invalidate', set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Relatorio) and obj.id:
+                ids.add(obj.id)
+            elif isinstance(obj, FotoRelatorio) and obj.relatorio_id:
+                ids.add(obj.relatorio_id)
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidate_after_commit(session):
+        for relatorio_id in session.info.pop('pdf_cache_invalidate', set()):
+            report_pdf_cache.invalidate(relatorio_id)
+
+    @event.listens_for(Session, 'after_rollback')
+    def _discard_on_rollback(session):
+        session.info.pop('pdf_cache_invalidate', None)
@@ -12,6 +12,7 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.utils import ImageReader
 from flask import current_app, Flask
 from PIL import Image as PILImage
+from photo_derivatives import photo_derivative_service
 
 class ReportPDFGenerator:
     def __init__(self):
@@ -1303,7 +1304,12 @@ class ReportPDFGenerator:
             photo_path = foto.filename_anotada if hasattr(foto, 'filename_anotada') and foto.filename_anotada else foto.filename
             full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], photo_path)
             
-            if os.path.exists(full_path):
+            # Foto redimensionada para a célula; a anotada só existe no filesystem
+            box_mm = (120, 80) if single else (80, 50)
+            origem = None if photo_path != foto.filename else foto
+            full_path = photo_derivative_service.pdf_image_path(origem, *box_mm, fallback_path=full_path)
+            
+            if full_path:
                 # Create image with appropriate size
                 max_width = 12*cm if single else 8*cm
                 max_height = 8*cm if single else 5*cm
@@ -11,6 +11,7 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.colors import HexColor
 from PIL import Image as PILImage
 from flask import current_app
+from photo_derivatives import photo_derivative_service
 
 
 class ArtesanoPDFGenerator:
@@ -364,8 +365,10 @@ class ArtesanoPDFGenerator:
             
             # Primeira foto
             if foto1:
-                img1_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), foto1.filename)
-                if os.path.exists(img1_path):
+                img1_path = photo_derivative_service.pdf_image_path(
+                    foto1, 75, 55,
+                    fallback_path=os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), foto1.filename))
+                if img1_path:
                     # Tamanho das fotos conforme modelo
                     img1 = Image(img1_path, width=75*mm, height=55*mm)
                     photos.append(img1)
@@ -383,8 +386,10 @@ class ArtesanoPDFGenerator:
             
             # Segunda foto (se existir)
             if foto2:
-                img2_path = os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), foto2.filename)
-                if os.path.exists(img2_path):
+                img2_path = photo_derivative_service.pdf_image_path(
+                    foto2, 75, 55,
+                    fallback_path=os.path.join(current_app.config.get('UPLOAD_FOLDER', 'uploads'), foto2.filename))
+                if img2_path:
                     img2 = Image(img2_path, width=75*mm, height=55*mm)
                     photos.append(img2)
                 else:
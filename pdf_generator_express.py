@@ -37,6 +37,110 @@ def gerar_numero_relatorio_express():
     return f"EXP-{ano_atual}-{novo_numero:04d}"
 
 
+def preparar_relatorio_express(relatorio_express):
+    """
+    Adapta um RelatorioExpress para o WeasyPrintReportGenerator.
+    Usado tanto na geração síncrona quanto pelo pool de renderização (pdf_jobs).
+    
+    Returns:
+        tuple (relatorio_adaptado, fotos)
+    """
+    from models import FotoRelatorioExpress
+    
+    fotos = FotoRelatorioExpress.query.filter_by(
+        relatorio_express_id=relatorio_express.id
+    ).order_by(FotoRelatorioExpress.ordem).all()
+    
+    class VirtualProject:
+        """Projeto virtual com dados da obra express"""
+        def __init__(self, obra_nome, obra_endereco, obra_construtora, obra_responsavel, info_tecnica=None):
+            self.nome = obra_nome or 'Obra Express'
+            self.endereco = obra_endereco or ''
+            self.construtora = obra_construtora or ''
+            self.cliente = obra_construtora or ''
+            self.responsavel = obra_responsavel or ''
+            
+            # Campos técnicos
+            info = info_tecnica or {}
+            self.elementos_construtivos_base = info.get('elementos_construtivos_base')
+            self.especificacao_chapisco_colante = info.get('especificacao_chapisco_colante')
+            self.especificacao_chapisco_alvenaria = info.get('especificacao_chapisco_alvenaria')
+            self.especificacao_argamassa_emboco = info.get('especificacao_argamassa_emboco')
+            self.forma_aplicacao_argamassa = info.get('forma_aplicacao_argamassa')
+            self.acabamentos_revestimento = info.get('acabamentos_revestimento')
+            self.acabamento_peitoris = info.get('acabamento_peitoris')
+            self.acabamento_muretas = info.get('acabamento_muretas')
+            self.definicao_frisos_cor = info.get('definicao_frisos_cor')
+            self.definicao_face_inferior_abas = info.get('definicao_face_inferior_abas')
+            self.observacoes_projeto_fachada = info.get('observacoes_projeto_fachada')
+            self.outras_observacoes = info.get('outras_observacoes')
+    
+    class VirtualAuthor:
+        """Autor virtual quando não há autor real"""
+        def __init__(self, nome='Não informado'):
+            self.nome_completo = nome
+    
+    class ExpressReportAdapter:
+        """Adaptador para fazer RelatorioExpress funcionar com WeasyPrintReportGenerator"""
+        def __init__(self, express_report):
+            self.id = express_report.id
+            self.numero = express_report.numero
+            self.titulo = express_report.titulo
+            self.conteudo = express_report.conteudo or ''
+            self.data_relatorio = express_report.data_relatorio
+            self.data_aprovacao = express_report.data_aprovacao
+            self.status = express_report.status
+            self.observacoes_finais = express_report.observacoes_finais
+            
+            acomp = express_report.acompanhantes
+            if isinstance(acomp, str):
+                try:
+                    self.acompanhantes = json.loads(acomp)
+                except:
+                    self.acompanhantes = []
+            else:
+                self.acompanhantes = acomp or []
+            
+            self.checklist_data = express_report.checklist_data
+            
+            if express_report.autor:
+                self.autor = express_report.autor
+            else:
+                self.autor = VirtualAuthor('Não informado')
+            
+            self.aprovador = express_report.aprovador
+            
+            # Parse technical info
+            info_tecnica = {}
+            if express_report.informacoes_tecnicas:
+                try:
+                    if isinstance(express_report.informacoes_tecnicas, str):
+                        info_tecnica = json.loads(express_report.informacoes_tecnicas)
+                    else:
+                        info_tecnica = express_report.informacoes_tecnicas
+                except:
+                    pass
+
+            # Ensure created_at is set, fallback to current time
+            try:
+                from models import brazil_now
+                self.created_at = express_report.created_at or brazil_now()
+            except ImportError:
+                 # Fallback if import fails (unlikely)
+                 self.created_at = express_report.created_at or datetime.now()
+
+            self.projeto = VirtualProject(
+                express_report.obra_nome,
+                express_report.obra_endereco,
+                express_report.obra_construtora,
+                express_report.obra_responsavel,
+                info_tecnica
+            )
+    
+    relatorio_adaptado = ExpressReportAdapter(relatorio_express)
+    return relatorio_adaptado, fotos
+
+
 def gerar_pdf_relatorio_express(relatorio_ou_id, output_path=None, salvar_arquivo=True):
     """
     Gera PDF do Relatório Express usando WeasyPrint.
@@ -64,97 +168,7 @@ def gerar_pdf_relatorio_express(relatorio_ou_id, output_path=None, salvar_arquiv
         else:
             relatorio_express = relatorio_ou_id
         
-        fotos = FotoRelatorioExpress.query.filter_by(
-            relatorio_express_id=relatorio_express.id
-        ).order_by(FotoRelatorioExpress.ordem).all()
-        
-        class VirtualProject:
-            """Projeto virtual com dados da obra express"""
-            def __init__(self, obra_nome, obra_endereco, obra_construtora, obra_responsavel, info_tecnica=None):
-                self.nome = obra_nome or 'Obra Express'
-                self.endereco = obra_endereco or ''
-                self.construtora = obra_construtora or ''
-                self.cliente = obra_construtora or ''
-                self.responsavel = obra_responsavel or ''
-                
-                # Campos técnicos
-                info = info_tecnica or {}
-                self.elementos_construtivos_base = info.get('elementos_construtivos_base')
-                self.especificacao_chapisco_colante = info.get('especificacao_chapisco_colante')
-                self.especificacao_chapisco_alvenaria = info.get('especificacao_chapisco_alvenaria')
-                self.especificacao_argamassa_emboco = info.get('especificacao_argamassa_emboco')
-                self.forma_aplicacao_argamassa = info.get('forma_aplicacao_argamassa')
-                self.acabamentos_revestimento = info.get('acabamentos_revestimento')
-                self.acabamento_peitoris = info.get('acabamento_peitoris')
-                self.acabamento_muretas = info.get('acabamento_muretas')
-                self.definicao_frisos_cor = info.get('definicao_frisos_cor')
-                self.definicao_face_inferior_abas = info.get('definicao_face_inferior_abas')
-                self.observacoes_projeto_fachada = info.get('observacoes_projeto_fachada')
-                self.outras_observacoes = info.get('outras_observacoes')
-        
-        class VirtualAuthor:
-            """Autor virtual quando não há autor real"""
-            def __init__(self, nome='Não informado'):
-                self.nome_completo = nome
-        
-        class ExpressReportAdapter:
-            """Adaptador para fazer RelatorioExpress funcionar com WeasyPrintReportGenerator"""
-            def __init__(self, express_report):
-                self.id = express_report.id
-                self.numero = express_report.numero
-                self.titulo = express_report.titulo
-                self.conteudo = express_report.conteudo or ''
-                self.data_relatorio = express_report.data_relatorio
-                self.data_aprovacao = express_report.data_aprovacao
-                self.status = express_report.status
-                self.observacoes_finais = express_report.observacoes_finais
-                
-                acomp = express_report.acompanhantes
-                if isinstance(acomp, str):
-                    try:
-                        self.acompanhantes = json.loads(acomp)
-                    except:
-                        self.acompanhantes = []
-                else:
-                    self.acompanhantes = acomp or []
-                
-                self.checklist_data = express_report.checklist_data
-                
-                if express_report.autor:
-                    self.autor = express_report.autor
-                else:
-                    self.autor = VirtualAuthor('Não informado')
-                
-                self.aprovador = express_report.aprovador
-                
-                # Parse technical info
-                info_tecnica = {}
-                if express_report.informacoes_tecnicas:
-                    try:
-                        if isinstance(express_report.informacoes_tecnicas, str):
-                            info_tecnica = json.loads(express_report.informacoes_tecnicas)
-                        else:
-                            info_tecnica = express_report.informacoes_tecnicas
-                    except:
-                        pass
-
-                # Ensure created_at is set, fallback to current time
-                try:
-                    from models import brazil_now
-                    self.created_at = express_report.created_at or brazil_now()
-                except ImportError:
-                     # Fallback if import fails (unlikely)
-                     self.created_at = express_report.created_at or datetime.now()
-
-                self.projeto = VirtualProject(
-                    express_report.obra_nome,
-                    express_report.obra_endereco,
-                    express_report.obra_construtora,
-                    express_report.obra_responsavel,
-                    info_tecnica
-                )
-        
-        relatorio_adaptado = ExpressReportAdapter(relatorio_express)
+        relatorio_adaptado, fotos = preparar_relatorio_express(relatorio_express)
         
         from pdf_generator_weasy import WeasyPrintReportGenerator
         generator = WeasyPrintReportGenerator()
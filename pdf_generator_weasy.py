@@ -3,15 +3,21 @@ Gerador de PDF usando WeasyPrint para replicar exatamente o modelo Artesano
 """
 
 import os
+import re
 import json
+import mimetypes
+import threading
 from datetime import datetime
 import pytz
 from jinja2 import Template
 from flask import current_app
+from photo_derivatives import photo_derivative_service, mm_to_px
+from photo_store import get_photo_store
 
 # Try to import WeasyPrint with graceful fallback
 try:
-    from weasyprint import HTML, CSS
+    from weasyprint import HTML, CSS, default_url_fetcher
+    from weasyprint.text.fonts import FontConfiguration
     WEASYPRINT_AVAILABLE = True
 except ImportError as e:
     print(f"⚠️  WeasyPrint não disponível: {e}")
@@ -19,11 +25,126 @@ except ImportError as e:
     WEASYPRINT_AVAILABLE = False
     HTML = None
     CSS = None
+    default_url_fetcher = None
+    FontConfiguration = None
+
+# Caixa das fotos no template (mm): coluna de 2 em A4 com margens de 15mm, max-height 60mm
+PHOTO_BOX_MM = (87, 60)
+
+# Esquemas internos do template: o HTML só carrega referências, os bytes são
+# abertos pelo url_fetcher no momento em que o WeasyPrint precisa de cada imagem
+PHOTO_SCHEME = 'elp-photo://'   # elp-photo://<largura>x<altura>/<imagem_hash>
+ASSET_SCHEME = 'elp-asset://'   # elp-asset://<arquivo em static/>
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+LOGO_FILENAME = 'logo_elp_new.jpg'
+
+_PHOTO_URL_RE = re.compile(r'^(\d+)x(\d+)/([0-9a-f]{64})$')
+
+def elp_url_fetcher(url, *args, **kwargs):
+    """
+    url_fetcher do WeasyPrint: resolve elp-photo:// pelo cache de derivados
+    (gerando a partir do photo store se preciso) e elp-asset:// em static/.
+    Demais URLs seguem para o fetcher padrão.
+    """
+    if url.startswith(PHOTO_SCHEME):
+        match = _PHOTO_URL_RE.match(url[len(PHOTO_SCHEME):])
+        if not match:
+            raise ValueError(f"URL de foto inválida: {url}")
+        width, height, digest = int(match.group(1)), int(match.group(2)), match.group(3)
+        path = photo_derivative_service.fit_path(digest, width, height)
+        if not path:
+            raise ValueError(f"Foto não encontrada no photo store: {digest}")
+        return {'file_obj': open(path, 'rb'), 'mime_type': 'image/jpeg', 'redirected_url': url}
+    if url.startswith(ASSET_SCHEME):
+        name = os.path.basename(url[len(ASSET_SCHEME):])
+        path = os.path.join(STATIC_DIR, name)
+        if name == LOGO_FILENAME and _assets is not None and _assets.logo_bytes:
+            return {'string': _assets.logo_bytes, 'mime_type': 'image/jpeg', 'redirected_url': url}
+        return {'file_obj': open(path, 'rb'), 'mime_type': mimetypes.guess_type(path)[0], 'redirected_url': url}
+    return default_url_fetcher(url, *args, **kwargs)
+
+def html_to_pdf(html_content, css_string, output_path=None):
+    """
+    Etapa CPU-bound da renderização: HTML + CSS -> PDF.
+    Função de módulo (picklable) para poder rodar num processo do pool de renderização.
+    O CSS já parseado e a configuração de fontes vêm do cache da thread
+    (RenderAssets), então renderizações em threads diferentes não se bloqueiam.
+    """
+    assets = get_render_assets()
+    css_doc = assets.stylesheet(css_string)
+    html_doc = HTML(string=html_content, url_fetcher=elp_url_fetcher)
+    if output_path:
+        html_doc.write_pdf(output_path, stylesheets=[css_doc], font_config=assets.font_config)
+        return output_path
+    return html_doc.write_pdf(stylesheets=[css_doc], font_config=assets.font_config)
+
+class RenderAssets:
+    """
+    Recursos fixos da renderização. Template Jinja compilado, CSS em texto e
+    bytes do logo são montados uma vez por processo; FontConfiguration e o
+    CSS parseado (que fica ligado a ela) são mutados pelo WeasyPrint durante
+    a renderização, então existem um por thread em vez de um lock global.
+    """
+    def __init__(self):
+        self.template_html = WeasyPrintReportGenerator._create_html_template()
+        self.template_css = WeasyPrintReportGenerator._create_css_styles()
+        self.template = Template(self.template_html)
+        self.logo_bytes = None
+        logo_path = os.path.join(STATIC_DIR, LOGO_FILENAME)
+        if os.path.exists(logo_path):
+            with open(logo_path, 'rb') as f:
+                self.logo_bytes = f.read()
+        self._local = threading.local()
+    
+    @property
+    def font_config(self):
+        """FontConfiguration da thread atual"""
+        if not WEASYPRINT_AVAILABLE:
+            return None
+        font_config = getattr(self._local, 'font_config', None)
+        if font_config is None:
+            font_config = self._local.font_config = FontConfiguration()
+            self._local.stylesheets = {}
+        return font_config
+    
+    def stylesheet(self, css_string=None):
+        """CSS parseado (cacheado pelo conteúdo, por thread)"""
+        css_string = css_string or self.template_css
+        font_config = self.font_config
+        css_doc = self._local.stylesheets.get(css_string)
+        if css_doc is None:
+            css_doc = CSS(string=css_string, font_config=font_config)
+            self._local.stylesheets[css_string] = css_doc
+        return css_doc
+
+_assets = None
+_assets_lock = threading.Lock()
+
+def get_render_assets():
+    """Instância única de RenderAssets no processo"""
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                _assets = RenderAssets()
+    return _assets
+
+def warm_up():
+    """
+    Pré-carrega template, CSS e fontes. Chamado no boot de cada worker do gunicorn
+    (gunicorn.conf.py) e na inicialização dos processos do pool de renderização.
+    """
+    assets = get_render_assets()
+    if WEASYPRINT_AVAILABLE:
+        assets.stylesheet()
+    return assets
 
 class WeasyPrintReportGenerator:
     def __init__(self):
-        self.template_html = self._create_html_template()
-        self.template_css = self._create_css_styles()
+        # Template e CSS são montados uma vez por processo (RenderAssets)
+        assets = get_render_assets()
+        self.template_html = assets.template_html
+        self.template_css = assets.template_css
     
     def generate_report_pdf(self, relatorio, fotos=None, output_path=None):
         """
@@ -47,23 +168,9 @@ class WeasyPrintReportGenerator:
                 raise Exception(f"Erro: WeasyPrint não disponível e falha no fallback ReportLab: {str(e)}")
         
         try:
-            # Preparar dados para o template
-            data = self._prepare_report_data(relatorio, fotos)
-            
-            # Renderizar HTML com os dados
-            template = Template(self.template_html)
-            html_content = template.render(data=data)
-            
-            # Gerar PDF
-            html_doc = HTML(string=html_content)
-            css_doc = CSS(string=self.template_css)
-            
-            if output_path:
-                html_doc.write_pdf(output_path, stylesheets=[css_doc])
-                return output_path
-            else:
-                pdf_bytes = html_doc.write_pdf(stylesheets=[css_doc])
-                return pdf_bytes
+            # Preparar HTML e gerar PDF
+            html_content = self.render_html(relatorio, fotos)
+            return html_to_pdf(html_content, self.template_css, output_path)
                 
         except Exception as e:
             # Fallback para ReportLab se WeasyPrint falhar
@@ -76,20 +183,21 @@ class WeasyPrintReportGenerator:
             except Exception as fallback_error:
                 raise Exception(f"Erro ao gerar PDF - WeasyPrint: {str(e)} | ReportLab: {str(fallback_error)}")
     
+    def render_html(self, relatorio, fotos=None):
+        """Etapa de preparação (acessa banco e fotos): retorna o HTML pronto para o WeasyPrint"""
+        data = self._prepare_report_data(relatorio, fotos)
+        return get_render_assets().template.render(data=data)
+    
     def _prepare_report_data(self, relatorio, fotos):
         """Preparar dados do relatório para o template"""
         projeto = relatorio.projeto
         
-        # Carregar logo em base64
-        logo_base64 = ""
-        try:
-            logo_path = os.path.join('static', 'logo_elp_new.jpg')
-            if os.path.exists(logo_path):
-                import base64
-                with open(logo_path, 'rb') as f:
-                    logo_base64 = base64.b64encode(f.read()).decode('utf-8')
-        except Exception as e:
-            print(f"Erro ao carregar logo: {e}")
+        # Logo referenciado pelo esquema interno (servido da memória pelo url_fetcher)
+        logo_url = ""
+        if get_render_assets().logo_bytes:
+            logo_url = f"{ASSET_SCHEME}{LOGO_FILENAME}"
+        else:
+            print(f"Logo não encontrado: {LOGO_FILENAME}")
         
         # Dados básicos - CHECKLIST REMOVIDO
         observacoes_filtradas = None
@@ -177,60 +285,41 @@ class WeasyPrintReportGenerator:
             'liberado_por': "Eng. José Leopoldo Pugliese",
             'responsavel': responsavel_acompanhamento,
             'data_relatorio': date_str, # Usar a mesma data (Criação)
-            'logo_base64': logo_base64,
+            'logo_url': logo_url,
             'fotos': []
         }
         
-        # Processar fotos - PRIORIDADE: PostgreSQL (campo imagem)
+        # Processar fotos - referências elp-photo:// resolvidas sob demanda pelo url_fetcher
         if fotos:
-            import base64
+            store = get_photo_store()
+            box_width, box_height = mm_to_px(PHOTO_BOX_MM[0]), mm_to_px(PHOTO_BOX_MM[1])
             
             for foto in fotos:
-                foto_base64 = None
+                foto_url = None
                 
                 print(f"🔍 Processando foto {foto.ordem}: filename={foto.filename if hasattr(foto, 'filename') else 'N/A'}")
                 
-                # PRIORIDADE 1: Buscar imagem do campo BYTEA do PostgreSQL
-                if hasattr(foto, 'imagem') and foto.imagem:
-                    try:
-                        # Verificar se é memoryview (PostgreSQL retorna assim)
-                        if isinstance(foto.imagem, memoryview):
-                            image_bytes = bytes(foto.imagem)
-                            foto_base64 = base64.b64encode(image_bytes).decode('utf-8')
-                            print(f"✅ Foto {foto.ordem} carregada do PostgreSQL (memoryview): {len(image_bytes)} bytes")
-                        elif isinstance(foto.imagem, bytes):
-                            foto_base64 = base64.b64encode(foto.imagem).decode('utf-8')
-                            print(f"✅ Foto {foto.ordem} carregada do PostgreSQL (bytes): {len(foto.imagem)} bytes")
-                        else:
-                            print(f"⚠️ Foto {foto.ordem}: campo imagem tem tipo inesperado: {type(foto.imagem)}")
-                    except Exception as e:
-                        print(f"⚠️ Erro ao processar imagem do PostgreSQL para foto {foto.ordem}: {e}")
-                else:
-                    print(f"⚠️ Foto {foto.ordem}: campo imagem não existe ou está vazio")
-                
-                # FALLBACK: Tentar carregar do filesystem
-                if not foto_base64 and hasattr(foto, 'filename') and foto.filename:
-                    try:
-                        upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
-                    except RuntimeError:
-                        upload_folder = 'uploads'
-                    
-                    foto_path = os.path.join(upload_folder, foto.filename)
-                    print(f"🔍 Tentando carregar do filesystem: {foto_path}")
-                    
-                    if os.path.exists(foto_path):
-                        try:
-                            with open(foto_path, 'rb') as f:
-                                file_bytes = f.read()
-                                foto_base64 = base64.b64encode(file_bytes).decode('utf-8')
-                            print(f"✅ Foto {foto.ordem} carregada do filesystem: {foto_path} ({len(file_bytes)} bytes)")
-                        except Exception as e:
-                            print(f"⚠️ Erro ao ler arquivo {foto_path}: {e}")
-                    else:
-                        print(f"❌ Arquivo não encontrado: {foto_path}")
+                try:
+                    digest = getattr(foto, 'imagem_hash', None)
+                    if not (digest and store.exists(digest)):
+                        # Sem original no photo store (bytes legados ou filesystem): o derivado
+                        # é gerado aqui, já que o processo de renderização não acessa o banco
+                        foto_path = None
+                        if hasattr(foto, 'filename') and foto.filename:
+                            try:
+                                upload_folder = current_app.config.get('UPLOAD_FOLDER', 'uploads')
+                            except RuntimeError:
+                                upload_folder = 'uploads'
+                            foto_path = os.path.join(upload_folder, foto.filename)
+                        embed_path = photo_derivative_service.pdf_image_path(foto, *PHOTO_BOX_MM, fallback_path=foto_path)
+                        digest = os.path.splitext(os.path.basename(embed_path))[0] if embed_path else None
+                    if digest:
+                        foto_url = f"{PHOTO_SCHEME}{box_width}x{box_height}/{digest}"
+                except Exception as e:
+                    print(f"⚠️ Erro ao preparar imagem da foto {foto.ordem}: {e}")
                 
-                if not foto_base64:
-                    print(f"❌ ERRO: Foto {foto.ordem} NÃO CARREGADA - não encontrada no PostgreSQL nem no filesystem")
+                if not foto_url:
+                    print(f"❌ ERRO: Foto {foto.ordem} NÃO CARREGADA - não encontrada no photo store nem no filesystem")
                 
                 # Criar legenda completa - incluir categoria e local
                 legenda_texto = ""
@@ -264,17 +353,18 @@ class WeasyPrintReportGenerator:
                 
                 # Adicionar foto aos dados
                 data['fotos'].append({
-                    'base64': foto_base64,
+                    'url': foto_url,
                     'legenda': legenda_completa,
                     'categoria': categoria,
                     'local': local,
                     'ordem': foto.ordem,
-                    'not_found': not foto_base64
+                    'not_found': not foto_url
                 })
         
         return data
     
-    def _create_html_template(self):
+    @staticmethod
+    def _create_html_template():
         """Template HTML replicando EXATAMENTE o modelo: 2 fotos na 1ª página, 4 nas demais"""
         return """
 <!DOCTYPE html>
@@ -287,7 +377,7 @@ class WeasyPrintReportGenerator:
     <!-- Cabeçalho com logo ELP e título -->
     <div class="header-section">
         <div class="logo-container">
-            <img src="data:image/jpeg;base64,{{ data.logo_base64 }}" alt="ELP Consultoria" class="elp-logo">
+            <img src="{{ data.logo_url }}" alt="ELP Consultoria" class="elp-logo">
         </div>
         
         <h1 class="main-title">{{ data.titulo }}</h1>
@@ -343,8 +433,8 @@ class WeasyPrintReportGenerator:
     <div class="first-page-photos-grid">
         {% for foto in first_page_photos %}
         <div class="first-photo-item">
-            {% if foto.base64 and not foto.not_found %}
-                <img src="data:image/jpeg;base64,{{ foto.base64 }}" alt="Foto {{ foto.ordem }}" class="first-photo-img">
+            {% if foto.url and not foto.not_found %}
+                <img src="{{ foto.url }}" alt="Foto {{ foto.ordem }}" class="first-photo-img">
             {% else %}
                 <div class="photo-placeholder-first">Foto não disponível</div>
             {% endif %}
@@ -384,8 +474,8 @@ class WeasyPrintReportGenerator:
             {% for foto in remaining_photos[batch_start:batch_start+4] %}
             {% if foto %}
             <div class="grid-photo-item">
-                {% if foto.base64 and not foto.not_found %}
-                    <img src="data:image/jpeg;base64,{{ foto.base64 }}" alt="Foto {{ foto.ordem }}" class="grid-photo-img">
+                {% if foto.url and not foto.not_found %}
+                    <img src="{{ foto.url }}" alt="Foto {{ foto.ordem }}" class="grid-photo-img">
                 {% else %}
                     <div class="photo-placeholder-grid">Foto não disponível</div>
                 {% endif %}
@@ -440,7 +530,7 @@ class WeasyPrintReportGenerator:
     <!-- Rodapé ELP -->
     <div class="footer-section">
         <div class="footer-left">
-            <img src="data:image/jpeg;base64,{{ data.logo_base64 }}" alt="ELP Consultoria" class="footer-logo">
+            <img src="{{ data.logo_url }}" alt="ELP Consultoria" class="footer-logo">
             <div class="company-info">
                 <div class="company-name">ELP Consultoria</div>
                 <div>Rua Jaboticabal, 530 apto. 31 - São Paulo - SP - CEP: 03188-000</div>
@@ -457,7 +547,8 @@ class WeasyPrintReportGenerator:
 </html>
         """
     
-    def _create_css_styles(self):
+    @staticmethod
+    def _create_css_styles():
         """CSS replicando exatamente o layout do PDF de referência"""
         return """
 @page {
@@ -0,0 +1,458 @@
+"""
+Fila de Renderização de PDFs em Segundo Plano
+Tira o WeasyPrint do ciclo da requisição: a rota cria um PdfRenderJob e responde
+na hora; o cliente consulta o status e baixa o resultado quando estiver pronto.
+
+Arquitetura:
+    - Despachante (threads no processo web): carrega relatório e fotos do banco,
+      monta o HTML e atualiza o status do job.
+    - Pool de processos: executa a etapa CPU-bound (HTML -> PDF) fora do GIL
+      do worker do gunicorn.
+    - O status fica na tabela pdf_render_jobs, então qualquer worker responde
+      ao polling; o PDF final vai para o store compartilhado (mesmo backend do
+      photo_store, endereçado por hash), então qualquer host serve o download.
+
+Jobs perdidos (worker reiniciado com o job na fila ou no meio da renderização)
+são re-despachados pela tarefa agendada 'recuperar_jobs_pdf' até
+PDF_JOB_MAX_ATTEMPTS vezes; a execução reivindica o job com um UPDATE
+condicional, então um job re-despachado nunca roda duas vezes.
+
+Jobs com acao='email_aprovacao' não têm ninguém acompanhando o polling: uma
+falha na renderização volta o job para a fila (até PDF_JOB_MAX_ATTEMPTS) e,
+se ele terminar em 'erro', quem aprovou recebe uma notificação de que os
+e-mails não foram enviados.
+
+Relatórios comuns passam pelo cache de PDFs (pdf_cache.py): se o conteúdo não
+mudou, o job conclui sem renderizar.
+
+Configuração (variáveis de ambiente):
+    PDF_RENDER_PROCESSES  = processos de renderização (padrão: 2)
+    PDF_JOBS_PATH         = diretório local do store de resultados e dos arquivos
+                            temporários (padrão: uploads/pdf_jobs)
+    PDF_JOBS_S3_PREFIX    = prefixo dos resultados com PHOTO_STORE_BACKEND=s3 (padrão: pdf_jobs/)
+    PDF_JOB_TIMEOUT       = segundos máximos de uma renderização (padrão: 900)
+    PDF_JOB_STALE_SECONDS = segundos até um job 'pendente' sem dono ser re-despachado (padrão: 300)
+    PDF_JOB_MAX_ATTEMPTS  = re-despachos antes de o job virar 'erro' (padrão: 3)
+    PDF_JOB_RETENTION_HOURS = horas que os resultados ficam disponíveis (padrão: 24)
+"""
+
+import os
+import uuid
+import shutil
+import logging
+import threading
+import multiprocessing
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+TIPOS_JOB = ('relatorio', 'express')
+STATUS_ATIVOS = ('pendente', 'processando')
+
+ACAO_EMAIL_APROVACAO = 'email_aprovacao'
+
+_resultados_store = None
+_resultados_lock = threading.Lock()
+
+
+def get_result_store():
+    """Store compartilhado dos PDFs gerados (mesmo backend do photo_store)"""
+    global _resultados_store
+    if _resultados_store is None:
+        with _resultados_lock:
+            if _resultados_store is None:
+                from photo_store import build_store
+                _resultados_store = build_store(
+                    os.environ.get('PDF_JOBS_PATH', os.path.join('uploads', 'pdf_jobs')),
+                    os.environ.get('PDF_JOBS_S3_PREFIX', 'pdf_jobs/'),
+                )
+    return _resultados_store
+
+
+class PdfRenderQueue:
+    """Despachante de jobs de PDF com pool de processos para a renderização"""
+
+    def __init__(self, processes=None, root=None, timeout=None):
+        self.processes = processes or int(os.environ.get('PDF_RENDER_PROCESSES', '2'))
+        self.root = os.path.abspath(root or os.environ.get('PDF_JOBS_PATH', os.path.join('uploads', 'pdf_jobs')))
+        self.timeout = timeout or int(os.environ.get('PDF_JOB_TIMEOUT', '900'))
+        self.stale_seconds = int(os.environ.get('PDF_JOB_STALE_SECONDS', '300'))
+        self.max_attempts = int(os.environ.get('PDF_JOB_MAX_ATTEMPTS', '3'))
+        self._process_pool = None
+        self._dispatcher = None
+        self._lock = threading.Lock()
+
+    def _pools(self):
+        # Criados sob demanda: com gunicorn --preload o fork acontece depois do import
+        with self._lock:
+            if self._process_pool is None:
+                # spawn: o processo filho não herda conexões do banco nem threads do pai
+                context = multiprocessing.get_context('spawn')
+                from pdf_generator_weasy import warm_up
+                self._process_pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context,
+                                                         initializer=warm_up)
+                self._dispatcher = ThreadPoolExecutor(max_workers=self.processes, thread_name_prefix='pdf-job')
+                logger.info(f"🖨️ Pool de renderização de PDF iniciado ({self.processes} processos)")
+            return self._process_pool, self._dispatcher
+
+    def result_path(self, job_id):
+        """Arquivo temporário da renderização; o resultado final fica no store"""
+        return os.path.join(self.root, 'tmp', f"{job_id}.pdf")
+
+    def render(self, relatorio, fotos):
+        """
+        Renderiza no pool de processos. Assinatura compatível com o parâmetro
+        render de get_report_pdf(); chamada só pelas threads do despachante.
+        """
+        from pdf_generator_weasy import WeasyPrintReportGenerator, html_to_pdf, WEASYPRINT_AVAILABLE
+
+        generator = WeasyPrintReportGenerator()
+        if not WEASYPRINT_AVAILABLE:
+            # Sem WeasyPrint o gerador usa o fallback ReportLab no próprio processo
+            return generator.generate_report_pdf(relatorio, fotos)
+
+        html_content = generator.render_html(relatorio, fotos)
+        process_pool, _ = self._pools()
+        future = process_pool.submit(html_to_pdf, html_content, generator.template_css)
+        return future.result(timeout=self.timeout)
+
+    def enqueue(self, tipo, relatorio_id, user_id=None, acao=None):
+        """
+        Cria (ou reaproveita) um job para o relatório e agenda a execução.
+
+        Returns:
+            PdfRenderJob
+        """
+        from app import db
+        from models import PdfRenderJob
+
+        if tipo not in TIPOS_JOB:
+            raise ValueError(f"Tipo de job inválido: {tipo}")
+
+        # Um job ativo por relatório: cliques repetidos reaproveitam o mesmo
+        existente = PdfRenderJob.query.filter(
+            PdfRenderJob.tipo == tipo,
+            PdfRenderJob.relatorio_id == relatorio_id,
+            PdfRenderJob.status.in_(STATUS_ATIVOS),
+        ).order_by(PdfRenderJob.created_at.desc()).first()
+        if existente and not self._expirou(existente) and not acao:
+            return existente
+
+        job = PdfRenderJob(
+            id=str(uuid.uuid4()),
+            tipo=tipo,
+            relatorio_id=relatorio_id,
+            status='pendente',
+            acao=acao,
+            solicitado_por_id=user_id,
+            despachado_em=datetime.utcnow(),
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self._despachar(job.id)
+        logger.info(f"🖨️ Job de PDF {job.id} enfileirado ({tipo} {relatorio_id})")
+        return job
+
+    def _despachar(self, job_id):
+        from flask import current_app
+
+        app = current_app._get_current_object()
+        _, dispatcher = self._pools()
+        dispatcher.submit(self._run, app, job_id)
+
+    def get_job(self, job_id):
+        """Job pelo id; se ficou órfão (worker reiniciado), é re-despachado aqui mesmo"""
+        from app import db
+        from models import PdfRenderJob
+
+        job = db.session.get(PdfRenderJob, job_id)
+        if job and self._parado(job):
+            self._recuperar(job)
+        return job
+
+    def _expirou(self, job):
+        inicio = job.started_at or job.created_at
+        return inicio is not None and datetime.utcnow() - inicio > timedelta(seconds=self.timeout)
+
+    def _parado(self, job):
+        """
+        Pendente há mais de stale_seconds (nenhum despachante pegou) ou
+        processando além do timeout da renderização (o worker morreu no meio).
+        """
+        agora = datetime.utcnow()
+        if job.status == 'pendente':
+            return agora - (job.despachado_em or job.created_at) > timedelta(seconds=self.stale_seconds)
+        if job.status == 'processando':
+            inicio = job.started_at or job.created_at
+            return agora - inicio > timedelta(seconds=self.timeout + 60)
+        return False
+
+    def _recuperar(self, job, erro=None):
+        """Volta o job para 'pendente' e despacha de novo; acima do limite de tentativas vira 'erro'"""
+        from app import db
+
+        if (job.tentativas or 0) >= self.max_attempts:
+            logger.error(f"❌ Job de PDF {job.id} desistido após {job.tentativas} tentativas")
+            self._falhar(job, f'{erro or "Job perdido"} após {job.tentativas} tentativas - solicite novamente')
+            return False
+
+        # created_at fica intacto: a idade do job continua visível para _expirou e a limpeza
+        job.status = 'pendente'
+        job.tentativas = (job.tentativas or 0) + 1
+        job.despachado_em = datetime.utcnow()
+        job.started_at = None
+        db.session.commit()
+        self._despachar(job.id)
+        logger.warning(f"⚠️ Job de PDF {job.id} re-despachado (tentativa {job.tentativas})")
+        return True
+
+    def recuperar_jobs_parados(self):
+        """Re-despacha os jobs perdidos por reinício de worker (tarefa agendada)"""
+        from models import PdfRenderJob
+
+        ativos = PdfRenderJob.query.filter(PdfRenderJob.status.in_(STATUS_ATIVOS)).all()
+        recuperados = desistidos = 0
+        for job in ativos:
+            if self._parado(job):
+                if self._recuperar(job):
+                    recuperados += 1
+                else:
+                    desistidos += 1
+        return {'recuperados': recuperados, 'desistidos': desistidos}
+
+    def _run(self, app, job_id):
+        """Executa o job numa thread do despachante"""
+        with app.app_context():
+            from app import db
+            from models import PdfRenderJob
+
+            # Reivindica o job: só um despachante (deste ou de outro worker) passa daqui
+            reivindicado = PdfRenderJob.query.filter_by(id=job_id, status='pendente').update(
+                {'status': 'processando', 'started_at': datetime.utcnow()}, synchronize_session=False)
+            db.session.commit()
+            if not reivindicado:
+                db.session.remove()
+                return
+            job = db.session.get(PdfRenderJob, job_id)
+
+            path = self.result_path(job.id)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                if job.tipo == 'relatorio':
+                    relatorio = self._render_relatorio(job, path)
+                else:
+                    relatorio = self._render_express(job, path)
+                with open(path, 'rb') as f:
+                    job.result_hash, _ = get_result_store().put_stream(f)
+
+                job.status = 'concluido'
+                job.finished_at = datetime.utcnow()
+                db.session.commit()
+                logger.info(f"✅ Job de PDF {job.id} concluído em "
+                            f"{(job.finished_at - job.started_at).total_seconds():.1f}s")
+
+                if job.acao == ACAO_EMAIL_APROVACAO:
+                    self._enviar_email_aprovacao(job, relatorio, path)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"❌ Erro no job de PDF {job_id}: {e}", exc_info=True)
+                job = db.session.get(PdfRenderJob, job_id)
+                if job is not None:
+                    if job.acao == ACAO_EMAIL_APROVACAO:
+                        # Ninguém está acompanhando: tenta de novo antes de desistir dos e-mails
+                        self._recuperar(job, erro=str(e))
+                    else:
+                        self._falhar(job, str(e))
+            finally:
+                if os.path.exists(path):
+                    os.unlink(path)
+                db.session.remove()
+
+    def _falhar(self, job, erro):
+        """Marca o job como 'erro'; se ele levava os e-mails de aprovação, avisa quem aprovou"""
+        from app import db
+
+        job.status = 'erro'
+        job.erro = erro
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        if job.acao == ACAO_EMAIL_APROVACAO:
+            self._alertar_email_aprovacao(job)
+
+    def _alertar_email_aprovacao(self, job):
+        """Os e-mails de aprovação dependem do PDF: sem ele, ninguém é avisado por e-mail"""
+        logger.error(f"❌ E-mails de aprovação NÃO enviados: job de PDF {job.id} "
+                     f"({job.tipo} {job.relatorio_id}) terminou em erro: {job.erro}")
+        if not job.solicitado_por_id:
+            return
+        try:
+            from notification_service import notification_service
+            if job.tipo == 'relatorio':
+                link, referencia = f'/reports/{job.relatorio_id}', {'relatorio_id': job.relatorio_id}
+            else:
+                link, referencia = f'/relatorio-express/{job.relatorio_id}', {'relatorio_express_id': job.relatorio_id}
+            notification_service.criar_notificacao(
+                user_id=job.solicitado_por_id,
+                tipo='email_aprovacao_falhou',
+                titulo='E-mails de aprovação não enviados',
+                mensagem='Não foi possível gerar o PDF do relatório aprovado, então os e-mails de '
+                         'aprovação não foram enviados. Gere o PDF e envie novamente.',
+                link_destino=link,
+                **referencia,
+            )
+        except Exception as e:
+            logger.error(f"❌ Erro ao notificar falha dos e-mails do job {job.id}: {e}", exc_info=True)
+
+    def _render_relatorio(self, job, path):
+        from app import db
+        from models import Relatorio
+        from pdf_cache import get_report_pdf
+
+        relatorio = db.session.get(Relatorio, job.relatorio_id)
+        if relatorio is None:
+            raise ValueError(f"Relatório {job.relatorio_id} não encontrado")
+        get_report_pdf(relatorio, output_path=path, render=self.render)
+        return relatorio
+
+    def _render_express(self, job, path):
+        from app import db
+        from models import RelatorioExpress
+        from pdf_generator_express import preparar_relatorio_express
+
+        relatorio = db.session.get(RelatorioExpress, job.relatorio_id)
+        if relatorio is None:
+            raise ValueError(f"Relatório Express {job.relatorio_id} não encontrado")
+        relatorio_adaptado, fotos = preparar_relatorio_express(relatorio)
+        pdf_bytes = self.render(relatorio_adaptado, fotos)
+        with open(path, 'wb') as f:
+            f.write(pdf_bytes)
+        return relatorio
+
+    def _enviar_email_aprovacao(self, job, relatorio, path):
+        """Enfileira os e-mails de aprovação na outbox depois que o PDF fica pronto"""
+        try:
+            if job.tipo == 'relatorio':
+                from email_service_resend import ReportApprovalEmailService
+                # Cópia em static/reports mantém o caminho usado pelo histórico de envios
+                pdf_filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+                pdf_path = os.path.join('static', 'reports', pdf_filename)
+                os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+                shutil.copyfile(path, pdf_path)
+                resultado = ReportApprovalEmailService().send_approval_email(
+                    relatorio, pdf_path, usuario_id=job.solicitado_por_id)
+            else:
+                from email_service_unified import get_email_service
+                resultado = get_email_service().send_approval_email(
+                    relatorio, path, usuario_id=job.solicitado_por_id)
+
+            if resultado.get('success'):
+                logger.info(f"📧 E-mails de aprovação do job {job.id} enfileirados: "
+                            f"{resultado.get('enfileirados', 0)}/{resultado.get('total', 0)}")
+            else:
+                logger.warning(f"⚠️ Falha ao enfileirar e-mails de aprovação do job {job.id}: "
+                               f"{resultado.get('error') or resultado.get('erros')}")
+        except Exception as e:
+            logger.error(f"❌ Erro ao enfileirar e-mails de aprovação do job {job.id}: {e}", exc_info=True)
+
+    def limpar_jobs_antigos(self, horas=None):
+        """Remove jobs finalizados e seus PDFs após o período de retenção"""
+        from app import db
+        from models import PdfRenderJob
+
+        horas = horas or int(os.environ.get('PDF_JOB_RETENTION_HOURS', '24'))
+        limite = datetime.utcnow() - timedelta(hours=horas)
+        antigos = PdfRenderJob.query.filter(
+            PdfRenderJob.created_at < limite,
+            ~PdfRenderJob.status.in_(STATUS_ATIVOS),
+        ).all()
+        hashes = set()
+        for job in antigos:
+            if job.result_hash:
+                hashes.add(job.result_hash)
+            elif job.result_path and os.path.exists(job.result_path):
+                # Jobs anteriores ao store compartilhado
+                try:
+                    os.unlink(job.result_path)
+                except OSError:
+                    pass
+            db.session.delete(job)
+        db.session.commit()
+
+        # Endereçado por hash: o mesmo PDF (cache) pode pertencer a um job mais novo
+        if hashes:
+            em_uso = {h for (h,) in db.session.query(PdfRenderJob.result_hash)
+                      .filter(PdfRenderJob.result_hash.in_(hashes))}
+            store = get_result_store()
+            for digest in hashes - em_uso:
+                try:
+                    store.delete(digest)
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro ao remover PDF {digest} do store: {e}")
+        return len(antigos)
+
+
+# Create singleton instance
+pdf_render_queue = PdfRenderQueue()
+
+
+def job_result_response(job, filename, as_attachment=True):
+    """
+    Resposta com o PDF do job (store compartilhado, com ETag e Range);
+    None se o resultado já foi removido - quem chama responde 410.
+    """
+    import unicodedata
+    from urllib.parse import quote
+    from flask import send_file
+    from photo_store import stream_photo_response
+
+    if job.result_hash:
+        response = stream_photo_response(job.result_hash, 'application/pdf', store=get_result_store())
+        if response is None:
+            return None
+    elif job.result_path and os.path.exists(job.result_path):
+        # Jobs anteriores ao store compartilhado
+        response = send_file(job.result_path, mimetype='application/pdf', conditional=True)
+    else:
+        return None
+
+    # Mesmo formato do send_file(download_name=...): nomes com acento vão em filename*
+    disposicao = 'attachment' if as_attachment else 'inline'
+    try:
+        filename.encode('ascii')
+        response.headers['Content-Disposition'] = f'{disposicao}; filename="{filename}"'
+    except UnicodeEncodeError:
+        simples = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        response.headers['Content-Disposition'] = (f'{disposicao}; filename="{simples}"; '
+                                                   f"filename*=UTF-8''{quote(filename)}")
+    return response
+
+
+def job_status_response(job, download_url):
+    """Payload JSON padrão da API de status de jobs"""
+    data = job.to_dict()
+    data['download_url'] = download_url if job.status == 'concluido' else None
+    return data
+
+
+def job_pending_response(job, status_url, download_url):
+    """
+    Resposta 202 de uma rota de PDF em cache miss: JSON com a URL de polling
+    para chamadas fetch/XHR; para links comuns (visualizar/baixar), uma página
+    de espera que consulta o status e abre o PDF quando o job conclui.
+    """
+    from flask import request, jsonify, render_template, make_response
+
+    quer_json = (request.accept_mimetypes.best == 'application/json'
+                 or request.headers.get('X-Requested-With') == 'XMLHttpRequest')
+    if quer_json:
+        response = jsonify({'success': True, 'job': job_status_response(job, download_url),
+                            'status_url': status_url})
+    else:
+        response = make_response(render_template('reports/pdf_job_wait.html', job=job,
+                                                 status_url=status_url, download_url=download_url))
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    response.headers['Retry-After'] = '2'
+    return response
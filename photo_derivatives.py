@@ -0,0 +1,179 @@
+"""
+Derivados de Fotos (thumbnail / preview / pdf)
+Gera versões redimensionadas das fotos dos relatórios sob demanda, com cache em disco
+indexado por imagem_hash + tamanho. O original continua intacto no photo_store.
+
+Configuração (variáveis de ambiente):
+    PHOTO_DERIVATIVES_PATH  = diretório do cache (padrão: uploads/derivatives)
+    PHOTO_DERIVATIVES_EAGER = 1 para gerar todos os tamanhos já no upload
+    PDF_EMBED_DPI           = resolução das fotos embutidas nos PDFs (padrão: 200)
+"""
+
+import io
+import os
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Lado maior (px) e qualidade JPEG de cada variante
+DERIVATIVE_SIZES = {
+    'thumb': {'max_side': 400, 'quality': 75},
+    'preview': {'max_side': 1280, 'quality': 82},
+    'pdf': {'max_side': 1600, 'quality': 85},
+}
+
+# Fotos embutidas em PDF: redimensionadas para a caixa do template nesta resolução
+PDF_EMBED_DPI = int(os.environ.get('PDF_EMBED_DPI', '200'))
+PDF_EMBED_QUALITY = 82
+
+# Locks listrados: (hash, tamanho) -> um de N locks fixos, sem crescer com as fotos pedidas
+NUM_LOCKS = 64
+
+
+def mm_to_px(mm, dpi=None):
+    """Converte uma medida do layout (mm) em pixels na resolução de embed"""
+    return int(round(mm / 25.4 * (dpi or PDF_EMBED_DPI)))
+
+
+class PhotoDerivativeService:
+    """Gera e mantém em cache as variantes redimensionadas de cada foto"""
+
+    def __init__(self, root=None, eager=None):
+        self.root = os.path.abspath(root or os.environ.get('PHOTO_DERIVATIVES_PATH', os.path.join('uploads', 'derivatives')))
+        if eager is None:
+            eager = os.environ.get('PHOTO_DERIVATIVES_EAGER', '').lower() in ('1', 'true', 'yes')
+        self.eager = eager
+        self._locks = [threading.Lock() for _ in range(NUM_LOCKS)]
+
+    def path_for(self, digest, size):
+        return os.path.join(self.root, size, digest[:2], f"{digest}.jpg")
+
+    def _lock_for(self, key):
+        return self._locks[hash(key) % NUM_LOCKS]
+
+    def get_path(self, digest, size, source_bytes=None):
+        """
+        Caminho do derivado em disco, gerando na primeira solicitação.
+        Retorna None se o tamanho é desconhecido ou o original não existe.
+        """
+        if size not in DERIVATIVE_SIZES or not digest:
+            return None
+        spec = DERIVATIVE_SIZES[size]
+        return self._get_or_create(self.path_for(digest, size), digest, size, source_bytes,
+                                   spec['max_side'], spec['max_side'], spec['quality'])
+
+    def fit_path(self, digest, max_width, max_height, source_bytes=None):
+        """
+        Variante que cabe em max_width x max_height pixels (caixa de foto de um PDF).
+        Cache por hash + tamanho alvo, como as variantes nomeadas.
+        """
+        if not digest:
+            return None
+        key = f"fit_{max_width}x{max_height}"
+        return self._get_or_create(os.path.join(self.root, key, digest[:2], f"{digest}.jpg"), digest, key,
+                                   source_bytes, max_width, max_height, PDF_EMBED_QUALITY)
+
+    def pdf_image_path(self, foto, max_width_mm, max_height_mm, fallback_path=None):
+        """
+        Foto pronta para embutir num PDF: redimensionada para a caixa do template
+        (em mm, na resolução PDF_EMBED_DPI) e re-encodada como JPEG progressivo.
+
+        Origem dos bytes: photo store pelo imagem_hash; para fotos sem hash, bytes
+        legados da linha ou o arquivo em fallback_path.
+        Retorna None se a foto não for encontrada.
+        """
+        max_width, max_height = mm_to_px(max_width_mm), mm_to_px(max_height_mm)
+
+        digest = getattr(foto, 'imagem_hash', None)
+        if digest:
+            path = self.fit_path(digest, max_width, max_height)
+            if path:
+                return path
+
+        source_bytes = None
+        try:
+            source_bytes = getattr(foto, 'imagem', None)
+        except Exception as e:
+            logger.warning(f"⚠️ Bytes da foto {getattr(foto, 'id', '?')} indisponíveis: {e}")
+        if not source_bytes and fallback_path and os.path.exists(fallback_path):
+            with open(fallback_path, 'rb') as f:
+                source_bytes = f.read()
+        if not source_bytes:
+            return None
+
+        from photo_store import compute_hash
+        source_bytes = bytes(source_bytes)
+        return self.fit_path(compute_hash(source_bytes), max_width, max_height, source_bytes=source_bytes)
+
+    def _get_or_create(self, path, digest, label, source_bytes, max_width, max_height, quality):
+        if os.path.exists(path):
+            return path
+
+        with self._lock_for((digest, label)):
+            if os.path.exists(path):
+                return path
+            if source_bytes is None:
+                from photo_store import get_photo_store
+                store = get_photo_store()
+                if not store.exists(digest):
+                    return None
+                source_bytes = store.read(digest)
+            data = self.resize(source_bytes, max_width, max_height, quality)
+            self._write_atomic(path, data)
+            logger.info(f"🖼️ Derivado '{label}' gerado para {digest[:12]} ({len(data)} bytes)")
+        return path
+
+    def generate_all(self, digest, source_bytes=None):
+        """Gera todas as variantes (modo eager no upload)"""
+        for size in DERIVATIVE_SIZES:
+            try:
+                self.get_path(digest, size, source_bytes=source_bytes)
+            except Exception as e:
+                logger.warning(f"⚠️ Falha ao gerar derivado '{size}' de {digest[:12]}: {e}")
+
+    @staticmethod
+    def render(source_bytes, size):
+        """Redimensiona para uma variante nomeada (DERIVATIVE_SIZES)"""
+        spec = DERIVATIVE_SIZES[size]
+        return PhotoDerivativeService.resize(source_bytes, spec['max_side'], spec['max_side'], spec['quality'])
+
+    @staticmethod
+    def resize(source_bytes, max_width, max_height, quality):
+        """Redimensiona mantendo proporção (sem ampliar) e re-encoda como JPEG progressivo"""
+        from PIL import Image, ImageOps
+
+        with Image.open(io.BytesIO(source_bytes)) as img:
+            # draft: decodifica JPEGs grandes já reduzidos (menos memória e CPU)
+            img.draft('RGB', (max(max_width, max_height),) * 2)
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ('RGB', 'L'):
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                if img.mode in ('RGBA', 'LA', 'P'):
+                    img = img.convert('RGBA')
+                    background.paste(img, mask=img.split()[-1])
+                else:
+                    background.paste(img.convert('RGB'))
+                img = background
+            img.thumbnail((max_width, max_height), Image.LANCZOS)
+            out = io.BytesIO()
+            img.save(out, format='JPEG', quality=quality, optimize=True, progressive=True)
+            return out.getvalue()
+
+    @staticmethod
+    def _write_atomic(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+
+# Create singleton instance
+photo_derivative_service = PhotoDerivativeService()
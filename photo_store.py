@@ -0,0 +1,336 @@
+"""
+Armazenamento de Fotos Endereçado por Conteúdo
+Os bytes das fotos ficam fora do PostgreSQL, indexados pelo SHA-256 (imagem_hash).
+As tabelas FotoRelatorio / FotoRelatorioExpress guardam apenas metadados + hash.
+
+Backends:
+    - local: filesystem com shard por prefixo do hash (ab/cd/abcd...)
+    - s3: qualquer storage compatível com S3 (AWS, R2, MinIO) - requer boto3
+
+Configuração (variáveis de ambiente):
+    PHOTO_STORE_BACKEND   = local | s3          (padrão: local)
+    PHOTO_STORE_PATH      = diretório raiz local (padrão: uploads/blobs)
+    PHOTO_STORE_S3_BUCKET, PHOTO_STORE_S3_PREFIX, PHOTO_STORE_S3_ENDPOINT
+"""
+
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+
+def compute_hash(data):
+    """SHA-256 hexdigest usado como chave de conteúdo"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class PhotoStore:
+    """Interface comum dos backends de armazenamento de fotos"""
+
+    def put(self, data):
+        """Grava bytes e retorna (hash, tamanho). Idempotente para o mesmo conteúdo."""
+        if isinstance(data, memoryview):
+            data = bytes(data)
+        digest = compute_hash(data)
+        if not self.exists(digest):
+            self._write(digest, data)
+        return digest, len(data)
+
+    def put_stream(self, fileobj):
+        """Grava a partir de um arquivo/stream sem carregar tudo em memória"""
+        raise NotImplementedError
+
+    def exists(self, digest):
+        raise NotImplementedError
+
+    def size(self, digest):
+        raise NotImplementedError
+
+    def open(self, digest):
+        """Retorna um file-like binário somente leitura"""
+        raise NotImplementedError
+
+    def read(self, digest):
+        with self.open(digest) as f:
+            return f.read()
+
+    def iter_chunks(self, digest, start=0, end=None, chunk_size=CHUNK_SIZE):
+        """Gera os bytes [start, end] em blocos - usado para respostas em streaming"""
+        with self.open(digest) as f:
+            if start:
+                f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                to_read = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = f.read(to_read)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def local_path(self, digest):
+        """Caminho no filesystem quando disponível (permite sendfile); None caso contrário"""
+        return None
+
+    def delete(self, digest):
+        raise NotImplementedError
+
+    def _write(self, digest, data):
+        raise NotImplementedError
+
+
+class LocalPhotoStore(PhotoStore):
+    """Backend em filesystem local com shard de dois níveis pelo prefixo do hash"""
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _write_atomic(self, digest, write_fn):
+        path = self._path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                write_fn(tmp)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _write(self, digest, data):
+        self._write_atomic(digest, lambda f: f.write(data))
+
+    def put_stream(self, fileobj):
+        # Grava em arquivo temporário calculando o hash em paralelo
+        hasher = hashlib.sha256()
+        size = 0
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            digest = hasher.hexdigest()
+            path = self._path(digest)
+            if os.path.exists(path):
+                os.unlink(tmp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+            return digest, size
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def exists(self, digest):
+        return bool(digest) and os.path.exists(self._path(digest))
+
+    def size(self, digest):
+        return os.path.getsize(self._path(digest))
+
+    def open(self, digest):
+        return open(self._path(digest), 'rb')
+
+    def local_path(self, digest):
+        return self._path(digest)
+
+    def delete(self, digest):
+        path = self._path(digest)
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+class S3PhotoStore(PhotoStore):
+    """Backend S3-compatível (AWS S3, Cloudflare R2, MinIO)"""
+
+    def __init__(self, bucket, prefix='fotos/', endpoint_url=None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("boto3 não instalado - necessário para PHOTO_STORE_BACKEND=s3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+
+    def _key(self, digest):
+        return f"{self.prefix}{digest[:2]}/{digest[2:4]}/{digest}"
+
+    def _write(self, digest, data):
+        self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=data)
+
+    def put_stream(self, fileobj):
+        # S3 precisa do hash antes da chave: bufferiza em arquivo temporário no disco
+        hasher = hashlib.sha256()
+        size = 0
+        with tempfile.TemporaryFile() as tmp:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                tmp.write(chunk)
+                size += len(chunk)
+            digest = hasher.hexdigest()
+            if not self.exists(digest):
+                tmp.seek(0)
+                self.client.upload_fileobj(tmp, self.bucket, self._key(digest))
+        return digest, size
+
+    def exists(self, digest):
+        if not digest:
+            return False
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except Exception:
+            return False
+
+    def size(self, digest):
+        head = self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+        return head['ContentLength']
+
+    def open(self, digest):
+        obj = self.client.get_object(Bucket=self.bucket, Key=self._key(digest))
+        return obj['Body']
+
+    def iter_chunks(self, digest, start=0, end=None, chunk_size=CHUNK_SIZE):
+        kwargs = {'Bucket': self.bucket, 'Key': self._key(digest)}
+        if start or end is not None:
+            kwargs['Range'] = f"bytes={start}-{'' if end is None else end}"
+        body = self.client.get_object(**kwargs)['Body']
+        try:
+            for chunk in body.iter_chunks(chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    def delete(self, digest):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(digest))
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def build_store(local_root, s3_prefix):
+    """
+    Store do backend configurado (PHOTO_STORE_BACKEND) com raiz/prefixo próprios.
+    Também usado por outros donos de blobs (ex.: anexos da outbox de e-mails).
+    """
+    backend = os.environ.get('PHOTO_STORE_BACKEND', 'local').lower()
+    if backend == 's3':
+        return S3PhotoStore(
+            bucket=os.environ['PHOTO_STORE_S3_BUCKET'],
+            prefix=s3_prefix,
+            endpoint_url=os.environ.get('PHOTO_STORE_S3_ENDPOINT'),
+        )
+    return LocalPhotoStore(local_root)
+
+
+def get_photo_store():
+    """Instância única do store configurado por variáveis de ambiente"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = build_store(os.environ.get('PHOTO_STORE_PATH', os.path.join('uploads', 'blobs')),
+                                     os.environ.get('PHOTO_STORE_S3_PREFIX', 'fotos/'))
+                logger.info(f"📦 Photo store inicializado: {type(_store).__name__}")
+    return _store
+
+
+# Fotos são servidas por id e podem mudar (anotação gera novo hash): o navegador sempre
+# revalida, mas com ETag forte a revalidação custa um 304 sem corpo.
+PHOTO_CACHE_CONTROL = 'private, no-cache'
+
+
+def photo_etag(digest, variant=None):
+    """ETag forte derivado do hash de conteúdo (e da variante, quando houver)"""
+    return f"{digest}-{variant}" if variant else digest
+
+
+def not_modified_response(etag):
+    """Resposta 304 se o If-None-Match do cliente bate com o ETag; None caso contrário"""
+    from flask import Response, request
+
+    if etag and request.if_none_match.contains(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = PHOTO_CACHE_CONTROL
+        return response
+    return None
+
+
+def send_file_conditional(path, mimetype, etag):
+    """send_file com validação por ETag (304) e suporte a Range (206)"""
+    from flask import send_file
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=etag, max_age=None)
+    response.headers['Cache-Control'] = PHOTO_CACHE_CONTROL
+    return response
+
+
+def stream_photo_response(digest, mimetype, filename=None, etag=None, store=None):
+    """
+    Resposta Flask servindo a foto direto do store, sem carregar os bytes no heap.
+    Backend local usa send_file (sendfile do SO); S3 faz streaming em blocos.
+    Ambos respondem 304 para If-None-Match, 206 para requisições Range e 416
+    para um Range fora do arquivo. Retorna None se o blob não está no store.
+    `store` serve blobs de outros donos (ex.: PDFs de pdf_jobs.py).
+    """
+    from flask import Response, request, stream_with_context
+
+    etag = etag or photo_etag(digest)
+    store = store or get_photo_store()
+    path = store.local_path(digest)
+    if path:
+        if not os.path.exists(path):
+            return None
+        response = send_file_conditional(path, mimetype, etag)
+    else:
+        response = not_modified_response(etag)
+        if response is not None:
+            return response
+        # Um único HEAD por requisição: o tamanho também confirma que o blob existe
+        try:
+            total = store.size(digest)
+        except Exception:
+            return None
+        byte_range = request.range.range_for_length(total) if request.range else None
+        if request.range and byte_range is None:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f"bytes */{total}"
+            response.headers['Accept-Ranges'] = 'bytes'
+            return response
+        if byte_range:
+            start, stop = byte_range
+            response = Response(stream_with_context(store.iter_chunks(digest, start, stop - 1)),
+                                status=206, mimetype=mimetype)
+            response.headers['Content-Range'] = f"bytes {start}-{stop - 1}/{total}"
+            response.headers['Content-Length'] = str(stop - start)
+        else:
+            response = Response(stream_with_context(store.iter_chunks(digest)), mimetype=mimetype)
+            response.headers['Content-Length'] = str(total)
+        response.headers['Accept-Ranges'] = 'bytes'
+        response.headers['Cache-Control'] = PHOTO_CACHE_CONTROL
+        response.set_etag(etag)
+    if filename:
+        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
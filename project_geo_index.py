@@ -0,0 +1,259 @@
+"""
+Índice Espacial de Obras - Obras Mais Próximas de uma Coordenada
+Atende /api/nearby-projects e /api/projects/nearby sem carregar todos os
+Projetos nem calcular a distância de cada um em Python a cada requisição.
+
+Funcionamento:
+    - As obras com latitude/longitude ficam em memória, distribuídas numa
+      grade de células de CELULA_GRAUS graus (buckets ao estilo geohash).
+      Uma busca por raio só olha as células que cobrem o retângulo do raio.
+    - Sem raio, a busca pelas `limite` obras mais próximas expande o raio
+      (dobrando) até achar obras suficientes: todas as que estão dentro do
+      raio são mais próximas que qualquer uma fora dele.
+    - A distância dos candidatos é o haversine em km, vetorizado com NumPy
+      quando disponível (sem NumPy, o mesmo cálculo com math).
+    - O índice é reconstruído sob demanda depois de commits que gravam
+      Projeto (listeners de sessão, como em recipient_index.py) ou depois
+      de PROJECT_GEO_INDEX_TTL segundos, para enxergar outros workers.
+
+Configuração (variáveis de ambiente):
+    PROJECT_GEO_BACKEND   = 'memory' (padrão) ou 'earthdistance' (Postgres com
+                            as extensões cube/earthdistance e o índice GiST
+                            da migração add_project_geo_index)
+    PROJECT_GEO_INDEX_TTL = segundos até o índice em memória ser recarregado (padrão: 300)
+"""
+
+import os
+import math
+import time
+import logging
+import threading
+
+# NumPy é opcional: sem ele as distâncias são calculadas uma a uma com math
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+RAIO_TERRA_KM = 6371.0
+KM_POR_GRAU = math.pi * RAIO_TERRA_KM / 180
+# ~5,5 km de lado no equador
+CELULA_GRAUS = 0.05
+RAIO_INICIAL_KM = 10.0
+# Metade da circunferência: nenhum ponto fica mais longe que isso
+RAIO_MAXIMO_KM = math.pi * RAIO_TERRA_KM
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+
+# Campos de Projeto devolvidos pela API (e que invalidam o índice quando mudam)
+CAMPOS = ('id', 'nome', 'numero', 'endereco', 'status', 'tipo_obra', 'latitude', 'longitude',
+          'numeracao_inicial')
+
+_SQL_PROXIMOS_PG = """
+    SELECT {campos},
+           earth_distance(ll_to_earth(:lat, :lon), ll_to_earth(latitude, longitude)) / 1000.0 AS distancia
+      FROM projetos
+     WHERE latitude IS NOT NULL AND longitude IS NOT NULL {filtro_raio}
+     ORDER BY ll_to_earth(latitude, longitude) <-> ll_to_earth(:lat, :lon)
+     LIMIT :limite
+"""
+
+_FILTRO_RAIO_PG = """
+       AND earth_box(ll_to_earth(:lat, :lon), :raio_m) @> ll_to_earth(latitude, longitude)
+       AND earth_distance(ll_to_earth(:lat, :lon), ll_to_earth(latitude, longitude)) <= :raio_m
+"""
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distância em km entre duas coordenadas (graus)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _celula(lat, lon):
+    return math.floor(lat / CELULA_GRAUS), math.floor(lon / CELULA_GRAUS)
+
+
+def _carregar_projetos_do_banco():
+    """Dict com CAMPOS de cada Projeto"""
+    from models import Projeto
+
+    for linha in Projeto.query.with_entities(*[getattr(Projeto, campo) for campo in CAMPOS]):
+        yield dict(zip(CAMPOS, linha))
+
+
+class ProjectGeoIndex:
+    """Grade de células sobre as coordenadas das obras"""
+
+    def __init__(self, loader=None, ttl=None, backend=None):
+        self.loader = loader or _carregar_projetos_do_banco
+        self.ttl = ttl if ttl is not None else int(os.environ.get('PROJECT_GEO_INDEX_TTL', '300'))
+        self.backend = (backend or os.environ.get('PROJECT_GEO_BACKEND', 'memory')).lower()
+        self._projetos = []       # dict de cada obra com coordenadas
+        self._sem_coordenadas = []
+        self._lat = []            # latitude/longitude em radianos (mesma posição de _projetos)
+        self._lon = []
+        self._celulas = {}        # (linha, coluna) -> posições em _projetos
+        self._carregado_em = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Descarta o índice; a próxima busca reconstrói"""
+        with self._lock:
+            self._carregado_em = None
+
+    def proximos(self, lat, lon, raio_km=None, limite=LIMITE_PADRAO):
+        """
+        Obras com coordenadas mais próximas de (lat, lon), da mais perto para a
+        mais longe: lista de dicts com CAMPOS + 'distancia_km'. Com `raio_km`,
+        só as que estão dentro do raio.
+        """
+        limite = max(1, min(int(limite), LIMITE_MAXIMO))
+        if self.backend == 'earthdistance':
+            try:
+                return self._proximos_pg(lat, lon, raio_km, limite)
+            except Exception as e:
+                logger.warning(f"⚠️ Índice de obras: earthdistance indisponível ({e}); usando índice em memória")
+                self.backend = 'memory'
+
+        self._garantir_carregado()
+        if raio_km is not None:
+            return self._dentro_do_raio(lat, lon, raio_km, limite)
+
+        raio = RAIO_INICIAL_KM
+        while True:
+            resultados = self._dentro_do_raio(lat, lon, raio, limite)
+            if len(resultados) >= limite or raio >= RAIO_MAXIMO_KM:
+                return resultados
+            raio *= 2
+
+    def sem_coordenadas(self, limite=LIMITE_PADRAO):
+        """Obras sem latitude/longitude, por nome"""
+        self._garantir_carregado()
+        return [dict(projeto) for projeto in self._sem_coordenadas[:limite]]
+
+    def _garantir_carregado(self):
+        agora = time.monotonic()
+        if self._carregado_em is not None and agora - self._carregado_em < self.ttl:
+            return
+        with self._lock:
+            if self._carregado_em is not None and agora - self._carregado_em < self.ttl:
+                return
+            projetos, sem_coordenadas, lats, lons, celulas = [], [], [], [], {}
+            for projeto in self.loader():
+                lat, lon = projeto.get('latitude'), projeto.get('longitude')
+                if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+                    sem_coordenadas.append(projeto)
+                    continue
+                celulas.setdefault(_celula(lat, lon), []).append(len(projetos))
+                projetos.append(projeto)
+                lats.append(math.radians(lat))
+                lons.append(math.radians(lon))
+            sem_coordenadas.sort(key=lambda p: p.get('nome') or '')
+            if np is not None:
+                lats, lons = np.array(lats, dtype=float), np.array(lons, dtype=float)
+            self._projetos, self._sem_coordenadas = projetos, sem_coordenadas
+            self._lat, self._lon, self._celulas = lats, lons, celulas
+            self._carregado_em = time.monotonic()
+            logger.info(f"🗺️ Índice de obras carregado: {len(projetos)} com coordenadas em {len(celulas)} células")
+
+    def _candidatos(self, lat, lon, raio_km):
+        """Posições das obras nas células que cobrem o retângulo do raio"""
+        dlat = raio_km / KM_POR_GRAU
+        cos_lat = math.cos(math.radians(min(89.0, abs(lat) + dlat)))
+        dlon = raio_km / (KM_POR_GRAU * max(cos_lat, 1e-6))
+        lat_min, lat_max = lat - dlat, lat + dlat
+        lon_min, lon_max = lon - dlon, lon + dlon
+
+        # Retângulo que cruza um polo ou o antimeridiano: todas as obras são candidatas
+        if lat_min <= -90 or lat_max >= 90 or lon_min <= -180 or lon_max >= 180:
+            return range(len(self._projetos))
+
+        (linha_min, coluna_min), (linha_max, coluna_max) = _celula(lat_min, lon_min), _celula(lat_max, lon_max)
+        if (linha_max - linha_min + 1) * (coluna_max - coluna_min + 1) > len(self._celulas):
+            # Raio grande: mais barato filtrar as células ocupadas do que percorrer o retângulo
+            chaves = [chave for chave in self._celulas
+                      if linha_min <= chave[0] <= linha_max and coluna_min <= chave[1] <= coluna_max]
+        else:
+            chaves = [(linha, coluna) for linha in range(linha_min, linha_max + 1)
+                      for coluna in range(coluna_min, coluna_max + 1)]
+        return [posicao for chave in chaves for posicao in self._celulas.get(chave, ())]
+
+    def _distancias(self, lat, lon, posicoes):
+        """Haversine (km) de (lat, lon) até cada posição"""
+        lat, lon = math.radians(lat), math.radians(lon)
+        if np is not None:
+            indices = np.fromiter(posicoes, dtype=np.intp)
+            lats, lons = self._lat[indices], self._lon[indices]
+            a = np.sin((lats - lat) / 2) ** 2 + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+            return 2 * RAIO_TERRA_KM * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+        cos_lat = math.cos(lat)
+        distancias = []
+        for posicao in posicoes:
+            lat2, lon2 = self._lat[posicao], self._lon[posicao]
+            a = math.sin((lat2 - lat) / 2) ** 2 + cos_lat * math.cos(lat2) * math.sin((lon2 - lon) / 2) ** 2
+            distancias.append(2 * RAIO_TERRA_KM * math.asin(min(1.0, math.sqrt(a))))
+        return distancias
+
+    def _dentro_do_raio(self, lat, lon, raio_km, limite):
+        posicoes = list(self._candidatos(lat, lon, raio_km))
+        if not posicoes:
+            return []
+        distancias = self._distancias(lat, lon, posicoes)
+        dentro = sorted((float(distancia), posicao) for distancia, posicao in zip(distancias, posicoes)
+                        if distancia <= raio_km)
+        return [dict(self._projetos[posicao], distancia_km=distancia) for distancia, posicao in dentro[:limite]]
+
+    @staticmethod
+    def _proximos_pg(lat, lon, raio_km, limite):
+        from sqlalchemy import text
+        from app import db
+
+        sql = _SQL_PROXIMOS_PG.format(campos=', '.join(CAMPOS),
+                                      filtro_raio=_FILTRO_RAIO_PG if raio_km is not None else '')
+        parametros = {'lat': lat, 'lon': lon, 'limite': limite}
+        if raio_km is not None:
+            parametros['raio_m'] = raio_km * 1000
+        linhas = db.session.execute(text(sql), parametros)
+        return [dict(zip(CAMPOS, linha[:-1]), distancia_km=float(linha[-1])) for linha in linhas]
+
+
+# Create singleton instance
+project_geo_index = ProjectGeoIndex()
+
+_listeners_installed = False
+
+
+def install_invalidation_listeners():
+    """Invalida o índice depois de commits que gravam Projeto"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    _listeners_installed = True
+
+    from sqlalchemy import event, inspect
+    from sqlalchemy.orm import Session
+    from models import Projeto
+
+    def _afeta_indice(obj):
+        estado = inspect(obj)
+        return any(getattr(estado.attrs, campo).history.has_changes() for campo in CAMPOS if campo != 'id')
+
+    @event.listens_for(Session, 'after_flush')
+    def _marcar_alteracao(session, flush_context):
+        alterados = [obj for obj in session.dirty if isinstance(obj, Projeto) and _afeta_indice(obj)]
+        novos = [obj for obj in list(session.new) + list(session.deleted) if isinstance(obj, Projeto)]
+        if alterados or novos:
+            session.info['project_geo_invalidate'] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidar_apos_commit(session):
+        if session.info.pop('project_geo_invalidate', False):
+            project_geo_index.invalidate()
+
+    @event.listens_for(Session, 'after_rollback')
+    def _descartar_no_rollback(session):
+        session.info.pop('project_geo_invalidate', None)
@@ -0,0 +1,204 @@
+"""
+Despachante de Push Notifications - Envio em Segundo Plano
+Tira a chamada ao OneSignal do ciclo da requisição: criar_notificacao só grava
+a Notificacao e coloca o id numa fila; uma thread do processo web envia depois.
+
+Funcionamento:
+    - A thread espera PUSH_COALESCE_WINDOW segundos depois do primeiro item
+      para juntar o que chegar em seguida (ex.: a mesma notificação para
+      todos os usuários de uma obra).
+    - Várias notificações do mesmo usuário na janela viram um único push.
+    - Pushes com o mesmo conteúdo são enviados numa única chamada, com até
+      ONESIGNAL_MAX_PLAYER_IDS player IDs por requisição.
+    - O resultado fica em Notificacao.push_enviado/push_sucesso/push_erro.
+    - Player IDs rejeitados pelo OneSignal são removidos de user_devices num
+      único DELETE por rodada.
+
+A fila é em memória: a notificação em si já está no banco, só o push de uma
+rodada em andamento se perde se o worker reiniciar.
+
+Configuração (variáveis de ambiente):
+    PUSH_COALESCE_WINDOW = segundos de espera para agrupar pushes (padrão: 2)
+    PUSH_BATCH_MAX       = itens por rodada (padrão: 500)
+"""
+
+import os
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Limite de include_player_ids por requisição da API do OneSignal
+ONESIGNAL_MAX_PLAYER_IDS = 2000
+
+
+def _invalid_player_ids(result):
+    """Player IDs que o OneSignal reportou como inválidos (formato varia com o status)"""
+    response_data = (result or {}).get('response') or {}
+    errors = response_data.get('errors')
+    if isinstance(errors, dict) and errors.get('invalid_player_ids'):
+        return list(errors['invalid_player_ids'])
+    return list(response_data.get('invalid_player_ids') or [])
+
+
+class PushDispatcher:
+    """Fila de pushes com agrupamento por usuário e envio em lote"""
+
+    def __init__(self, window=None, batch_max=None):
+        self.window = window if window is not None else float(os.environ.get('PUSH_COALESCE_WINDOW', '2'))
+        self.batch_max = batch_max or int(os.environ.get('PUSH_BATCH_MAX', '500'))
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, notificacao_id):
+        """Agenda o push de uma Notificacao já gravada (chamar depois do commit)"""
+        self._put(('notificacao', notificacao_id))
+
+    def enqueue_direct(self, player_ids, title, message, url=None, data=None):
+        """Agenda um push sem Notificacao associada"""
+        player_ids = [pid for pid in (player_ids or []) if pid]
+        if player_ids:
+            self._put(('direto', (tuple(player_ids), title, message, url, data)))
+
+    def _put(self, item):
+        from flask import current_app
+
+        self._ensure_started(current_app._get_current_object())
+        self._queue.put(item)
+
+    def _ensure_started(self, app):
+        # Iniciada sob demanda: com gunicorn --preload o fork acontece depois do import
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, args=(app,), name='push-dispatcher', daemon=True)
+                self._thread.start()
+                logger.info("📱 Despachante de push iniciado")
+
+    def _loop(self, app):
+        while True:
+            itens = [self._queue.get()]
+            # Janela de agrupamento: junta o que chegar logo depois do primeiro item
+            try:
+                while len(itens) < self.batch_max:
+                    itens.append(self._queue.get(timeout=self.window))
+            except queue.Empty:
+                pass
+
+            with app.app_context():
+                try:
+                    self.dispatch(itens)
+                except Exception as e:
+                    logger.error(f"❌ Erro no despachante de push: {e}", exc_info=True)
+                finally:
+                    from app import db
+                    db.session.remove()
+
+    def dispatch(self, itens):
+        """Envia uma rodada de itens da fila e registra os resultados"""
+        from flask import current_app
+        from app import db
+        from models import Notificacao, UserDevice, User
+
+        notificacao_ids = [valor for tipo, valor in itens if tipo == 'notificacao']
+        diretos = [valor for tipo, valor in itens if tipo == 'direto']
+
+        notificacoes = []
+        if notificacao_ids:
+            notificacoes = Notificacao.query.filter(Notificacao.id.in_(notificacao_ids)) \
+                .order_by(Notificacao.created_at, Notificacao.id).all()
+
+        por_usuario = {}
+        for notificacao in notificacoes:
+            por_usuario.setdefault(notificacao.user_id, []).append(notificacao)
+
+        # Dispositivos de todos os usuários da rodada numa única consulta
+        dispositivos = {}
+        if por_usuario:
+            for user_id, player_id in db.session.query(UserDevice.user_id, UserDevice.player_id) \
+                    .filter(UserDevice.user_id.in_(list(por_usuario))):
+                dispositivos.setdefault(user_id, []).append(player_id)
+            sem_dispositivo = [uid for uid in por_usuario if uid not in dispositivos]
+            if sem_dispositivo:
+                # Fallback: player ID antigo guardado em User.fcm_token
+                for user_id, token in db.session.query(User.id, User.fcm_token) \
+                        .filter(User.id.in_(sem_dispositivo), User.fcm_token.isnot(None)):
+                    dispositivos[user_id] = [token]
+
+        titulo_app = f"Nova Notificação - {current_app.config.get('APP_NAME', 'ObraFlow')}"
+        # conteúdo do push -> (player IDs, notificações cobertas)
+        envios = {}
+        for user_id, lista in por_usuario.items():
+            player_ids = dispositivos.get(user_id)
+            if not player_ids:
+                for notificacao in lista:
+                    notificacao.push_enviado = False
+                    notificacao.push_sucesso = False
+                    notificacao.push_erro = 'Nenhum dispositivo registrado'
+                continue
+
+            ultima = lista[-1]
+            if len(lista) == 1:
+                mensagem, tipo = ultima.mensagem, ultima.tipo
+            else:
+                mensagem, tipo = f"Você tem {len(lista)} novas notificações. {ultima.mensagem}", 'multiplas'
+            url = notification_service_url(ultima.link_destino)
+            chave = (titulo_app, mensagem, url, (('tipo', tipo),) if tipo else None)
+            destino = envios.setdefault(chave, ([], []))
+            destino[0].extend(player_ids)
+            destino[1].extend(lista)
+
+        for player_ids, title, message, url, data in diretos:
+            chave = (title, message, url, tuple(sorted(data.items())) if data else None)
+            envios.setdefault(chave, ([], []))[0].extend(player_ids)
+
+        invalidos = set()
+        for (title, message, url, data), (player_ids, cobertas) in envios.items():
+            resultados = []
+            for i in range(0, len(player_ids), ONESIGNAL_MAX_PLAYER_IDS):
+                lote = player_ids[i:i + ONESIGNAL_MAX_PLAYER_IDS]
+                result = self._send(lote, title, message, url, dict(data) if data else None)
+                invalidos.update(_invalid_player_ids(result))
+                resultados.append((set(lote), result))
+
+            for notificacao in cobertas:
+                ids_usuario = set(dispositivos.get(notificacao.user_id, []))
+                sucesso, erro = False, None
+                for lote, result in resultados:
+                    if not ids_usuario & lote:
+                        continue
+                    if result.get('success') and ids_usuario & lote - invalidos:
+                        sucesso = True
+                    elif not erro:
+                        erro = result.get('error') or 'Nenhum dispositivo válido'
+                notificacao.push_enviado = True
+                notificacao.push_sucesso = sucesso
+                notificacao.push_erro = None if sucesso else str(erro)[:500]
+
+        if invalidos:
+            # SELF-HEALING: dispositivos inválidos são removidos para forçar novo registro
+            removidos = db.session.query(UserDevice).filter(UserDevice.player_id.in_(list(invalidos))) \
+                .delete(synchronize_session=False)
+            logger.warning(f"🧹 SELF-HEALING: {removidos} dispositivo(s) inválido(s) removido(s)")
+
+        db.session.commit()
+        logger.info(f"📱 Push: {len(itens)} item(ns) em {len(envios)} envio(s) ao OneSignal")
+
+    @staticmethod
+    def _send(player_ids, title, message, url, data):
+        from onesignal_service import onesignal_service
+
+        result = onesignal_service.send_notification_to_many(
+            player_ids=player_ids, title=title, message=message, url=url, data=data)
+        return result or {'success': False, 'error': 'Sem resposta do OneSignal'}
+
+
+def notification_service_url(path):
+    """URL absoluta do link da notificação (OneSignal exige https://)"""
+    from notification_service import notification_service
+    return notification_service._build_full_url(path)
+
+
+# Create singleton instance
+push_dispatcher = PushDispatcher()
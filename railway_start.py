@@ -29,6 +29,8 @@ def main():
     logging.info("🌐 Step 2: Starting Flask application...")
     try:
         from app import app
+        from scheduler_tasks import iniciar_no_servidor
+        iniciar_no_servidor(app)
         port = int(os.environ.get('PORT', 5000))
         app.run(host='0.0.0.0', port=port)
     except Exception as e:
@@ -0,0 +1,258 @@
+"""
+Índice de Nomes de Destinatários - Busca Aproximada de E-mail por Nome
+Resolve o e-mail de um acompanhante a partir do nome digitado no relatório,
+sem varrer User/EmailCliente e sem SequenceMatcher linha a linha.
+
+Funcionamento:
+    - Os nomes (User.nome_completo, User.username, EmailCliente.nome_contato)
+      são normalizados: sem acentos, minúsculos, pontuação vira espaço.
+    - Cada nome é indexado pelos seus trigramas (mesma regra do pg_trgm).
+      Uma busca só compara com os nomes que compartilham trigramas suficientes
+      com o nome procurado; a nota final continua sendo o SequenceMatcher,
+      então o limiar de 0.6 mantém o comportamento anterior.
+    - O índice é reconstruído sob demanda depois que usuários ou contatos
+      mudam (listeners de sessão, como em pdf_cache.py) ou depois de
+      RECIPIENT_INDEX_TTL segundos, para enxergar alterações de outros workers.
+
+Configuração (variáveis de ambiente):
+    RECIPIENT_INDEX_BACKEND = 'memory' (padrão) ou 'pg_trgm' (candidatos vêm
+                              do Postgres via índices GIN; requer a extensão)
+    RECIPIENT_INDEX_TTL     = segundos até o índice em memória ser recarregado (padrão: 300)
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+
+logger = logging.getLogger(__name__)
+
+LIMIAR_PADRAO = 0.6
+# Fração mínima de trigramas em comum para um nome virar candidato
+# (baixa de propósito: 'jon' x 'john' tem 0.28 de trigramas e 0.86 de SequenceMatcher)
+LIMIAR_TRIGRAMAS = 0.15
+MAX_CANDIDATOS = 20
+
+_NAO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+_SQL_CANDIDATOS_PG = """
+    SELECT nome, email FROM (
+        SELECT lower(nome_completo) AS nome, email FROM users
+         WHERE email IS NOT NULL AND lower(nome_completo) % :nome
+        UNION ALL
+        SELECT lower(username), email FROM users
+         WHERE email IS NOT NULL AND lower(username) % :nome
+        UNION ALL
+        SELECT lower(nome_contato), email FROM emails_clientes
+         WHERE email IS NOT NULL AND lower(nome_contato) % :nome
+    ) candidatos
+    ORDER BY similarity(nome, :nome) DESC
+    LIMIT :limite
+"""
+
+
+def normalizar_nome(nome):
+    """'  José  da Silva-Júnior ' -> 'jose da silva junior'"""
+    if not nome:
+        return ''
+    sem_acentos = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode('ascii')
+    return _NAO_ALFANUMERICO.sub(' ', sem_acentos.lower()).strip()
+
+
+def trigramas(nome_normalizado):
+    """Trigramas no formato do pg_trgm: cada palavra com dois espaços antes e um depois"""
+    resultado = set()
+    for palavra in nome_normalizado.split():
+        padded = f"  {palavra} "
+        resultado.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return resultado
+
+
+def _carregar_nomes_do_banco():
+    """(nome, email) de usuários e contatos de obra com e-mail"""
+    from models import User, EmailCliente
+
+    for nome_completo, username, email in User.query.with_entities(
+            User.nome_completo, User.username, User.email).filter(User.email.isnot(None)):
+        if nome_completo:
+            yield nome_completo, email
+        if username:
+            yield username, email
+    for nome_contato, email in EmailCliente.query.with_entities(
+            EmailCliente.nome_contato, EmailCliente.email).filter(EmailCliente.email.isnot(None)):
+        if nome_contato:
+            yield nome_contato, email
+
+
+class RecipientNameIndex:
+    """Índice invertido de trigramas sobre os nomes de usuários e contatos"""
+
+    def __init__(self, loader=None, ttl=None, backend=None):
+        self.loader = loader or _carregar_nomes_do_banco
+        self.ttl = ttl if ttl is not None else int(os.environ.get('RECIPIENT_INDEX_TTL', '300'))
+        self.backend = (backend or os.environ.get('RECIPIENT_INDEX_BACKEND', 'memory')).lower()
+        self._nomes = []       # nomes normalizados
+        self._emails = []      # e-mail de cada nome (mesma posição)
+        self._conjuntos = []   # trigramas de cada nome
+        self._postings = {}    # trigrama -> posições em _nomes
+        self._cache = {}       # nome normalizado -> e-mail (ou None)
+        self._carregado_em = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Descarta o índice; o próximo lookup reconstrói"""
+        with self._lock:
+            self._carregado_em = None
+            self._cache = {}
+
+    def lookup(self, nome, limiar=LIMIAR_PADRAO):
+        """
+        E-mail cujo nome mais se parece com `nome`, ou None abaixo do limiar.
+        """
+        alvo = normalizar_nome(nome)
+        if not alvo:
+            return None
+
+        if self.backend == 'pg_trgm':
+            try:
+                return self._melhor(alvo, self._candidatos_pg(alvo), limiar)
+            except Exception as e:
+                logger.warning(f"⚠️ Índice de destinatários: pg_trgm indisponível ({e}); usando índice em memória")
+                self.backend = 'memory'
+
+        self._garantir_carregado()
+        chave = (alvo, limiar)
+        if chave in self._cache:
+            return self._cache[chave]
+        email = self._melhor(alvo, self._candidatos_memoria(alvo), limiar)
+        self._cache[chave] = email
+        return email
+
+    def _garantir_carregado(self):
+        agora = time.monotonic()
+        if self._carregado_em is not None and agora - self._carregado_em < self.ttl:
+            return
+        with self._lock:
+            if self._carregado_em is not None and agora - self._carregado_em < self.ttl:
+                return
+            nomes, emails, conjuntos, postings = [], [], [], {}
+            vistos = set()
+            for nome, email in self.loader():
+                normalizado = normalizar_nome(nome)
+                email = (email or '').strip()
+                if not normalizado or '@' not in email or (normalizado, email.lower()) in vistos:
+                    continue
+                vistos.add((normalizado, email.lower()))
+                posicao = len(nomes)
+                tris = frozenset(trigramas(normalizado))
+                nomes.append(normalizado)
+                emails.append(email)
+                conjuntos.append(tris)
+                for tri in tris:
+                    postings.setdefault(tri, []).append(posicao)
+            self._nomes, self._emails, self._conjuntos, self._postings = nomes, emails, conjuntos, postings
+            self._cache = {}
+            self._carregado_em = time.monotonic()
+            logger.info(f"📇 Índice de destinatários carregado: {len(nomes)} nomes, {len(postings)} trigramas")
+
+    def _candidatos_memoria(self, alvo):
+        tris = trigramas(alvo)
+        if not tris:
+            return []
+
+        # Trigramas muito comuns (sobrenomes frequentes) quase não discriminam e
+        # dominam o custo; a contagem usa só os seletivos, quando houver
+        limite_comum = max(64, len(self._nomes) // 50)
+        listas = [self._postings[tri] for tri in tris if tri in self._postings]
+        seletivas = [lista for lista in listas if len(lista) <= limite_comum] or listas
+        comuns = Counter()
+        for lista in seletivas:
+            comuns.update(lista)
+
+        # Similaridade exata de trigramas (mesma fórmula do pg_trgm) só para os mais promissores
+        jaccard = []
+        for posicao, _ in comuns.most_common(MAX_CANDIDATOS * 4):
+            n = len(tris & self._conjuntos[posicao])
+            jaccard.append((n / (len(tris) + len(self._conjuntos[posicao]) - n), posicao))
+        jaccard.sort(reverse=True)
+        return [(self._nomes[posicao], self._emails[posicao])
+                for score, posicao in jaccard[:MAX_CANDIDATOS] if score >= LIMIAR_TRIGRAMAS]
+
+    def _candidatos_pg(self, alvo):
+        from sqlalchemy import text
+        from app import db
+
+        linhas = db.session.execute(text(_SQL_CANDIDATOS_PG), {'nome': alvo, 'limite': MAX_CANDIDATOS})
+        return [(normalizar_nome(nome), email.strip()) for nome, email in linhas if email and '@' in email]
+
+    @staticmethod
+    def _melhor(alvo, candidatos, limiar):
+        """
+        Maior SequenceMatcher.ratio() entre o alvo e os candidatos, também com
+        as palavras em ordem alfabética ('silva joao' x 'joao silva').
+        """
+        direto = SequenceMatcher(None, '', alvo)
+        alvo_ordenado = ' '.join(sorted(alvo.split()))
+        ordenado = SequenceMatcher(None, '', alvo_ordenado) if alvo_ordenado != alvo else None
+
+        melhor_email, melhor_score = None, limiar
+        for nome, email in candidatos:
+            comparacoes = [(direto, nome)]
+            if ordenado is not None or ' ' in nome:
+                comparacoes.append((ordenado or direto, ' '.join(sorted(nome.split()))))
+            for matcher, texto in comparacoes:
+                # O alvo fica em seq2 (pré-processado uma vez); os limites rápidos descartam cedo
+                matcher.set_seq1(texto)
+                if matcher.real_quick_ratio() <= melhor_score or matcher.quick_ratio() <= melhor_score:
+                    continue
+                score = matcher.ratio()
+                if score > melhor_score:
+                    melhor_email, melhor_score = email, score
+        if melhor_email:
+            logger.info(f"      ✅ Destinatário encontrado: {alvo} → {melhor_email} (score: {melhor_score:.2f})")
+        return melhor_email
+
+
+# Create singleton instance
+recipient_index = RecipientNameIndex()
+
+_listeners_installed = False
+
+
+def install_invalidation_listeners():
+    """Invalida o índice depois de commits que gravam User ou EmailCliente"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    _listeners_installed = True
+
+    from sqlalchemy import event, inspect
+    from sqlalchemy.orm import Session
+    from models import User, EmailCliente
+
+    campos = {User: ('nome_completo', 'username', 'email'), EmailCliente: ('nome_contato', 'email')}
+
+    def _afeta_indice(obj):
+        # Atualizações comuns de usuário (último acesso etc.) não recarregam o índice
+        estado = inspect(obj)
+        return any(getattr(estado.attrs, campo).history.has_changes() for campo in campos[type(obj)])
+
+    @event.listens_for(Session, 'after_flush')
+    def _marcar_alteracao(session, flush_context):
+        alterados = [obj for obj in session.dirty if type(obj) in campos and _afeta_indice(obj)]
+        novos = [obj for obj in list(session.new) + list(session.deleted) if type(obj) in campos]
+        if alterados or novos:
+            session.info['recipient_index_invalidate'] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidar_apos_commit(session):
+        if session.info.pop('recipient_index_invalidate', False):
+            recipient_index.invalidate()
+
+    @event.listens_for(Session, 'after_rollback')
+    def _descartar_no_rollback(session):
+        session.info.pop('recipient_index_invalidate', None)
@@ -34,6 +34,9 @@ def main():
         # Configure for Replit environment
         app.config['SERVER_NAME'] = None  # Allow all hostnames
         
+        from scheduler_tasks import iniciar_no_servidor
+        iniciar_no_servidor(app)
+        
         # Get port (Replit provides PORT environment variable)
         port = int(os.environ.get('PORT', 5000))
         logger.info(f"🚀 Starting server on 0.0.0.0:{port}")
@@ -0,0 +1,184 @@
+"""
+Listagem de Relatórios - Paginação por Cursor e Caches dos Filtros
+Apoia a rota /reports para que a página 50 custe o mesmo que a página 1.
+
+Funcionamento:
+    - Paginação keyset em (created_at, id), ambos decrescentes, com a
+      relevância da busca na frente quando há termo (report_search.py). O
+      cursor (keyset_cursor.py, o mesmo da API) guarda os valores da
+      última/primeira linha da página; "Próxima" e "Anterior" são uma
+      condição WHERE + LIMIT, sem OFFSET.
+    - O total exibido vem de um COUNT guardado por combinação de filtros
+      durante REPORT_LIST_TOTAL_TTL segundos: navegar entre páginas não
+      conta de novo.
+    - As listas dos selects de Obra e Autor (só id e nome) ficam em cache
+      por REPORT_LIST_OPTIONS_TTL segundos e são invalidadas depois de
+      commits que gravam Projeto ou User (listeners de sessão, como em
+      recipient_index.py). Outros workers enxergam a mudança pelo TTL.
+
+Configuração (variáveis de ambiente):
+    REPORT_LIST_OPTIONS_TTL = segundos do cache das listas de filtro (padrão: 300)
+    REPORT_LIST_TOTAL_TTL   = segundos do cache dos totais (padrão: 60)
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+from keyset_cursor import ler_cursor, gerar_cursor, condicao_depois
+
+logger = logging.getLogger(__name__)
+
+OpcaoFiltro = namedtuple('OpcaoFiltro', 'id nome')
+# Máximo de combinações de filtro com total guardado
+MAX_TOTAIS = 500
+
+_listeners_installed = False
+
+
+class PaginaCursor:
+    """Página de resultados com links por cursor (substitui o Pagination do paginate())"""
+
+    def __init__(self, items, proximo_cursor=None, cursor_anterior=None, total=None):
+        self.items = items
+        self.proximo_cursor = proximo_cursor
+        self.cursor_anterior = cursor_anterior
+        self.total = total if total is not None else len(items)
+
+    @property
+    def has_next(self):
+        return self.proximo_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.cursor_anterior is not None
+
+
+def paginar_keyset(query, ordem, cursor=None, anterior=False, por_pagina=20):
+    """
+    Página de `query` ordenada por `ordem` (lista de (expressão, conversor),
+    todas decrescentes; a última deve ser única). `anterior=True` busca a
+    página antes do cursor. Devolve PaginaCursor com as entidades da query.
+    """
+    expressoes = [expr for expr, _ in ordem]
+    if cursor:
+        valores = ler_cursor(cursor, [conversor for _, conversor in ordem])
+        # "Anterior" percorre a mesma ordem ao contrário
+        query = query.filter(condicao_depois(expressoes, valores, [not anterior] * len(expressoes)))
+
+    query = query.add_columns(*expressoes)
+    query = query.order_by(*[expr.asc() if anterior else expr.desc() for expr in expressoes])
+    linhas = query.limit(por_pagina + 1).all()
+
+    mais = len(linhas) > por_pagina
+    linhas = linhas[:por_pagina]
+    if anterior:
+        linhas.reverse()
+    if not linhas:
+        return PaginaCursor([])
+
+    primeira, ultima = gerar_cursor(linhas[0][1:]), gerar_cursor(linhas[-1][1:])
+    if anterior:
+        return PaginaCursor([linha[0] for linha in linhas], proximo_cursor=ultima,
+                            cursor_anterior=primeira if mais else None)
+    return PaginaCursor([linha[0] for linha in linhas], proximo_cursor=ultima if mais else None,
+                        cursor_anterior=primeira if cursor else None)
+
+
+class ReportListCache:
+    """Listas dos filtros e totais por filtro, em memória com TTL"""
+
+    def __init__(self, ttl_opcoes=None, ttl_total=None):
+        self.ttl_opcoes = ttl_opcoes if ttl_opcoes is not None else int(os.environ.get('REPORT_LIST_OPTIONS_TTL', '300'))
+        self.ttl_total = ttl_total if ttl_total is not None else int(os.environ.get('REPORT_LIST_TOTAL_TTL', '60'))
+        self._lock = threading.Lock()
+        self._opcoes = None  # (expira_em, projetos, autores)
+        self._totais = {}    # chave do filtro -> (expira_em, total)
+
+    def opcoes_filtro(self):
+        """(projetos, autores) como listas de OpcaoFiltro(id, nome), ordenadas por nome"""
+        with self._lock:
+            if self._opcoes is not None and self._opcoes[0] > time.monotonic():
+                return self._opcoes[1], self._opcoes[2]
+
+        from models import Projeto, User
+
+        projetos = [OpcaoFiltro(*linha) for linha in
+                    Projeto.query.with_entities(Projeto.id, Projeto.nome).order_by(Projeto.nome)]
+        autores = [OpcaoFiltro(*linha) for linha in
+                   User.query.with_entities(User.id, User.nome_completo).filter_by(ativo=True)
+                   .order_by(User.nome_completo)]
+        with self._lock:
+            self._opcoes = (time.monotonic() + self.ttl_opcoes, projetos, autores)
+        return projetos, autores
+
+    def total(self, chave, query):
+        """COUNT de `query` guardado por `chave` (tupla dos filtros) durante o TTL"""
+        agora = time.monotonic()
+        with self._lock:
+            guardado = self._totais.get(chave)
+            if guardado is not None and guardado[0] > agora:
+                return guardado[1]
+
+        total = query.order_by(None).count()
+        with self._lock:
+            if len(self._totais) >= MAX_TOTAIS:
+                self._totais = {k: v for k, v in self._totais.items() if v[0] > agora}
+                if len(self._totais) >= MAX_TOTAIS:
+                    self._totais.clear()
+            self._totais[chave] = (agora + self.ttl_total, total)
+        return total
+
+    def invalidar_opcoes(self):
+        with self._lock:
+            self._opcoes = None
+
+    def invalidar_totais(self):
+        with self._lock:
+            self._totais.clear()
+
+
+def install_invalidation_listeners():
+    """Invalida as listas de filtro (Projeto/User) e os totais (Relatorio criado/apagado) após o commit"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    _listeners_installed = True
+
+    from sqlalchemy import event, inspect
+    from sqlalchemy.orm import Session
+    from models import Projeto, User, Relatorio
+
+    campos = {Projeto: ('nome',), User: ('nome_completo', 'ativo')}
+
+    def _afeta_opcoes(obj):
+        # Atualizações comuns de usuário (último acesso etc.) não invalidam as listas
+        estado = inspect(obj)
+        return any(getattr(estado.attrs, campo).history.has_changes() for campo in campos[type(obj)])
+
+    @event.listens_for(Session, 'after_flush')
+    def _marcar_alteracao(session, flush_context):
+        alterados = [obj for obj in session.dirty if type(obj) in campos and _afeta_opcoes(obj)]
+        novos = [obj for obj in list(session.new) + list(session.deleted) if type(obj) in campos]
+        if alterados or novos:
+            session.info['report_list_opcoes'] = True
+        if any(isinstance(obj, Relatorio) for obj in list(session.new) + list(session.deleted)):
+            session.info['report_list_totais'] = True
+
+    @event.listens_for(Session, 'after_commit')
+    def _invalidar_apos_commit(session):
+        if session.info.pop('report_list_opcoes', False):
+            report_list_cache.invalidar_opcoes()
+        if session.info.pop('report_list_totais', False):
+            report_list_cache.invalidar_totais()
+
+    @event.listens_for(Session, 'after_rollback')
+    def _descartar_no_rollback(session):
+        session.info.pop('report_list_opcoes', None)
+        session.info.pop('report_list_totais', None)
+
+
+# Create singleton instance
+report_list_cache = ReportListCache()
@@ -0,0 +1,191 @@
+"""
+Busca Textual de Relatórios - Full-Text Search do Postgres
+Busca em relatórios comuns e Express pelo texto inteiro (título, descrição,
+conteúdo, observações finais, legendas e descrições das fotos), com stemming
+em português e sem diferenciar acentos, ordenando pela relevância.
+
+Funcionamento:
+    - relatorios.search_vector e relatorios_express.search_vector (tsvector,
+      índice GIN) são mantidos por triggers do Postgres: o documento é
+      recalculado quando o texto do relatório muda e quando uma foto é
+      incluída, editada ou apagada. O ORM não mapeia a coluna.
+    - A configuração 'pt_unaccent' é a 'portuguese' com unaccent antes do
+      stemming: "concretagem" encontra "concretágem", "concretar" etc.
+    - A consulta usa websearch_to_tsquery: palavras soltas viram AND,
+      "frase entre aspas" vira busca por frase, -palavra exclui.
+    - Nome da obra e do autor continuam valendo: os ids de projetos/usuários
+      que casam com o termo (tabelas pequenas) entram na mesma condição.
+    - Sem Postgres (SQLite/desenvolvimento) ou sem a migração aplicada, a
+      busca volta para ILIKE nos mesmos campos.
+
+Configuração (variáveis de ambiente):
+    REPORT_SEARCH_BACKEND = 'auto' (padrão: FTS se disponível) ou 'ilike'
+"""
+
+import os
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CONFIG_TS = 'pt_unaccent'
+# Opções do ts_headline para o trecho exibido nos resultados
+OPCOES_TRECHO = 'MaxFragments=2, MaxWords=20, MinWords=8, StartSel=<mark>, StopSel=</mark>'
+
+
+class ReportSearch:
+    """Condições de busca e busca ranqueada em Relatorio e RelatorioExpress"""
+
+    def __init__(self, backend=None):
+        self.backend = (backend or os.environ.get('REPORT_SEARCH_BACKEND', 'auto')).lower()
+        self._fts = None
+
+    def usa_fts(self):
+        """True se o Postgres tem as colunas search_vector (migração aplicada)"""
+        if self.backend == 'ilike':
+            return False
+        if self._fts is None:
+            from sqlalchemy import text
+            from app import db
+
+            if db.engine.dialect.name != 'postgresql':
+                self._fts = False
+            else:
+                try:
+                    with db.engine.connect() as conn:
+                        self._fts = conn.execute(text(
+                            "SELECT count(*) FROM information_schema.columns "
+                            "WHERE table_name IN ('relatorios', 'relatorios_express') AND column_name = 'search_vector'"
+                        )).scalar() == 2
+                except Exception as e:
+                    logger.warning(f"⚠️ Busca textual: não foi possível verificar search_vector ({e}); usando ILIKE")
+                    self._fts = False
+                if not self._fts:
+                    logger.warning("⚠️ Busca textual: search_vector ausente (migração pendente); usando ILIKE")
+        return self._fts
+
+    @staticmethod
+    def _vetor(tabela):
+        from app import db
+        return db.literal_column(f'{tabela}.search_vector')
+
+    @staticmethod
+    def _consulta(termo):
+        from app import db
+        return db.func.websearch_to_tsquery(CONFIG_TS, termo)
+
+    def filtro_relatorios(self, termo):
+        """Condição para Relatorio.query (a consulta não precisa de JOIN com Projeto/User)"""
+        from app import db
+        from models import Relatorio, Projeto, User
+
+        padrao = f'%{termo}%'
+        projetos = [pid for pid, in db.session.query(Projeto.id).filter(Projeto.nome.ilike(padrao))]
+        autores = [uid for uid, in db.session.query(User.id).filter(User.nome_completo.ilike(padrao))]
+        por_nome = [Relatorio.projeto_id.in_(projetos)] if projetos else []
+        por_nome += [Relatorio.autor_id.in_(autores)] if autores else []
+
+        if self.usa_fts():
+            return db.or_(self._vetor('relatorios').op('@@')(self._consulta(termo)), *por_nome)
+        return db.or_(
+            Relatorio.numero.ilike(padrao),
+            Relatorio.titulo.ilike(padrao),
+            Relatorio.descricao.ilike(padrao),
+            Relatorio.conteudo.ilike(padrao),
+            Relatorio.observacoes_finais.ilike(padrao),
+            *por_nome
+        )
+
+    def filtro_express(self, termo):
+        """Condição para RelatorioExpress.query"""
+        from app import db
+        from models import RelatorioExpress
+
+        if self.usa_fts():
+            return self._vetor('relatorios_express').op('@@')(self._consulta(termo))
+        padrao = f'%{termo}%'
+        return db.or_(
+            RelatorioExpress.numero.ilike(padrao),
+            RelatorioExpress.titulo.ilike(padrao),
+            RelatorioExpress.obra_nome.ilike(padrao),
+            RelatorioExpress.obra_construtora.ilike(padrao),
+            RelatorioExpress.descricao.ilike(padrao),
+            RelatorioExpress.conteudo.ilike(padrao),
+            RelatorioExpress.observacoes_finais.ilike(padrao)
+        )
+
+    def relevancia(self, tabela, termo):
+        """Expressão da relevância (None sem FTS)"""
+        from app import db
+
+        if not self.usa_fts():
+            return None
+        return db.func.ts_rank_cd(self._vetor(tabela), self._consulta(termo), 32)
+
+    def ordem_relevancia(self, tabela, termo):
+        """ORDER BY da relevância (lista vazia sem FTS: fica a ordem de data)"""
+        relevancia = self.relevancia(tabela, termo)
+        return [relevancia.desc()] if relevancia is not None else []
+
+    def buscar(self, termo, tipo='todos', limite=20):
+        """
+        Busca ranqueada: lista de dicts (tipo, id, numero, titulo, obra, data,
+        relevancia, trecho), dos dois tipos de relatório juntos, mais relevantes primeiro.
+        """
+        from app import db
+        from models import Relatorio, RelatorioExpress, Projeto
+
+        termo = (termo or '').strip()
+        if not termo:
+            return []
+
+        fts = self.usa_fts()
+        resultados = []
+
+        def colunas_extra(tabela, texto):
+            if not fts:
+                return [db.literal(0.0), db.literal(None)]
+            consulta = self._consulta(termo)
+            return [db.func.ts_rank_cd(self._vetor(tabela), consulta, 32),
+                    db.func.ts_headline(CONFIG_TS, texto, consulta, OPCOES_TRECHO)]
+
+        if tipo in ('todos', 'relatorio'):
+            texto = db.func.concat_ws(' ', Relatorio.descricao, Relatorio.conteudo, Relatorio.observacoes_finais)
+            extra = colunas_extra('relatorios', texto)
+            query = db.session.query(
+                Relatorio.id, Relatorio.numero, Relatorio.titulo, Projeto.nome, Relatorio.created_at, *extra
+            ).outerjoin(Projeto, Projeto.id == Relatorio.projeto_id).filter(self.filtro_relatorios(termo))
+            query = query.order_by(extra[0].desc() if fts else Relatorio.created_at.desc()).limit(limite)
+            resultados += [('relatorio',) + tuple(linha) for linha in query]
+
+        if tipo in ('todos', 'express'):
+            texto = db.func.concat_ws(' ', RelatorioExpress.descricao, RelatorioExpress.conteudo,
+                                      RelatorioExpress.observacoes_finais)
+            extra = colunas_extra('relatorios_express', texto)
+            query = db.session.query(
+                RelatorioExpress.id, RelatorioExpress.numero, RelatorioExpress.titulo, RelatorioExpress.obra_nome,
+                RelatorioExpress.created_at, *extra
+            ).filter(self.filtro_express(termo))
+            query = query.order_by(extra[0].desc() if fts else RelatorioExpress.created_at.desc()).limit(limite)
+            resultados += [('express',) + tuple(linha) for linha in query]
+
+        # Cada tipo já vem ordenado e limitado; junta os dois pela relevância (ou data)
+        if fts:
+            resultados.sort(key=lambda r: r[6], reverse=True)
+        else:
+            resultados.sort(key=lambda r: r[5] or datetime.min, reverse=True)
+
+        return [{
+            'tipo': tipo_rel,
+            'id': rel_id,
+            'numero': numero,
+            'titulo': titulo,
+            'obra': obra,
+            'data': criado.isoformat() if criado else None,
+            'relevancia': round(float(relevancia or 0), 4),
+            'trecho': trecho,
+        } for tipo_rel, rel_id, numero, titulo, obra, criado, relevancia, trecho in resultados[:limite]]
+
+
+# Create singleton instance
+report_search = ReportSearch()
@@ -0,0 +1,84 @@
+"""
+Status de Relatórios - Valores Canônicos
+Cada status de Relatorio e RelatorioExpress tem uma única grafia gravada no
+banco. As consultas usam igualdade/IN com estes valores (índice em
+(status, created_at)) em vez de lower(status), ILIKE ou listas de variantes.
+
+Funcionamento:
+    - Os modelos normalizam o status em toda escrita (@validates): grafias
+      antigas ('Em Preenchimento', 'Aguardando Aprovacao', 'em_andamento',
+      'aprovado final'...) viram o valor canônico; valor desconhecido gera
+      ValueError.
+    - A migração add_report_status_canonical converte as linhas existentes
+      (valores desconhecidos viram o status de preenchimento) e, no
+      Postgres, adiciona CHECK constraints com os valores permitidos.
+    - Os rótulos continuam os mesmos exibidos pelos templates ('Aprovado',
+      'Aguardando Aprovação'...), então nada muda na interface.
+"""
+
+import unicodedata
+
+# Relatorio
+PREENCHIMENTO = 'preenchimento'
+RASCUNHO = 'Rascunho'
+EM_EDICAO = 'Em edição'
+AGUARDANDO_APROVACAO = 'Aguardando Aprovação'
+APROVADO = 'Aprovado'
+REJEITADO = 'Rejeitado'
+ENVIADO = 'Enviado'
+FINALIZADO = 'Finalizado'
+
+# RelatorioExpress (o preenchimento tem grafia própria nos templates do Express)
+EXPRESS_PREENCHIMENTO = 'Em preenchimento'
+
+STATUS_RELATORIO = (PREENCHIMENTO, RASCUNHO, EM_EDICAO, AGUARDANDO_APROVACAO, APROVADO, REJEITADO,
+                    ENVIADO, FINALIZADO)
+STATUS_EXPRESS = (EXPRESS_PREENCHIMENTO, AGUARDANDO_APROVACAO, APROVADO, REJEITADO)
+
+# Grupos usados nos filtros e contadores
+PENDENTES = (PREENCHIMENTO, RASCUNHO, AGUARDANDO_APROVACAO, REJEITADO)
+PENDENTES_DASHBOARD = (RASCUNHO, AGUARDANDO_APROVACAO)
+APROVADOS = (APROVADO, FINALIZADO)
+
+# Grafia normalizada (sem acento, minúscula, espaços simples) -> valor canônico
+_ALIASES_RELATORIO = {
+    'preenchimento': PREENCHIMENTO,
+    'em preenchimento': PREENCHIMENTO,
+    'em andamento': PREENCHIMENTO,
+    'rascunho': RASCUNHO,
+    'em edicao': EM_EDICAO,
+    'aguardando aprovacao': AGUARDANDO_APROVACAO,
+    'pendente': AGUARDANDO_APROVACAO,
+    'aprovado': APROVADO,
+    'aprovado final': APROVADO,
+    'rejeitado': REJEITADO,
+    'enviado': ENVIADO,
+    'finalizado': FINALIZADO,
+}
+
+_ALIASES_EXPRESS = {
+    'preenchimento': EXPRESS_PREENCHIMENTO,
+    'em preenchimento': EXPRESS_PREENCHIMENTO,
+    'em andamento': EXPRESS_PREENCHIMENTO,
+    'aguardando aprovacao': AGUARDANDO_APROVACAO,
+    'pendente': AGUARDANDO_APROVACAO,
+    'aprovado': APROVADO,
+    'aprovado final': APROVADO,
+    'finalizado': APROVADO,
+    'rejeitado': REJEITADO,
+}
+
+
+def _chave(valor):
+    sem_acento = unicodedata.normalize('NFKD', valor).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(sem_acento.replace('_', ' ').lower().split())
+
+
+def normalizar_status(valor, express=False):
+    """Valor canônico do status (None continua None); ValueError se não for um status conhecido"""
+    if valor is None:
+        return None
+    canonico = (_ALIASES_EXPRESS if express else _ALIASES_RELATORIO).get(_chave(valor))
+    if canonico is None:
+        raise ValueError(f"Status de relatório desconhecido: {valor!r}")
+    return canonico
@@ -11,7 +11,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import check_password_hash, generate_password_hash
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import HTTPException
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, contains_eager
 
 from app import app, db, csrf
 from models import (
@@ -23,6 +23,26 @@ from models import (
     VisitaParticipante, TipoObra, CategoriaObra, Notificacao, GoogleDriveToken,
     RelatorioExpress, FotoRelatorioExpress, Lembrete
 )
+from pdf_cache import cached_report_pdf_path, install_invalidation_listeners
+from recipient_index import install_invalidation_listeners as install_recipient_index_listeners
+from sync_tombstones import install_tombstone_listeners
+from report_search import report_search
+import report_status
+from dashboard_counters import dashboard_counters, install_counter_listeners
+from project_geo_index import project_geo_index, haversine_km, LIMITE_PADRAO as LIMITE_PADRAO_OBRAS, \
+    install_invalidation_listeners as install_project_geo_listeners
+from report_listing import PaginaCursor, paginar_keyset, report_list_cache, \
+    install_invalidation_listeners as install_report_list_listeners
+from pdf_jobs import pdf_render_queue, job_status_response, job_pending_response, job_result_response, \
+    ACAO_EMAIL_APROVACAO
+from autosave_versioning import parse_version, claim_autosave_version, conflict_response
+
+install_invalidation_listeners()
+install_recipient_index_listeners()
+install_tombstone_listeners()
+install_report_list_listeners()
+install_counter_listeners()
+install_project_geo_listeners()
 
 # ==========================================================================================
 # UTILITY HELPERS
@@ -92,8 +112,9 @@ def can_edit_report(user, relatorio):
     return True
 # ==========================================================================================
 
-# Health check endpoint for Railway deployment - LIGHTWEIGHT VERSION
-@app.route('/health')
+# Health check com consulta ao banco. app.py já registra /health (sempre 200, para
+# o health check do Railway); registrar de novo o mesmo endpoint faz o Flask
+# recusar a importação deste módulo, então esta versão só vale se lá não houver
 def health_check():
     """Health check robusto - versão definitiva"""
     try:
@@ -120,6 +141,9 @@ def health_check():
             'version': '1.0.1'
         }), 500
 
+if 'health_check' not in app.view_functions:
+    app.add_url_rule('/health', 'health_check', health_check)
+
 @app.route('/debug/images-data')
 def debug_images_data():
     """Debug para verificar dados das imagens - PÚBLICO PARA TESTE"""
@@ -133,8 +157,8 @@ def debug_images_data():
         debug_data = {
             'database_url': db_url,
             'total_fotos': FotoRelatorio.query.count(),
-            'fotos_com_imagem': FotoRelatorio.query.filter(FotoRelatorio.imagem.isnot(None)).count(),
-            'fotos_sem_imagem': FotoRelatorio.query.filter(FotoRelatorio.imagem.is_(None)).count(),
+            'fotos_com_imagem': FotoRelatorio.query.filter(FotoRelatorio.imagem_hash.isnot(None)).count(),
+            'fotos_sem_imagem': FotoRelatorio.query.filter(FotoRelatorio.imagem_hash.is_(None)).count(),
             'fotos_recentes': []
         }
         
@@ -144,8 +168,8 @@ def debug_images_data():
                 'relatorio_id': foto.relatorio_id,
                 'filename': foto.filename,
                 'legenda': foto.legenda,
-                'imagem_presente': foto.imagem is not None,
-                'imagem_size': len(foto.imagem) if foto.imagem else 0,
+                'imagem_presente': foto.imagem_hash is not None,
+                'imagem_size': foto.imagem_size or 0,
                 'created_at': foto.created_at.isoformat() if foto.created_at else None
             })
         
@@ -1189,25 +1213,15 @@ def fechar_lembrete(lembrete_id):
 def api_dashboard_stats():
     """API para fornecer estatísticas reais do dashboard"""
     try:
-        # Buscar dados reais do PostgreSQL
-        projetos_ativos = Projeto.query.filter_by(status='Ativo').count()
-        visitas_agendadas = Visita.query.filter_by(status='Agendada').count()
-        relatorios_pendentes = Relatorio.query.filter(
-            Relatorio.status.in_(['Rascunho', 'Aguardando Aprovação'])
-        ).count()
-
-        # Reembolsos com verificação de tabela
-        try:
-            usuarios_ativos = User.query.filter_by(ativo=True).count()
-        except:
-            usuarios_ativos = 0
+        # Contadores materializados (dashboard_counters.py): uma consulta, sem COUNT(*)
+        contadores = dashboard_counters.valores()
 
         response_data = {
             'success': True,
-            'projetos_ativos': projetos_ativos,
-            'visitas_agendadas': visitas_agendadas,
-            'relatorios_pendentes': relatorios_pendentes,
-            'usuarios_ativos': usuarios_ativos,
+            'projetos_ativos': contadores['projetos_ativos'],
+            'visitas_agendadas': contadores['visitas_agendadas'],
+            'relatorios_pendentes': contadores['relatorios_pendentes'],
+            'usuarios_ativos': contadores['usuarios_ativos'],
             'timestamp': datetime.utcnow().isoformat(),
             'user_id': current_user.id,
             'source': 'postgresql'
@@ -1398,165 +1412,254 @@ def reverse_geocoding():
             'error': 'Erro interno do servidor'
         }), 500
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using Haversine formula"""
-    import math
-    
-    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
-    
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-    a = math.sin(dlat/2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon/2)**2
-    c = 2 * math.asin(math.sqrt(a))
-    
-    r = 6371
-    
-    return r * c
+def _coordenadas_validas(lat, lon):
+    return lat is not None and lon is not None and -90 <= lat <= 90 and -180 <= lon <= 180
 
 @app.route('/api/nearby-projects')
+@login_required
 def get_nearby_projects():
-    """Get ALL projects ordered by distance from user location"""
-    try:
-        lat = request.args.get('lat', type=float)
-        lon = request.args.get('lon', type=float)
-        
-        projects = Projeto.query.all()
-        
-        all_projects = []
-        projects_with_distance = []
-        projects_without_distance = []
-        
-        for project in projects:
-            project_data = {
-                'id': project.id,
-                'nome': project.nome,
-                'endereco': project.endereco or 'Endereço não informado',
-                'status': project.status,
-                'tipo_obra': project.tipo_obra,
-                'latitude': project.latitude,
-                'longitude': project.longitude,
-                'numeracao_inicial': project.numeracao_inicial
-            }
-            
-            if lat and lon and project.latitude and project.longitude:
-                distance = calculate_distance(lat, lon, project.latitude, project.longitude)
-                project_data['distance'] = round(distance, 2)
-                projects_with_distance.append(project_data)
+    """
+    Obras mais próximas da localização do usuário (índice espacial, ver project_geo_index.py).
+
+    Parâmetros: lat, lon, radius_km (ou radius; opcional, em km) e limit (padrão 50, máximo 500).
+    """
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    raio_km = request.args.get('radius_km', type=float)
+    if raio_km is None:
+        raio_km = request.args.get('radius', type=float)
+    limite = request.args.get('limit', LIMITE_PADRAO_OBRAS, type=int)
+
+    if not _coordenadas_validas(lat, lon):
+        return jsonify({'success': False, 'error': 'Parâmetros lat e lon válidos são obrigatórios'}), 400
+    if raio_km is not None and raio_km <= 0:
+        return jsonify({'success': False, 'error': 'radius_km deve ser positivo'}), 400
+
+    try:
+        projetos = project_geo_index.proximos(lat, lon, raio_km=raio_km, limite=limite)
+        for projeto in projetos:
+            projeto['endereco'] = projeto['endereco'] or 'Endereço não informado'
+            projeto['distance'] = round(projeto.pop('distancia_km'), 2)
+        return jsonify({'success': True, 'projects': projetos, 'total': len(projetos)})
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao buscar obras próximas: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/projects/nearby', methods=['POST'])
+@login_required
+def api_nearby_projects():
+    """Obras num raio de 10 km para o botão "Obras próximas" (static/js/main.js)"""
+    data = request.get_json(silent=True) or {}
+    try:
+        lat, lon = float(data.get('latitude')), float(data.get('longitude'))
+    except (TypeError, ValueError):
+        lat = lon = None
+    if not _coordenadas_validas(lat, lon):
+        return jsonify({'success': False, 'error': 'Coordenadas inválidas'}), 400
+
+    try:
+        projetos = project_geo_index.proximos(lat, lon, raio_km=10, limite=LIMITE_PADRAO_OBRAS)
+        return jsonify({'success': True, 'nearby': [{
+            'id': projeto['id'],
+            'nome': projeto['nome'],
+            'numero': projeto['numero'],
+            'endereco': projeto['endereco'] or 'Endereço não informado',
+            'distancia': round(projeto['distancia_km'], 2),
+        } for projeto in projetos]})
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao buscar obras próximas: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/relatorios/busca')
+@login_required
+def buscar_relatorios():
+    """
+    Busca ranqueada em relatórios comuns e Express (full-text em português).
+
+    Parâmetros: q (obrigatório), tipo = todos | relatorio | express,
+    limite (padrão 20, máx. 100).
+    """
+    termo = request.args.get('q', '').strip()
+    tipo = request.args.get('tipo', 'todos')
+    limite = min(max(request.args.get('limite', 20, type=int), 1), 100)
+    if not termo:
+        return jsonify({'success': False, 'error': 'Informe o termo de busca (q)'}), 400
+    if tipo not in ('todos', 'relatorio', 'express'):
+        return jsonify({'success': False, 'error': 'tipo deve ser todos, relatorio ou express'}), 400
+
+    try:
+        resultados = report_search.buscar(termo, tipo=tipo, limite=limite)
+        for item in resultados:
+            if item['tipo'] == 'express':
+                item['url'] = url_for('view_express_report', report_id=item['id'])
             else:
-                project_data['distance'] = 'N/A'
-                projects_without_distance.append(project_data)
-        
-        projects_with_distance.sort(key=lambda x: x['distance'])
-        
-        projects_without_distance.sort(key=lambda x: x['nome'])
-        
-        all_projects = projects_with_distance + projects_without_distance
-        
-        return jsonify({'success': True, 'projects': all_projects, 'total': len(all_projects)})
-        
+                item['url'] = url_for('view_report', report_id=item['id'])
+        return jsonify({'success': True, 'resultados': resultados, 'total': len(resultados)})
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
+        current_app.logger.exception(f"❌ Erro na busca de relatórios: {e}")
+        return jsonify({'success': False, 'error': 'Erro ao buscar relatórios'}), 500
+
+def _notificacoes_do_sino(user_id):
+    """
+    Notificações que o sino mostra (48h ou não lidas), sem as pendências de
+    aprovação já processadas. Base da listagem e do contador do stream.
+    """
+    limite_48h = datetime.utcnow() - timedelta(hours=48)
+
+    # Pendências de aprovação cujo relatório já foi processado não aparecem
+    pendencia_processada = db.or_(
+        db.and_(Notificacao.tipo == 'relatorio_pendente',
+                Relatorio.id.isnot(None),
+                Relatorio.status != 'Aguardando Aprovação'),
+        db.and_(Notificacao.tipo == 'relatorio_express_pendente',
+                RelatorioExpress.id.isnot(None),
+                RelatorioExpress.status != 'Aguardando Aprovação'),
+    )
+
+    return db.session.query(Notificacao) \
+        .outerjoin(Relatorio, Relatorio.id == Notificacao.relatorio_id) \
+        .outerjoin(RelatorioExpress, RelatorioExpress.id == Notificacao.relatorio_express_id) \
+        .filter(
+            Notificacao.user_id == user_id,
+            db.or_(
+                Notificacao.created_at >= limite_48h,
+                Notificacao.nao_lida()
+            ),
+            db.not_(pendencia_processada)
+        )
 
 @app.route('/api/notificacoes')
 @login_required
 def listar_notificacoes():
-    """Listar notificações do usuário autenticado (48h ou não lidas)"""
+    """
+    Listar notificações do usuário autenticado (48h ou não lidas).
+
+    Paginação por cursor: ?limite=N (padrão 50, máx. 100) e ?cursor= com o
+    'proximo_cursor' da página anterior. 'nao_lidas' vem só na primeira página.
+    """
     try:
         from notification_service import notification_service
-        
-        try:
-            agora = datetime.utcnow()
-            limite_48h = agora - timedelta(hours=48)
-            
-            notificacoes = Notificacao.query.filter(
-                Notificacao.user_id == current_user.id,
-                db.or_(
-                    Notificacao.created_at >= limite_48h,
-                    Notificacao.status == 'nova'
-                )
-            ).order_by(Notificacao.created_at.desc()).all()
-        except Exception as db_error:
-            current_app.logger.error(f"❌ Erro SQL ao buscar notificações: {db_error}")
-            current_app.logger.error(f"❌ Stack trace: {traceback.format_exc()}")
-            
-            if 'UndefinedColumn' in str(type(db_error).__name__):
-                current_app.logger.error(f"❌ Coluna indefinida detectada. Verificar schema do banco de dados.")
-                return jsonify({
-                    'success': False, 
-                    'error': 'Erro de schema no banco de dados. Por favor, contate o administrador.',
-                    'details': str(db_error)
-                }), 500
-            raise
-        
-        
-        notificacoes_json = []
-        nao_lidas = 0
-        
-        for notif in notificacoes:
-            # Filtrar notificações de relatórios pendentes que já foram processados
-            if notif.tipo in ['relatorio_pendente', 'relatorio_express_pendente']:
-                deve_ocultar = False
-                
-                try:
-                    # Extrair ID do relatório do link
-                    if notif.link_destino:
-                        import re
-                        
-                        if notif.tipo == 'relatorio_pendente':
-                            # Formato: /reports/{id}/review
-                            match = re.search(r'/reports/(\d+)', notif.link_destino)
-                            if match:
-                                relatorio_id = int(match.group(1))
-                                relatorio = Relatorio.query.get(relatorio_id)
-                                
-                                if relatorio and relatorio.status != 'Aguardando Aprovação':
-                                    deve_ocultar = True
-                        
-                        elif notif.tipo == 'relatorio_express_pendente':
-                            # Formato: /relatorio-express/{id}
-                            match = re.search(r'/relatorio-express/(\d+)', notif.link_destino)
-                            if match:
-                                relatorio_id = int(match.group(1))
-                                relatorio_express = RelatorioExpress.query.get(relatorio_id)
-                                
-                                if relatorio_express and relatorio_express.status != 'Aguardando Aprovação':
-                                    deve_ocultar = True
-                
-                except Exception as filter_error:
-                    # Se houver erro ao filtrar, manter a notificação (fail-safe)
-                    current_app.logger.warning(f"⚠️ Erro ao filtrar notificação {notif.id}: {filter_error}")
-                    deve_ocultar = False
-                
-                if deve_ocultar:
-                    continue  # Pular esta notificação
-            
-            if notif.status == 'nova':
-                nao_lidas += 1
-            
-            notificacoes_json.append({
-                'id': notif.id,
-                'titulo': notif.titulo,
-                'mensagem': notif.mensagem,
-                'tipo': notif.tipo,
-                'icone': notification_service.get_icone_tipo(notif.tipo),
-                'status': notif.status,
-                'link_destino': notif.link_destino,
-                'created_at': notif.created_at.isoformat() if notif.created_at else None,
-                'lida_em': notif.lida_em.isoformat() if notif.lida_em else None
-            })
-        
-        return jsonify({
+
+        limite = min(max(request.args.get('limite', 50, type=int), 1), 100)
+        cursor = request.args.get('cursor')
+        query = _notificacoes_do_sino(current_user.id)
+
+        if cursor:
+            try:
+                cursor_data, cursor_id = cursor.rsplit('_', 1)
+                cursor_data, cursor_id = datetime.fromisoformat(cursor_data), int(cursor_id)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Cursor inválido'}), 400
+            query = query.filter(db.or_(
+                Notificacao.created_at < cursor_data,
+                db.and_(Notificacao.created_at == cursor_data, Notificacao.id < cursor_id)
+            ))
+            linhas = [(notif, None) for notif in query.order_by(
+                Notificacao.created_at.desc(), Notificacao.id.desc()).limit(limite + 1)]
+        else:
+            # Total de não lidas na mesma consulta (calculado antes do LIMIT)
+            nao_lidas_total = db.func.sum(
+                db.case((Notificacao.nao_lida(), 1), else_=0)
+            ).over()
+            linhas = query.add_columns(nao_lidas_total).order_by(
+                Notificacao.created_at.desc(), Notificacao.id.desc()).limit(limite + 1).all()
+
+        tem_mais = len(linhas) > limite
+        linhas = linhas[:limite]
+        notificacoes_json = [notification_service.serializar_notificacao(notif) for notif, _ in linhas]
+
+        resposta = {
             'success': True,
             'notificacoes': notificacoes_json,
             'total': len(notificacoes_json),
-            'nao_lidas': nao_lidas
-        })
-    
+            'proximo_cursor': None
+        }
+        if tem_mais:
+            ultima = linhas[-1][0]
+            resposta['proximo_cursor'] = f"{ultima.created_at.isoformat()}_{ultima.id}"
+        if not cursor:
+            resposta['nao_lidas'] = int(linhas[0][1] or 0) if linhas else 0
+
+        return jsonify(resposta)
+
     except Exception as e:
         current_app.logger.error(f"❌ Erro ao listar notificações: {e}")
         current_app.logger.error(f"❌ Stack trace completo: {traceback.format_exc()}")
         return jsonify({'success': False, 'error': 'Erro ao carregar notificações. Tente novamente.'}), 500
 
+@app.route('/api/notificacoes/stream')
+@login_required
+def stream_notificacoes():
+    """
+    Server-Sent Events com notificações novas ('nova') e leituras ('lida').
+    Ao reconectar, reenvia as notificações com id maior que o Last-Event-ID
+    (ou ?ultimo_id= na primeira conexão) e o contador de não lidas.
+    """
+    import queue
+    from time import monotonic
+    from notification_service import notification_service
+    from notification_stream import notification_broker, formatar_evento
+
+    user_id = current_user.id
+    ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id', '')
+
+    # Inscrever antes de consultar: nada publicado entre a consulta e o stream se perde
+    fila = notification_broker.subscribe(user_id)
+    if fila is None:
+        # Limite de streams do worker: o EventSource fecha com 503 e o cliente volta ao polling
+        return Response('Limite de streams atingido; use /api/notificacoes', status=503,
+                        mimetype='text/plain', headers={'Retry-After': '60'})
+    pendentes = []
+    try:
+        if ultimo_id.isdigit():
+            ultimo_id = int(ultimo_id)
+            novas = Notificacao.query.filter(
+                Notificacao.user_id == user_id,
+                Notificacao.id > ultimo_id
+            ).order_by(Notificacao.id).limit(50).all()
+            pendentes = [formatar_evento('nova', notification_service.serializar_notificacao(n), n.id) for n in novas]
+            # Mesmo contador da listagem (/api/notificacoes)
+            nao_lidas = _notificacoes_do_sino(user_id).filter(Notificacao.nao_lida()).count()
+            pendentes.append(formatar_evento('contador', {'nao_lidas': nao_lidas}))
+            ultimo_id = max([ultimo_id] + [n.id for n in novas])
+        else:
+            ultimo_id = 0
+    except Exception:
+        notification_broker.unsubscribe(user_id, fila)
+        raise
+    finally:
+        # O stream não segura conexão do pool enquanto espera eventos
+        db.session.remove()
+
+    heartbeat = int(os.environ.get('NOTIFICATION_STREAM_HEARTBEAT', '25'))
+    duracao_maxima = int(os.environ.get('NOTIFICATION_STREAM_MAX_SECONDS', '300'))
+
+    def gerar():
+        enviado_ate = ultimo_id
+        try:
+            yield "retry: 5000\n\n"
+            yield from pendentes
+            fim = monotonic() + duracao_maxima
+            while monotonic() < fim:
+                try:
+                    evento, dados, event_id = fila.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if evento == 'nova' and event_id is not None:
+                    if event_id <= enviado_ate:
+                        continue  # já reenviada na reconexão
+                    enviado_ate = event_id
+                yield formatar_evento(evento, dados, event_id)
+        finally:
+            notification_broker.unsubscribe(user_id, fila)
+
+    # Encerrado depois de duracao_maxima; o navegador reconecta com Last-Event-ID
+    return Response(gerar(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
 @app.route('/api/notificacoes/marcar-lida', methods=['POST'])
 @login_required
 def marcar_notificacao_lida():
@@ -2605,7 +2708,7 @@ def api_upload_photo():
         foto.imagem_size = file_size
         
         # LOG: Verificar atribuição
-        current_app.logger.info(f"💾 APÓS ATRIBUIÇÃO: foto.imagem type={type(foto.imagem).__name__}, size={len(foto.imagem) if foto.imagem else 0}")
+        current_app.logger.info(f"💾 APÓS ATRIBUIÇÃO: foto.imagem_hash={foto.imagem_hash[:12]}, size={foto.imagem_size}")
         
         # Adicionar ao session
         db.session.add(foto)
@@ -2613,7 +2716,7 @@ def api_upload_photo():
         # FLUSH para obter ID
         try:
             db.session.flush()
-            current_app.logger.info(f"🔄 FLUSH OK: foto.id={foto.id}, imagem_presente={foto.imagem is not None}")
+            current_app.logger.info(f"🔄 FLUSH OK: foto.id={foto.id}, imagem_hash={foto.imagem_hash[:12]}")
         except Exception as flush_error:
             current_app.logger.error(f"❌ ERRO NO FLUSH: {flush_error}")
             db.session.rollback()
@@ -2645,47 +2748,27 @@ def api_upload_photo():
                 'error': 'Foto não foi salva no banco de dados'
             }), 500
         
-        # Verificar dados binários no PostgreSQL
-        if foto_verificada.imagem:
-            if isinstance(foto_verificada.imagem, (bytes, bytearray)):
-                imagem_size_db = len(foto_verificada.imagem)
-            elif isinstance(foto_verificada.imagem, memoryview):
-                imagem_size_db = len(bytes(foto_verificada.imagem))
-            else:
-                imagem_size_db = 0
+        # Verificar bytes no photo_store (sem carregar o conteúdo)
+        from photo_store import get_photo_store
+        store = get_photo_store()
+        if foto_verificada.imagem_hash and store.exists(foto_verificada.imagem_hash):
+            imagem_size_db = store.size(foto_verificada.imagem_hash)
         else:
             imagem_size_db = 0
         
-        current_app.logger.info(f"✅ VERIFICAÇÃO POSTGRESQL: foto.id={foto.id}, imagem_size_db={imagem_size_db}, imagem_size_original={file_size}")
+        current_app.logger.info(f"✅ VERIFICAÇÃO PHOTO STORE: foto.id={foto.id}, imagem_size_store={imagem_size_db}, imagem_size_original={file_size}")
         
         # VALIDAÇÃO FINAL
         if imagem_size_db == 0:
-            current_app.logger.error(f"❌ FALHA: Imagem NÃO foi salva no PostgreSQL! foto.id={foto.id}")
+            current_app.logger.error(f"❌ FALHA: Imagem NÃO foi salva no photo store! foto.id={foto.id}")
             db.session.rollback()
             return jsonify({
                 'success': False,
-                'error': 'FALHA: Imagem não foi gravada no banco PostgreSQL'
+                'error': 'FALHA: Imagem não foi gravada no armazenamento de fotos'
             }), 500
         
         if imagem_size_db != file_size:
-            current_app.logger.warning(f"⚠️ ATENÇÃO: Tamanho difere! Enviado={file_size}, PostgreSQL={imagem_size_db}")
-        
-        # DIAGNÓSTICO FINAL: Query SQL direta no PostgreSQL
-        try:
-            from sqlalchemy import text
-            sql_check = text("SELECT id, LENGTH(imagem) as img_size FROM fotos_relatorio WHERE id = :foto_id")
-            resultado = db.session.execute(sql_check, {'foto_id': foto.id}).fetchone()
-            
-            if resultado:
-                sql_img_size = resultado.img_size if resultado.img_size else 0
-                current_app.logger.info(f"🔍 SQL DIRETO: foto.id={foto.id}, LENGTH(imagem)={sql_img_size}")
-                
-                if sql_img_size == 0:
-                    current_app.logger.error(f"❌ POSTGRESQL VAZIO! foto.id={foto.id} tem imagem NULL ou vazia")
-            else:
-                current_app.logger.error(f"❌ SQL DIRETO: foto.id={foto.id} não encontrada!")
-        except Exception as sql_error:
-            current_app.logger.error(f"❌ ERRO SQL DIRETO: {sql_error}")
+            current_app.logger.warning(f"⚠️ ATENÇÃO: Tamanho difere! Enviado={file_size}, Store={imagem_size_db}")
         
         return jsonify({
             'success': True,
@@ -2714,55 +2797,41 @@ def api_upload_photo():
 @login_required
 def api_get_photo(foto_id):
     """
-    API para recuperar imagem do banco de dados PostgreSQL
-    Serve a imagem diretamente do campo BYTEA com Content-Type correto
+    API para recuperar imagem do photo store
+    Serve os bytes direto do armazenamento endereçado por imagem_hash, sem passar pelo heap
+    
+    Query params:
+    - size: thumb | preview | pdf (opcional) - serve variante redimensionada em cache
+    
+    Responde 304 (If-None-Match) e 206 (Range) usando ETag forte do imagem_hash
     """
     try:
+        # Consulta só de metadados - o 304 não precisa do blob
         foto = FotoRelatorio.query.get_or_404(foto_id)
         
-        # Verificar se tem dados binários
-        if not foto.imagem:
-            current_app.logger.warning(f"⚠️ Foto {foto_id} sem dados binários no campo imagem")
-            
-            # Retornar imagem placeholder
-            from flask import send_file
-            import io
-            placeholder = generate_placeholder_image(foto.filename)
-            return send_file(
-                io.BytesIO(placeholder),
-                mimetype='image/png',
-                as_attachment=False
-            )
-        
         # Usar content_type do banco de dados (prioridade)
         mimetype = foto.content_type or 'image/jpeg'
         
         # Fallback: se content_type não estiver no DB, detectar pelo filename
         if not foto.content_type and foto.filename:
-            if foto.filename.lower().endswith('.png'):
-                mimetype = 'image/png'
-            elif foto.filename.lower().endswith('.gif'):
-                mimetype = 'image/gif'
-            elif foto.filename.lower().endswith('.webp'):
-                mimetype = 'image/webp'
-            else:
-                mimetype = 'image/jpeg'
-        
-        current_app.logger.info(f"📤 Servindo foto {foto_id}: size={len(foto.imagem)} bytes, type={mimetype}")
+            mimetype = get_content_type(foto.filename)
         
-        # CRÍTICO: Garantir que foto.imagem seja bytes
-        image_data = foto.imagem
-        if isinstance(image_data, memoryview):
-            image_data = bytes(image_data)
+        response = serve_foto_from_store(foto, mimetype, filename=foto.filename)
+        if response is not None:
+            current_app.logger.info(f"📤 Servindo foto {foto_id}: status={response.status_code}, type={mimetype}")
+            return response
         
-        # Retornar a imagem com cabeçalhos corretos
-        response = make_response(image_data)
-        response.headers['Content-Type'] = mimetype
-        response.headers['Content-Disposition'] = f'inline; filename="{foto.filename}"'
-        response.headers['Cache-Control'] = 'public, max-age=31536000'
-        response.headers['Content-Length'] = str(len(image_data))
+        current_app.logger.warning(f"⚠️ Foto {foto_id} sem dados binários no photo store")
         
-        return response
+        # Retornar imagem placeholder
+        from flask import send_file
+        import io
+        placeholder = generate_placeholder_image(foto.filename)
+        return send_file(
+            io.BytesIO(placeholder),
+            mimetype='image/png',
+            as_attachment=False
+        )
         
     except Exception as e:
         current_app.logger.error(f"❌ Erro ao servir foto {foto_id}: {str(e)}")
@@ -2779,39 +2848,79 @@ def api_get_photo(foto_id):
             as_attachment=False
         )
 
+def serve_foto_from_store(foto, mimetype, filename=None):
+    """
+    Serve FotoRelatorio/FotoRelatorioExpress do photo store com ETag, 304 e Range.
+    O 304 é decidido só com metadados (imagem_hash), sem tocar no blob; no S3 o
+    resto da resposta custa um único HEAD.
+    Aceita ?size=thumb|preview|pdf para servir a variante redimensionada.
+    Retorna None se a foto não tem bytes - quem chama decide o fallback.
+    """
+    from photo_store import photo_etag, not_modified_response, stream_photo_response, send_file_conditional
+    from photo_derivatives import photo_derivative_service, DERIVATIVE_SIZES
+
+    if not foto.imagem_hash:
+        return _serve_foto_legada(foto, mimetype, filename)
+
+    size = request.args.get('size')
+    variant = size if size in DERIVATIVE_SIZES else None
+
+    not_modified = not_modified_response(photo_etag(foto.imagem_hash, variant))
+    if not_modified is not None:
+        return not_modified
+
+    if variant:
+        path = photo_derivative_service.get_path(foto.imagem_hash, variant)
+        if path:
+            return send_file_conditional(path, 'image/jpeg', photo_etag(foto.imagem_hash, variant))
+
+    return stream_photo_response(foto.imagem_hash, mimetype, filename=filename)
+
+def _serve_foto_legada(foto, mimetype, filename=None):
+    """
+    Linha ainda não migrada para o photo store: serve os bytes da coluna
+    legada sem gravar nada. A migração é feita por migrate_photos_to_blob_store.py,
+    nunca por um GET.
+    """
+    from werkzeug.exceptions import RequestedRangeNotSatisfiable
+    from photo_store import compute_hash, PHOTO_CACHE_CONTROL
+
+    legado = db.session.query(type(foto).imagem_legado).filter(type(foto).id == foto.id).scalar()
+    if not legado:
+        return None
+    legado = bytes(legado)
+    current_app.logger.warning(f"⚠️ {type(foto).__name__} {foto.id} ainda fora do photo store - "
+                               f"execute migrate_photos_to_blob_store.py")
+
+    response = Response(legado, mimetype=mimetype)
+    response.set_etag(compute_hash(legado))
+    response.headers['Cache-Control'] = PHOTO_CACHE_CONTROL
+    try:
+        response.make_conditional(request, accept_ranges=True, complete_length=len(legado))
+    except RequestedRangeNotSatisfiable as e:
+        return e.get_response()
+    if filename and response.status_code != 304:
+        response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+    return response
+
 # ==================== END NEW UNIFIED IMAGE UPLOAD API ====================
 
 # Main routes
-@app.route('/')
 def index():
     # Se não estiver logado, redirecionar para login
     if not current_user.is_authenticated:
         return redirect(url_for('login'))
 
     try:
-        # BUSCAR DADOS REAIS DO POSTGRESQL COM FALLBACK
-        projetos_ativos = Projeto.query.filter_by(status='Ativo').count()
-        visitas_agendadas = Visita.query.filter_by(status='Agendada').count()
-        relatorios_pendentes = Relatorio.query.filter(
-            Relatorio.status.in_(['Rascunho', 'Aguardando Aprovação'])
-        ).count()
-
-        # Usuários ativos
-        try:
-            usuarios_ativos = User.query.filter_by(ativo=True).count()
-        except:
-            usuarios_ativos = 0
-
+        # Contadores materializados (dashboard_counters.py): uma consulta, sem COUNT(*)
+        contadores = dashboard_counters.valores()
         stats = {
-            'projetos_ativos': projetos_ativos,
-            'visitas_agendadas': visitas_agendadas,
-            'relatorios_pendentes': relatorios_pendentes,
-            'usuarios_ativos': usuarios_ativos
+            'projetos_ativos': contadores['projetos_ativos'],
+            'visitas_agendadas': contadores['visitas_agendadas'],
+            'relatorios_pendentes': contadores['relatorios_pendentes'],
+            'usuarios_ativos': contadores['usuarios_ativos']
         }
 
-        # Log para monitoramento
-        print(f"REAL STATS FROM DB: P={projetos_ativos}, V={visitas_agendadas}, R={relatorios_pendentes}, U={usuarios_ativos}")
-
         # Get recent reports com fallback
         # Relatórios recentes
         query = Relatorio.query
@@ -2824,11 +2933,11 @@ def index():
         query = query.filter(
             db.or_(
                 # 1. Não é "Aguardando Aprovação" -> Visível para todos
-                ~Relatorio.status.ilike('%Aguardando Aprovação%'),
+                Relatorio.status != report_status.AGUARDANDO_APROVACAO,
                 
                 # 2. É "Aguardando Aprovação" -> Só visível se eu for o aprovador
                 db.and_(
-                    Relatorio.status.ilike('%Aguardando Aprovação%'),
+                    Relatorio.status == report_status.AGUARDANDO_APROVACAO,
                     Relatorio.aprovador_id == current_user.id
                 )
             )
@@ -2851,6 +2960,13 @@ def index():
                          stats=stats,
                          relatorios_recentes=relatorios_recentes)
 
+# app.py registra '/' (endpoint 'index') como a raiz JSON da API; com as rotas web
+# carregadas, '/' e url_for('index') são o dashboard
+if 'index' in app.view_functions:
+    app.view_functions['index'] = index
+else:
+    app.add_url_rule('/', 'index', index)
+
 # User management routes
 @app.route('/users')
 @login_required
@@ -2910,8 +3026,6 @@ def user_edit(user_id):
 @app.route('/projects')
 @login_required
 def projects_list():
-    from geopy.distance import geodesic
-    
     # Try to get user location from session or request
     user_lat = request.args.get('lat', type=float)
     user_lon = request.args.get('lon', type=float)
@@ -2957,10 +3071,7 @@ def projects_list():
     for project in projects:
         # Calculate distance if user location and project coordinates are available
         if user_lat and user_lon and project.latitude and project.longitude:
-            distance = geodesic(
-                (user_lat, user_lon),
-                (float(project.latitude), float(project.longitude))
-            ).km
+            distance = haversine_km(user_lat, user_lon, float(project.latitude), float(project.longitude))
         else:
             # Projects without coordinates go to the end
             distance = float('inf')
@@ -2986,46 +3097,31 @@ def projects_list():
 def reports():
     """Listar relatórios de obra - versão corrigida com paginação e filtros avançados"""
     try:
-        # Obter parâmetros de busca e paginação
-        page = request.args.get('page', 1, type=int)
+        # Obter parâmetros de busca e paginação (cursor: ver report_listing.py)
+        cursor = request.args.get('cursor') or None
+        anterior = request.args.get('dir') == 'prev'
         search_query = request.args.get('q', '')
         status_filter = request.args.get('status', '')
         projeto_filter = request.args.get('projeto_id', '', type=str)
         autor_filter = request.args.get('autor_id', '', type=str)
         per_page = 20  # Relatórios por página
 
-        # Query básica com joins
+        # Query básica com joins (autor e obra já vêm carregados para os cards)
         query = db.session.query(Relatorio).join(
             User, Relatorio.autor_id == User.id
         ).outerjoin(
             Projeto, Relatorio.projeto_id == Projeto.id
-        )
+        ).options(contains_eager(Relatorio.autor), contains_eager(Relatorio.projeto))
 
-        # Aplicar filtro de status se fornecido
+        # Aplicar filtro de status se fornecido (valores canônicos: report_status.py)
         if status_filter:
-            from sqlalchemy import or_, func
             if status_filter == 'pendentes':
-                query = query.filter(or_(
-                    Relatorio.status == 'Aguardando Aprovação',
-                    Relatorio.status == 'Em Preenchimento',
-                    func.lower(Relatorio.status) == 'preenchimento',
-                    Relatorio.status == 'Rejeitado',
-                    Relatorio.status == 'Rascunho'
-                ))
-            elif status_filter == 'preenchimento':
-                query = query.filter(or_(
-                    Relatorio.status == 'preenchimento',
-                    Relatorio.status == 'Em Preenchimento',
-                    Relatorio.status == 'Em preenchimento',
-                    func.lower(Relatorio.status) == 'preenchimento'
-                ))
-            elif status_filter == 'Aguardando Aprovação':
-                query = query.filter(or_(
-                    Relatorio.status == 'Aguardando Aprovação',
-                    Relatorio.status == 'Aguardando Aprovacao'
-                ))
+                query = query.filter(Relatorio.status.in_(report_status.PENDENTES))
             else:
-                query = query.filter(Relatorio.status == status_filter)
+                try:
+                    query = query.filter(Relatorio.status == report_status.normalizar_status(status_filter))
+                except ValueError:
+                    query = query.filter(db.false())
 
         # Aplicar filtro de projeto se fornecido
         if projeto_filter:
@@ -3043,32 +3139,31 @@ def reports():
             except (ValueError, TypeError):
                 pass
 
-        # Aplicar filtro de busca se fornecido
+        # Aplicar filtro de busca se fornecido (full-text, ver report_search.py)
+        ordem = [(Relatorio.created_at, datetime.fromisoformat), (Relatorio.id, int)]
         if search_query and search_query.strip():
-            from sqlalchemy import or_
-            search_term = f"%{search_query.strip()}%"
-            query = query.filter(or_(
-                Relatorio.numero.ilike(search_term),
-                Relatorio.titulo.ilike(search_term),
-                Projeto.nome.ilike(search_term),
-                User.nome_completo.ilike(search_term)
-            ))
-
-        # Ordenar por data de criação (mais recente primeiro)
-        query = query.order_by(Relatorio.created_at.desc())
-
-        # Aplicar paginação
-        relatorios = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
+            termo = search_query.strip()
+            query = query.filter(report_search.filtro_relatorios(termo))
+            relevancia = report_search.relevancia('relatorios', termo)
+            if relevancia is not None:
+                # ts_rank_cd é float4: o valor devolvido ao cursor (float8 no Python) nunca seria
+                # igual ao da coluna e "Próxima" repetiria a página; float8 compara exatamente
+                ordem.insert(0, (db.cast(relevancia, db.Float(53)), float))
+
+        # Mais relevantes primeiro quando há busca; depois por data de criação (mais recente primeiro)
+        try:
+            relatorios = paginar_keyset(query, ordem, cursor, anterior, per_page)
+        except ValueError:
+            # Cursor inválido (link antigo/editado): volta para a primeira página
+            relatorios = paginar_keyset(query, ordem, None, False, per_page)
+        relatorios.total = report_list_cache.total(
+            (status_filter, projeto_filter, autor_filter, search_query.strip()), query
         )
 
-        # Buscar listas para os selects de filtros
-        projetos_list = Projeto.query.order_by(Projeto.nome).all()
-        autores_list = User.query.filter_by(ativo=True).order_by(User.nome_completo).all()
+        # Listas para os selects de filtros (cache invalidado em escritas de Projeto/User)
+        projetos_list, autores_list = report_list_cache.opcoes_filtro()
 
-        current_app.logger.info(f"✅ Relatórios carregados: {relatorios.total} total, página {page}, filtro={status_filter}, projeto={projeto_filter}, autor={autor_filter}")
+        current_app.logger.info(f"✅ Relatórios carregados: {relatorios.total} total, cursor={'sim' if cursor else 'não'}, filtro={status_filter}, projeto={projeto_filter}, autor={autor_filter}")
         return render_template("reports/list.html", 
                                relatorios=relatorios, 
                                status_filter=status_filter,
@@ -3084,7 +3179,6 @@ def reports():
         # Fallback com SQL direto
         try:
             from sqlalchemy import text
-            offset = (page - 1) * per_page if 'page' in locals() else 0
             
             sql_query = """
                 SELECT r.*, p.nome as projeto_nome, u.nome_completo as autor_nome
@@ -3092,38 +3186,20 @@ def reports():
                 LEFT JOIN projetos p ON r.projeto_id = p.id
                 LEFT JOIN users u ON r.autor_id = u.id
                 ORDER BY r.created_at DESC
-                LIMIT :limit OFFSET :offset
+                LIMIT :limit
             """
             
             rows = db.session.execute(text(sql_query), {
-                'limit': per_page if 'per_page' in locals() else 20,
-                'offset': offset
+                'limit': per_page if 'per_page' in locals() else 20
             }).fetchall()
 
-            # Criar objeto mock para paginação
-            class MockPagination:
-                def __init__(self, items, current_page=1, per_page=20):
-                    self.items = items
-                    self.total = len(items)
-                    self.page = current_page
-                    self.per_page = per_page
-                    self.pages = max(1, (self.total // self.per_page) + (1 if self.total % self.per_page > 0 else 0))
-                    self.has_prev = self.page > 1
-                    self.has_next = self.page < self.pages
-
-                def iter_pages(self):
-                    """Método para compatibilidade com template"""
-                    return range(1, min(self.pages + 1, 6))  # Máximo 5 páginas
-
-            current_page = page if 'page' in locals() else 1
-            per_page_value = per_page if 'per_page' in locals() else 20
-            relatorios = MockPagination(rows, current_page, per_page_value)
+            relatorios = PaginaCursor(rows)
             current_app.logger.warning(f"⚠️ Usando fallback SQL: {len(rows)} relatórios")
             return render_template("reports/list.html", relatorios=relatorios, fallback=True)
 
         except Exception as fallback_error:
             current_app.logger.error(f"❌ Fallback também falhou: {str(fallback_error)}")
-            return render_template("reports/list.html", relatorios=MockPagination([]), fallback=True, error=str(e))
+            return render_template("reports/list.html", relatorios=PaginaCursor([]), fallback=True, error=str(e))
 
 
 @app.route('/reports/autosave/<int:report_id>', methods=['POST'])
@@ -3153,6 +3229,9 @@ def autosave_report(report_id):
             current_app.logger.warning(f"🚫 AUTOSAVE: Usuário {current_user.username} sem permissão para relatório {report_id}")
             return jsonify({"success": False, "error": "Sem permissão para editar este relatório"}), 403
 
+        # Versão conhecida pelo cliente (concorrência otimista)
+        expected_version = parse_version(data)
+
         # Whitelist de campos permitidos conforme especificação
         allowed_fields = [
             'titulo', 'observacoes', 'latitude', 'longitude', 
@@ -3227,8 +3306,14 @@ def autosave_report(report_id):
                     changes_made = True
                     current_app.logger.info(f"📝 AUTOSAVE: Campo '{field}' atualizado")
 
+        if expected_version is not None and expected_version != relatorio.autosave_version:
+            return conflict_response(relatorio, data, allowed_fields)
+
         # Se houve mudanças, atualizar status conforme especificação
         if changes_made:
+            if claim_autosave_version(relatorio, expected_version) is None:
+                return conflict_response(relatorio, data, allowed_fields)
+
             # Se report.status != 'Aprovado', definir report.status = 'preenchimento'
             if relatorio.status != 'Aprovado':
                 relatorio.status = 'preenchimento'
@@ -3245,6 +3330,7 @@ def autosave_report(report_id):
                     "success": True, 
                     "message": "Rascunho salvo automaticamente",
                     "status": relatorio.status,
+                    "version": relatorio.autosave_version,
                     "timestamp": relatorio.updated_at.isoformat()
                 }), 200
             except Exception as e:
@@ -3256,7 +3342,8 @@ def autosave_report(report_id):
             return jsonify({
                 "success": True, 
                 "message": "Nenhuma alteração para salvar",
-                "status": relatorio.status
+                "status": relatorio.status,
+                "version": relatorio.autosave_version
             }), 200
 
     except Exception as e:
@@ -3677,7 +3764,7 @@ def create_report():
                                 foto.coordenadas_anotacao = photo_data['coordinates']
 
                             db.session.add(foto)
-                            current_app.logger.info(f"✅ Foto mobile {i+1} completa: legenda='{foto.legenda}', tipo='{foto.tipo_servico}', imagem={len(foto.imagem) if foto.imagem else 0} bytes")
+                            current_app.logger.info(f"✅ Foto mobile {i+1} completa: legenda='{foto.legenda}', tipo='{foto.tipo_servico}', imagem={foto.imagem_size or 0} bytes")
 
                         except Exception as foto_error:
                             current_app.logger.error(f"❌ Erro ao processar foto mobile {i+1}: {foto_error}")
@@ -3863,7 +3950,7 @@ def create_report():
             # Debug: Verificar fotos antes do commit
             fotos_debug = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).all()
             for foto_debug in fotos_debug:
-                current_app.logger.info(f"🔍 FOTO PRÉ-COMMIT: ID={foto_debug.id}, filename='{foto_debug.filename}', legenda='{foto_debug.legenda}', descricao='{foto_debug.descricao}', tipo='{foto_debug.tipo_servico}', imagem_size={len(foto_debug.imagem) if foto_debug.imagem else 0}")
+                current_app.logger.info(f"🔍 FOTO PRÉ-COMMIT: ID={foto_debug.id}, filename='{foto_debug.filename}', legenda='{foto_debug.legenda}', descricao='{foto_debug.descricao}', tipo='{foto_debug.tipo_servico}', imagem_size={foto_debug.imagem_size or 0}")
 
             current_app.logger.info(f"🔧 Fazendo COMMIT de {photo_count} fotos para relatório {relatorio.id}")
             
@@ -3874,7 +3961,7 @@ def create_report():
             # VERIFICAÇÃO PÓS-COMMIT: Contar imagens salvas com dados binários
             fotos_com_imagem = db.session.query(FotoRelatorio).filter(
                 FotoRelatorio.relatorio_id == relatorio.id,
-                FotoRelatorio.imagem != None
+                FotoRelatorio.imagem_hash != None
             ).count()
             current_app.logger.info(f"📊 VERIFICAÇÃO: {fotos_com_imagem} de {photo_count} fotos têm dados binários salvos")
 
@@ -3883,8 +3970,8 @@ def create_report():
             current_app.logger.info(f"✅ PÓS-COMMIT: {len(fotos_post)} fotos encontradas no banco para relatório {relatorio.id}")
             
             for foto_post in fotos_post:
-                imagem_size = len(foto_post.imagem) if foto_post.imagem else 0
-                current_app.logger.info(f"💾 FOTO ID={foto_post.id}: legenda='{foto_post.legenda}', filename='{foto_post.filename}', imagem_bytes={imagem_size}, imagem_presente={foto_post.imagem is not None}")
+                imagem_size = foto_post.imagem_size or 0
+                current_app.logger.info(f"💾 FOTO ID={foto_post.id}: legenda='{foto_post.legenda}', filename='{foto_post.filename}', imagem_bytes={imagem_size}, imagem_hash={foto_post.imagem_hash}")
                 
                 # Verificar dados JSON
                 if foto_post.anotacoes_dados:
@@ -4542,39 +4629,11 @@ def approve_report(id):
         except Exception as notif_error:
             current_app.logger.error(f"⚠️ Erro ao criar notificação de aprovação: {notif_error}")
 
-        # Gerar PDF usando WeasyPrint
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
-        
-        # Buscar fotos do relatório
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=relatorio.id).order_by(FotoRelatorio.ordem).all()
-        
-        # Gerar PDF
-        obra_nome = sanitize_filename(relatorio.projeto.nome)
-        pdf_filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        pdf_path = os.path.join('static', 'reports', pdf_filename)
-        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
-        
-        generator.generate_report_pdf(relatorio, fotos, output_path=pdf_path)
-        current_app.logger.info(f"📄 PDF gerado: {pdf_path}")
-
-        # Enviar e-mail de aprovação
-        try:
-            from email_service_resend import ReportApprovalEmailService
-            email_service = ReportApprovalEmailService()
-            resultado_email = email_service.send_approval_email(relatorio, pdf_path)
-            
-            if resultado_email.get('success'):
-                enviados = resultado_email.get('enviados', 0)
-                total = resultado_email.get('total', enviados)
-                current_app.logger.info(f"✅ E-mails enviados com sucesso para {enviados}/{total} destinatário(s)")
-                flash(f'✅ Relatório aprovado com sucesso! E-mails enviados para {enviados} destinatário(s).', 'success')
-            else:
-                current_app.logger.warning(f"⚠️ Falha ao enviar e-mails: {resultado_email.get('error')}")
-                flash('✅ Relatório aprovado com sucesso! Não foi possível enviar os e-mails de notificação.', 'warning')
-        except Exception as e:
-            current_app.logger.warning(f"⚠️ Erro ao enviar e-mails de aprovação: {e}")
-            flash('✅ Relatório aprovado com sucesso! Não foi possível enviar os e-mails de notificação.', 'warning')
+        # PDF e e-mails de aprovação saem da requisição: o job renderiza no pool e envia ao concluir
+        job = pdf_render_queue.enqueue('relatorio', relatorio.id, user_id=current_user.id,
+                                       acao=ACAO_EMAIL_APROVACAO)
+        current_app.logger.info(f"🖨️ Job de PDF {job.id} enfileirado para aprovação de {relatorio.numero}")
+        flash('✅ Relatório aprovado com sucesso! O PDF e os e-mails de notificação estão sendo gerados em segundo plano.', 'success')
         
         return redirect(url_for('report_edit', report_id=id))
             
@@ -4830,36 +4889,34 @@ def delete_report(id):
     from flask import redirect as flask_redirect, Response
     return flask_redirect(url_for('reports'), code=303)
 
+def _report_pdf_response(relatorio, inline):
+    """
+    PDF do relatório: cache hit é servido na hora; em cache miss a renderização
+    vai para a fila (pdf_jobs.py) e a resposta é 202 com a URL de polling, sem
+    prender a thread do worker enquanto o WeasyPrint roda.
+    """
+    cached_path = cached_report_pdf_path(relatorio)
+    if cached_path:
+        obra_nome = sanitize_filename(relatorio.projeto.nome)
+        filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
+        return send_file(cached_path, mimetype='application/pdf', as_attachment=not inline,
+                         download_name=filename, conditional=True)
+
+    job = pdf_render_queue.enqueue('relatorio', relatorio.id, user_id=current_user.id)
+    download_args = {'inline': '1'} if inline else {}
+    return job_pending_response(
+        job,
+        url_for('report_pdf_job_status', id=relatorio.id, job_id=job.id),
+        url_for('report_pdf_job_download', id=relatorio.id, job_id=job.id, **download_args),
+    )
+
 @app.route('/reports/<int:report_id>/pdf')
 @login_required
 def generate_pdf_report(report_id):
-    """Gerar PDF do relatório usando WeasyPrint (modelo Artesano) para visualização"""
+    """Visualizar PDF do relatório (WeasyPrint, modelo Artesano)"""
+    relatorio = Relatorio.query.get_or_404(report_id)
     try:
-        relatorio = Relatorio.query.get_or_404(report_id)
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=report_id).order_by(FotoRelatorio.ordem).all()
-
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
-
-        # Generate PDF
-        pdf_data = generator.generate_report_pdf(relatorio, fotos)
-
-        # Create response for inline viewing
-        from flask import Response
-        obra_nome = sanitize_filename(relatorio.projeto.nome)
-        filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
-
-        response = Response(
-            pdf_data,
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'inline; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
-
-        return response
-
+        return _report_pdf_response(relatorio, inline=True)
     except Exception as e:
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
         return redirect(url_for('report_edit', report_id=report_id))
@@ -4867,36 +4924,59 @@ def generate_pdf_report(report_id):
 @app.route('/reports/<int:id>/pdf/download')
 @login_required
 def generate_report_pdf_download(id):
-    """Baixar PDF do relatório usando WeasyPrint (mesmo formato da visualização)"""
+    """Baixar PDF do relatório (mesmo conteúdo da visualização)"""
+    relatorio = Relatorio.query.get_or_404(id)
     try:
-        relatorio = Relatorio.query.get_or_404(id)
-        fotos = FotoRelatorio.query.filter_by(relatorio_id=id).order_by(FotoRelatorio.ordem).all()
-
-        from pdf_generator_weasy import WeasyPrintReportGenerator
-        generator = WeasyPrintReportGenerator()
+        return _report_pdf_response(relatorio, inline=False)
+    except Exception as e:
+        flash(f'Erro ao gerar PDF: {str(e)}', 'error')
+        return redirect(url_for('report_edit', report_id=id))
 
-        # Generate PDF (mesmo conteúdo da visualização)
-        pdf_data = generator.generate_report_pdf(relatorio, fotos)
+@app.route('/reports/<int:id>/pdf/jobs', methods=['POST'])
+@login_required
+def enqueue_report_pdf_job(id):
+    """Enfileira a renderização do PDF em segundo plano (202 + URL de status)"""
+    relatorio = Relatorio.query.get_or_404(id)
+    try:
+        job = pdf_render_queue.enqueue('relatorio', relatorio.id, user_id=current_user.id)
+    except Exception as e:
+        current_app.logger.error(f"❌ Erro ao enfileirar PDF do relatório {id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        # Create response for download
-        from flask import Response
-        obra_nome = sanitize_filename(relatorio.projeto.nome)
-        filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    status_url = url_for('report_pdf_job_status', id=id, job_id=job.id)
+    response = jsonify({'success': True, 'job': job_status_response(
+        job, url_for('report_pdf_job_download', id=id, job_id=job.id))})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
 
-        response = Response(
-            pdf_data,
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
+@app.route('/reports/<int:id>/pdf/jobs/<job_id>')
+@login_required
+def report_pdf_job_status(id, job_id):
+    """Status do job de PDF (polling)"""
+    job = pdf_render_queue.get_job(job_id)
+    if not job or job.tipo != 'relatorio' or job.relatorio_id != id:
+        return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+    return jsonify({'success': True, 'job': job_status_response(
+        job, url_for('report_pdf_job_download', id=id, job_id=job.id))})
 
-        return response
+@app.route('/reports/<int:id>/pdf/jobs/<job_id>/download')
+@login_required
+def report_pdf_job_download(id, job_id):
+    """Baixa o PDF gerado pelo job"""
+    job = pdf_render_queue.get_job(job_id)
+    if not job or job.tipo != 'relatorio' or job.relatorio_id != id:
+        abort(404)
+    if job.status != 'concluido':
+        return jsonify({'success': False, 'status': job.status, 'error': job.erro}), 409
 
-    except Exception as e:
-        flash(f'Erro ao gerar PDF: {str(e)}', 'error')
-        return redirect(url_for('report_edit', report_id=report_id))
+    relatorio = Relatorio.query.get_or_404(id)
+    obra_nome = sanitize_filename(relatorio.projeto.nome)
+    filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    response = job_result_response(job, filename, as_attachment=request.args.get('inline') != '1')
+    if response is None:
+        return jsonify({'success': False, 'error': 'Resultado expirado - solicite novamente'}), 410
+    return response
 
 @app.route('/reports/<int:id>/pdf/legacy')
 @login_required
@@ -4932,15 +5012,6 @@ def generate_pdf_report_legacy(id):
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
         return redirect(url_for('report_edit', report_id=report_id))
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points using geopy"""
-    from geopy.distance import geodesic
-    
-    # Calculate distance using geodesic (more accurate than Haversine)
-    distance_km = geodesic((lat1, lon1), (lat2, lon2)).km
-    
-    return distance_km
-
 def normalizar_endereco(endereco):
     """Normaliza endereços expandindo abreviações comuns"""
     import re
@@ -7219,6 +7290,7 @@ def report_edit_complete(report_id):
                 {
                     "id": f.id,
                     "url": url_for('api_get_photo', foto_id=f.id),
+                    "thumb_url": url_for('api_get_photo', foto_id=f.id, size='thumb'),
                     "filename": safe_attr(f, "filename"),
                     "legenda": safe_attr(f, "legenda") or safe_attr(f, "titulo"),
                     "categoria": safe_attr(f, "tipo_servico") or safe_attr(f, "categoria"),
@@ -7880,6 +7952,7 @@ def uploaded_file(filename):
 
         # Buscar no banco PostgreSQL primeiro
         from models import FotoRelatorio, FotoRelatorioExpress
+        from photo_store import PHOTO_CACHE_CONTROL
 
         # Definir diretórios de busca (priorizar uploads)
         search_directories = [
@@ -7890,6 +7963,7 @@ def uploaded_file(filename):
 
         # Tentar encontrar nos relatórios normais
         try:
+            # Consulta só de metadados - bytes legados são buscados sob demanda na promoção
             foto_normal = FotoRelatorio.query.filter_by(filename=filename).first()
             
             # Se não encontrou em FotoRelatorio, tentar em FotoRelatorioExpress
@@ -7905,18 +7979,15 @@ def uploaded_file(filename):
                 elif hasattr(foto_normal, 'relatorio_express_id') and foto_normal.relatorio_express_id:
                     current_app.logger.info(f"✅ ENCONTRADA NO BANCO (Relatório Express {foto_normal.relatorio_express_id}): {filename}")
 
-                # Verificar se tem dados binários salvos no banco
-                if hasattr(foto_normal, 'imagem') and foto_normal.imagem:
-                    current_app.logger.info(f"📱 SERVINDO IMAGEM DIRETAMENTE DO BANCO: {filename}")
-                    try:
-                        content_type = get_content_type(filename)
-                        response = Response(foto_normal.imagem, mimetype=content_type)
-                        response.headers['Content-Type'] = content_type
-                        response.headers['Cache-Control'] = 'public, max-age=3600'
-                        response.headers['X-Image-Source'] = 'database_binary'
+                # Servir do photo store (streaming, ETag/304/Range, sem carregar bytes no heap)
+                try:
+                    response = serve_foto_from_store(foto_normal, get_content_type(filename))
+                    if response is not None:
+                        current_app.logger.info(f"📱 SERVINDO IMAGEM DO PHOTO STORE: {filename}")
+                        response.headers['X-Image-Source'] = 'photo_store'
                         return response
-                    except Exception as binary_error:
-                        current_app.logger.error(f"❌ Erro ao servir imagem do banco: {binary_error}")
+                except Exception as binary_error:
+                    current_app.logger.error(f"❌ Erro ao servir imagem do photo store: {binary_error}")
 
                 # Buscar arquivo físico
                 for dir_name, dir_path in search_directories:
@@ -7927,7 +7998,7 @@ def uploaded_file(filename):
                             content_type = get_content_type(filename)
                             response = send_from_directory(dir_path, filename)
                             response.headers['Content-Type'] = content_type
-                            response.headers['Cache-Control'] = 'public, max-age=3600'
+                            response.headers['Cache-Control'] = PHOTO_CACHE_CONTROL
                             response.headers['X-Image-Source'] = f'normal_report_{dir_name}'
                             return response
                         except Exception as send_error:
@@ -7953,7 +8024,7 @@ def uploaded_file(filename):
                         content_type = get_content_type(filename)
                         response = send_from_directory(dir_path, filename)
                         response.headers['Content-Type'] = content_type
-                        response.headers['Cache-Control'] = 'public, max-age=1800'  # Cache menor para arquivos órfãos
+                        response.headers['Cache-Control'] = PHOTO_CACHE_CONTROL
                         response.headers['X-Image-Source'] = f'orphan_{dir_name}'
                         return response
                     except Exception as send_error:
@@ -8053,24 +8124,22 @@ def get_imagem(id):
     """Servir imagem diretamente do banco de dados para FotoRelatorio"""
     try:
         from models import FotoRelatorio
+        # Consulta só de metadados - o 304 não precisa do blob
         foto = FotoRelatorio.query.get_or_404(id)
 
-        # Se tem imagem no banco, usar ela
-        if foto.imagem:
-            # Determinar mimetype baseado no filename
-            mimetype = get_content_type(foto.filename)
-            return Response(foto.imagem, mimetype=mimetype)
+        # Se tem imagem no photo store, servir em streaming (ETag/304/Range)
+        response = serve_foto_from_store(foto, get_content_type(foto.filename or ''))
+        if response is not None:
+            return response
 
-        # Fallback: tentar carregar do arquivo se não tem no banco (compatibilidade)
+        # Fallback: tentar carregar do arquivo se não tem no store (compatibilidade)
         if foto.filename:
             upload_folder = app.config.get('UPLOAD_FOLDER', 'uploads')
             filepath = os.path.join(upload_folder, foto.filename)
             if os.path.exists(filepath):
                 try:
-                    with open(filepath, 'rb') as f:
-                        file_data = f.read()
                     mimetype = get_content_type(foto.filename)
-                    return Response(file_data, mimetype=mimetype)
+                    return send_from_directory(upload_folder, foto.filename, mimetype=mimetype)
                 except Exception as e:
                     current_app.logger.error(f"Erro ao ler arquivo {filepath}: {e}")
 
@@ -8222,35 +8291,14 @@ def report_approve(report_id):
     # Enviar e-mail de aprovação para todos os envolvidos (após commit)
     if action == 'approve':
         try:
-            # Gerar PDF
-            from pdf_generator_weasy import WeasyPrintReportGenerator
-            generator = WeasyPrintReportGenerator()
-            fotos = FotoRelatorio.query.filter_by(relatorio_id=report_id).order_by(FotoRelatorio.ordem).all()
-            
-            obra_nome = sanitize_filename(relatorio.projeto.nome if relatorio.projeto else "Obra")
-            pdf_filename = f"relatorio_{relatorio.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
-            pdf_path = os.path.join('static', 'reports', pdf_filename)
-            os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
-            
-            generator.generate_report_pdf(relatorio, fotos, output_path=pdf_path)
-            current_app.logger.info(f"📄 PDF gerado para aprovação: {pdf_path}")
-            
-            # Enviar e-mail
-            from email_service_resend import ReportApprovalEmailService
-            email_service = ReportApprovalEmailService()
-            resultado_email = email_service.send_approval_email(relatorio, pdf_path)
-            
-            if resultado_email.get('success'):
-                enviados = resultado_email.get('enviados', 0)
-                flash_message += f" E-mails enviados: {enviados}"
-                current_app.logger.info(f"✅ {enviados} e-mail(s) de aprovação enviados para relatório {relatorio.numero}")
-            else:
-                erro_msg = resultado_email.get('error', 'Erro desconhecido')
-                flash_message += f" Não foi possível enviar os e-mails de notificação."
-                current_app.logger.warning(f"⚠️ Erro ao enviar e-mails para relatório {relatorio.numero}: {erro_msg}")
+            # PDF e e-mails em segundo plano (pdf_jobs): a resposta não espera o WeasyPrint
+            job = pdf_render_queue.enqueue('relatorio', relatorio.id, user_id=current_user.id,
+                                           acao=ACAO_EMAIL_APROVACAO)
+            flash_message += " O PDF e os e-mails de notificação estão sendo gerados em segundo plano."
+            current_app.logger.info(f"🖨️ Job de PDF {job.id} enfileirado para aprovação de {relatorio.numero}")
         except Exception as e:
             flash_message += f" Não foi possível enviar os e-mails de notificação."
-            current_app.logger.error(f"❌ Exceção ao enviar e-mails para relatório {relatorio.numero}: {str(e)}")
+            current_app.logger.error(f"❌ Erro ao enfileirar PDF do relatório {relatorio.numero}: {str(e)}")
 
     return jsonify({'success': True, 'message': flash_message})
 
@@ -9826,12 +9874,12 @@ def admin_drive_test():
         except Exception as e:
             logging.error(f"Erro ao verificar token Google Drive: {e}")
     
-    # Usar case-insensitive para capturar todas as variações de status
+    # Status já normalizados no banco (report_status.py): igualdade usa o índice
     relatorios_aprovados = Relatorio.query.filter(
-        db.func.lower(Relatorio.status).in_(['aprovado', 'finalizado', 'aprovado final'])
+        Relatorio.status.in_(report_status.APROVADOS)
     ).count()
     express_aprovados = RelatorioExpress.query.filter(
-        db.func.lower(RelatorioExpress.status).in_(['aprovado', 'finalizado', 'aprovado final'])
+        RelatorioExpress.status == report_status.APROVADO
     ).count()
     
     stats = {
@@ -1,15 +1,43 @@
-from flask import Blueprint, jsonify, request, current_app, g
+from flask import Blueprint, jsonify, request, current_app, g, Response
 from werkzeug.security import check_password_hash
 from flask_login import current_user
 import jwt
+import json
+import gzip
+import base64
 import datetime
 from functools import wraps
-from models import User, Relatorio, Projeto, FotoRelatorio, Visita
+from models import User, Relatorio, Projeto, FotoRelatorio, Visita, Lembrete, SyncTombstone
 from app import db
+from sync_tombstones import retencao as retencao_tombstones
+from dashboard_counters import dashboard_counters
+from keyset_cursor import ler_cursor, gerar_cursor, condicao_depois
 import os
 
+# orjson é opcional: sem ele as respostas saem pelo json da biblioteca padrão
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# brotli é opcional: sem ele as respostas grandes saem em gzip
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 500
+
+# Delta sync: linhas por entidade em cada resposta e folga do cursor para
+# transações que gravaram updated_at antes de commitar (e relógios de workers)
+LIMITE_SYNC = int(os.environ.get('SYNC_PAGE_SIZE', '500'))
+FOLGA_CURSOR_SYNC = datetime.timedelta(seconds=int(os.environ.get('SYNC_CURSOR_OVERLAP_SECONDS', '120')))
+# Respostas menores que isso não compensam comprimir
+TAMANHO_MINIMO_COMPRESSAO = 1024
+
 # Configuração JWT (chaves devem vir do app.config)
 def get_jwt_secret():
     return current_app.config.get('SECRET_KEY', 'dev-secret-key')
@@ -39,6 +67,203 @@ def token_required(f):
     
     return decorated
 
+# ---------------------------------------------------------------------------
+# Projeções: cada recurso declara seus campos como colunas (e, se preciso, uma
+# função que monta o valor). A consulta seleciona só as colunas dos campos
+# pedidos em ?fields= e só faz JOIN com Projeto/User quando algum campo usa.
+# ---------------------------------------------------------------------------
+
+def _nome_projeto_visita(is_pessoal, projeto_numero, projeto_nome, projeto_outros):
+    """Mesma regra de Visita.projeto_nome, sem carregar o Projeto"""
+    if is_pessoal:
+        return "Compromisso Pessoal"
+    if projeto_nome is not None:
+        return f"{projeto_numero} - {projeto_nome}"
+    return projeto_outros or "Outros"
+
+
+# campo -> (colunas, função opcional que recebe os valores das colunas)
+CAMPOS_PROJETO = {
+    'id': ((Projeto.id,), None),
+    'numero': ((Projeto.numero,), None),
+    'nome': ((Projeto.nome,), None),
+    'endereco': ((Projeto.endereco,), None),
+    'tipo_obra': ((Projeto.tipo_obra,), None),
+    'construtora': ((Projeto.construtora,), None),
+    'status': ((Projeto.status,), None),
+    'data_inicio': ((Projeto.data_inicio,), None),
+}
+
+CAMPOS_RELATORIO = {
+    'id': ((Relatorio.id,), None),
+    'numero': ((Relatorio.numero,), None),
+    'titulo': ((Relatorio.titulo,), None),
+    'projeto_id': ((Relatorio.projeto_id,), None),
+    'projeto_nome': ((Projeto.nome,), None),
+    'status': ((Relatorio.status,), None),
+    'data_relatorio': ((Relatorio.data_relatorio,), None),
+    'autor_nome': ((User.nome_completo,), None),
+    'created_at': ((Relatorio.created_at,), None),
+}
+
+CAMPOS_VISITA = {
+    'id': ((Visita.id,), None),
+    'numero': ((Visita.numero,), None),
+    'projeto_id': ((Visita.projeto_id,), None),
+    'projeto_nome': ((Visita.is_pessoal, Projeto.numero, Projeto.nome, Visita.projeto_outros), _nome_projeto_visita),
+    'data_inicio': ((Visita.data_inicio,), None),
+    'data_fim': ((Visita.data_fim,), None),
+    'status': ((Visita.status,), None),
+    'observacoes': ((Visita.observacoes,), None),
+}
+
+CAMPOS_FOTO = {
+    'id': ((FotoRelatorio.id,), None),
+    'relatorio_id': ((FotoRelatorio.relatorio_id,), None),
+    'titulo': ((FotoRelatorio.titulo,), None),
+    'legenda': ((FotoRelatorio.legenda,), None),
+    'descricao': ((FotoRelatorio.descricao,), None),
+    'tipo_servico': ((FotoRelatorio.tipo_servico,), None),
+    'local': ((FotoRelatorio.local,), None),
+    'ordem': ((FotoRelatorio.ordem,), None),
+    'imagem_hash': ((FotoRelatorio.imagem_hash,), None),
+    'content_type': ((FotoRelatorio.content_type,), None),
+    'imagem_size': ((FotoRelatorio.imagem_size,), None),
+}
+
+CAMPOS_LEMBRETE = {
+    'id': ((Lembrete.id,), None),
+    'projeto_id': ((Lembrete.projeto_id,), None),
+    'texto': ((Lembrete.texto,), None),
+    'criado_em': ((Lembrete.criado_em,), None),
+}
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    return valor
+
+
+def _campos_pedidos(campos, padrao=None):
+    """Campos de ?fields=a,b,c (ou `padrao`/todos); ValueError se algum não existir"""
+    pedido = request.args.get('fields')
+    if not pedido:
+        return list(padrao or campos)
+    nomes = [nome.strip() for nome in pedido.split(',') if nome.strip()]
+    desconhecidos = [nome for nome in nomes if nome not in campos]
+    if desconhecidos:
+        raise ValueError(f"Campos desconhecidos: {', '.join(desconhecidos)}. Disponíveis: {', '.join(campos)}")
+    return nomes
+
+
+def _projetar(query, campos, nomes, joins, entidade, prefixo=()):
+    """
+    Troca as entidades da consulta por `prefixo` + as colunas dos campos
+    pedidos, a partir de `entidade`, com só os JOINs que essas colunas exigem.
+    Devolve (query, montar), onde montar(linha sem o prefixo) -> dict.
+    """
+    colunas, fatias = [], []
+    for nome in nomes:
+        cols, funcao = campos[nome]
+        fatias.append((nome, len(colunas), len(colunas) + len(cols), funcao))
+        colunas.extend(cols)
+
+    # O FROM começa na entidade mesmo quando a primeira coluna é de um JOIN; a consulta
+    # já chega filtrada (escopo do usuário, cursor), o que o select_from() recusaria
+    query = query.enable_assertions(False).with_entities(*prefixo, *colunas).select_from(entidade)
+    usadas = {col.class_ for col in colunas}
+    for relacionada, condicao in joins:
+        if relacionada in usadas:
+            query = query.outerjoin(relacionada, condicao)
+
+    def montar(linha):
+        item = {}
+        for nome, inicio, fim, funcao in fatias:
+            valores = linha[inicio:fim]
+            item[nome] = _valor_json(funcao(*valores) if funcao else valores[0])
+        return item
+
+    return query, montar
+
+
+def _pagina(query, campos, nomes, joins, entidade, ordem):
+    """
+    Executa a consulta projetada com paginação por cursor (keyset, ver keyset_cursor.py).
+
+    `ordem` é uma lista de (coluna, descendente, conversor do valor do cursor);
+    a última coluna deve ser única (id). ?limit= (padrão 100, máx. 500) e
+    ?cursor= vêm da requisição. Devolve (itens, proximo_cursor).
+    """
+    limite = min(max(request.args.get('limit', LIMITE_PADRAO, type=int), 1), LIMITE_MAXIMO)
+    cursor = request.args.get('cursor')
+
+    if cursor:
+        valores = ler_cursor(cursor, [conversor for _, _, conversor in ordem])
+        query = query.filter(condicao_depois([coluna for coluna, _, _ in ordem], valores,
+                                             [desc for _, desc, _ in ordem]))
+
+    # As colunas de ordenação vêm primeiro na linha (para o cursor), os campos depois
+    query, montar = _projetar(query, campos, nomes, joins, entidade, [coluna for coluna, _, _ in ordem])
+    query = query.order_by(*[coluna.desc() if desc else coluna.asc() for coluna, desc, _ in ordem])
+    linhas = query.limit(limite + 1).all()
+
+    n_ordem = len(ordem)
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo = gerar_cursor(linhas[-1][:n_ordem])
+    return [montar(linha[n_ordem:]) for linha in linhas], proximo
+
+
+def _resposta_json(payload, status=200, headers=None):
+    """JSON com orjson quando disponível (listas grandes serializam bem mais rápido)"""
+    if orjson is not None:
+        return Response(orjson.dumps(payload), status=status, headers=headers, mimetype='application/json')
+    resposta = jsonify(payload)
+    resposta.status_code = status
+    if headers:
+        resposta.headers.update(headers)
+    return resposta
+
+
+def _resposta_paginada(itens, proximo_cursor):
+    """Corpo continua sendo a lista (compatível com o app); o cursor vai no header"""
+    headers = {'X-Next-Cursor': proximo_cursor} if proximo_cursor else None
+    return _resposta_json(itens, headers=headers)
+
+
+def _parse_datetime(valor):
+    return datetime.datetime.fromisoformat(valor)
+
+
+@api_bp.after_request
+def _comprimir_resposta(response):
+    """Comprime respostas JSON grandes com brotli (se instalado) ou gzip, conforme Accept-Encoding"""
+    if (response.direct_passthrough or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers or not 200 <= response.status_code < 300):
+        return response
+
+    aceitos = request.headers.get('Accept-Encoding', '').lower()
+    if brotli is not None and 'br' in aceitos:
+        codificacao = 'br'
+    elif 'gzip' in aceitos:
+        codificacao = 'gzip'
+    else:
+        return response
+
+    dados = response.get_data()
+    if len(dados) < TAMANHO_MINIMO_COMPRESSAO:
+        return response
+    if codificacao == 'br':
+        response.set_data(brotli.compress(dados, quality=5))
+    else:
+        response.set_data(gzip.compress(dados, compresslevel=6))
+    response.headers['Content-Encoding'] = codificacao
+    response.vary.add('Accept-Encoding')
+    return response
+
+
 @api_bp.route('/status', methods=['GET'])
 def api_status():
     return jsonify({'status': 'online', 'server_time': datetime.datetime.utcnow().isoformat()})
@@ -78,15 +303,8 @@ def login():
 @token_required
 def dashboard_data(current_user):
     try:
-        # Estatísticas
-        obras_ativas = Projeto.query.filter_by(status='Ativo').count()
-        relatorios_pendentes = Relatorio.query.filter(
-            Relatorio.status.in_(['Aguardando Aprovação', 'Pendente'])
-        ).count()
-        visitas_agendadas = Visita.query.filter(
-            Visita.status == 'Agendada',
-            Visita.data_inicio >= datetime.datetime.now()
-        ).count()
+        # Estatísticas (contadores materializados, ver dashboard_counters.py)
+        contadores = dashboard_counters.valores()
 
         # Relatórios Recentes
         if current_user.is_master:
@@ -94,24 +312,24 @@ def dashboard_data(current_user):
         else:
             relatorios_query = Relatorio.query.filter_by(autor_id=current_user.id)
             
-        relatorios = relatorios_query.order_by(Relatorio.created_at.desc()).limit(10).all()
-        
+        relatorios_query, montar = _projetar(
+            relatorios_query,
+            CAMPOS_RELATORIO,
+            ['id', 'numero', 'titulo', 'projeto_nome', 'status', 'data_relatorio', 'autor_nome'],
+            [(Projeto, Projeto.id == Relatorio.projeto_id), (User, User.id == Relatorio.autor_id)],
+            Relatorio
+        )
         recent_reports = []
-        for r in relatorios:
-            recent_reports.append({
-                'id': r.id,
-                'numero': r.numero,
-                'titulo': r.titulo,
-                'projeto_nome': r.projeto.nome if r.projeto else 'Sem projeto',
-                'status': r.status,
-                'data_relatorio': r.data_relatorio.isoformat() if r.data_relatorio else None,
-                'autor_nome': r.autor.nome_completo if r.autor else 'Desconhecido'
-            })
+        for linha in relatorios_query.order_by(Relatorio.created_at.desc()).limit(10):
+            item = montar(linha)
+            item['projeto_nome'] = item['projeto_nome'] or 'Sem projeto'
+            item['autor_nome'] = item['autor_nome'] or 'Desconhecido'
+            recent_reports.append(item)
 
         return jsonify({
-            'obras_ativas': obras_ativas,
-            'relatorios_pendentes': relatorios_pendentes,
-            'visitas_agendadas': visitas_agendadas,
+            'obras_ativas': contadores['projetos_ativos'],
+            'relatorios_pendentes': contadores['relatorios_aguardando_aprovacao'],
+            'visitas_agendadas': contadores['visitas_agendadas'],
             'relatorios_recentes': recent_reports
         })
     except Exception as e:
@@ -121,20 +339,15 @@ def dashboard_data(current_user):
 @token_required
 def get_projects(current_user):
     try:
-        projetos = Projeto.query.filter_by(status='Ativo').all()
-        output = []
-        for p in projetos:
-            output.append({
-                'id': p.id,
-                'numero': p.numero,
-                'nome': p.nome,
-                'endereco': p.endereco,
-                'tipo_obra': p.tipo_obra,
-                'construtora': p.construtora,
-                'status': p.status,
-                'data_inicio': p.data_inicio.isoformat() if p.data_inicio else None
-            })
-        return jsonify(output)
+        nomes = _campos_pedidos(CAMPOS_PROJETO)
+        itens, proximo = _pagina(
+            Projeto.query.filter_by(status='Ativo'),
+            CAMPOS_PROJETO, nomes, [], Projeto,
+            [(Projeto.id, False, int)]
+        )
+        return _resposta_paginada(itens, proximo)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -142,25 +355,22 @@ def get_projects(current_user):
 @token_required
 def get_reports(current_user):
     try:
+        nomes = _campos_pedidos(CAMPOS_RELATORIO)
         if current_user.is_master:
-            relatorios = Relatorio.query.all()
+            relatorios = Relatorio.query
         else:
-            relatorios = Relatorio.query.filter_by(autor_id=current_user.id).all()
+            relatorios = Relatorio.query.filter_by(autor_id=current_user.id)
         
-        output = []
-        for r in relatorios:
-            output.append({
-                'id': r.id,
-                'numero': r.numero,
-                'titulo': r.titulo,
-                'projeto_id': r.projeto_id,
-                'projeto_nome': r.projeto.nome if r.projeto else None,
-                'status': r.status,
-                'data_relatorio': r.data_relatorio.isoformat() if r.data_relatorio else None,
-                'autor_nome': r.autor.nome_completo if r.autor else None,
-                'created_at': r.created_at.isoformat() if r.created_at else None
-            })
-        return jsonify(output)
+        # Mais recentes primeiro (id acompanha created_at e é único)
+        itens, proximo = _pagina(
+            relatorios, CAMPOS_RELATORIO, nomes,
+            [(Projeto, Projeto.id == Relatorio.projeto_id), (User, User.id == Relatorio.autor_id)],
+            Relatorio,
+            [(Relatorio.id, True, int)]
+        )
+        return _resposta_paginada(itens, proximo)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -168,70 +378,151 @@ def get_reports(current_user):
 @token_required
 def get_visits(current_user):
     try:
+        nomes = _campos_pedidos(CAMPOS_VISITA)
         if current_user.is_master:
-            visitas = Visita.query.all()
+            visitas = Visita.query
         else:
-            visitas = Visita.query.filter_by(responsavel_id=current_user.id).all()
+            visitas = Visita.query.filter_by(responsavel_id=current_user.id)
         
-        output = []
-        for v in visitas:
-            output.append({
-                'id': v.id,
-                'numero': v.numero,
-                'projeto_id': v.projeto_id,
-                'projeto_nome': v.projeto_nome,
-                'data_inicio': v.data_inicio.isoformat() if v.data_inicio else None,
-                'data_fim': v.data_fim.isoformat() if v.data_fim else None,
-                'status': v.status,
-                'observacoes': v.observacoes
-            })
-        return jsonify(output)
+        itens, proximo = _pagina(
+            visitas, CAMPOS_VISITA, nomes,
+            [(Projeto, Projeto.id == Visita.projeto_id)],
+            Visita,
+            [(Visita.data_inicio, True, _parse_datetime), (Visita.id, True, int)]
+        )
+        return _resposta_paginada(itens, proximo)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# ---------------------------------------------------------------------------
+# Delta sync: cada entidade avança por (updated_at, id) e o cursor devolvido ao
+# app guarda a posição de cada uma. Exclusões vêm de sync_tombstones; linhas que
+# saíram do escopo (projeto inativo, lembrete fechado) também vão em 'removidos'.
+# ---------------------------------------------------------------------------
+
+CHAVE_REMOVIDOS = 'removidos'
+
+
+def _entidades_sync(usuario):
+    """
+    entidade -> (modelo, consulta no escopo do usuário, campos, nomes enviados,
+    condição de "continua no aparelho" ou None)
+    """
+    relatorios_do_usuario = db.select(Relatorio.id).where(Relatorio.autor_id == usuario.id)
+    return {
+        'projetos': (Projeto, Projeto.query, CAMPOS_PROJETO,
+                     ['id', 'numero', 'nome', 'endereco', 'tipo_obra', 'status'], Projeto.status == 'Ativo'),
+        'relatorios': (Relatorio, Relatorio.query.filter_by(autor_id=usuario.id), CAMPOS_RELATORIO,
+                       ['id', 'numero', 'titulo', 'projeto_id', 'status', 'data_relatorio'], None),
+        'visitas': (Visita, Visita.query.filter_by(responsavel_id=usuario.id), CAMPOS_VISITA,
+                    ['id', 'numero', 'projeto_id', 'data_inicio', 'data_fim', 'status'], None),
+        'fotos': (FotoRelatorio, FotoRelatorio.query.filter(FotoRelatorio.relatorio_id.in_(relatorios_do_usuario)),
+                  CAMPOS_FOTO, list(CAMPOS_FOTO), None),
+        'lembretes': (Lembrete, Lembrete.query, CAMPOS_LEMBRETE, list(CAMPOS_LEMBRETE), db.not_(Lembrete.fechado)),
+    }
+
+
+def _ler_cursor_sync(texto):
+    """Cursor do sync -> {entidade: (momento, id)}; ValueError se inválido"""
+    try:
+        posicoes = json.loads(base64.urlsafe_b64decode(texto.encode('ascii')))
+        return {entidade: (_parse_datetime(momento), int(ultimo_id))
+                for entidade, (momento, ultimo_id) in posicoes.items()}
+    except Exception:
+        raise ValueError('Cursor de sincronização inválido')
+
+
+def _gerar_cursor_sync(posicoes):
+    dados = {entidade: [momento.isoformat(), ultimo_id] for entidade, (momento, ultimo_id) in posicoes.items()}
+    return base64.urlsafe_b64encode(json.dumps(dados).encode('ascii')).decode('ascii')
+
+
+def _depois_de(coluna_momento, coluna_id, posicao):
+    momento, ultimo_id = posicao
+    return db.or_(coluna_momento > momento, db.and_(coluna_momento == momento, coluna_id > ultimo_id))
+
+
+def _ler_delta(query, coluna_momento, coluna_id, posicao, inicio):
+    """
+    Linhas (momento, id, ...) depois de `posicao`, em ordem, até LIMITE_SYNC.
+    Devolve (linhas, nova posição, página cheia). Página cheia continua logo
+    depois da última linha; página completa recua para `inicio - folga` e pega
+    commits atrasados na próxima vez (o app grava por id, repetir não duplica).
+    """
+    if posicao is not None:
+        query = query.filter(_depois_de(coluna_momento, coluna_id, posicao))
+    linhas = query.order_by(coluna_momento.asc(), coluna_id.asc()).limit(LIMITE_SYNC + 1).all()
+
+    if len(linhas) > LIMITE_SYNC:
+        linhas = linhas[:LIMITE_SYNC]
+        return linhas, (linhas[-1][0], linhas[-1][1]), True
+    return linhas, (inicio - FOLGA_CURSOR_SYNC, 0), False
+
+
 @api_bp.route('/sync/down', methods=['GET'])
 @token_required
 def sync_down(current_user):
     """
     Endpoint para baixar dados iniciais/incrementais para o app.
+
+    Sem ?since= devolve a carga completa (completo=true: o app substitui os
+    dados locais). Com ?since=<cursor da resposta anterior> devolve só o que
+    mudou desde então, com os ids apagados ou fora do escopo em 'removidos'.
+    Enquanto tem_mais=true o app chama de novo com o novo cursor.
     """
     try:
-        # Projetos
-        projetos = Projeto.query.filter_by(status='Ativo').all()
-        projetos_data = [{
-            'id': p.id,
-            'numero': p.numero,
-            'nome': p.nome,
-            'endereco': p.endereco,
-            'tipo_obra': p.tipo_obra
-        } for p in projetos]
-        
-        # Relatórios do usuário
-        relatorios = Relatorio.query.filter_by(autor_id=current_user.id).order_by(Relatorio.created_at.desc()).limit(50).all()
-        relatorios_data = [{
-            'id': r.id,
-            'numero': r.numero,
-            'titulo': r.titulo,
-            'projeto_id': r.projeto_id,
-            'status': r.status,
-            'data_relatorio': r.data_relatorio.isoformat() if r.data_relatorio else None
-        } for r in relatorios]
-        
-        # Visitas do usuário
-        visitas = Visita.query.filter_by(responsavel_id=current_user.id).order_by(Visita.data_inicio.desc()).limit(50).all()
-        visitas_data = [{
-            'id': v.id,
-            'numero': v.numero,
-            'projeto_id': v.projeto_id,
-            'data_inicio': v.data_inicio.isoformat() if v.data_inicio else None,
-            'status': v.status
-        } for v in visitas]
-        
-        return jsonify({
-            'projetos': projetos_data,
-            'relatorios': relatorios_data,
-            'visitas': visitas_data,
-            'sync_time': datetime.datetime.utcnow().isoformat()
+        inicio = datetime.datetime.utcnow()
+        since = request.args.get('since')
+        posicoes = _ler_cursor_sync(since) if since else {}
+
+        # Cursor mais velho que a retenção dos tombstones: exclusões podem ter se perdido
+        if any(momento < inicio - retencao_tombstones() for momento, _ in posicoes.values()):
+            posicoes = {}
+        completo = not posicoes
+
+        resposta = {CHAVE_REMOVIDOS: {}}
+        novas_posicoes = {}
+        tem_mais = False
+
+        for entidade, (modelo, query, campos, nomes, visivel) in _entidades_sync(current_user).items():
+            if completo and visivel is not None:
+                # Carga inicial: o aparelho ainda não tem nada para remover
+                query = query.filter(visivel)
+            prefixo = [modelo.updated_at, modelo.id, visivel if visivel is not None else db.true()]
+            query, montar = _projetar(query, campos, nomes, [], modelo, prefixo)
+            linhas, novas_posicoes[entidade], cheia = _ler_delta(
+                query, modelo.updated_at, modelo.id, posicoes.get(entidade), inicio
+            )
+            resposta[entidade] = [montar(linha[3:]) for linha in linhas if linha[2]]
+            fora_do_escopo = [linha[1] for linha in linhas if not linha[2]]
+            if fora_do_escopo:
+                resposta[CHAVE_REMOVIDOS][entidade] = fora_do_escopo
+            tem_mais = tem_mais or cheia
+
+        # Exclusões desde o último sync (na carga completa não há o que remover)
+        tombstones = SyncTombstone.query.with_entities(
+            SyncTombstone.removido_em, SyncTombstone.id, SyncTombstone.entidade, SyncTombstone.entidade_id
+        )
+        if completo:
+            linhas, novas_posicoes[CHAVE_REMOVIDOS], cheia = [], (inicio - FOLGA_CURSOR_SYNC, 0), False
+        else:
+            linhas, novas_posicoes[CHAVE_REMOVIDOS], cheia = _ler_delta(
+                tombstones, SyncTombstone.removido_em, SyncTombstone.id, posicoes.get(CHAVE_REMOVIDOS), inicio
+            )
+        for _, _, entidade, entidade_id in linhas:
+            resposta[CHAVE_REMOVIDOS].setdefault(entidade, []).append(entidade_id)
+        tem_mais = tem_mais or cheia
+
+        resposta.update({
+            'cursor': _gerar_cursor_sync(novas_posicoes),
+            'tem_mais': tem_mais,
+            'completo': completo,
+            'sync_time': inicio.isoformat()
         })
+        return _resposta_json(resposta)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
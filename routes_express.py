@@ -8,11 +8,14 @@ import json
 import logging
 from datetime import datetime
 from pytz import timezone as tz
-from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from app import app, db
 from models import RelatorioExpress, FotoRelatorioExpress, User, ChecklistPadrao
+from autosave_versioning import parse_version, claim_autosave_version, conflict_response
+from report_search import report_search
+from report_status import normalizar_status
 
 logger = logging.getLogger(__name__)
 
@@ -42,26 +45,19 @@ def express_reports_list():
         query = RelatorioExpress.query
         
         if status_filter:
-            if status_filter == 'Em preenchimento':
-                query = query.filter(RelatorioExpress.status == 'Em preenchimento')
-            elif status_filter == 'Aguardando Aprovação':
-                query = query.filter(RelatorioExpress.status == 'Aguardando Aprovação')
-            elif status_filter == 'Aprovado':
-                query = query.filter(RelatorioExpress.status == 'Aprovado')
-            elif status_filter == 'Rejeitado':
-                query = query.filter(RelatorioExpress.status == 'Rejeitado')
-        
-        if search_query:
-            query = query.filter(
-                db.or_(
-                    RelatorioExpress.numero.ilike(f'%{search_query}%'),
-                    RelatorioExpress.titulo.ilike(f'%{search_query}%'),
-                    RelatorioExpress.obra_nome.ilike(f'%{search_query}%'),
-                    RelatorioExpress.obra_construtora.ilike(f'%{search_query}%')
-                )
-            )
+            # Valores canônicos (report_status.py); filtro desconhecido é ignorado
+            try:
+                query = query.filter(RelatorioExpress.status == normalizar_status(status_filter, express=True))
+            except ValueError:
+                pass
+        
+        ordem = []
+        if search_query.strip():
+            # Full-text com relevância (report_search.py)
+            query = query.filter(report_search.filtro_express(search_query.strip()))
+            ordem = report_search.ordem_relevancia('relatorios_express', search_query.strip())
         
-        relatorios = query.order_by(RelatorioExpress.created_at.desc()).paginate(
+        relatorios = query.order_by(*ordem, RelatorioExpress.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
@@ -496,56 +492,16 @@ def approve_express_report(report_id):
         except Exception as notif_error:
             logger.error(f"⚠️ Erro ao criar notificação de aprovação: {notif_error}")
         
-        # ========== GERAR PDF E ENVIAR EMAIL SÍNCRONO (MESMO SISTEMA DO NORMAL) ==========
-        from pdf_generator_express import gerar_pdf_relatorio_express
-        from email_service_unified import get_email_service
-        
-        pdf_path = None
-        email_enviado = False
-        mensagem_erro = ""
-        
-        # Gerar PDF
+        # ========== PDF E EMAIL EM SEGUNDO PLANO (MESMA FILA DO RELATÓRIO NORMAL) ==========
         try:
-            logger.info(f"📄 Gerando PDF para {relatorio.numero}...")
-            resultado_pdf = gerar_pdf_relatorio_express(relatorio.id, salvar_arquivo=True)
-            
-            if resultado_pdf.get('success'):
-                pdf_path = resultado_pdf.get('path')
-                logger.info(f"✅ PDF gerado: {pdf_path}")
-            else:
-                mensagem_erro = f"Erro ao gerar PDF: {resultado_pdf.get('error', 'Desconhecido')}"
-                logger.warning(mensagem_erro)
-        except Exception as pdf_err:
-            mensagem_erro = f"Erro ao gerar PDF: {str(pdf_err)}"
-            logger.error(mensagem_erro, exc_info=True)
-        
-        # Enviar emails
-        emails_enviados = 0
-        if pdf_path and os.path.exists(pdf_path):
-            try:
-                logger.info(f"📧 Enviando email para {relatorio.numero}...")
-                email_service = get_email_service()
-                resultado = email_service.send_approval_email(relatorio, pdf_path)
-                emails_enviados = resultado.get('enviados', 0)
-                
-                if emails_enviados > 0:
-                    total = resultado.get('total', 0)
-                    flash(f'✅ Relatório Express {relatorio.numero} aprovado com sucesso! 📧 Email enviado para {emails_enviados}/{total} destinatário(s).', 'success')
-                    logger.info(f"✅ Email enviado com sucesso para {emails_enviados}/{total} destinatário(s)")
-                    email_enviado = True
-                else:
-                    mensagem_erro = f"Nenhum email enviado - verifique os destinatários"
-                    flash(f'✅ Relatório aprovado! ⚠️ {mensagem_erro}', 'warning')
-                    logger.warning(mensagem_erro)
-            except Exception as email_err:
-                mensagem_erro = f"Erro ao enviar email: {str(email_err)}"
-                flash(f'✅ Relatório aprovado! ⚠️ {mensagem_erro}', 'warning')
-                logger.error(mensagem_erro, exc_info=True)
-        else:
-            if mensagem_erro:
-                flash(f'✅ Relatório aprovado! ⚠️ {mensagem_erro}', 'warning')
-            else:
-                flash(f'✅ Relatório Express {relatorio.numero} aprovado com sucesso!', 'success')
+            from pdf_jobs import pdf_render_queue, ACAO_EMAIL_APROVACAO
+            job = pdf_render_queue.enqueue('express', relatorio.id, user_id=current_user.id,
+                                           acao=ACAO_EMAIL_APROVACAO)
+            logger.info(f"🖨️ Job de PDF {job.id} enfileirado para aprovação de {relatorio.numero}")
+            flash(f'✅ Relatório Express {relatorio.numero} aprovado com sucesso! O PDF e os e-mails estão sendo gerados em segundo plano.', 'success')
+        except Exception as job_err:
+            logger.error(f"Erro ao enfileirar PDF do Relatório Express: {job_err}", exc_info=True)
+            flash(f'✅ Relatório aprovado! ⚠️ Não foi possível gerar o PDF: {job_err}', 'warning')
         
         return redirect(url_for('express_reports_list'))
         
@@ -706,6 +662,11 @@ def autosave_express_report_api():
             
             campos = ['titulo', 'obra_nome', 'obra_endereco', 'obra_tipo', 'obra_construtora',
                       'obra_responsavel', 'obra_email', 'obra_telefone', 'conteudo', 'observacoes_finais', 'informacoes_tecnicas']
+            
+            # Concorrência otimista: o cliente envia só o delta + a versão que conhece
+            if claim_autosave_version(relatorio, parse_version(data)) is None:
+                return conflict_response(relatorio, data, campos + ['acompanhantes', 'checklist_data'])
+
             for campo in campos:
                 if campo in data:
                     value = data[campo]
@@ -838,6 +799,7 @@ def autosave_express_report_api():
             'message': 'Salvo automaticamente',
             'relatorio_id': relatorio_id,
             'imagens': imagens_resultado,
+            'version': relatorio.autosave_version,
             'saved_at': datetime.now().isoformat()
         })
         
@@ -953,74 +915,92 @@ def duplicate_express_report(report_id):
         return redirect(url_for('express_reports_list'))
 
 
+def _express_pdf_response(relatorio_express, inline):
+    """Enfileira o PDF Express (pdf_jobs.py) e responde 202 com a URL de polling"""
+    from pdf_jobs import pdf_render_queue, job_pending_response
+    
+    job = pdf_render_queue.enqueue('express', relatorio_express.id, user_id=current_user.id)
+    download_args = {'inline': '1'} if inline else {}
+    return job_pending_response(
+        job,
+        url_for('express_pdf_job_status', report_id=relatorio_express.id, job_id=job.id),
+        url_for('express_pdf_job_download', report_id=relatorio_express.id, job_id=job.id, **download_args),
+    )
+
+
 @app.route('/relatorio-express/<int:report_id>/pdf')
 @login_required
 def generate_express_pdf(report_id):
-    """Gera PDF do Relatório Express - Visualização Inline"""
+    """PDF do Relatório Express - Visualização Inline (renderizado pela fila de jobs)"""
+    relatorio_express = RelatorioExpress.query.get_or_404(report_id)
     try:
-        from flask import Response
-        from pdf_generator_express import gerar_pdf_relatorio_express
-        
-        relatorio_express = RelatorioExpress.query.get_or_404(report_id)
-        
-        # Gerar PDF em memória usando o gerador centralizado (que contém as correções de data)
-        pdf_io = gerar_pdf_relatorio_express(relatorio_express, salvar_arquivo=False)
-        
-        # Sanitizar nome
-        import re
-        def sanitize(name):
-            if not name: return 'express'
-            return re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')[:50]
-            
-        obra_nome = sanitize(relatorio_express.obra_nome)
-        filename = f"relatorio_express_{relatorio_express.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        
-        return Response(
-            pdf_io.getvalue(),
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'inline; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
-        
+        return _express_pdf_response(relatorio_express, inline=True)
     except Exception as e:
         logger.error(f"Erro ao gerar PDF do Relatório Express: {e}", exc_info=True)
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
         return redirect(url_for('view_express_report', report_id=report_id))
 
 
+@app.route('/relatorio-express/<int:report_id>/pdf/jobs', methods=['POST'])
+@login_required
+def enqueue_express_pdf_job(report_id):
+    """Enfileira a renderização do PDF Express em segundo plano"""
+    from pdf_jobs import pdf_render_queue, job_status_response
+    
+    relatorio_express = RelatorioExpress.query.get_or_404(report_id)
+    try:
+        job = pdf_render_queue.enqueue('express', relatorio_express.id, user_id=current_user.id)
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar PDF do Relatório Express {report_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    response = jsonify({'success': True, 'job': job_status_response(
+        job, url_for('express_pdf_job_download', report_id=report_id, job_id=job.id))})
+    response.status_code = 202
+    response.headers['Location'] = url_for('express_pdf_job_status', report_id=report_id, job_id=job.id)
+    return response
+
+
+@app.route('/relatorio-express/<int:report_id>/pdf/jobs/<job_id>')
+@login_required
+def express_pdf_job_status(report_id, job_id):
+    """Status do job de PDF Express (polling)"""
+    from pdf_jobs import pdf_render_queue, job_status_response
+    
+    job = pdf_render_queue.get_job(job_id)
+    if not job or job.tipo != 'express' or job.relatorio_id != report_id:
+        return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+    return jsonify({'success': True, 'job': job_status_response(
+        job, url_for('express_pdf_job_download', report_id=report_id, job_id=job.id))})
+
+
+@app.route('/relatorio-express/<int:report_id>/pdf/jobs/<job_id>/download')
+@login_required
+def express_pdf_job_download(report_id, job_id):
+    """Baixa o PDF Express gerado pelo job"""
+    from pdf_jobs import pdf_render_queue, job_result_response
+    
+    job = pdf_render_queue.get_job(job_id)
+    if not job or job.tipo != 'express' or job.relatorio_id != report_id:
+        abort(404)
+    if job.status != 'concluido':
+        return jsonify({'success': False, 'status': job.status, 'error': job.erro}), 409
+    
+    relatorio_express = RelatorioExpress.query.get_or_404(report_id)
+    filename = f"relatorio_express_{relatorio_express.numero.replace('/', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    response = job_result_response(job, filename, as_attachment=request.args.get('inline') != '1')
+    if response is None:
+        return jsonify({'success': False, 'error': 'Resultado expirado - solicite novamente'}), 410
+    return response
+
+
 @app.route('/relatorio-express/<int:report_id>/pdf/download')
 @login_required
 def download_express_pdf(report_id):
-    """Baixa PDF do Relatório Express - Visualização Download"""
+    """Baixa PDF do Relatório Express (renderizado pela fila de jobs)"""
+    relatorio_express = RelatorioExpress.query.get_or_404(report_id)
     try:
-        from flask import Response
-        from pdf_generator_express import gerar_pdf_relatorio_express
-        
-        relatorio_express = RelatorioExpress.query.get_or_404(report_id)
-        
-        # Gerar PDF em memória
-        pdf_io = gerar_pdf_relatorio_express(relatorio_express, salvar_arquivo=False)
-        
-        # Sanitizar nome
-        import re
-        def sanitize(name):
-            if not name: return 'express'
-            return re.sub(r'[^\w\s-]', '', name).strip().replace(' ', '_')[:50]
-            
-        obra_nome = sanitize(relatorio_express.obra_nome)
-        filename = f"relatorio_express_{relatorio_express.numero.replace('/', '_')}_{obra_nome}_{datetime.now().strftime('%Y%m%d')}.pdf"
-        
-        return Response(
-            pdf_io.getvalue(),
-            mimetype='application/pdf',
-            headers={
-                'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': 'application/pdf'
-            }
-        )
-        
+        return _express_pdf_response(relatorio_express, inline=False)
     except Exception as e:
         logger.error(f"Erro ao baixar PDF do Relatório Express: {e}", exc_info=True)
         flash(f'Erro ao gerar PDF: {str(e)}', 'error')
@@ -3,7 +3,6 @@ from flask import send_from_directory, jsonify, request
 from flask_login import current_user, login_required
 from app import app, db
 from models import Projeto
-import math
 
 @app.route('/manifest.json')
 def manifest():
@@ -204,7 +203,8 @@ def check_updates():
         # Verificar relatórios pendentes de aprovação para masters
         if current_user.is_master:
             from models import Relatorio
-            pending_count = Relatorio.query.filter_by(status='pendente').count()
+            from report_status import AGUARDANDO_APROVACAO
+            pending_count = Relatorio.query.filter_by(status=AGUARDANDO_APROVACAO).count()
             if pending_count > 0:
                 updates.append({
                     'id': 'pending_reports',
@@ -225,17 +225,6 @@ def check_updates():
 
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calcular distância entre duas coordenadas em metros"""
-    R = 6371000  # Raio da Terra em metros
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = (math.sin(delta_lat / 2) * math.sin(delta_lat / 2) +
-         math.cos(lat1_rad) * math.cos(lat2_rad) *
-         math.sin(delta_lon / 2) * math.sin(delta_lon / 2))
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return R * c
+    from project_geo_index import haversine_km
+    return haversine_km(lat1, lon1, lat2, lon2) * 1000
 
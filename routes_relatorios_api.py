@@ -7,13 +7,14 @@ import logging
 import uuid
 import shutil
 from datetime import datetime
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, url_for
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from app import app, db, csrf
 from models import Relatorio, FotoRelatorio, Projeto, User
+from autosave_versioning import parse_version, claim_autosave_version, conflict_response
 import traceback # Import traceback for detailed error logging
 import json # Import json for handling JSON data
 
@@ -475,7 +476,8 @@ def get_relatorio(relatorio_id):
             'conteudo': relatorio.conteudo or '',
             'status': relatorio.status or 'preenchimento',
             'created_at': relatorio.created_at.isoformat() if relatorio.created_at else None,
-            'updated_at': relatorio.updated_at.isoformat() if relatorio.updated_at else None
+            'updated_at': relatorio.updated_at.isoformat() if relatorio.updated_at else None,
+            'version': relatorio.autosave_version
         }
 
         return jsonify({
@@ -522,6 +524,20 @@ def api_atualizar_relatorio(relatorio_id):
             data = request.get_json()
             files = []
 
+        # Validar o status antes de alterar qualquer campo
+        if 'status' in data:
+            from report_status import normalizar_status, STATUS_RELATORIO
+            try:
+                status = normalizar_status(data['status']) if isinstance(data['status'], str) else None
+            except ValueError:
+                status = None
+            if status is None:
+                return jsonify({
+                    'success': False,
+                    'error': f'Status inválido. Valores aceitos: {", ".join(STATUS_RELATORIO)}',
+                    'status_permitidos': list(STATUS_RELATORIO)
+                }), 400
+
         # Atualizar campos do relatório
         if 'titulo' in data:
             relatorio.titulo = data['titulo'] or 'Relatório sem título'
@@ -538,7 +554,7 @@ def api_atualizar_relatorio(relatorio_id):
         if 'checklist_data' in data:
             relatorio.checklist_data = data['checklist_data']
         if 'status' in data:
-            relatorio.status = data['status']
+            relatorio.status = status
 
         # Processar lembrete_proxima_visita
         if 'lembrete_proxima_visita' in data:
@@ -931,6 +947,13 @@ def api_autosave_relatorio():
                 'observacoes', 'endereco'
             ]
 
+            # Concorrência otimista: o cliente envia só o delta + a versão que conhece
+            if claim_autosave_version(relatorio, parse_version(data)) is None:
+                return conflict_response(relatorio, data, campos_atualizaveis + [
+                    'latitude', 'longitude', 'data_relatorio', 'lembrete_proxima_visita',
+                    'checklist_data', 'acompanhantes'
+                ])
+
             for campo in campos_atualizaveis:
                 if campo in data:
                     setattr(relatorio, campo, data[campo])
@@ -1345,7 +1368,7 @@ def api_autosave_relatorio():
         total_imagens_db = FotoRelatorio.query.filter_by(relatorio_id=relatorio_id).count()
         imagens_com_bytes = FotoRelatorio.query.filter(
             FotoRelatorio.relatorio_id == relatorio_id,
-            FotoRelatorio.imagem.isnot(None)
+            FotoRelatorio.imagem_hash.isnot(None)
         ).count()
 
         logger.info(f"📊 AutoSave VALIDAÇÃO FINAL:")
@@ -1390,7 +1413,8 @@ def api_autosave_relatorio():
                 'numero': relatorio_final.numero,
                 'titulo': relatorio_final.titulo,
                 'status': relatorio_final.status,
-                'updated_at': relatorio_final.updated_at.isoformat() if relatorio_final.updated_at else None
+                'updated_at': relatorio_final.updated_at.isoformat() if relatorio_final.updated_at else None,
+                'version': relatorio_final.autosave_version
             },
             'imagens': imagens_response  # Array sempre válido e completo
         }), 200
@@ -1475,28 +1499,18 @@ def approve_relatorio_api(relatorio_id):
         
         logger.info(f"✅ Relatório {relatorio.numero} aprovado")
         
-        # Gerar PDF
-        pdf_path = None
-        try:
-            from pdf_generator import gerar_pdf_relatorio
-            resultado_pdf = gerar_pdf_relatorio(relatorio_id, salvar_arquivo=True)
-            if resultado_pdf.get('success'):
-                pdf_path = resultado_pdf.get('path')
-        except Exception as e:
-            logger.error(f"⚠️ Erro ao gerar PDF: {e}")
-        
-        # Enviar emails
-        emails_enviados = 0
-        if pdf_path and os.path.exists(pdf_path):
-            try:
-                from email_service_unified import get_email_service
-                email_service = get_email_service()
-                resultado = email_service.send_approval_email(relatorio, pdf_path)
-                emails_enviados = resultado.get('enviados', 0)
-            except Exception as e:
-                logger.error(f"⚠️ Erro ao enviar emails: {e}")
+        # PDF e e-mails em segundo plano: o job renderiza e enfileira os e-mails na outbox
+        from pdf_jobs import pdf_render_queue, ACAO_EMAIL_APROVACAO
+        job = pdf_render_queue.enqueue('relatorio', relatorio.id, user_id=current_user.id,
+                                       acao=ACAO_EMAIL_APROVACAO)
+        logger.info(f"🖨️ Job de PDF {job.id} enfileirado para aprovação de {relatorio.numero}")
         
-        return jsonify({'success': True, 'emails_enviados': emails_enviados}), 200
+        return jsonify({
+            'success': True,
+            'emails_enviados': 0,
+            'job_id': job.id,
+            'status_url': url_for('report_pdf_job_status', id=relatorio.id, job_id=job.id)
+        }), 202
     
     except Exception as e:
         db.session.rollback()
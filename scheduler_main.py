@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+"""
+Processo dedicado do scheduler de tarefas periódicas.
+
+Para tirar as tarefas dos workers web, configure SCHEDULER_MODE=dedicated no
+serviço web e rode este script como um serviço separado. Mais de uma réplica
+pode rodar ao mesmo tempo: só a que obtém o advisory lock executa as tarefas
+(ver scheduler_tasks.py).
+
+Uso:
+    python scheduler_main.py
+"""
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+from app import app  # noqa: E402
+from scheduler_tasks import executar_dedicado  # noqa: E402
+
+if __name__ == '__main__':
+    executar_dedicado(app)
@@ -1,9 +1,43 @@
 """
 Tarefas Agendadas - Sistema de Limpeza Automática
 Usa APScheduler para executar tarefas periódicas
+
+Registro:
+    Cada tarefa se registra com o decorador @tarefa(id, nome, trigger, ...).
+    O scheduler agenda só o id; a função é resolvida no registro na hora de
+    rodar, então renomear uma função não invalida jobs já persistidos.
+
+Execução em um único processo:
+    O scheduler só roda no líder, o processo que obtém o advisory lock do
+    Postgres LOCK_LIDER e o mantém numa conexão dedicada enquanto viver. Os
+    demais processos tentam de novo a cada SCHEDULER_ELECTION_INTERVAL
+    segundos; se o líder morrer, a conexão cai, o lock é liberado e outro
+    processo assume. Cada execução confere a liderança de novo antes de rodar.
+    Sem Postgres (desenvolvimento) todo processo é líder.
+
+    Os jobs ficam na tabela apscheduler_jobs (SQLAlchemyJobStore): um novo
+    líder continua de onde o anterior parou, e execuções perdidas enquanto
+    ninguém era líder rodam uma vez só (coalesce) dentro do misfire_grace_time.
+
+Modos (variável SCHEDULER_MODE):
+    leader    = (padrão) cada processo web se candidata a líder
+    dedicated = os processos web não rodam tarefas; use `python scheduler_main.py`
+    off       = nenhuma tarefa agendada
+
+Fuso horário:
+    As tarefas com CronTrigger (limpezas das 3h/4h, backup do Drive) rodam no
+    horário de SCHEDULER_TIMEZONE, ou TZ, ou America/Sao_Paulo, nunca no
+    relógio do container (UTC no Railway).
+
+O scheduler não sobe ao importar app.py (Alembic, scripts fix_*.py): só os
+pontos de entrada do servidor chamam iniciar_no_servidor().
 """
 
+import os
+import time
 import logging
+import threading
+from collections import namedtuple
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.cron import CronTrigger
@@ -11,72 +45,328 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-scheduler = BackgroundScheduler()
+scheduler = None
+_app = None
 
-def limpar_notificacoes_expiradas_task():
-    """Tarefa periódica para limpar notificações expiradas (>24h)"""
+# Chave do pg_advisory_lock que elege o processo líder do scheduler
+LOCK_LIDER = 0x0b7a5c4e
+
+TarefaAgendada = namedtuple('TarefaAgendada', 'id nome func trigger opcoes')
+
+# id -> TarefaAgendada
+TAREFAS = {}
+
+# Padrões de todos os jobs: nunca duas execuções simultâneas e, após um
+# período sem líder, uma única execução de recuperação
+JOB_DEFAULTS = {
+    'coalesce': True,
+    'max_instances': 1,
+    'misfire_grace_time': 300,
+}
+
+
+def tarefa(id, nome, trigger, habilitada=True, **opcoes):
+    """
+    Registra uma função como tarefa agendada.
+
+    A função roda dentro do app context e pode devolver um dict de métricas
+    (ex.: {'removidas': 10}), que vai para a linha de métricas da execução.
+    """
+    def registrar(func):
+        if habilitada:
+            TAREFAS[id] = TarefaAgendada(id, nome, func, trigger, opcoes)
+        return func
+    return registrar
+
+
+class LiderScheduler:
+    """Eleição de líder entre processos via pg_try_advisory_lock"""
+
+    def __init__(self, chave=LOCK_LIDER):
+        self.chave = chave
+        self._conexao = None
+        self._lock = threading.Lock()
+
+    def e_lider(self):
+        """True se este processo é (ou acabou de se tornar) o líder"""
+        from sqlalchemy import text
+        from app import db
+
+        with self._lock:
+            if db.engine.dialect.name != 'postgresql':
+                return True
+
+            if self._conexao is not None:
+                try:
+                    self._conexao.execute(text("SELECT 1"))
+                    return True
+                except Exception as e:
+                    # Conexão caiu: o lock foi junto; tenta reeleger abaixo
+                    logger.warning(f"⚠️ [SCHEDULER] Conexão do líder perdida ({e})")
+                    self._descartar()
+
+            conexao = db.engine.connect().execution_options(isolation_level='AUTOCOMMIT')
+            try:
+                obtido = conexao.execute(text("SELECT pg_try_advisory_lock(:chave)"), {'chave': self.chave}).scalar()
+            except Exception:
+                conexao.close()
+                raise
+            if not obtido:
+                conexao.close()
+                return False
+            # Conexão fora do pool: o lock de sessão vive enquanto ela estiver aberta
+            conexao.connection.detach()
+            self._conexao = conexao
+            logger.info("👑 [SCHEDULER] Este processo assumiu a execução das tarefas agendadas")
+            return True
+
+    def _descartar(self):
+        try:
+            self._conexao.close()
+        except Exception:
+            pass
+        self._conexao = None
+
+
+lider = LiderScheduler()
+
+
+def _registrar_metricas(tarefa_id, inicio, **valores):
+    """Linha de métricas chave=valor por execução (agregável a partir dos logs)"""
+    campos = ' '.join(f"{chave}={valor}" for chave, valor in valores.items())
+    logger.info(f"📊 [SCHEDULER] metrica tarefa={tarefa_id} duracao_ms={int((time.monotonic() - inicio) * 1000)} {campos}")
+
+
+def executar_tarefa(tarefa_id):
+    """Ponto de entrada de todos os jobs (referência estável no job store)"""
+    registrada = TAREFAS.get(tarefa_id)
+    if registrada is None:
+        logger.warning(f"⚠️ [SCHEDULER] Tarefa '{tarefa_id}' não está mais registrada")
+        return
+
+    inicio = time.monotonic()
     try:
-        with scheduler.app.app_context():
-            from notification_service import notification_service
-            
-            resultado = notification_service.limpar_notificacoes_expiradas()
-            
-            if resultado['success']:
-                count = resultado.get('removed_count', 0)
-                if count > 0:
-                    logger.info(f"🧹 [SCHEDULER] {count} notificações expiradas removidas")
-                else:
-                    logger.debug("🧹 [SCHEDULER] Nenhuma notificação expirada encontrada")
-            else:
-                logger.error(f"❌ [SCHEDULER] Erro ao limpar notificações: {resultado.get('error')}")
-                
+        with _app.app_context():
+            if not lider.e_lider():
+                logger.info(f"ℹ️ [SCHEDULER] Liderança perdida; '{tarefa_id}' não executada")
+                return
+            metricas = registrada.func() or {}
+        _registrar_metricas(tarefa_id, inicio, sucesso=True, **metricas)
     except Exception as e:
-        logger.error(f"❌ [SCHEDULER] Erro na tarefa de limpeza: {e}")
+        _registrar_metricas(tarefa_id, inicio, sucesso=False)
+        logger.error(f"❌ [SCHEDULER] Erro na tarefa '{registrada.nome}': {e}", exc_info=True)
+
+
+@tarefa('limpar_notificacoes_expiradas', 'Limpar notificações expiradas (>24h)',
+        IntervalTrigger(hours=6), misfire_grace_time=3600)
+@tarefa('limpeza_diaria_3am', 'Limpeza diária às 3h',
+        CronTrigger(hour=3, minute=0), misfire_grace_time=6 * 3600)
+def limpar_notificacoes_expiradas_task():
+    """Tarefa periódica para limpar notificações expiradas (>24h)"""
+    from notification_service import notification_service
+
+    resultado = notification_service.limpar_notificacoes_expiradas()
+    if not resultado['success']:
+        raise RuntimeError(resultado.get('error'))
+
+    count = resultado.get('removed_count', 0)
+    if count > 0:
+        logger.info(f"🧹 [SCHEDULER] {count} notificações expiradas removidas")
+    else:
+        logger.debug("🧹 [SCHEDULER] Nenhuma notificação expirada encontrada")
+    return {'removidas': count}
+
+
+@tarefa('limpar_jobs_pdf', 'Limpar jobs de PDF expirados', IntervalTrigger(hours=1), misfire_grace_time=1800)
+def limpar_jobs_pdf_task():
+    """Tarefa periódica para remover jobs de PDF finalizados e seus arquivos"""
+    from pdf_jobs import pdf_render_queue
+
+    count = pdf_render_queue.limpar_jobs_antigos()
+    if count > 0:
+        logger.info(f"🧹 [SCHEDULER] {count} jobs de PDF antigos removidos")
+    return {'removidos': count}
+
+
+@tarefa('recuperar_jobs_pdf', 'Re-despachar jobs de PDF perdidos', IntervalTrigger(minutes=2),
+        misfire_grace_time=120)
+def recuperar_jobs_pdf_task():
+    """Re-enfileira jobs de PDF parados (worker reiniciado), com limite de tentativas"""
+    from pdf_jobs import pdf_render_queue
+
+    return pdf_render_queue.recuperar_jobs_parados()
+
+
+@tarefa('processar_outbox_email', 'Processar outbox de e-mails', IntervalTrigger(minutes=1), misfire_grace_time=60)
+def processar_outbox_email_task():
+    """Tarefa periódica para enviar e-mails vencidos da outbox (novas tentativas)"""
+    from email_outbox import email_outbox
+
+    count = email_outbox.processar_pendentes()
+    if count > 0:
+        logger.info(f"📧 [SCHEDULER] {count} e-mails da outbox processados")
+    return {'processados': count}
+
+
+@tarefa('limpar_sync_tombstones', 'Limpar tombstones antigos do delta sync',
+        CronTrigger(hour=4, minute=0), misfire_grace_time=6 * 3600)
+def limpar_sync_tombstones_task():
+    """Tarefa diária para apagar tombstones do sync fora da retenção"""
+    from sync_tombstones import limpar_tombstones_antigos
+
+    return {'removidos': limpar_tombstones_antigos()}
+
+
+@tarefa('reconciliar_contadores_dashboard', 'Recalcular os contadores materializados do dashboard',
+        IntervalTrigger(minutes=15), misfire_grace_time=300)
+def reconciliar_contadores_dashboard_task():
+    """Corrige com COUNT o que os listeners não enxergam (UPDATE em massa, SQL direto)"""
+    from dashboard_counters import dashboard_counters
+
+    return dashboard_counters.reconciliar()
+
+
+@tarefa('backup_drive', 'Backup diário dos PDFs no Google Drive',
+        CronTrigger(hour=int(os.environ.get('DRIVE_BACKUP_HOUR') or 2), minute=30),
+        habilitada=bool(os.environ.get('DRIVE_BACKUP_HOUR')), misfire_grace_time=6 * 3600)
+def backup_drive_task():
+    """Backup dos PDFs com o token do Google Drive de cada usuário master conectado"""
+    from app import db
+    from models import (GoogleDriveToken, User, Relatorio, FotoRelatorio,
+                        RelatorioExpress, FotoRelatorioExpress)
+    from google_drive_backup import backup_all_reports_to_drive
+    from pdf_generator_weasy import WeasyPrintReportGenerator
+
+    enviados = 0
+    tokens = GoogleDriveToken.query.join(User, User.id == GoogleDriveToken.user_id) \
+        .filter(User.is_master.is_(True)).all()
+    for stored_token in tokens:
+        resultado = backup_all_reports_to_drive(
+            token_info={
+                'token': stored_token.get_access_token(),
+                'refresh_token': stored_token.get_refresh_token()
+            },
+            db_session=db.session,
+            Relatorio=Relatorio,
+            FotoRelatorio=FotoRelatorio,
+            RelatorioExpress=RelatorioExpress,
+            FotoRelatorioExpress=FotoRelatorioExpress,
+            WeasyPrintReportGenerator=WeasyPrintReportGenerator
+        )
+        resultados = resultado.get('results', {})
+        enviados += sum(resultados.get(tipo, {}).get('success', 0) for tipo in ('relatorios', 'express'))
+    return {'contas': len(tokens), 'enviados': enviados}
+
+
+def _criar_scheduler():
+    """BackgroundScheduler com job store persistente no Postgres"""
+    from app import db
+
+    jobstores = {}
+    if db.engine.dialect.name == 'postgresql':
+        from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+        jobstores['default'] = SQLAlchemyJobStore(engine=db.engine, tablename='apscheduler_jobs')
+    fuso = os.environ.get('SCHEDULER_TIMEZONE') or os.environ.get('TZ') or 'America/Sao_Paulo'
+    return BackgroundScheduler(jobstores=jobstores, job_defaults=JOB_DEFAULTS, timezone=fuso)
+
+
+def _sincronizar_jobs(sched):
+    """Alinha o job store ao registro sem perder o próximo horário dos jobs existentes"""
+    registrados = set(TAREFAS)
+    for job in sched.get_jobs():
+        if job.id not in registrados:
+            logger.info(f"🗑️ [SCHEDULER] Removendo job órfão '{job.id}'")
+            job.remove()
+
+    for registrada in TAREFAS.values():
+        job = sched.get_job(registrada.id)
+        if job is None:
+            sched.add_job(executar_tarefa, trigger=registrada.trigger, args=[registrada.id],
+                          id=registrada.id, name=registrada.nome, **registrada.opcoes)
+            continue
+        job.modify(name=registrada.nome, func=executar_tarefa, args=[registrada.id],
+                   **{**JOB_DEFAULTS, **registrada.opcoes})
+        if str(job.trigger) != str(registrada.trigger):
+            job.reschedule(trigger=registrada.trigger)
 
 
 def init_scheduler(app):
-    """Inicializar scheduler com as tarefas agendadas"""
+    """Inicializar scheduler com as tarefas agendadas (chamar só no processo líder)"""
+    global scheduler, _app
     try:
         # Armazenar referência do app para uso nas tarefas
-        scheduler.app = app
-        
-        # Tarefa 1: Limpar notificações expiradas a cada 6 horas
-        scheduler.add_job(
-            func=limpar_notificacoes_expiradas_task,
-            trigger=IntervalTrigger(hours=6),
-            id='limpar_notificacoes_expiradas',
-            name='Limpar notificações expiradas (>24h)',
-            replace_existing=True
-        )
-        
-        # Tarefa 2: Limpeza diária às 3h da manhã (horário de baixo uso)
-        scheduler.add_job(
-            func=limpar_notificacoes_expiradas_task,
-            trigger=CronTrigger(hour=3, minute=0),
-            id='limpeza_diaria_3am',
-            name='Limpeza diária às 3h',
-            replace_existing=True
-        )
-        
-        # Iniciar scheduler
-        scheduler.start()
-        
+        _app = app
+
+        with app.app_context():
+            novo = _criar_scheduler()
+            # Pausado até o job store estar alinhado ao registro
+            novo.start(paused=True)
+            _sincronizar_jobs(novo)
+            novo.resume()
+        scheduler = novo
+
         logger.info("✅ Scheduler iniciado com sucesso")
         logger.info("📅 Tarefas agendadas:")
-        logger.info("   - Limpeza de notificações a cada 6 horas")
-        logger.info("   - Limpeza diária às 3h da manhã")
-        
+        for registrada in TAREFAS.values():
+            logger.info(f"   - {registrada.nome} ({registrada.trigger})")
+
         return scheduler
-        
+
     except Exception as e:
         logger.error(f"❌ Erro ao inicializar scheduler: {e}")
         return None
 
+
 def shutdown_scheduler():
     """Desligar scheduler de forma segura"""
     try:
-        if scheduler.running:
+        if scheduler is not None and scheduler.running:
             scheduler.shutdown(wait=False)
             logger.info("🛑 Scheduler desligado")
     except Exception as e:
         logger.error(f"❌ Erro ao desligar scheduler: {e}")
+
+
+def _candidatar(app, intervalo):
+    """Laço de eleição: sobe o scheduler ao virar líder e o desliga se perder o lock"""
+    while True:
+        try:
+            with app.app_context():
+                e_lider = lider.e_lider()
+            if e_lider and (scheduler is None or not scheduler.running):
+                init_scheduler(app)
+            elif not e_lider and scheduler is not None and scheduler.running:
+                logger.warning("⚠️ [SCHEDULER] Liderança perdida; desligando scheduler local")
+                shutdown_scheduler()
+        except Exception as e:
+            logger.error(f"❌ [SCHEDULER] Erro na eleição de líder: {e}")
+        time.sleep(intervalo)
+
+
+_candidatura = None
+
+
+def iniciar_no_servidor(app):
+    """Chamado pelos pontos de entrada do servidor web (gunicorn, app.run)"""
+    global _candidatura
+    modo = os.environ.get('SCHEDULER_MODE', 'leader').lower()
+    if modo != 'leader':
+        logger.info(f"📅 Scheduler não iniciado neste processo (SCHEDULER_MODE={modo})")
+        return
+    if _candidatura is not None and _candidatura.is_alive():
+        return
+
+    intervalo = int(os.environ.get('SCHEDULER_ELECTION_INTERVAL', '30'))
+    _candidatura = threading.Thread(target=_candidatar, args=(app, intervalo),
+                                    name='scheduler-leader-election', daemon=True)
+    _candidatura.start()
+
+
+def executar_dedicado(app):
+    """Processo dedicado (scheduler_main.py): disputa a liderança e bloqueia"""
+    intervalo = int(os.environ.get('SCHEDULER_ELECTION_INTERVAL', '30'))
+    logger.info("📅 Scheduler dedicado iniciado")
+    try:
+        _candidatar(app, intervalo)
+    except (KeyboardInterrupt, SystemExit):
+        shutdown_scheduler()
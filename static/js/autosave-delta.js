@@ -0,0 +1,136 @@
+/**
+ * AutoSave Delta - Protocolo Incremental com Versão
+ * Mantém o último estado confirmado pelo servidor e monta payloads apenas
+ * com os campos alterados, mais a versão conhecida (concorrência otimista).
+ *
+ * Uso:
+ *   const delta = new AutoSaveDelta();
+ *   const patch = delta.buildPatch(payloadCompleto);   // null = nada a enviar
+ *   ... POST patch ...
+ *   if (response.status === 409) delta.markConflict(await response.json());
+ *   else delta.acknowledge(patch, await response.json());
+ */
+
+class AutoSaveDelta {
+    constructor(options = {}) {
+        // Campos que sempre acompanham o patch (identificação do relatório)
+        this.keyFields = options.keyFields || ['id'];
+        this.photoField = options.photoField || 'fotos';
+
+        this.version = options.version ?? null;
+        this.snapshot = null;     // Último estado confirmado {campo: JSON}
+        this.photos = new Map();  // chave (id / temp_id) -> JSON da foto confirmada
+        this.conflict = null;
+    }
+
+    static photoKey(foto) {
+        if (foto.id) return `id:${foto.id}`;
+        if (foto.temp_id) return `tmp:${foto.temp_id}`;
+        return null;
+    }
+
+    /**
+     * Monta o patch a partir do payload completo.
+     * Sem snapshot (primeiro salvamento / relatório novo) envia tudo.
+     */
+    buildPatch(full) {
+        if (this.conflict) {
+            console.warn('⛔ AutoSave: conflito de versão pendente - salvamento suspenso');
+            return null;
+        }
+
+        if (!this.snapshot || !full.id) {
+            return this.withVersion({ ...full });
+        }
+
+        const patch = {};
+        let changed = false;
+
+        Object.keys(full).forEach(campo => {
+            if (campo === this.photoField || this.keyFields.includes(campo)) return;
+            if (JSON.stringify(full[campo]) !== this.snapshot[campo]) {
+                patch[campo] = full[campo];
+                changed = true;
+            }
+        });
+
+        const fotos = (full[this.photoField] || []).filter(foto => {
+            const key = AutoSaveDelta.photoKey(foto);
+            return !key || this.photos.get(key) !== JSON.stringify(foto);
+        });
+        if (fotos.length > 0) {
+            patch[this.photoField] = fotos;
+            changed = true;
+        }
+
+        if (!changed) return null;
+
+        this.keyFields.forEach(campo => {
+            if (full[campo] !== undefined) patch[campo] = full[campo];
+        });
+        return this.withVersion(patch);
+    }
+
+    withVersion(patch) {
+        if (this.version !== null) patch.version = this.version;
+        return patch;
+    }
+
+    /**
+     * Registra o que o servidor confirmou: campos enviados, nova versão e
+     * o mapeamento temp_id -> id das imagens.
+     */
+    acknowledge(sent, result = {}) {
+        this.snapshot = this.snapshot || {};
+        Object.keys(sent).forEach(campo => {
+            if (campo === this.photoField || campo === 'version') return;
+            this.snapshot[campo] = JSON.stringify(sent[campo]);
+        });
+
+        const salvas = new Map();
+        (result.imagens || []).forEach(img => {
+            if (img.temp_id) salvas.set(img.temp_id, img.id);
+        });
+
+        (sent[this.photoField] || []).forEach(foto => {
+            if (foto.deletar) {
+                this.photos.delete(AutoSaveDelta.photoKey(foto));
+                return;
+            }
+            // Foto nova: na próxima coleta ela aparece com o id definitivo
+            const confirmada = foto.temp_id && salvas.has(foto.temp_id)
+                ? { ...foto, id: salvas.get(foto.temp_id), temp_id: undefined }
+                : foto;
+            const key = AutoSaveDelta.photoKey(confirmada);
+            if (key) this.photos.set(key, JSON.stringify(foto));
+        });
+
+        const version = result.version ?? result.relatorio?.version;
+        if (version !== undefined && version !== null) {
+            this.version = version;
+        }
+    }
+
+    /** Estado carregado do servidor (edição de relatório existente) */
+    setVersion(version) {
+        if (version !== undefined && version !== null && version !== '') {
+            this.version = parseInt(version, 10);
+        }
+    }
+
+    markConflict(result = {}) {
+        this.conflict = result;
+        console.warn('⚠️ AutoSave: relatório alterado em outro dispositivo', result);
+        document.dispatchEvent(new CustomEvent('autosave:conflict', { detail: result }));
+    }
+
+    /** Descarta o estado local confirmado - o próximo salvamento envia tudo */
+    reset(version = null) {
+        this.snapshot = null;
+        this.photos.clear();
+        this.conflict = null;
+        this.version = version;
+    }
+}
+
+window.AutoSaveDelta = AutoSaveDelta;
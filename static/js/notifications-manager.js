@@ -10,6 +10,8 @@ class NotificationsManager {
         this.unreadCountSpan = null;
         this.markAllReadBtn = null;
         this.refreshInterval = null;
+        this.eventSource = null;
+        this.naoLidas = 0;
         this.offcanvasInstance = null;
         
         this.init();
@@ -54,11 +56,8 @@ class NotificationsManager {
                 });
             }
             
-            this.carregarNotificacoes();
-            
-            this.refreshInterval = setInterval(() => {
-                this.carregarNotificacoes(true);
-            }, 30000);
+            // Carga inicial e, depois, atualizações em tempo real via SSE
+            this.carregarNotificacoes().then(() => this.conectarStream());
             
             console.log('✅ Notifications Manager inicializado');
         });
@@ -99,7 +98,62 @@ class NotificationsManager {
         }
     }
     
+    conectarStream() {
+        if (typeof EventSource === 'undefined') {
+            this.iniciarPolling();
+            return;
+        }
+        
+        const ultimoId = this.notificacoes.reduce((max, n) => Math.max(max, n.id), 0);
+        this.eventSource = new EventSource(`/api/notificacoes/stream?ultimo_id=${ultimoId}`);
+        
+        this.eventSource.addEventListener('nova', (e) => {
+            const notif = JSON.parse(e.data);
+            if (this.notificacoes.some(n => n.id === notif.id)) return;
+            
+            this.notificacoes.unshift(notif);
+            if (notif.status === 'nova') {
+                this.atualizarContador(this.naoLidas + 1);
+            }
+            this.renderizarNotificacoes();
+        });
+        
+        this.eventSource.addEventListener('lida', (e) => {
+            const dados = JSON.parse(e.data);
+            let lidas = 0;
+            this.notificacoes.forEach(n => {
+                if (n.status === 'nova' && (dados.todas || dados.ids.includes(n.id))) {
+                    n.status = 'lida';
+                    lidas++;
+                }
+            });
+            this.atualizarContador(dados.todas ? 0 : Math.max(0, this.naoLidas - lidas));
+            this.renderizarNotificacoes();
+        });
+        
+        this.eventSource.addEventListener('contador', (e) => {
+            this.atualizarContador(JSON.parse(e.data).nao_lidas);
+        });
+        
+        this.eventSource.addEventListener('error', () => {
+            // CLOSED = servidor recusou o stream (ex.: sessão expirada); volta ao polling
+            if (this.eventSource.readyState === EventSource.CLOSED) {
+                console.warn('⚠️ Stream de notificações indisponível, usando polling');
+                this.eventSource = null;
+                this.iniciarPolling();
+            }
+        });
+    }
+    
+    iniciarPolling() {
+        if (this.refreshInterval) return;
+        this.refreshInterval = setInterval(() => {
+            this.carregarNotificacoes(true);
+        }, 30000);
+    }
+    
     atualizarContador(count) {
+        this.naoLidas = count;
         const displayCount = count > 99 ? '99+' : count;
         
         // Atualizar badge desktop
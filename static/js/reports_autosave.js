@@ -13,6 +13,9 @@ class ReportsAutoSave {
         this.debounceTimer = null;
         this.isConnected = navigator.onLine;
 
+        // Envia apenas os campos alterados + versão (static/js/autosave-delta.js)
+        this.delta = window.AutoSaveDelta ? new AutoSaveDelta({ keyFields: ['id', 'projeto_id'] }) : null;
+
         console.log('🕒 AutoSave: Iniciando sistema de autosave silencioso');
 
         // Verificar se há parâmetro edit na URL
@@ -69,6 +72,7 @@ class ReportsAutoSave {
 
                 // Preencher formulário com dados carregados
                 this.populateForm(data.relatorio);
+                this.delta?.setVersion(data.relatorio?.version);
 
                 // Selecionar projeto se disponível
                 if (data.projeto) {
@@ -623,7 +627,14 @@ class ReportsAutoSave {
         this.isSaving = true;
 
         // Coletar dados do formulário de forma assíncrona (aguardar upload de imagens)
-        const payload = await this.collectFormDataAsync();
+        const fullPayload = await this.collectFormDataAsync();
+        const payload = this.delta ? this.delta.buildPatch(fullPayload) : fullPayload;
+
+        if (!payload) {
+            console.log('⏭️ AutoSave: Nenhuma alteração desde o último salvamento');
+            this.isSaving = false;
+            return;
+        }
 
         try {
             console.log('📤 AutoSave: Enviando dados...', payload);
@@ -637,6 +648,12 @@ class ReportsAutoSave {
                 body: JSON.stringify(payload)
             });
 
+            if (response.status === 409) {
+                // Outro dispositivo salvou antes: não sobrescrever nem guardar no localStorage
+                this.delta?.markConflict(await response.json().catch(() => ({})));
+                return;
+            }
+
             if (!response.ok) {
                 const err = await response.json().catch(() => ({}));
                 console.error('❌ AutoSave erro HTTP:', response.status);
@@ -647,6 +664,7 @@ class ReportsAutoSave {
 
             const result = await response.json();
             console.log('✅ AutoSave concluído com sucesso:', result);
+            this.delta?.acknowledge(payload, result);
 
             // Atualizar reportId se foi criado novo relatório
                 if (result.relatorio_id) {
@@ -0,0 +1,73 @@
+"""
+Tombstones do Delta Sync - Exclusões para o App Offline
+Registra em sync_tombstones cada projeto, relatório, visita, foto ou lembrete
+apagado, para que /api/sync/down?since=... avise os aparelhos que ainda têm a
+cópia local.
+
+Funcionamento:
+    - Um listener de sessão (como em pdf_cache.py e recipient_index.py) vê as
+      exclusões de cada flush e grava os tombstones na mesma transação: se a
+      exclusão sofrer rollback, o tombstone também some.
+    - Exclusões em cascata feitas pelo ORM (fotos de um relatório, lembretes
+      de um projeto) passam pelo flush e também geram tombstone.
+    - Tombstones antigos são apagados pela tarefa agendada
+      'limpar_sync_tombstones'; aparelhos com cursor mais velho que a retenção
+      recebem uma sincronização completa.
+
+Configuração (variáveis de ambiente):
+    SYNC_TOMBSTONE_RETENTION_DAYS = dias que um tombstone fica guardado (padrão: 90)
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+_listeners_installed = False
+
+
+def retencao():
+    return timedelta(days=int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', '90')))
+
+
+def entidades_rastreadas():
+    """Modelo -> nome da entidade usado no payload de /api/sync/down"""
+    from models import Projeto, Relatorio, Visita, FotoRelatorio, Lembrete
+    return {Projeto: 'projetos', Relatorio: 'relatorios', Visita: 'visitas',
+            FotoRelatorio: 'fotos', Lembrete: 'lembretes'}
+
+
+def install_tombstone_listeners():
+    """Grava um tombstone para cada entidade sincronizada que for apagada"""
+    global _listeners_installed
+    if _listeners_installed:
+        return
+    _listeners_installed = True
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from models import SyncTombstone
+
+    rastreadas = entidades_rastreadas()
+
+    @event.listens_for(Session, 'after_flush')
+    def _registrar_exclusoes(session, flush_context):
+        agora = datetime.utcnow()
+        linhas = [{'entidade': rastreadas[type(obj)], 'entidade_id': obj.id, 'removido_em': agora}
+                  for obj in session.deleted if type(obj) in rastreadas and obj.id is not None]
+        if linhas:
+            session.connection().execute(SyncTombstone.__table__.insert(), linhas)
+
+
+def limpar_tombstones_antigos():
+    """Apaga tombstones mais velhos que a retenção; retorna quantos saíram"""
+    from app import db
+    from models import SyncTombstone
+
+    limite = datetime.utcnow() - retencao()
+    removidos = SyncTombstone.query.filter(SyncTombstone.removido_em < limite).delete(synchronize_session=False)
+    db.session.commit()
+    if removidos:
+        logger.info(f"🧹 Sync: {removidos} tombstones anteriores a {limite:%Y-%m-%d} removidos")
+    return removidos
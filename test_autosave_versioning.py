@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Teste: concorrência otimista do autosave (autosave_version)
+
+Dois dispositivos que partem da mesma versão não podem ambos gravar:
+o segundo recebe None de claim_autosave_version() e a rota de autosave
+responde 409 com a versão e os valores do servidor.
+
+Uso:
+    python -m pytest test_autosave_versioning.py
+"""
+
+import pytest
+
+import routes  # noqa: F401  (registra as rotas)
+import routes_relatorios_api  # noqa: F401
+from app import app, db
+from models import Projeto, Relatorio, User
+from autosave_versioning import parse_version, claim_autosave_version, conflict_response
+
+
+@pytest.fixture
+def relatorio_id(tabelas):
+    with app.app_context():
+        tabelas(User, Projeto, Relatorio)
+        user = User(username='autosave', email='autosave@example.com', nome_completo='Autosave',
+                    password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        relatorio = Relatorio(numero='REL-0001', titulo='Teste', projeto_id=1, autor_id=user.id)
+        db.session.add(relatorio)
+        db.session.commit()
+        yield relatorio.id
+        db.session.rollback()
+
+
+def test_parse_version():
+    assert parse_version({'version': 3}) == 3
+    assert parse_version({'version': '7'}) == 7
+    assert parse_version({'version': ''}) is None
+    assert parse_version({'version': 'abc'}) is None
+    assert parse_version({}) is None
+
+
+def test_claim_incrementa_versao(relatorio_id):
+    relatorio = db.session.get(Relatorio, relatorio_id)
+    assert relatorio.autosave_version == 0
+
+    assert claim_autosave_version(relatorio, 0) == 1
+    assert relatorio.autosave_version == 1
+    db.session.commit()
+
+
+def test_versao_antiga_gera_conflito(relatorio_id):
+    relatorio = db.session.get(Relatorio, relatorio_id)
+    assert claim_autosave_version(relatorio, 0) == 1
+    db.session.commit()
+
+    # Segundo dispositivo ainda conhece a versão 0
+    assert claim_autosave_version(relatorio, 0) is None
+
+    with app.test_request_context():
+        response, status = conflict_response(relatorio, {'version': 0, 'titulo': 'Outro'}, ['titulo'])
+    assert status == 409
+    body = response.get_json()
+    assert body['conflict'] is True
+    assert body['version'] == 1
+    assert body['server'] == {'titulo': 'Teste'}
+
+
+def test_cliente_sem_versao_nao_verifica(relatorio_id):
+    relatorio = db.session.get(Relatorio, relatorio_id)
+    assert claim_autosave_version(relatorio, None) == 1
+    assert claim_autosave_version(relatorio, None) == 2
+    db.session.commit()
+
+
+def test_rota_autosave_responde_409(relatorio_id):
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(db.session.get(Relatorio, relatorio_id).autor_id)
+        sess['_fresh'] = True
+
+    primeiro = client.post(f'/reports/autosave/{relatorio_id}', json={'version': 0, 'titulo': 'Celular'})
+    assert primeiro.status_code == 200
+    assert primeiro.get_json()['version'] == 1
+
+    segundo = client.post(f'/reports/autosave/{relatorio_id}', json={'version': 0, 'titulo': 'Notebook'})
+    assert segundo.status_code == 409
+    body = segundo.get_json()
+    assert body['conflict'] is True and body['version'] == 1
+    assert body['server']['titulo'] == 'Celular'
+    db.session.expire_all()
+    assert db.session.get(Relatorio, relatorio_id).titulo == 'Celular'
+
+
+def test_put_com_status_desconhecido_responde_400(relatorio_id):
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(db.session.get(Relatorio, relatorio_id).autor_id)
+        sess['_fresh'] = True
+
+    resposta = client.put(f'/api/relatorios/{relatorio_id}', json={'titulo': 'Outro', 'status': 'Arquivado'})
+    assert resposta.status_code == 400
+    assert 'Aprovado' in resposta.get_json()['status_permitidos']
+    db.session.expire_all()
+    assert db.session.get(Relatorio, relatorio_id).titulo == 'Teste'
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Teste: contadores materializados do dashboard (dashboard_counters.py)
+
+A primeira leitura semeia a tabela com COUNT; depois, criar, mudar o status e
+apagar ajustam os contadores após o commit, rollback não deixa rastro, um
+status não carregado ainda gera o delta (active_history) e a reconciliação
+corrige o que foi alterado por fora do ORM.
+
+Uso:
+    python -m pytest test_dashboard_counters.py
+"""
+
+import pytest
+
+from app import app, db
+from models import (DashboardCounter, FotoRelatorio, LogEnvioEmail, Notificacao, Projeto, Relatorio, SyncTombstone,
+                    User, Visita)
+from dashboard_counters import dashboard_counters, install_counter_listeners
+from report_status import AGUARDANDO_APROVACAO, APROVADO, RASCUNHO
+
+install_counter_listeners()
+
+
+@pytest.fixture
+def projeto(tabelas):
+    with app.app_context():
+        # Apagar um Relatorio carrega fotos, logs de envio e notificações e grava o tombstone do sync
+        tabelas(User, Projeto, Visita, Relatorio, FotoRelatorio, LogEnvioEmail, Notificacao, SyncTombstone,
+                DashboardCounter)
+        user = User(username='painel', email='painel@example.com', nome_completo='Eng. Painel',
+                    password_hash='x', ativo=True)
+        db.session.add(user)
+        db.session.flush()
+        projeto = Projeto(numero='OB-7', nome='Obra Painel', tipo_obra='Residencial', construtora='C',
+                          nome_funcionario='F', responsavel_id=user.id, email_principal='obra@example.com',
+                          status='Ativo')
+        db.session.add(projeto)
+        db.session.commit()
+        yield projeto
+        db.session.rollback()
+
+
+def test_primeira_leitura_semeia(projeto):
+    valores = dashboard_counters.valores()
+    assert valores['projetos_ativos'] == 1
+    assert valores['usuarios_ativos'] == 1
+    assert valores['relatorios_pendentes'] == 0
+
+
+def test_deltas_por_evento(projeto):
+    dashboard_counters.valores()
+    relatorio = Relatorio(numero='R1', projeto_id=projeto.id, autor_id=projeto.responsavel_id, status=RASCUNHO)
+    db.session.add(relatorio)
+    db.session.commit()
+    assert dashboard_counters.valores()['relatorios_pendentes'] == 1
+    assert dashboard_counters.valores()['relatorios_aguardando_aprovacao'] == 0
+
+    relatorio.status = AGUARDANDO_APROVACAO
+    db.session.commit()
+    valores = dashboard_counters.valores()
+    assert valores['relatorios_pendentes'] == 1
+    assert valores['relatorios_aguardando_aprovacao'] == 1
+
+    relatorio.status = APROVADO
+    projeto.status = 'Concluído'
+    db.session.commit()
+    valores = dashboard_counters.valores()
+    assert valores['relatorios_pendentes'] == 0
+    assert valores['relatorios_aguardando_aprovacao'] == 0
+    assert valores['projetos_ativos'] == 0
+
+
+def test_apagar_e_rollback(projeto):
+    dashboard_counters.valores()
+    relatorio = Relatorio(numero='R2', projeto_id=projeto.id, autor_id=projeto.responsavel_id, status=RASCUNHO)
+    db.session.add(relatorio)
+    db.session.commit()
+
+    db.session.delete(relatorio)
+    db.session.flush()
+    db.session.rollback()
+    assert dashboard_counters.valores()['relatorios_pendentes'] == 1
+
+    db.session.delete(db.session.get(Relatorio, relatorio.id))
+    db.session.commit()
+    assert dashboard_counters.valores()['relatorios_pendentes'] == 0
+
+
+def test_status_expirado_gera_delta(projeto):
+    dashboard_counters.valores()
+    # Depois do commit os atributos expiram: o valor antigo é carregado na atribuição
+    db.session.expire(projeto)
+    projeto.status = 'Pausado'
+    db.session.commit()
+    assert dashboard_counters.valores()['projetos_ativos'] == 0
+
+
+def test_reconciliacao_corrige_update_em_massa(projeto):
+    dashboard_counters.valores()
+    # UPDATE em massa não passa pelos listeners
+    Projeto.query.update({'status': 'Pausado'}, synchronize_session=False)
+    db.session.commit()
+    assert dashboard_counters.valores()['projetos_ativos'] == 1
+    assert dashboard_counters.reconciliar()['projetos_ativos'] == 0
+    assert dashboard_counters.valores()['projetos_ativos'] == 0
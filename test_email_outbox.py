@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Teste: outbox de e-mails (email_outbox.py)
+
+Falhas transitórias do Resend voltam para a fila com backoff; falhas
+definitivas não são repetidas; a mesma aprovação não gera e-mail duplicado;
+mensagens sem anexo saem numa única chamada ao endpoint de lote; lotes com o
+mesmo anexo saem por uma única conexão SMTP; o anexo é copiado para o store
+da outbox e apagado quando o envio termina; uma mensagem que derruba o worker
+em todas as tentativas (lease expirado) vai para 'falhou'.
+
+Uso:
+    python -m pytest test_email_outbox.py
+"""
+
+import os
+import tempfile
+
+os.environ.setdefault('EMAIL_OUTBOX_ATTACHMENTS_PATH', tempfile.mkdtemp(prefix='outbox_anexos_test_'))
+
+import pytest
+
+import email_outbox as outbox_module
+from app import app, db
+from models import EmailOutbox
+from email_outbox import EmailOutboxWorker, chave_idempotencia, get_attachment_store
+
+
+class _Resposta:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self._body = body or {}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+
+@pytest.fixture
+def worker(tabelas):
+    with app.app_context():
+        tabelas(EmailOutbox)
+        yield EmailOutboxWorker(concurrency=1, max_attempts=2, backoff=30)
+        db.session.rollback()
+
+
+@pytest.fixture
+def anexo():
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.write(fd, b'%PDF-1.4 teste')
+    os.close(fd)
+    yield path
+    os.unlink(path)
+
+
+def _mensagem(anexo=None, destinatario='cliente@example.com'):
+    return {
+        'destinatario': destinatario,
+        'nome_destinatario': 'Cliente',
+        'assunto': 'Relatório de visita',
+        'corpo_html': '<p>Segue o relatório</p>',
+        'anexo_path': anexo,
+        'anexo_nome': 'relatorio.pdf',
+    }
+
+
+def _responder(monkeypatch, *respostas):
+    fila = list(respostas)
+    chamadas = []
+
+    def post(sessao, url, json=None, headers=None, timeout=None):
+        chamadas.append((url, headers['Idempotency-Key']))
+        return fila.pop(0)
+
+    monkeypatch.setattr(outbox_module.requests.Session, 'post', post)
+    monkeypatch.setattr(EmailOutboxWorker, 'wake', lambda self, app: None)
+    return chamadas
+
+
+def test_chave_idempotencia_estavel():
+    a = chave_idempotencia('express', 1, '2026-10-17T09:00:00', 'Cliente@Example.com ')
+    b = chave_idempotencia('express', 1, '2026-10-17T09:00:00', 'cliente@example.com')
+    assert a == b
+    assert a != chave_idempotencia('express', 1, '2026-10-18T09:00:00', 'cliente@example.com')
+
+
+def test_mesma_aprovacao_nao_duplica(worker, anexo, monkeypatch):
+    _responder(monkeypatch)
+    assert worker.enqueue([_mensagem(anexo)], 'express', 1, referencia='r1') == 1
+    assert worker.enqueue([_mensagem(anexo)], 'express', 1, referencia='r1') == 0
+    assert EmailOutbox.query.count() == 1
+
+
+def test_falha_transitoria_tenta_de_novo(worker, anexo, monkeypatch):
+    chamadas = _responder(monkeypatch, _Resposta(503), _Resposta(200, {'id': 'abc'}))
+    worker.enqueue([_mensagem(anexo)], 'express', 1, referencia='r1')
+
+    assert worker.processar_pendentes() == 1
+    msg = EmailOutbox.query.one()
+    assert msg.status == 'pendente'
+    assert msg.tentativas == 1
+    assert 'HTTP 503' in msg.ultimo_erro
+
+    # Antes do backoff vencer nada é reenviado
+    assert worker.processar_pendentes() == 0
+
+    msg.proxima_tentativa_em = msg.created_at
+    db.session.commit()
+    assert worker.processar_pendentes() == 1
+    msg = EmailOutbox.query.one()
+    assert msg.status == 'enviado'
+    assert msg.provider_id == 'abc'
+    assert chamadas[0][1] == chamadas[1][1] == msg.idempotency_key
+
+
+def test_falha_definitiva_nao_repete(worker, anexo, monkeypatch):
+    _responder(monkeypatch, _Resposta(422, {'message': 'invalid to'}))
+    worker.enqueue([_mensagem(anexo)], 'express', 1, referencia='r1')
+
+    worker.processar_pendentes()
+    msg = EmailOutbox.query.one()
+    assert msg.status == 'falhou'
+    assert msg.tentativas == 1
+
+
+def test_lote_sem_anexo_uma_chamada(worker, monkeypatch):
+    chamadas = _responder(monkeypatch, _Resposta(200, {'data': [{'id': f'id{i}'} for i in range(3)]}))
+    mensagens = [_mensagem(destinatario=f'pessoa{i}@example.com') for i in range(3)]
+    worker.enqueue(mensagens, 'express', 1, referencia='r1')
+
+    assert worker.processar_pendentes() == 3
+    assert len(chamadas) == 1
+    assert chamadas[0][0].endswith('/emails/batch')
+    assert {m.status for m in EmailOutbox.query.all()} == {'enviado'}
+
+
+def test_lote_rejeitado_cai_para_envio_individual(worker, monkeypatch):
+    chamadas = _responder(monkeypatch,
+                          _Resposta(422, {'message': 'invalid to'}),
+                          _Resposta(200, {'id': 'ok'}),
+                          _Resposta(422, {'message': 'invalid to'}))
+    mensagens = [_mensagem(destinatario='bom@example.com'), _mensagem(destinatario='ruim@example')]
+    worker.enqueue(mensagens, 'express', 1, referencia='r1')
+
+    worker.processar_pendentes()
+    assert len(chamadas) == 3
+    status = {m.destinatario: m.status for m in EmailOutbox.query.all()}
+    assert status == {'bom@example.com': 'enviado', 'ruim@example': 'falhou'}
+
+
+def test_anexo_copiado_para_o_store(worker, anexo, monkeypatch):
+    enviados = []
+
+    def post(sessao, url, json=None, headers=None, timeout=None):
+        enviados.append(json['attachments'][0]['content'])
+        return _Resposta(200, {'id': 'ok'})
+
+    monkeypatch.setattr(outbox_module.requests.Session, 'post', post)
+    monkeypatch.setattr(EmailOutboxWorker, 'wake', lambda self, app: None)
+    worker.enqueue([_mensagem(anexo)], 'express', 1, referencia='r1')
+
+    # O arquivo original (ex.: resultado de um job de PDF) pode sumir antes do envio
+    os.unlink(anexo)
+    open(anexo, 'wb').close()
+    msg = EmailOutbox.query.one()
+    assert msg.anexo_path is None
+    assert get_attachment_store().exists(msg.anexo_hash)
+
+    worker.processar_pendentes()
+    assert EmailOutbox.query.one().status == 'enviado'
+    assert enviados and enviados[0]
+    assert not get_attachment_store().exists(msg.anexo_hash)
+
+
+def test_lote_com_anexo_uma_conexao_smtp(worker, anexo, monkeypatch):
+    conexoes = []
+
+    class _SMTP:
+        def __init__(self, host, port, timeout=None):
+            self.enviadas = []
+            conexoes.append(self)
+
+        def login(self, usuario, senha):
+            pass
+
+        def send_message(self, mime):
+            self.enviadas.append(mime['To'])
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+    chamadas = _responder(monkeypatch)
+    monkeypatch.setattr(outbox_module.smtplib, 'SMTP_SSL', _SMTP)
+    mensagens = [_mensagem(anexo, destinatario=f'pessoa{i}@example.com') for i in range(3)]
+    worker.enqueue(mensagens, 'express', 1, referencia='r1')
+
+    assert worker.processar_pendentes() == 3
+    assert not chamadas
+    assert len(conexoes) == 1
+    assert sorted(conexoes[0].enviadas) == [f'pessoa{i}@example.com' for i in range(3)]
+    assert {m.status for m in EmailOutbox.query.all()} == {'enviado'}
+
+
+def test_lease_expirado_sem_tentativas_vira_falhou(worker, anexo, monkeypatch):
+    chamadas = _responder(monkeypatch, _Resposta(200, {'id': 'abc'}))
+    worker.enqueue([_mensagem(anexo, 'trava@example.com'), _mensagem(destinatario='volta@example.com')],
+                   'express', 1, referencia='r1')
+    # Dois workers morreram no meio do envio: as linhas ficaram 'enviando' com o lease vencido
+    trava = EmailOutbox.query.filter_by(destinatario='trava@example.com').one()
+    volta = EmailOutbox.query.filter_by(destinatario='volta@example.com').one()
+    trava.status, trava.tentativas = 'enviando', trava.max_tentativas
+    volta.status, volta.tentativas = 'enviando', trava.max_tentativas - 1
+    trava.bloqueado_ate = volta.bloqueado_ate = trava.created_at
+    db.session.commit()
+    anexo_hash = trava.anexo_hash
+
+    assert worker.processar_pendentes() == 1
+    db.session.expire_all()
+    assert (trava.status, trava.tentativas) == ('falhou', trava.max_tentativas)
+    assert 'interrompido' in trava.ultimo_erro
+    assert volta.status == 'enviado'
+    assert len(chamadas) == 1
+    assert not get_attachment_store().exists(anexo_hash)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Teste: limpeza de notificações expiradas (NotificationService.limpar_notificacoes_expiradas)
+
+Apaga em lotes de no máximo `lote` linhas até não sobrar nada expirado e não
+toca nas que ainda valem nem nas que não expiram.
+
+Uso:
+    python -m pytest test_limpeza_notificacoes.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import app, db
+from models import Notificacao, User
+from notification_service import notification_service
+
+
+@pytest.fixture
+def usuario(tabelas):
+    with app.app_context():
+        tabelas(User, Notificacao)
+        user = User(username='limpeza', email='limpeza@example.com', nome_completo='Limpeza', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        yield user.id
+        db.session.rollback()
+
+
+def test_remove_em_lotes_so_expiradas(usuario):
+    agora = datetime.utcnow()
+    for i in range(7):
+        db.session.add(Notificacao(user_id=usuario, tipo='obra_criada', titulo=f'V{i}', mensagem='m',
+                                   expires_at=agora - timedelta(hours=1)))
+    db.session.add(Notificacao(user_id=usuario, tipo='obra_criada', titulo='Valida', mensagem='m',
+                               expires_at=agora + timedelta(minutes=1)))
+    db.session.add(Notificacao(user_id=usuario, tipo='obra_criada', titulo='Sem validade', mensagem='m',
+                               expires_at=None))
+    db.session.commit()
+
+    lotes = []
+
+    def contar_delete(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('DELETE FROM NOTIFICACOES'):
+            lotes.append(cursor.rowcount)
+
+    event.listen(db.engine, 'after_cursor_execute', contar_delete)
+    try:
+        resultado = notification_service.limpar_notificacoes_expiradas(lote=3)
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', contar_delete)
+
+    assert resultado == {'success': True, 'removed_count': 7}
+    # Um DELETE por lote, nenhum com mais de `lote` linhas; o último (incompleto) encerra
+    assert lotes == [3, 3, 1]
+    assert sorted(n.titulo for n in Notificacao.query.all()) == ['Sem validade', 'Valida']
+
+
+def test_nada_expirado_um_unico_delete(usuario):
+    db.session.add(Notificacao(user_id=usuario, tipo='obra_criada', titulo='Valida', mensagem='m',
+                               expires_at=datetime.utcnow() + timedelta(hours=1)))
+    db.session.commit()
+
+    assert notification_service.limpar_notificacoes_expiradas(lote=3) == {'success': True, 'removed_count': 0}
+    assert Notificacao.query.count() == 1
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Teste: listagem de notificações (/api/notificacoes)
+
+Pendências de relatórios já processados ficam fora da lista (filtro em SQL
+pelo relatorio_express_id), o contador de não lidas vem na mesma consulta e
+a paginação por cursor percorre tudo sem repetir. 'nao_lida' (padrão da
+coluna) conta como não lida, e o stream SSE envia o mesmo contador.
+
+Uso:
+    python -m pytest test_notificacoes_listagem.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import routes  # noqa: F401  (registra as rotas)
+from app import app, db
+from models import Notificacao, Projeto, Relatorio, RelatorioExpress, User
+
+
+@pytest.fixture
+def cliente(tabelas):
+    app.config['WTF_CSRF_ENABLED'] = False
+    with app.app_context():
+        tabelas(User, Projeto, Relatorio, RelatorioExpress, Notificacao)
+        user = User(username='sino', email='sino@example.com', nome_completo='Sino', password_hash='x')
+        outro = User(username='outro', email='outro@example.com', nome_completo='Outro', password_hash='x')
+        db.session.add_all([user, outro])
+        db.session.flush()
+
+        aguardando = RelatorioExpress(numero='EXP-1', empresa_nome='A', autor_id=outro.id,
+                                      status='Aguardando Aprovação')
+        aprovado = RelatorioExpress(numero='EXP-2', empresa_nome='B', autor_id=outro.id, status='Aprovado')
+        db.session.add_all([aguardando, aprovado])
+        db.session.flush()
+
+        base = datetime.utcnow()
+        for i, (tipo, express_id) in enumerate([
+                ('relatorio_express_pendente', aguardando.id),
+                ('relatorio_express_pendente', aprovado.id),
+                ('obra_criada', None),
+                ('obra_criada', None)]):
+            db.session.add(Notificacao(user_id=user.id, tipo=tipo, titulo=f'N{i}', mensagem='m',
+                                       relatorio_express_id=express_id, status='nova',
+                                       created_at=base - timedelta(minutes=i)))
+        db.session.add(Notificacao(user_id=outro.id, tipo='obra_criada', titulo='Outro', mensagem='m',
+                                   status='nova'))
+        db.session.commit()
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+        yield client
+        db.session.rollback()
+
+
+def test_oculta_pendencia_processada(cliente):
+    data = cliente.get('/api/notificacoes').get_json()
+    assert data['success']
+    assert [n['titulo'] for n in data['notificacoes']] == ['N0', 'N2', 'N3']
+    assert data['nao_lidas'] == 3
+    assert data['proximo_cursor'] is None
+
+
+def test_paginacao_por_cursor(cliente):
+    primeira = cliente.get('/api/notificacoes?limite=2').get_json()
+    assert [n['titulo'] for n in primeira['notificacoes']] == ['N0', 'N2']
+    assert primeira['nao_lidas'] == 3
+
+    segunda = cliente.get('/api/notificacoes', query_string={
+        'limite': 2, 'cursor': primeira['proximo_cursor']}).get_json()
+    assert [n['titulo'] for n in segunda['notificacoes']] == ['N3']
+    assert segunda['proximo_cursor'] is None
+    assert 'nao_lidas' not in segunda
+
+
+def test_cursor_invalido(cliente):
+    assert cliente.get('/api/notificacoes?cursor=xyz').status_code == 400
+
+
+def test_status_padrao_conta_como_nao_lida(cliente):
+    user = User.query.filter_by(username='sino').one()
+    db.session.add(Notificacao(user_id=user.id, tipo='obra_criada', titulo='Antiga', mensagem='m',
+                               created_at=datetime.utcnow() - timedelta(days=5)))
+    db.session.commit()
+
+    data = cliente.get('/api/notificacoes').get_json()
+    assert 'Antiga' in [n['titulo'] for n in data['notificacoes']]
+    assert data['nao_lidas'] == 4
+
+    resposta = cliente.get('/api/notificacoes/stream?ultimo_id=0', buffered=False)
+    try:
+        eventos = iter(resposta.response)
+        contador = next(e for e in map(bytes.decode, eventos) if 'event: contador' in e)
+    finally:
+        resposta.close()
+    assert '"nao_lidas": 4' in contador
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Teste: stream SSE de notificações (notification_stream.py)
+
+Eventos publicados chegam só aos streams do usuário, no formato SSE, uma
+fila cheia descarta eventos em vez de bloquear quem publica, e acima do
+limite de streams por processo subscribe() recusa o stream.
+
+Uso:
+    python -m pytest test_notification_stream.py
+"""
+
+import json
+import queue
+
+import notification_stream
+from notification_stream import NotificationBroker, formatar_evento
+
+
+def test_formato_sse():
+    msg = formatar_evento('nova', {'id': 7, 'titulo': 'Relatório'}, 7)
+    linhas = msg.split('\n')
+    assert linhas[0] == 'id: 7'
+    assert linhas[1] == 'event: nova'
+    assert json.loads(linhas[2][len('data: '):]) == {'id': 7, 'titulo': 'Relatório'}
+    assert msg.endswith('\n\n')
+
+    assert not formatar_evento('lida', {'todas': True}).startswith('id:')
+
+
+def test_entrega_por_usuario():
+    broker = NotificationBroker(backend='memory')
+    fila_1 = broker.subscribe(1)
+    fila_1_outra_aba = broker.subscribe(1)
+    fila_2 = broker.subscribe(2)
+
+    broker.publish(1, 'lida', {'ids': [3]})
+
+    assert fila_1.get_nowait() == ('lida', {'ids': [3]}, None)
+    assert fila_1_outra_aba.get_nowait() == ('lida', {'ids': [3]}, None)
+    assert fila_2.empty()
+
+
+def test_unsubscribe_e_fila_cheia(monkeypatch):
+    monkeypatch.setattr(notification_stream, 'TAMANHO_FILA', 2)
+    broker = NotificationBroker(backend='memory')
+    fila = broker.subscribe(1)
+
+    for i in range(5):
+        broker.publish(1, 'nova', {'id': i}, i)
+    assert fila.qsize() == 2
+
+    broker.unsubscribe(1, fila)
+    broker.publish(1, 'nova', {'id': 9}, 9)
+    assert [fila.get_nowait()[2] for _ in range(2)] == [0, 1]
+    try:
+        fila.get_nowait()
+        assert False, 'evento entregue depois do unsubscribe'
+    except queue.Empty:
+        pass
+
+
+def test_limite_de_streams():
+    broker = NotificationBroker(backend='memory', max_streams=2)
+    fila_1 = broker.subscribe(1)
+    fila_2 = broker.subscribe(2)
+    assert broker.subscribe(3) is None
+
+    broker.unsubscribe(1, fila_1)
+    broker.unsubscribe(1, fila_1)  # repetido não libera vaga a mais
+    fila_3 = broker.subscribe(3)
+    assert fila_3 is not None
+    assert broker.subscribe(4) is None
+
+    broker.unsubscribe(2, fila_2)
+    broker.unsubscribe(3, fila_3)
+    assert broker.subscribe(5) is not None
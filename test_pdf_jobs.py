@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Teste: recuperação de jobs de PDF perdidos (pdf_jobs.py)
+
+Jobs parados (pendentes sem dono ou processando além do timeout) voltam para
+a fila com o contador de tentativas, sem perder a idade (created_at); acima
+do limite viram 'erro'. Um job já reivindicado não é executado de novo. O PDF
+vai para o store compartilhado, e um job de e-mail de aprovação que falha é
+tentado de novo e, ao desistir, avisa quem aprovou.
+
+Uso:
+    python -m pytest test_pdf_jobs.py
+"""
+
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+os.environ.setdefault('PDF_JOBS_PATH', tempfile.mkdtemp(prefix='pdf_jobs_test_'))
+
+import pytest
+
+from app import app, db
+from models import PdfRenderJob
+from pdf_jobs import PdfRenderQueue, get_result_store, job_result_response
+
+
+@pytest.fixture
+def fila(tabelas, monkeypatch):
+    with app.app_context():
+        tabelas(PdfRenderJob)
+        fila = PdfRenderQueue(processes=1, timeout=60)
+        despachados = []
+        monkeypatch.setattr(fila, '_despachar', despachados.append)
+        fila.despachados = despachados
+        alertas = []
+        monkeypatch.setattr(fila, '_alertar_email_aprovacao', lambda job: alertas.append(job.id))
+        fila.alertas = alertas
+        yield fila
+        db.session.rollback()
+
+
+def _job(job_id, status, idade, tentativas=0, acao='email_aprovacao'):
+    momento = datetime.utcnow() - timedelta(seconds=idade)
+    job = PdfRenderJob(id=job_id, tipo='relatorio', relatorio_id=1, status=status, acao=acao,
+                       tentativas=tentativas, created_at=momento,
+                       started_at=momento if status == 'processando' else None)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_recupera_pendente_e_processando_parados(fila):
+    _job('pendente-velho', 'pendente', idade=fila.stale_seconds + 10)
+    _job('processando-velho', 'processando', idade=fila.timeout + 120)
+    _job('pendente-novo', 'pendente', idade=5)
+
+    assert fila.recuperar_jobs_parados() == {'recuperados': 2, 'desistidos': 0}
+    assert sorted(fila.despachados) == ['pendente-velho', 'processando-velho']
+    job = db.session.get(PdfRenderJob, 'processando-velho')
+    assert (job.status, job.tentativas, job.acao) == ('pendente', 1, 'email_aprovacao')
+    # A idade do job continua visível; o check de parado usa o último despacho
+    assert datetime.utcnow() - job.created_at > timedelta(seconds=fila.timeout)
+    assert not fila._parado(job)
+
+
+def test_desiste_apos_limite(fila):
+    _job('teimoso', 'pendente', idade=fila.stale_seconds + 10, tentativas=fila.max_attempts)
+
+    assert fila.recuperar_jobs_parados() == {'recuperados': 0, 'desistidos': 1}
+    assert fila.despachados == []
+    assert db.session.get(PdfRenderJob, 'teimoso').status == 'erro'
+    assert fila.alertas == ['teimoso']
+
+
+def test_job_reivindicado_nao_roda_de_novo(fila, monkeypatch):
+    _job('em-andamento', 'processando', idade=5)
+    monkeypatch.setattr(fila, '_render_relatorio', lambda job, path: pytest.fail('renderizou duas vezes'))
+
+    fila._run(app, 'em-andamento')
+    assert db.session.get(PdfRenderJob, 'em-andamento').status == 'processando'
+
+
+def _falhar_render(job, path):
+    raise RuntimeError('WeasyPrint caiu')
+
+
+def test_falha_do_email_de_aprovacao_volta_para_a_fila(fila, monkeypatch):
+    _job('aprovacao', 'pendente', idade=5)
+    monkeypatch.setattr(fila, '_render_relatorio', _falhar_render)
+
+    fila._run(app, 'aprovacao')
+    job = db.session.get(PdfRenderJob, 'aprovacao')
+    assert (job.status, job.tentativas) == ('pendente', 1)
+    assert fila.despachados == ['aprovacao'] and fila.alertas == []
+
+
+def test_falha_no_limite_avisa_quem_aprovou(fila, monkeypatch):
+    _job('aprovacao', 'pendente', idade=5, tentativas=fila.max_attempts)
+    _job('download', 'pendente', idade=5, acao=None)
+    monkeypatch.setattr(fila, '_render_relatorio', _falhar_render)
+
+    fila._run(app, 'aprovacao')
+    fila._run(app, 'download')
+    assert db.session.get(PdfRenderJob, 'aprovacao').status == 'erro'
+    assert 'WeasyPrint caiu' in db.session.get(PdfRenderJob, 'aprovacao').erro
+    assert db.session.get(PdfRenderJob, 'download').status == 'erro'
+    assert fila.alertas == ['aprovacao'] and fila.despachados == []
+
+
+def test_resultado_vai_para_o_store(fila, monkeypatch):
+    _job('pronto', 'pendente', idade=5, acao=None)
+
+    def render(job, path):
+        with open(path, 'wb') as f:
+            f.write(b'%PDF-1.4 teste')
+    monkeypatch.setattr(fila, '_render_relatorio', render)
+
+    fila._run(app, 'pronto')
+    job = db.session.get(PdfRenderJob, 'pronto')
+    assert job.status == 'concluido' and job.result_path is None
+    digest = job.result_hash
+    assert get_result_store().read(digest) == b'%PDF-1.4 teste'
+    assert not os.path.exists(fila.result_path('pronto'))
+
+    with app.test_request_context(headers={'Range': 'bytes=0-3'}):
+        response = job_result_response(job, 'relatório.pdf')
+        response.direct_passthrough = False
+        assert response.status_code == 206 and response.get_data() == b'%PDF'
+        assert "filename*=UTF-8''relat%C3%B3rio.pdf" in response.headers['Content-Disposition']
+
+    job.created_at = datetime.utcnow() - timedelta(days=2)
+    job.status = 'concluido'
+    db.session.commit()
+    assert fila.limpar_jobs_antigos(horas=24) == 1
+    assert not get_result_store().exists(digest)
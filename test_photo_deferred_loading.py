@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Teste: listagens de fotos não podem carregar o blob da coluna 'imagem'
+
+A coluna legada é mapeada como deferred/raiseload. Qualquer acesso direto
+a ela numa foto vinda de uma query comum deve falhar; apenas
+query_with_bytes() (serving de imagem e PDF) pode trazê-la.
+
+Uso:
+    python -m pytest test_photo_deferred_loading.py
+"""
+
+import os
+import re
+import tempfile
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('PHOTO_STORE_PATH', tempfile.mkdtemp(prefix='photo_store_test_'))
+
+import pytest
+from sqlalchemy.exc import InvalidRequestError
+
+from app import app, db
+from models import FotoRelatorio
+
+BLOB_COLUMN = re.compile(r'fotos_relatorio\.imagem(?!_)')
+
+
+@pytest.fixture
+def foto_id():
+    with app.app_context():
+        FotoRelatorio.__table__.create(bind=db.engine, checkfirst=True)
+        foto = FotoRelatorio(relatorio_id=1, filename='teste.jpg', legenda='Legenda', ordem=0)
+        foto.imagem_legado = b'\xff\xd8' + b'0' * 1024
+        db.session.add(foto)
+        db.session.commit()
+        yield foto.id
+        db.session.rollback()
+        FotoRelatorio.__table__.drop(bind=db.engine)
+
+
+def test_list_query_does_not_select_blob_column():
+    with app.app_context():
+        sql = str(FotoRelatorio.query.filter_by(relatorio_id=1).order_by(FotoRelatorio.ordem).statement)
+        assert not BLOB_COLUMN.search(sql)
+
+
+def test_list_view_raises_on_blob_access(foto_id):
+    with app.app_context():
+        db.session.expire_all()
+        fotos = FotoRelatorio.query.filter_by(relatorio_id=1).order_by(FotoRelatorio.ordem).all()
+        assert [f.legenda for f in fotos] == ['Legenda']
+        with pytest.raises(InvalidRequestError):
+            fotos[0].imagem_legado
+
+
+def test_query_with_bytes_loads_blob(foto_id):
+    with app.app_context():
+        db.session.expire_all()
+        sql = str(FotoRelatorio.query_with_bytes().filter_by(relatorio_id=1).statement)
+        assert BLOB_COLUMN.search(sql)
+        foto = FotoRelatorio.query_with_bytes().get(foto_id)
+        assert foto.imagem_legado.startswith(b'\xff\xd8')
+
+
+def test_legacy_fallback_logs_caller(foto_id, caplog):
+    with app.app_context():
+        db.session.expire_all()
+        foto = FotoRelatorio.query.get(foto_id)
+        with caplog.at_level('WARNING', logger='models'):
+            assert foto.imagem.startswith(b'\xff\xd8')
+        assert 'test_legacy_fallback_logs_caller' in caplog.text
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Teste: serving de fotos (serve_foto_from_store em routes.py)
+
+Um GET nunca grava: fotos ainda não migradas são servidas da coluna legada
+(migração só pelo migrate_photos_to_blob_store.py). No S3 a resposta custa
+um único HEAD, e um Range fora do arquivo responde 416.
+
+Uso:
+    python -m pytest test_photo_serving.py
+"""
+
+import io
+import os
+import tempfile
+
+os.environ.setdefault('PHOTO_STORE_PATH', tempfile.mkdtemp(prefix='photo_store_test_'))
+
+import pytest
+
+import photo_store
+import routes
+from app import app, db
+from models import FotoRelatorio
+from photo_store import PhotoStore, compute_hash
+
+DADOS = b'\xff\xd8' + b'0' * 1022
+
+
+class _StoreRemoto(PhotoStore):
+    """Store sem caminho local (como o S3) que conta os HEADs"""
+
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.heads = 0
+
+    def exists(self, digest):
+        self.heads += 1
+        return digest in self.blobs
+
+    def size(self, digest):
+        self.heads += 1
+        return len(self.blobs[digest])
+
+    def open(self, digest):
+        return io.BytesIO(self.blobs[digest])
+
+
+@pytest.fixture
+def foto(tabelas):
+    with app.app_context():
+        tabelas(FotoRelatorio)
+        foto = FotoRelatorio(relatorio_id=1, filename='teste.jpg', ordem=0)
+        db.session.add(foto)
+        db.session.commit()
+        yield foto
+        db.session.rollback()
+
+
+def _servir(foto, headers=None):
+    with app.test_request_context(headers=headers or {}):
+        response = routes.serve_foto_from_store(foto, 'image/jpeg')
+        if response is not None:
+            response.direct_passthrough = False
+            response.get_data()
+        return response
+
+
+def test_foto_legada_servida_sem_gravar(foto):
+    foto.imagem_legado = DADOS
+    db.session.commit()
+
+    response = _servir(foto)
+    assert response.status_code == 200 and response.get_data() == DADOS
+    assert _servir(foto, {'Range': 'bytes=0-1'}).get_data() == b'\xff\xd8'
+    assert _servir(foto, {'Range': 'bytes=5000-'}).status_code == 416
+
+    db.session.expire_all()
+    assert foto.imagem_hash is None
+    assert db.session.query(FotoRelatorio.imagem_legado).scalar() == DADOS
+
+
+def test_store_remoto_um_head_e_416(foto, monkeypatch):
+    digest = compute_hash(DADOS)
+    store = _StoreRemoto({digest: DADOS})
+    monkeypatch.setattr(photo_store, '_store', store)
+    foto.imagem_hash = digest
+    db.session.commit()
+
+    response = _servir(foto)
+    assert response.status_code == 200 and response.get_data() == DADOS
+    assert store.heads == 1
+
+    response = _servir(foto, {'Range': 'bytes=0-1'})
+    assert response.status_code == 206 and response.get_data() == b'\xff\xd8'
+
+    response = _servir(foto, {'Range': 'bytes=5000-'})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f'bytes */{len(DADOS)}'
+
+    foto.imagem_hash = compute_hash(b'outra')
+    assert _servir(foto) is None
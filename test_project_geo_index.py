@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Teste: índice espacial de obras (project_geo_index.py)
+
+As obras mais próximas saem em ordem de distância, o raio corta as de fora,
+a busca sem raio expande até achar `limite` obras e o resultado é o mesmo
+de calcular a distância de todas.
+
+Uso:
+    python -m pytest test_project_geo_index.py
+"""
+
+import random
+
+from project_geo_index import ProjectGeoIndex, haversine_km
+
+# Praça da Sé (SP) como referência
+SE = (-23.5503, -46.6339)
+
+OBRAS = [
+    {'id': 1, 'nome': 'Obra Sé', 'latitude': -23.5505, 'longitude': -46.6333},
+    {'id': 2, 'nome': 'Obra Paulista', 'latitude': -23.5614, 'longitude': -46.6559},
+    {'id': 3, 'nome': 'Obra Santos', 'latitude': -23.9608, 'longitude': -46.3336},
+    {'id': 4, 'nome': 'Obra Rio', 'latitude': -22.9068, 'longitude': -43.1729},
+    {'id': 5, 'nome': 'Obra sem GPS', 'latitude': None, 'longitude': None},
+]
+
+
+def _indice(obras=OBRAS):
+    return ProjectGeoIndex(loader=lambda: (dict(obra) for obra in obras), ttl=3600, backend='memory')
+
+
+def test_haversine_km():
+    assert haversine_km(*SE, *SE) == 0
+    # Sé -> Rio de Janeiro: ~360 km
+    assert 350 < haversine_km(*SE, -22.9068, -43.1729) < 365
+
+
+def test_proximos_em_ordem():
+    resultado = _indice().proximos(*SE, limite=3)
+    assert [obra['id'] for obra in resultado] == [1, 2, 3]
+    assert resultado[0]['distancia_km'] < 0.1
+
+
+def test_raio_filtra():
+    assert [obra['id'] for obra in _indice().proximos(*SE, raio_km=5)] == [1, 2]
+    assert _indice().proximos(0.0, 0.0, raio_km=50) == []
+
+
+def test_sem_coordenadas_fora_da_busca():
+    indice = _indice()
+    assert 5 not in [obra['id'] for obra in indice.proximos(*SE, limite=10)]
+    assert [obra['id'] for obra in indice.sem_coordenadas()] == [5]
+
+
+def test_igual_a_forca_bruta():
+    aleatorio = random.Random(42)
+    obras = [{'id': i, 'nome': f'O{i}', 'latitude': aleatorio.uniform(-34, 5),
+              'longitude': aleatorio.uniform(-74, -34)} for i in range(2000)]
+    indice = _indice(obras)
+    for _ in range(20):
+        lat, lon = aleatorio.uniform(-34, 5), aleatorio.uniform(-74, -34)
+        esperado = sorted(obras, key=lambda o: haversine_km(lat, lon, o['latitude'], o['longitude']))
+        assert [o['id'] for o in indice.proximos(lat, lon, limite=15)] == [o['id'] for o in esperado[:15]]
+        dentro = [o['id'] for o in esperado if haversine_km(lat, lon, o['latitude'], o['longitude']) <= 100]
+        assert [o['id'] for o in indice.proximos(lat, lon, raio_km=100, limite=500)] == dentro[:500]
+
+
+def test_invalidate_recarrega():
+    obras = list(OBRAS)
+    indice = _indice(obras)
+    assert indice.proximos(*SE, limite=1)[0]['id'] == 1
+    obras[0] = dict(obras[0], latitude=10.0, longitude=10.0)
+    indice.invalidate()
+    assert indice.proximos(*SE, limite=1)[0]['id'] == 2
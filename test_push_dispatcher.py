@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Teste: despachante de push notifications (push_dispatcher.py)
+
+Notificações da mesma rodada viram um push por usuário, conteúdos iguais saem
+numa única chamada ao OneSignal e player IDs rejeitados são removidos.
+
+Uso:
+    python -m pytest test_push_dispatcher.py
+"""
+
+import pytest
+
+from app import app, db
+from models import Notificacao, User, UserDevice
+from push_dispatcher import PushDispatcher
+
+
+@pytest.fixture
+def envios(monkeypatch):
+    chamadas = []
+
+    def send(player_ids, title, message, url, data):
+        chamadas.append((sorted(player_ids), message))
+        invalidos = [pid for pid in player_ids if pid.startswith('velho')]
+        return {'success': len(invalidos) < len(player_ids), 'recipients': len(player_ids) - len(invalidos),
+                'response': {'errors': {'invalid_player_ids': invalidos}} if invalidos else {}}
+
+    monkeypatch.setattr(PushDispatcher, '_send', staticmethod(send))
+    return chamadas
+
+
+@pytest.fixture
+def usuarios(tabelas):
+    with app.app_context():
+        tabelas(User, UserDevice, Notificacao)
+        criados = []
+        for i, devices in enumerate([['p1a', 'p1b'], ['p2', 'velho2'], ['velho3']]):
+            user = User(username=f'push{i}', email=f'push{i}@example.com', nome_completo=f'Push {i}',
+                        password_hash='x')
+            db.session.add(user)
+            db.session.flush()
+            db.session.add_all(UserDevice(user_id=user.id, player_id=pid) for pid in devices)
+            criados.append(user.id)
+        db.session.commit()
+        yield criados
+        db.session.rollback()
+
+
+def _notificar(user_id, mensagem):
+    notificacao = Notificacao(user_id=user_id, tipo='obra_criada', titulo='Obra', mensagem=mensagem,
+                              link_destino='/projects/1', status='nova')
+    db.session.add(notificacao)
+    db.session.commit()
+    return ('notificacao', notificacao.id)
+
+
+def test_mesmo_conteudo_uma_chamada(usuarios, envios):
+    itens = [_notificar(uid, 'Nova obra') for uid in usuarios]
+    PushDispatcher(window=0).dispatch(itens)
+
+    assert len(envios) == 1
+    assert envios[0][0] == ['p1a', 'p1b', 'p2', 'velho2', 'velho3']
+    resultado = {n.user_id: n.push_sucesso for n in Notificacao.query.all()}
+    assert resultado == {usuarios[0]: True, usuarios[1]: True, usuarios[2]: False}
+
+
+def test_varias_do_mesmo_usuario_viram_um_push(usuarios, envios):
+    itens = [_notificar(usuarios[0], 'Primeira'), _notificar(usuarios[0], 'Segunda')]
+    PushDispatcher(window=0).dispatch(itens)
+
+    assert len(envios) == 1
+    assert envios[0][1].startswith('Você tem 2 novas notificações')
+    assert all(n.push_enviado for n in Notificacao.query.all())
+
+
+def test_player_ids_invalidos_removidos(usuarios, envios):
+    PushDispatcher(window=0).dispatch([_notificar(uid, 'Nova obra') for uid in usuarios])
+
+    restantes = {d.player_id for d in UserDevice.query.all()}
+    assert restantes == {'p1a', 'p1b', 'p2'}
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Teste: índice de nomes de destinatários (recipient_index.py)
+
+O e-mail de um acompanhante é encontrado pelo nome mesmo com acentos,
+maiúsculas, pontuação ou palavras fora de ordem; nomes sem semelhança
+suficiente não retornam nada.
+
+Uso:
+    python -m pytest test_recipient_index.py
+"""
+
+from recipient_index import RecipientNameIndex, normalizar_nome, trigramas
+
+NOMES = [
+    ('João da Silva', 'joao@example.com'),
+    ('Maria Souza', 'maria@example.com'),
+    ('john', 'john@example.com'),
+    ('Contato sem email', None),
+]
+
+
+def _indice(nomes=NOMES):
+    return RecipientNameIndex(loader=lambda: iter(nomes), ttl=3600, backend='memory')
+
+
+def test_normalizar_nome():
+    assert normalizar_nome('  José  da Silva-Júnior ') == 'jose da silva junior'
+    assert normalizar_nome(None) == ''
+
+
+def test_trigramas_formato_pg_trgm():
+    assert trigramas('ana') == {'  a', ' an', 'ana', 'na '}
+
+
+def test_lookup_tolerante():
+    indice = _indice()
+    assert indice.lookup('joao silva') == 'joao@example.com'
+    assert indice.lookup('SOUZA, Maria') == 'maria@example.com'
+    assert indice.lookup('Jon') == 'john@example.com'
+
+
+def test_lookup_sem_correspondencia():
+    indice = _indice()
+    assert indice.lookup('Pedro Albuquerque') is None
+    assert indice.lookup('Contato sem email') is None
+    assert indice.lookup('') is None
+
+
+def test_invalidate_recarrega():
+    nomes = list(NOMES)
+    indice = _indice(nomes)
+    assert indice.lookup('Pedro Albuquerque') is None
+
+    nomes.append(('Pedro Albuquerque', 'pedro@example.com'))
+    assert indice.lookup('Pedro Albuquerque') is None  # resultado em cache até invalidar
+    indice.invalidate()
+    assert indice.lookup('Pedro Albuquerque') == 'pedro@example.com'
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Teste: listagem de relatórios (report_listing.py)
+
+Paginação por cursor em (created_at, id) percorre tudo sem repetir, volta com
+"Anterior" e as listas dos filtros saem do cache até um Projeto mudar de nome.
+
+Uso:
+    python -m pytest test_report_listing.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import app, db
+from models import Projeto, Relatorio, User
+from report_listing import ReportListCache, install_invalidation_listeners, paginar_keyset, report_list_cache
+
+install_invalidation_listeners()
+
+ORDEM = [(Relatorio.created_at, datetime.fromisoformat), (Relatorio.id, int)]
+
+
+@pytest.fixture
+def relatorios(tabelas):
+    with app.app_context():
+        tabelas(User, Projeto, Relatorio)
+        user = User(username='lista', email='lista@example.com', nome_completo='Eng. Lista', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        projeto = Projeto(numero='OB-5', nome='Obra Lista', tipo_obra='Residencial', construtora='C',
+                          nome_funcionario='F', responsavel_id=user.id, email_principal='obra@example.com')
+        db.session.add(projeto)
+        db.session.flush()
+        base = datetime(2026, 1, 1)
+        # Dois relatórios por horário: o id desempata
+        for i in range(7):
+            db.session.add(Relatorio(numero=f'R{i}', projeto_id=projeto.id, autor_id=user.id,
+                                     created_at=base + timedelta(hours=i // 2)))
+        db.session.commit()
+        yield projeto
+        db.session.rollback()
+
+
+def test_percorre_todas_as_paginas(relatorios):
+    vistos, cursor = [], None
+    while True:
+        pagina = paginar_keyset(Relatorio.query, ORDEM, cursor, por_pagina=3)
+        vistos.extend(r.numero for r in pagina.items)
+        if not pagina.has_next:
+            break
+        cursor = pagina.proximo_cursor
+    assert vistos == ['R6', 'R5', 'R4', 'R3', 'R2', 'R1', 'R0']
+
+
+def test_pagina_anterior(relatorios):
+    primeira = paginar_keyset(Relatorio.query, ORDEM, por_pagina=3)
+    segunda = paginar_keyset(Relatorio.query, ORDEM, primeira.proximo_cursor, por_pagina=3)
+    volta = paginar_keyset(Relatorio.query, ORDEM, segunda.cursor_anterior, anterior=True, por_pagina=3)
+    assert [r.numero for r in volta.items] == [r.numero for r in primeira.items]
+    assert not volta.has_prev and volta.has_next
+
+
+def test_cursor_invalido(relatorios):
+    with pytest.raises(ValueError):
+        paginar_keyset(Relatorio.query, ORDEM, 'lixo')
+
+
+def test_total_guardado_por_filtro(relatorios):
+    cache = ReportListCache(ttl_total=60)
+    assert cache.total(('todos',), Relatorio.query) == 7
+    db.session.add(Relatorio(numero='R7', projeto_id=relatorios.id, autor_id=relatorios.responsavel_id))
+    db.session.commit()
+    assert cache.total(('todos',), Relatorio.query) == 7
+    assert cache.total(('outro',), Relatorio.query) == 8
+
+
+def test_opcoes_invalidadas_ao_renomear_projeto(relatorios):
+    report_list_cache.invalidar_opcoes()
+    projetos, autores = report_list_cache.opcoes_filtro()
+    assert [p.nome for p in projetos] == ['Obra Lista']
+    assert [a.nome for a in autores] == ['Eng. Lista']
+
+    relatorios.nome = 'Obra Renomeada'
+    db.session.commit()
+    assert [p.nome for p in report_list_cache.opcoes_filtro()[0]] == ['Obra Renomeada']
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Teste: busca de relatórios (report_search.py)
+
+No SQLite a busca usa o fallback ILIKE; confere que o backend 'auto' cai
+para ele, que o texto do relatório (não só número/título) é pesquisado, que o
+nome da obra e do autor continuam valendo e que os dois tipos de relatório
+aparecem juntos na busca ranqueada, sem relevância nem trecho.
+
+Uso:
+    python -m pytest test_report_search.py
+"""
+
+import pytest
+
+from app import app, db
+from models import Projeto, Relatorio, RelatorioExpress, User
+from report_search import ReportSearch
+
+
+@pytest.fixture
+def dados(tabelas):
+    with app.app_context():
+        tabelas(User, Projeto, Relatorio, RelatorioExpress)
+        user = User(username='busca', email='busca@example.com', nome_completo='Eng. Busca', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        projeto = Projeto(numero='OB-9', nome='Edifício Aurora', tipo_obra='Residencial', construtora='C',
+                          nome_funcionario='F', responsavel_id=user.id, email_principal='obra@example.com')
+        db.session.add(projeto)
+        db.session.flush()
+        db.session.add_all([
+            Relatorio(numero='R1', titulo='Visita', projeto_id=projeto.id, autor_id=user.id,
+                      conteudo='Pilar P3 com ninho de concretagem na base'),
+            Relatorio(numero='R2', titulo='Visita', projeto_id=projeto.id, autor_id=user.id,
+                      conteudo='Alvenaria sem problemas'),
+            RelatorioExpress(numero='EXP-0001', empresa_nome='E', obra_nome='Galpão Norte', autor_id=user.id,
+                             observacoes_finais='Ninho de concretagem na viga V2'),
+        ])
+        db.session.commit()
+        yield
+        db.session.rollback()
+
+
+def test_auto_sem_postgres_usa_ilike(dados):
+    busca = ReportSearch(backend='auto')
+    assert not busca.usa_fts()
+    assert busca.relevancia('relatorios', 'ninho') is None
+    assert busca.ordem_relevancia('relatorios', 'ninho') == []
+
+
+def test_busca_no_conteudo(dados):
+    busca = ReportSearch(backend='ilike')
+    encontrados = Relatorio.query.filter(busca.filtro_relatorios('ninho de concretagem')).all()
+    assert [r.numero for r in encontrados] == ['R1']
+
+
+def test_nome_da_obra_continua_valendo(dados):
+    busca = ReportSearch(backend='ilike')
+    assert Relatorio.query.filter(busca.filtro_relatorios('Aurora')).count() == 2
+    assert Relatorio.query.filter(busca.filtro_relatorios('Eng. Busca')).count() == 2
+    assert Relatorio.query.filter(busca.filtro_relatorios('Obra inexistente')).count() == 0
+
+
+def test_filtro_express(dados):
+    busca = ReportSearch(backend='ilike')
+    assert [r.numero for r in RelatorioExpress.query.filter(busca.filtro_express('galpão'))] == ['EXP-0001']
+    assert RelatorioExpress.query.filter(busca.filtro_express('alvenaria')).count() == 0
+
+
+def test_busca_ranqueada_junta_os_dois_tipos(dados):
+    with app.test_request_context():
+        resultados = ReportSearch(backend='ilike').buscar('ninho de concretagem')
+    assert {(r['tipo'], r['numero']) for r in resultados} == {('relatorio', 'R1'), ('express', 'EXP-0001')}
+    assert {r['relevancia'] for r in resultados} == {0.0}
+    assert {r['trecho'] for r in resultados} == {None}
+    assert ReportSearch(backend='ilike').buscar('ninho', tipo='express')[0]['obra'] == 'Galpão Norte'
+    assert ReportSearch(backend='ilike').buscar('   ') == []
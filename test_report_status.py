@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Teste: status canônicos de relatórios (report_status.py)
+
+Grafias legadas viram o valor canônico gravado no banco; valores
+desconhecidos são recusados.
+
+Uso:
+    python -m pytest test_report_status.py
+"""
+
+import pytest
+
+import report_status
+from report_status import normalizar_status
+
+
+@pytest.mark.parametrize('valor, esperado', [
+    ('Em Preenchimento', report_status.PREENCHIMENTO),
+    ('em_andamento', report_status.PREENCHIMENTO),
+    ('Aguardando Aprovacao', report_status.AGUARDANDO_APROVACAO),
+    ('  aguardando  APROVAÇÃO ', report_status.AGUARDANDO_APROVACAO),
+    ('aprovado final', report_status.APROVADO),
+    ('Em edicao', report_status.EM_EDICAO),
+    ('Finalizado', report_status.FINALIZADO),
+])
+def test_relatorio(valor, esperado):
+    assert normalizar_status(valor) == esperado
+
+
+def test_express_tem_grafia_propria_de_preenchimento():
+    assert normalizar_status('preenchimento', express=True) == report_status.EXPRESS_PREENCHIMENTO
+    assert normalizar_status('finalizado', express=True) == report_status.APROVADO
+
+
+def test_canonicos_sao_pontos_fixos():
+    for valor in report_status.STATUS_RELATORIO:
+        assert normalizar_status(valor) == valor
+    for valor in report_status.STATUS_EXPRESS:
+        assert normalizar_status(valor, express=True) == valor
+
+
+def test_desconhecido_e_none():
+    assert normalizar_status(None) is None
+    with pytest.raises(ValueError):
+        normalizar_status('Em Análise')
+    with pytest.raises(ValueError):
+        normalizar_status('Enviado', express=True)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Teste: API do app mobile (routes_api.py)
+
+Campos esparsos com ?fields=, paginação por cursor no header X-Next-Cursor,
+escopo do usuário não master e nomes de projeto/autor vindos do JOIN, sem
+carregar as entidades.
+
+Uso:
+    python -m pytest test_routes_api.py
+"""
+
+import datetime
+
+import jwt
+import pytest
+
+from app import app, db
+from models import Projeto, Relatorio, User, Visita
+from routes_api import api_bp, get_jwt_secret
+
+if 'api' not in app.blueprints:
+    app.register_blueprint(api_bp)
+
+
+@pytest.fixture
+def cliente(tabelas):
+    with app.app_context():
+        tabelas(User, Projeto, Relatorio, Visita)
+        user = User(username='mobile', email='mobile@example.com', nome_completo='Eng. Mobile',
+                    password_hash='x', is_master=True)
+        db.session.add(user)
+        db.session.flush()
+        projeto = Projeto(numero='OB-1', nome='Torre A', tipo_obra='Residencial', construtora='C',
+                          nome_funcionario='F', responsavel_id=user.id, email_principal='obra@example.com',
+                          status='Ativo')
+        db.session.add(projeto)
+        db.session.flush()
+        for i in range(5):
+            db.session.add(Relatorio(numero=f'R{i}', titulo=f'Relatório {i}', projeto_id=projeto.id,
+                                     autor_id=user.id, status='Rascunho'))
+        agora = datetime.datetime(2026, 10, 17, 9, 0)
+        db.session.add(Visita(numero='V1', projeto_id=projeto.id, responsavel_id=user.id,
+                              data_inicio=agora, data_fim=agora + datetime.timedelta(hours=1)))
+        db.session.add(Visita(numero='V2', projeto_outros='Galpão', responsavel_id=user.id,
+                              data_inicio=agora, data_fim=agora + datetime.timedelta(hours=1)))
+        db.session.commit()
+
+        with app.test_request_context():
+            token = jwt.encode({'user_id': user.id}, get_jwt_secret(), algorithm='HS256')
+        client = app.test_client()
+        client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        yield client
+        db.session.rollback()
+
+
+def test_relatorios_campos_esparsos(cliente):
+    resposta = cliente.get('/api/reports?fields=id,projeto_nome,autor_nome')
+    assert resposta.status_code == 200
+    itens = resposta.get_json()
+    assert len(itens) == 5
+    assert set(itens[0]) == {'id', 'projeto_nome', 'autor_nome'}
+    assert itens[0]['projeto_nome'] == 'Torre A'
+    assert itens[0]['autor_nome'] == 'Eng. Mobile'
+    assert [i['id'] for i in itens] == sorted((i['id'] for i in itens), reverse=True)
+
+
+def test_relatorios_paginacao_por_cursor(cliente):
+    vistos = []
+    url = '/api/reports?limit=2&fields=id'
+    while url:
+        resposta = cliente.get(url)
+        vistos.extend(i['id'] for i in resposta.get_json())
+        cursor = resposta.headers.get('X-Next-Cursor')
+        url = f'/api/reports?limit=2&fields=id&cursor={cursor}' if cursor else None
+    assert len(vistos) == 5 and len(set(vistos)) == 5
+
+
+def test_campo_desconhecido(cliente):
+    assert cliente.get('/api/reports?fields=id,senha').status_code == 400
+    assert cliente.get('/api/reports?cursor=lixo').status_code == 400
+
+
+def test_visitas_nome_do_projeto(cliente):
+    itens = cliente.get('/api/visits?fields=numero,projeto_nome').get_json()
+    assert {i['numero']: i['projeto_nome'] for i in itens} == {'V1': 'OB-1 - Torre A', 'V2': 'Galpão'}
+
+
+def test_usuario_comum_ve_so_os_seus(cliente):
+    with app.app_context():
+        outro = User(username='campo', email='campo@example.com', nome_completo='Eng. Campo', password_hash='x')
+        db.session.add(outro)
+        db.session.flush()
+        projeto_id = Projeto.query.first().id
+        for i in range(3):
+            db.session.add(Relatorio(numero=f'C{i}', projeto_id=projeto_id, autor_id=outro.id))
+        db.session.commit()
+        with app.test_request_context():
+            token = jwt.encode({'user_id': outro.id}, get_jwt_secret(), algorithm='HS256')
+
+    cabecalho = {'Authorization': f'Bearer {token}'}
+    primeira = cliente.get('/api/reports?limit=2&fields=numero,autor_nome', headers=cabecalho)
+    assert primeira.status_code == 200
+    segunda = cliente.get(f"/api/reports?limit=2&fields=numero&cursor={primeira.headers['X-Next-Cursor']}",
+                          headers=cabecalho)
+    assert segunda.status_code == 200
+    numeros = [i['numero'] for i in primeira.get_json() + segunda.get_json()]
+    assert numeros == ['C2', 'C1', 'C0']
+    assert {i['autor_nome'] for i in primeira.get_json()} == {'Eng. Campo'}
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Teste: registro de tarefas e sincronização com o job store (scheduler_tasks.py)
+
+Jobs já persistidos mantêm o próximo horário, jobs que saíram do registro são
+removidos e todos apontam para executar_tarefa com o id como argumento. Os
+crons seguem o horário de Brasília, não o relógio UTC do container.
+
+Uso:
+    python -m pytest test_scheduler_tasks.py
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+
+import scheduler_tasks
+from scheduler_tasks import TarefaAgendada, _sincronizar_jobs, executar_tarefa
+
+
+@pytest.fixture
+def sched(monkeypatch):
+    monkeypatch.setattr(scheduler_tasks, 'TAREFAS', {
+        'a': TarefaAgendada('a', 'Tarefa A', lambda: None, IntervalTrigger(hours=1), {}),
+        'b': TarefaAgendada('b', 'Tarefa B', lambda: None, IntervalTrigger(minutes=5), {'misfire_grace_time': 60}),
+    })
+    s = BackgroundScheduler(job_defaults=scheduler_tasks.JOB_DEFAULTS)
+    s.start(paused=True)
+    yield s
+    s.shutdown(wait=False)
+
+
+def test_sincroniza_registro(sched):
+    proxima = datetime.now().astimezone() + timedelta(minutes=17)
+    sched.add_job(executar_tarefa, IntervalTrigger(hours=1), args=['a'], id='a', next_run_time=proxima)
+    sched.add_job(executar_tarefa, IntervalTrigger(hours=1), args=['velha'], id='velha')
+
+    _sincronizar_jobs(sched)
+
+    jobs = {job.id: job for job in sched.get_jobs()}
+    assert set(jobs) == {'a', 'b'}
+    assert jobs['a'].next_run_time == proxima
+    assert jobs['a'].name == 'Tarefa A'
+    assert jobs['b'].args == ('b',)
+    assert jobs['b'].misfire_grace_time == 60
+    assert jobs['b'].coalesce and jobs['b'].max_instances == 1
+
+
+def test_trigger_alterado_reagenda(sched):
+    sched.add_job(executar_tarefa, IntervalTrigger(hours=12), args=['a'], id='a')
+
+    _sincronizar_jobs(sched)
+
+    assert str(sched.get_job('a').trigger) == str(IntervalTrigger(hours=1))
+
+
+def test_fuso_padrao_e_sao_paulo(monkeypatch):
+    from app import app
+
+    monkeypatch.delenv('SCHEDULER_TIMEZONE', raising=False)
+    monkeypatch.delenv('TZ', raising=False)
+    with app.app_context():
+        assert str(scheduler_tasks._criar_scheduler().timezone) == 'America/Sao_Paulo'
+
+        monkeypatch.setenv('TZ', 'UTC')
+        assert str(scheduler_tasks._criar_scheduler().timezone) == 'UTC'
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Teste: delta sync do app mobile (/api/sync/down?since=)
+
+A carga completa devolve um cursor; o sync seguinte traz só o que mudou, com
+exclusões (tombstones) e projetos inativados em 'removidos'. Respostas grandes
+saem comprimidas.
+
+Uso:
+    python -m pytest test_sync_delta.py
+"""
+
+import gzip
+import datetime
+
+import jwt
+import pytest
+
+import routes_api
+from app import app, db
+from models import FotoRelatorio, Lembrete, Projeto, Relatorio, SyncTombstone, User, Visita
+from routes_api import api_bp, get_jwt_secret
+from sync_tombstones import install_tombstone_listeners
+
+if 'api' not in app.blueprints:
+    app.register_blueprint(api_bp)
+install_tombstone_listeners()
+
+
+@pytest.fixture
+def cliente(tabelas, monkeypatch):
+    # Sem folga no cursor: o teste não espera commits atrasados
+    monkeypatch.setattr(routes_api, 'FOLGA_CURSOR_SYNC', datetime.timedelta(0))
+    with app.app_context():
+        tabelas(User, Projeto, Relatorio, FotoRelatorio, Visita, Lembrete, SyncTombstone)
+        user = User(username='campo', email='campo@example.com', nome_completo='Eng. Campo', password_hash='x')
+        db.session.add(user)
+        db.session.flush()
+        for numero in ('OB-1', 'OB-2'):
+            db.session.add(Projeto(numero=numero, nome=f'Obra {numero}', tipo_obra='Residencial', construtora='C',
+                                   nome_funcionario='F', responsavel_id=user.id,
+                                   email_principal='obra@example.com', status='Ativo'))
+        db.session.flush()
+        projeto = Projeto.query.filter_by(numero='OB-1').one()
+        for i in range(3):
+            relatorio = Relatorio(numero=f'R{i}', titulo=f'Relatório {i}', projeto_id=projeto.id,
+                                  autor_id=user.id, status='Rascunho')
+            db.session.add(relatorio)
+            db.session.flush()
+            db.session.add(FotoRelatorio(relatorio_id=relatorio.id, legenda=f'Foto {i}', ordem=0))
+        db.session.commit()
+
+        with app.test_request_context():
+            token = jwt.encode({'user_id': user.id}, get_jwt_secret(), algorithm='HS256')
+        client = app.test_client()
+        client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        yield client
+        db.session.rollback()
+
+
+def test_carga_completa_e_delta(cliente):
+    completa = cliente.get('/api/sync/down').get_json()
+    assert completa['completo'] is True and completa['tem_mais'] is False
+    assert len(completa['projetos']) == 2
+    assert len(completa['relatorios']) == 3
+    assert len(completa['fotos']) == 3
+
+    relatorio = Relatorio.query.filter_by(numero='R0').one()
+    relatorio.titulo = 'Relatório revisado'
+    db.session.delete(FotoRelatorio.query.filter_by(legenda='Foto 1').one())
+    Projeto.query.filter_by(numero='OB-2').one().status = 'Concluído'
+    db.session.commit()
+
+    delta = cliente.get(f"/api/sync/down?since={completa['cursor']}").get_json()
+    assert delta['completo'] is False
+    assert [r['titulo'] for r in delta['relatorios']] == ['Relatório revisado']
+    assert delta['fotos'] == [] and delta['projetos'] == []
+    assert len(delta['removidos']['fotos']) == 1
+    assert delta['removidos']['projetos'] == [Projeto.query.filter_by(numero='OB-2').one().id]
+
+    vazio = cliente.get(f"/api/sync/down?since={delta['cursor']}").get_json()
+    assert vazio['relatorios'] == [] and vazio['removidos'] == {}
+
+
+def test_paginas_por_entidade(cliente, monkeypatch):
+    monkeypatch.setattr(routes_api, 'LIMITE_SYNC', 2)
+    vistos, url = [], '/api/sync/down'
+    while url:
+        dados = cliente.get(url).get_json()
+        vistos.extend(r['id'] for r in dados['relatorios'])
+        url = f"/api/sync/down?since={dados['cursor']}" if dados['tem_mais'] else None
+    assert len(vistos) == 3 and len(set(vistos)) == 3
+
+
+def test_cursor_invalido(cliente):
+    assert cliente.get('/api/sync/down?since=lixo').status_code == 400
+
+
+def test_resposta_comprimida(cliente, monkeypatch):
+    monkeypatch.setattr(routes_api, 'brotli', None)
+    monkeypatch.setattr(routes_api, 'TAMANHO_MINIMO_COMPRESSAO', 0)
+    resposta = cliente.get('/api/sync/down', headers={'Accept-Encoding': 'gzip, br'})
+    assert resposta.headers['Content-Encoding'] == 'gzip'
+    assert b'"projetos"' in gzip.decompress(resposta.get_data())